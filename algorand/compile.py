@@ -1,12 +1,17 @@
-
 from pyteal import compileTeal, Mode
 
 from contract import approval_program, clear_program
 
-with open("approval.teal", "w") as f:
-    compiled = compileTeal(approval_program(), mode=Mode.Application, version=6)
-    f.write(compiled)
 
-with open("clear.teal", "w") as f:
-    compiled = compileTeal(clear_program(), mode=Mode.Application, version=6)
-    f.write(compiled)
+def compile_contract():
+    with open("approval.teal", "w") as f:
+        compiled = compileTeal(approval_program(), mode=Mode.Application, version=6)
+        f.write(compiled)
+
+    with open("clear.teal", "w") as f:
+        compiled = compileTeal(clear_program(), mode=Mode.Application, version=6)
+        f.write(compiled)
+
+
+if __name__ == "__main__":
+    compile_contract()
@@ -2,6 +2,17 @@
 
 from pyteal import *
 
+VERSION = "0.1.1"
+TEAL_VERSION = 6
+
+GLOBAL_SCHEMA = {"num_uints": 2, "num_byte_slices": 2}
+LOCAL_SCHEMA = {"num_uints": 1, "num_byte_slices": 0}
+
+METHODS = {
+    "fund": ["amount:uint64"],
+    "spend": ["amount:uint64"],
+}
+
 def approval_program():
     # Application global state
     balance_key = Bytes("balance")  # int
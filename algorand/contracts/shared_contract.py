@@ -0,0 +1,133 @@
+# shared_contract.py
+#
+# One application for every tenant instead of one legacy contract.py app per
+# user. Each tenant is a box "t" + sha256(user_id) holding
+# owner (32 bytes) | balance (uint64) | limit (uint64), so onboarding is a
+# single register call and phone numbers never go on chain.
+
+from pyteal import *
+
+VERSION = "0.1.0"
+TEAL_VERSION = 8
+
+GLOBAL_SCHEMA = {"num_uints": 1, "num_byte_slices": 1}
+LOCAL_SCHEMA = {"num_uints": 0, "num_byte_slices": 0}
+
+# Every method takes the tenant key (sha256 of the user ID) first and must
+# reference the tenant's box
+METHODS = {
+    "register": ["tenant:bytes", "owner:address"],
+    "import_tenant": ["tenant:bytes", "owner:address", "balance:uint64", "limit:uint64"],
+    "fund": ["tenant:bytes", "amount:uint64"],
+    "spend": ["tenant:bytes", "amount:uint64"],
+    "set_limit": ["tenant:bytes", "limit:uint64"],
+}
+
+TENANT_PREFIX = b"t"
+TENANT_KEY_SIZE = 32
+TENANT_BOX_SIZE = 48
+DEFAULT_LIMIT = 1000000  # 1 Algo, as in contract.py
+
+BOXES = {
+    "tenant": {
+        "prefix": TENANT_PREFIX.hex(),
+        "key": "tenant:sha256(user_id)",
+        "value": "owner:address,balance:uint64,limit:uint64",
+    },
+}
+
+
+def approval_program():
+    admin_key = Bytes("admin")          # address allowed to onboard tenants
+    tenants_key = Bytes("tenants")      # int
+
+    tenant = Txn.application_args[1]
+    tenant_box = Concat(Bytes(TENANT_PREFIX), tenant)
+    owner = App.box_extract(tenant_box, Int(0), Int(32))
+    balance = Btoi(App.box_extract(tenant_box, Int(32), Int(8)))
+    limit = Btoi(App.box_extract(tenant_box, Int(40), Int(8)))
+    amount = Btoi(Txn.application_args[2])
+
+    is_admin = Txn.sender() == App.globalGet(admin_key)
+    created = ScratchVar(TealType.uint64)
+
+    def create_tenant(owner_arg, balance_value, limit_value):
+        return Seq([
+            Assert(Len(tenant) == Int(TENANT_KEY_SIZE)),
+            Assert(Len(owner_arg) == Int(32)),
+            created.store(App.box_create(tenant_box, Int(TENANT_BOX_SIZE))),
+            # Re-running an onboarding or migration batch leaves existing
+            # tenants untouched
+            If(created.load()).Then(Seq([
+                App.box_put(tenant_box, Concat(owner_arg, Itob(balance_value), Itob(limit_value))),
+                App.globalPut(tenants_key, App.globalGet(tenants_key) + Int(1)),
+            ])),
+            Log(Concat(
+                If(created.load(), Bytes("TenantCreated:"), Bytes("TenantExists:")),
+                tenant
+            )),
+            Approve()
+        ])
+
+    on_create = Seq([
+        App.globalPut(admin_key, Txn.sender()),
+        App.globalPut(tenants_key, Int(0)),
+        Approve()
+    ])
+
+    on_register = Seq([
+        Assert(Txn.application_args.length() == Int(3)),
+        Assert(is_admin),
+        create_tenant(Txn.application_args[2], Int(0), Int(DEFAULT_LIMIT))
+    ])
+
+    on_import = Seq([
+        Assert(Txn.application_args.length() == Int(5)),
+        Assert(is_admin),
+        create_tenant(
+            Txn.application_args[2],
+            Btoi(Txn.application_args[3]),
+            Btoi(Txn.application_args[4])
+        )
+    ])
+
+    on_fund = Seq([
+        Assert(Txn.application_args.length() == Int(3)),
+        Assert(is_admin),
+        App.box_replace(tenant_box, Int(32), Itob(balance + amount)),
+        Approve()
+    ])
+
+    on_spend = Seq([
+        Assert(Txn.application_args.length() == Int(3)),
+        Assert(Txn.sender() == owner),
+        Assert(balance >= amount),
+        Assert(amount <= limit),
+        App.box_replace(tenant_box, Int(32), Itob(balance - amount)),
+        Approve()
+    ])
+
+    on_set_limit = Seq([
+        Assert(Txn.application_args.length() == Int(3)),
+        Assert(is_admin),
+        Assert(Len(Txn.application_args[2]) == Int(8)),
+        Assert(Len(owner) == Int(32)),  # tenant exists
+        App.box_replace(tenant_box, Int(40), Txn.application_args[2]),
+        Approve()
+    ])
+
+    program = Cond(
+        [Txn.application_id() == Int(0), on_create],
+        [Txn.on_completion() == OnComplete.NoOp, Cond(
+            [Txn.application_args[0] == Bytes("register"), on_register],
+            [Txn.application_args[0] == Bytes("import_tenant"), on_import],
+            [Txn.application_args[0] == Bytes("fund"), on_fund],
+            [Txn.application_args[0] == Bytes("spend"), on_spend],
+            [Txn.application_args[0] == Bytes("set_limit"), on_set_limit],
+        )]
+    )
+
+    return program
+
+def clear_program():
+    return Approve()
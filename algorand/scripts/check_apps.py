@@ -3,14 +3,15 @@
 """
 Check applications created by an address
 """
-import requests
-import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from instrumentation import algod_client_from_env
 
 def check_created_apps(address):
     try:
-        url = f"https://testnet-api.algonode.cloud/v2/accounts/{address}"
-        response = requests.get(url)
-        data = response.json()
+        data = algod_client_from_env().account_info(address)
         if "created-apps" in data:
             for app in data["created-apps"]:
                 print(f"Application ID: {app['id']}")
@@ -3,32 +3,32 @@
 simple_balance.py - Super simple balance checker
 """
 
-import requests
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from algosdk.error import AlgodHTTPError
+from instrumentation import algod_client_from_env
 
 def check_balance_simple(address):
-    """Simple balance check using direct API"""
+    """Simple balance check against the node in ALGOD_ADDRESS"""
     try:
-        url = f"https://testnet-api.algonode.cloud/v2/accounts/{address}"
-        response = requests.get(url)
+        data = algod_client_from_env().account_info(address)
+        balance_microalgos = data['amount']
+        balance_algos = balance_microalgos / 1_000_000
         
-        if response.status_code == 200:
-            data = response.json()
-            balance_microalgos = data['amount']
-            balance_algos = balance_microalgos / 1_000_000
-            
-            print(f"Address: {address}")
-            print(f"Balance: {balance_algos:.6f} ALGO")
-            
-            if balance_algos > 0:
-                print("✅ Your wallet is funded!")
-            else:
-                print("❌ Your wallet is empty - get TestNet tokens!")
-                
-            return balance_algos
+        print(f"Address: {address}")
+        print(f"Balance: {balance_algos:.6f} ALGO")
+        
+        if balance_algos > 0:
+            print("✅ Your wallet is funded!")
         else:
-            print(f"Error: {response.status_code}")
-            return None
+            print("❌ Your wallet is empty - get TestNet tokens!")
             
+        return balance_algos
+    except AlgodHTTPError as e:
+        print(f"Error: {e.code}")
+        return None
     except Exception as e:
         print(f"Error: {e}")
         return None
@@ -5,9 +5,12 @@ Your first real Algorand wallet!
 """
 
 from algosdk import account, mnemonic
-from algosdk.v2client import algod
+from pathlib import Path
 import json
-import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from instrumentation import algod_client_from_env
 
 def create_new_wallet():
     """Create a brand new Algorand wallet"""
@@ -70,8 +73,8 @@ def load_existing_wallet():
 def check_wallet_balance(address):
     """Check the balance of a wallet"""
     try:
-        # Connect to TestNet
-        algod_client = algod.AlgodClient("", "https://testnet-api.algonode.cloud", 443)
+        # Connect to TestNet, or the node in ALGOD_ADDRESS
+        algod_client = algod_client_from_env()
         
         # Get account info
         account_info = algod_client.account_info(address)
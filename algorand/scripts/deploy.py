@@ -1,19 +1,21 @@
 # deploy.py
 
-from algosdk.v2client import algod
 from algosdk.future.transaction import *
 from algosdk import account, mnemonic
+from pathlib import Path
 import json
+import sys
 
-# Use your sandbox or Algorand wallet keys
-ALGOD_ADDRESS = "https://testnet-api.algonode.cloud"
-ALGOD_TOKEN = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from instrumentation import algod_client_from_env
+
+# Node from ALGOD_ADDRESS / ALGOD_TOKEN (your sandbox), public TestNet otherwise
 
 creator_mnemonic = "your 25-word mnemonic phrase here"
 creator_private_key = mnemonic.to_private_key(creator_mnemonic)
 creator_address = mnemonic.to_public_key(creator_mnemonic)
 
-algod_client = algod.AlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS)
+algod_client = algod_client_from_env()
 
 with open("approval.teal") as f:
     approval_program = f.read()
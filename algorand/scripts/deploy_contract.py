@@ -4,11 +4,15 @@ deploy_contract.py - Deploy your compiled smart contract to TestNet
 """
 
 from algosdk import account, mnemonic
-from algosdk.v2client import algod
 from algosdk.transaction import ApplicationCreateTxn, wait_for_confirmation
+from pathlib import Path
 import base64
 import os
 import json
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from instrumentation import algod_client_from_env
 
 class ContractDeployer:
     def __init__(self, mnemonic_phrase):
@@ -16,8 +20,8 @@ class ContractDeployer:
         try:
             self.private_key = mnemonic.to_private_key(mnemonic_phrase)
             self.address = account.address_from_private_key(self.private_key)
-            # Connect to TestNet
-            self.algod_client = algod.AlgodClient("", "https://testnet-api.algonode.cloud")
+            # Connect to TestNet, or the node in ALGOD_ADDRESS
+            self.algod_client = algod_client_from_env()
             print(f"🏦 Deploying from wallet: {self.address}")
         except Exception as e:
             print(f"❌ Failed to initialize deployer: {e}")
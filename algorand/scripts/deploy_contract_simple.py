@@ -1,21 +1,39 @@
 import os
+import sys
 import socket
-from algosdk.v2client import algod
+from algosdk.v2client import algod, indexer
 from algosdk import account, mnemonic, transaction
 from algosdk.transaction import ApplicationCreateTxn, OnComplete
 from supabase import create_client
 from pathlib import Path
 import urllib.error
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from algosdk.logic import get_application_address
+from artifacts import ArtifactError, load_artifact
+from fee_policy import FeePolicy
+from submission import Submitter
+from tenants import SharedTenants, tenant_box_min_balance, tenant_key
 
 # Load environment variables
 SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
+# Writes need the service role key under RLS; the anon key is the old fallback
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY', os.getenv('SUPABASE_ANON_KEY'))
 ALGORAND_MNEMONIC = os.getenv('ALGORAND_MNEMONIC')
-ALGORAND_URL = os.getenv('ALGORAND_URL', 'https://testnet-algorand.api.purestake.io/ps2')
+# ALGOD_ADDRESS / ALGOD_TOKEN point it elsewhere, e.g. at mock_algod.py offline
+ALGORAND_URL = os.getenv('ALGORAND_URL', os.getenv('ALGOD_ADDRESS', 'https://testnet-algorand.api.purestake.io/ps2'))
+ALGORAND_TOKEN = os.getenv('ALGOD_TOKEN', 'YOUR_PURESTAKE_API_KEY')
+# "per-user": one legacy app each; "shared": every user is a tenant box in
+# one application (see algorand/contracts/shared_contract.py) whose ID is
+# ALGORAND_SHARED_APP_ID. Deploy that app once with --deploy-shared-app.
+DEPLOY_MODE = os.getenv('ALGORAND_DEPLOY_MODE', 'per-user')
+SHARED_APP_ID = int(os.getenv('ALGORAND_SHARED_APP_ID', '0'))
 
-# Test DNS resolution
+# Test DNS resolution of the configured node
 try:
-    socket.getaddrinfo('testnet-algorand.api.purestake.io', 443)
+    node = urlsplit(ALGORAND_URL)
+    socket.getaddrinfo(node.hostname, node.port or (443 if node.scheme == 'https' else 80))
     print("DNS resolution successful")
 except socket.gaierror as e:
     print(f"DNS resolution failed: {e}")
@@ -26,33 +44,30 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize Algorand client
 try:
-    algod_client = algod.AlgodClient('YOUR_PURESTAKE_API_KEY', ALGORAND_URL, headers={'User-Agent': 'algosdk'})
+    algod_client = algod.AlgodClient(ALGORAND_TOKEN, ALGORAND_URL, headers={'User-Agent': 'algosdk'})
     status = algod_client.status()
     print(f"Algorand node status: {status}")
 except urllib.error.URLError as e:
     print(f"Failed to connect to Algorand node: {e}")
     exit(1)
 
-# Read TEAL files
-def read_teal(file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"TEAL file not found: {file_path}")
-        exit(1)
+# Reruns find app creates and registrations that already confirmed through
+# the indexer; without one they are only refused inside the lease window
+indexer_client = None
+if os.getenv('INDEXER_ADDRESS'):
+    indexer_client = indexer.IndexerClient(os.getenv('INDEXER_TOKEN', ''), os.getenv('INDEXER_ADDRESS'))
+else:
+    print("Warning: INDEXER_ADDRESS is not set, so reruns are not idempotent")
 
-approval_program = read_teal('approval.teal')
-clear_program = read_teal('clear.teal')
+fee_policy = FeePolicy()
 
-# Compile TEAL
+# Load the prebuilt contract artifact for the deploy mode
 try:
-    approval_result = algod_client.compile(approval_program)
-    clear_result = algod_client.compile(clear_program)
-    approval_program = bytes.fromhex(approval_result['hash'])
-    clear_program = bytes.fromhex(clear_result['hash'])
-except Exception as e:
-    print(f"TEAL compilation failed: {e}")
+    artifact = load_artifact("shared_contract" if DEPLOY_MODE == "shared" else "legacy_contract")
+    approval_program = artifact.approval_program
+    clear_program = artifact.clear_program
+except ArtifactError as e:
+    print(f"Contract artifact unavailable: {e}")
     exit(1)
 
 # Deploy contract
@@ -61,14 +76,48 @@ def deploy_contract(user_id):
         private_key = mnemonic.to_private_key(ALGORAND_MNEMONIC)
         address = account.address_from_private_key(private_key)
 
-        params = algod_client.suggested_params()
-        params.fee = 1000
-        params.flat_fee = True
+        global_schema, local_schema = artifact.state_schemas()
+
+        def build(params):
+            return ApplicationCreateTxn(
+                sender=address,
+                sp=params,
+                on_complete=OnComplete.NoOpOC,
+                approval_program=approval_program,
+                clear_program=clear_program,
+                global_schema=global_schema,
+                local_schema=local_schema,
+                app_args=[user_id.encode()]
+            )
+
+        # Keyed by user so a rerun finds their app instead of creating a
+        # second one (through the indexer; see INDEXER_ADDRESS above)
+        submitter = Submitter(algod_client, private_key, indexer_client, fee_policy)
+        result = submitter.submit(f"app_create:user:{user_id}", build, "app_create")
+        app_id = result['application-index']
+
+        # Save to Supabase
+        supabase.table('algorand_contracts').insert({
+            'user_id': user_id,
+            'app_id': app_id,
+            'address': address,
+            'network': 'testnet'
+        }).execute()
+
+        print(f"Deployed contract for user {user_id}: App ID {app_id}")
+        return app_id
+    except Exception as e:
+        print(f"Contract deployment failed: {e}")
+        exit(1)
 
-        global_schema = transaction.StateSchema(num_uints=2, num_byte_slices=2)
-        local_schema = transaction.StateSchema(num_uints=1, num_byte_slices=0)
+# Deploy the shared multi-tenant application (once)
+def deploy_shared_app():
+    private_key = mnemonic.to_private_key(ALGORAND_MNEMONIC)
+    address = account.address_from_private_key(private_key)
+    global_schema, local_schema = artifact.state_schemas()
 
-        txn = ApplicationCreateTxn(
+    def build(params):
+        return ApplicationCreateTxn(
             sender=address,
             sp=params,
             on_complete=OnComplete.NoOpOC,
@@ -76,28 +125,65 @@ def deploy_contract(user_id):
             clear_program=clear_program,
             global_schema=global_schema,
             local_schema=local_schema,
-            app_args=[user_id.encode()]
+            extra_pages=artifact.extra_pages
         )
 
-        signed_txn = txn.sign(private_key)
-        tx_id = algod_client.send_transaction(signed_txn)
-        result = transaction.wait_for_confirmation(algod_client, tx_id, 4)
-        app_id = result['application-index']
+    submitter = Submitter(algod_client, private_key, indexer_client, fee_policy)
+    result = submitter.submit(f"app_create:shared:{artifact.version}", build, "app_create")
+    app_id = result['application-index']
+    print(f"Deployed shared contract: App ID {app_id} (set ALGORAND_SHARED_APP_ID={app_id})")
+    return app_id
 
-        # Save to Supabase
-        supabase.table('algorand_contracts').insert({
+# Onboard a user as a tenant of the shared application: one group with the
+# box minimum balance payment and the register call, no compile or app create
+def onboard_user(user_id, app_id):
+    try:
+        private_key = mnemonic.to_private_key(ALGORAND_MNEMONIC)
+        address = account.address_from_private_key(private_key)
+        tenants = SharedTenants(algod_client, app_id)
+
+        def build(params):
+            funding = transaction.PaymentTxn(
+                address, params, get_application_address(app_id),
+                tenant_box_min_balance(tenants.prefix)
+            )
+            register = tenants.register_txn(address, params, user_id, address)
+            return [funding, register]
+
+        # Only a new tenant pays for its box
+        if tenants.get(user_id) is None:
+            submitter = Submitter(algod_client, private_key, indexer_client, fee_policy)
+            submitter.submit(f"register:{app_id}:{tenant_key(user_id).hex()}", build,
+                             ["payment", "register"])
+        else:
+            print(f"User {user_id} is already a tenant of App ID {app_id}")
+
+        supabase.table('algorand_tenants').upsert({
             'user_id': user_id,
             'app_id': app_id,
+            'tenant_key': tenant_key(user_id).hex(),
             'address': address,
             'network': 'testnet'
-        }).execute()
+        }, on_conflict='app_id,tenant_key').execute()
 
-        print(f"Deployed contract for user {user_id}: App ID {app_id}")
+        print(f"Onboarded user {user_id} into shared App ID {app_id}")
         return app_id
     except Exception as e:
-        print(f"Contract deployment failed: {e}")
+        print(f"Tenant onboarding failed: {e}")
         exit(1)
 
 if __name__ == '__main__':
+    if DEPLOY_MODE == "shared":
+        if '--deploy-shared-app' in sys.argv[1:]:
+            deploy_shared_app()
+            exit(0)
+        # Never create a shared app implicitly: every run would make another
+        if not SHARED_APP_ID:
+            print("ALGORAND_SHARED_APP_ID is not set; deploy the shared app once with "
+                  "--deploy-shared-app and set it to the printed App ID")
+            exit(1)
     user_id = input("Enter user ID (phone number): ")
-    deploy_contract(user_id)
\ No newline at end of file
+    if DEPLOY_MODE == "shared":
+        onboard_user(user_id, SHARED_APP_ID)
+    else:
+        deploy_contract(user_id)
\ No newline at end of file
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Consolidate per-user legacy apps into the shared multi-tenant contract
+Reads every deployment in Supabase `algorand_contracts`, copies each legacy
+app's balance, limit and owner into a tenant box of the shared app with
+import_tenant, and records the tenant in `algorand_tenants`. Each batch is
+one atomic group: a payment covering the new boxes' minimum balance plus up
+to 15 imports. Reruns skip tenants that already exist. Both tables come
+from supabase/migrations/20261019110000_algorand_tenants.sql.
+
+Legacy apps reject DeleteApplication, so they are marked inactive rather
+than deleted; their creator min-balance stays locked.
+
+Usage:
+    python migrate_to_shared.py --shared-app-id 123456 [--dry-run]
+"""
+import argparse
+import base64
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+from algosdk import account, encoding, mnemonic, transaction
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.v2client import indexer
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from instrumentation import algod_client_from_env
+from submission import DuplicateOperation, SubmissionError, Submitter
+from tenants import SharedTenants, tenant_box_min_balance, tenant_key
+
+MAX_GROUP_SIZE = 16
+
+
+def legacy_state(algod_client, app_id):
+    """(owner, balance, limit) of a legacy contract.py app, or None if it is gone"""
+    try:
+        app = algod_client.application_info(app_id)
+    except AlgodHTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    state = {}
+    for entry in app["params"].get("global-state", []):
+        value = entry["value"]
+        state[base64.b64decode(entry["key"]).decode()] = (
+            base64.b64decode(value["bytes"]) if value["type"] == 1 else value["uint"]
+        )
+    owner = state.get("owner")
+    if not isinstance(owner, bytes) or len(owner) != 32:
+        owner = encoding.decode_address(app["params"]["creator"])
+    return encoding.encode_address(owner), state.get("balance", 0), state.get("limit", 0)
+
+
+def plan(algod_client, tenants, rows, shared_app_id):
+    """Legacy deployments still to migrate, with their on-chain state"""
+    pending = []
+    for row in rows:
+        if row["app_id"] == shared_app_id or row.get("status") == "inactive":
+            continue
+        if tenants.get(row["user_id"]) is not None:
+            continue
+        state = legacy_state(algod_client, row["app_id"])
+        if state is None:
+            print(f"⚠️ App {row['app_id']} for {row['user_id']} no longer exists, skipping")
+            continue
+        pending.append((row, state))
+    return pending
+
+
+def migrate_batch(submitter, tenants, sender, batch):
+    def build(params):
+        funding = transaction.PaymentTxn(
+            sender, params, get_application_address(tenants.app_id),
+            tenant_box_min_balance(tenants.prefix) * len(batch),
+        )
+        return [funding] + [
+            tenants.import_txn(sender, params, row["user_id"], owner, balance, limit)
+            for row, (owner, balance, limit) in batch
+        ]
+
+    users = ",".join(sorted(str(row["user_id"]) for row, _ in batch))
+    digest = hashlib.sha256(users.encode()).hexdigest()[:16]
+    return submitter.submit(f"import_tenants:{tenants.app_id}:{digest}", build,
+                            ["payment"] + ["import_tenant"] * len(batch))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move per-user apps into the shared contract")
+    parser.add_argument("--shared-app-id", type=int,
+                        default=int(os.getenv("ALGORAND_SHARED_APP_ID", "0")))
+    parser.add_argument("--batch-size", type=int, default=MAX_GROUP_SIZE - 1)
+    parser.add_argument("--network", default="testnet")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.shared_app_id:
+        parser.error("--shared-app-id or ALGORAND_SHARED_APP_ID is required")
+    batch_size = max(1, min(args.batch_size, MAX_GROUP_SIZE - 1))
+
+    from supabase import create_client
+
+    supabase = create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_ANON_KEY")),
+    )
+    algod_client = algod_client_from_env()
+    private_key = mnemonic.to_private_key(os.getenv("ALGORAND_MNEMONIC"))
+    sender = account.address_from_private_key(private_key)
+    tenants = SharedTenants(algod_client, args.shared_app_id)
+
+    rows = supabase.table("algorand_contracts").select("*").execute().data
+    pending = plan(algod_client, tenants, rows, args.shared_app_id)
+    print(f"📋 {len(pending)} of {len(rows)} deployments to migrate into app {args.shared_app_id}")
+    if args.dry_run:
+        for row, (owner, balance, limit) in pending:
+            print(f"   {row['user_id']}: app {row['app_id']} -> owner {owner}, "
+                  f"balance {balance}, limit {limit}")
+        return 0
+
+    # Batches that already confirmed are found again through the indexer
+    indexer_client = None
+    if os.getenv("INDEXER_ADDRESS"):
+        indexer_client = indexer.IndexerClient(
+            os.getenv("INDEXER_TOKEN", ""), os.getenv("INDEXER_ADDRESS")
+        )
+    else:
+        print("⚠️ INDEXER_ADDRESS is not set: a batch resubmitted inside its validity "
+              "window is recorded without checking that it confirmed")
+    submitter = Submitter(algod_client, private_key, indexer_client)
+    migrated = failed = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            migrate_batch(submitter, tenants, sender, batch)
+        except DuplicateOperation:
+            pass
+        except SubmissionError as e:
+            print(f"❌ Batch {start // batch_size + 1} failed: {e}")
+            failed += len(batch)
+            continue
+        for row, (owner, _, _) in batch:
+            supabase.table("algorand_tenants").upsert({
+                "user_id": row["user_id"],
+                "app_id": args.shared_app_id,
+                "tenant_key": tenant_key(row["user_id"]).hex(),
+                "address": owner,
+                "network": args.network,
+                "legacy_app_id": row["app_id"],
+            }, on_conflict="app_id,tenant_key").execute()
+            supabase.table("algorand_contracts").update({"status": "inactive"}) \
+                .eq("app_id", row["app_id"]).execute()
+        migrated += len(batch)
+        print(f"✅ Migrated {migrated}/{len(pending)}")
+
+    print(f"🎉 {migrated} migrated, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
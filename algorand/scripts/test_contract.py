@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 """
 test_contract.py - Test your deployed smart contract functions
+Virtual Card Manager apps are read through get_card_summary (card_summary.py);
+legacy apps through their global state
 """
 
 from algosdk import account, mnemonic
-from algosdk.v2client import algod
 from algosdk.transaction import ApplicationCallTxn, wait_for_confirmation
+from pathlib import Path
 import json
 import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+from algosdk.error import AlgodHTTPError
+from card_index import CardIndex
+from card_summary import CardSummaryError, simulate_card_summary
+from instrumentation import algod_client_from_env, get_metrics, instrument_client, timed
 
 class ContractTester:
     def __init__(self, mnemonic_phrase, app_id):
@@ -16,8 +25,8 @@ class ContractTester:
         self.address = account.address_from_private_key(self.private_key)
         self.app_id = app_id
         
-        # Connect to TestNet
-        self.algod_client = algod.AlgodClient("", "https://testnet-api.algonode.cloud", 443)
+        # Connect to TestNet, or the node in ALGOD_ADDRESS (e.g. mock_algod.py)
+        self.algod_client = instrument_client(algod_client_from_env())
         
         print(f"🧪 Testing contract {app_id} with wallet {self.address}")
     
@@ -52,11 +61,34 @@ class ContractTester:
             print(f"❌ Could not get app state: {e}")
             return {}
     
+    def get_card_summary(self):
+        """
+        This wallet's card through the contract's read-only get_card_summary
+        method (one simulate call, no fee), or None for apps without it
+        """
+        try:
+            # Rolling-window apps need the card ID to reference its window box
+            card_id = CardIndex(self.algod_client, self.app_id).card_of(self.address)
+            return simulate_card_summary(self.algod_client, self.app_id, self.address, card_id)
+        except (CardSummaryError, AlgodHTTPError):
+            return None
+    
     def print_app_state(self):
         """Print current application state"""
         print("\n📊 Current Application State:")
         print("="*40)
         
+        summary = self.get_card_summary()
+        if summary is not None:
+            status = "active" if summary.is_active else "inactive"
+            print(f"   💳 Card: {status}, KYC tier {summary.kyc_tier}, {summary.currency}")
+            balance = summary.balance
+            print(f"   💰 Balance: {balance} microALGOs ({balance/1_000_000:.6f} ALGO)")
+            print(f"   📅 Daily remaining: {summary.daily_remaining} microALGOs")
+            print(f"   🗓️ Monthly remaining: {summary.monthly_remaining} microALGOs")
+            return
+        
+        # Legacy contracts keep their state in global keys
         state = self.get_app_state()
         
         if state:
@@ -88,13 +120,16 @@ class ContractTester:
             )
             
             # Sign and send
-            signed_txn = txn.sign(self.private_key)
-            tx_id = self.algod_client.send_transaction(signed_txn)
+            with timed("sign"):
+                signed_txn = txn.sign(self.private_key)
+            with timed("submit"):
+                tx_id = self.algod_client.send_transaction(signed_txn)
             
             print(f"📤 Transaction sent: {tx_id}")
             
             # Wait for confirmation
-            confirmed_txn = wait_for_confirmation(self.algod_client, tx_id, 4)
+            with timed("confirm"):
+                confirmed_txn = wait_for_confirmation(self.algod_client, tx_id, 4)
             
             print(f"✅ Transaction confirmed in round {confirmed_txn.get('confirmed-round')}")
             return True
@@ -231,4 +266,7 @@ def main():
 if __name__ == "__main__":
     # Add missing import
     import base64
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        get_metrics().export()
\ No newline at end of file
@@ -4,6 +4,11 @@ test_setup.py - Test script to verify Algorand SDK installation
 This is your first Algorand development test!
 """
 
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "contracts" / "algorand"))
+
 def test_algorand_setup():
     print("=== Testing Your Algorand SDK Setup ===\n")
     
@@ -44,14 +49,12 @@ def test_algorand_setup():
     # Test 4: Test connection to Algorand network
     print("\n🔍 Test 4: Testing connection to Algorand TestNet...")
     try:
-        # These are public TestNet connection details
-        algod_token = ""  # No token needed for public node
-        algod_server = "https://testnet-api.algonode.cloud"
-        algod_port = 443
-        
-        algod_client = algod.AlgodClient(algod_token, algod_server, algod_port)
+        # Public TestNet (no token needed) unless ALGOD_ADDRESS names another node
+        from instrumentation import algod_client_from_env
+
+        algod_client = algod_client_from_env()
         print("✅ SUCCESS: Connected to TestNet node!")
-        print(f"   Server: {algod_server}")
+        print(f"   Server: {algod_client.algod_address}")
     except Exception as e:
         print(f"❌ FAILED: Could not create connection: {e}")
         return False
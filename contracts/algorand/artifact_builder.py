@@ -0,0 +1,244 @@
+"""
+Artifact builder for the Algorand contracts
+Compiles each contract with PyTeal once and writes a versioned artifact
+(TEAL, bytecode and interface JSON) that runtime tools load via artifacts.py
+
+Bytecode comes from the offline assembler unless --algod-url is given, in
+which case the node's compile endpoint is used instead. PyTeal output goes
+through teal_optimizer.py first unless --no-optimize is given. Contracts
+with TEMPLATE_PARAMETERS also get a TMPL_ template of the approval program
+(teal_template.py) for per-partner variants. Programs are compiled across a
+process pool with a compile cache (compile_pool.py).
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+
+from artifacts import ARTIFACTS_DIR, MANIFEST_NAME, TEMPLATE_NAME, ArtifactError
+from instrumentation import timed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(HERE))
+
+# name: (source file, approval function, clear function, approval options)
+CONTRACTS = {
+    "virtual_card_manager": (
+        os.path.join(HERE, "virtual_card_manager.py"), "approval_program", "clear_state_program",
+        {}
+    ),
+    "virtual_card_manager_rolling": (
+        os.path.join(HERE, "virtual_card_manager.py"), "approval_program", "clear_state_program",
+        {"rolling_window": True}
+    ),
+    "legacy_contract": (
+        os.path.join(REPO_ROOT, "algorand", "contracts", "contract.py"),
+        "approval_program", "clear_program", {}
+    ),
+    "shared_contract": (
+        os.path.join(REPO_ROOT, "algorand", "contracts", "shared_contract.py"),
+        "approval_program", "clear_program", {}
+    ),
+}
+
+
+def load_contract_module(name):
+    path = CONTRACTS[name][0]
+    spec = importlib.util.spec_from_file_location(f"contract_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_programs(name, optimized=False):
+    """Compile a contract's approval and clear programs to TEAL"""
+    from pyteal import Mode, compileTeal
+
+    module = load_contract_module(name)
+    _, approval_fn, clear_fn, options = CONTRACTS[name]
+    with timed("compile", "pyteal"):
+        teals = {
+            program: compileTeal(
+                getattr(module, fn)(**kwargs), Mode.Application,
+                version=module.TEAL_VERSION, assembleConstants=True
+            )
+            for program, fn, kwargs in (("approval", approval_fn, options), ("clear", clear_fn, {}))
+        }
+    if optimized:
+        from teal_optimizer import optimize
+
+        with timed("optimize", "teal"):
+            teals = {program: optimize(teal)[0] for program, teal in teals.items()}
+    return module, teals
+
+
+def compile_template(name, module, optimized=False):
+    """Approval TEAL with TMPL_ placeholders, or None for contracts without TEMPLATE_PARAMETERS"""
+    if not hasattr(module, "TEMPLATE_PARAMETERS"):
+        return None
+    from pyteal import Mode, compileTeal
+
+    _, approval_fn, _, options = CONTRACTS[name]
+    with timed("compile", "template"):
+        teal = compileTeal(
+            getattr(module, approval_fn)(template=True, **options), Mode.Application,
+            version=module.TEAL_VERSION, assembleConstants=True
+        )
+    if optimized:
+        from teal_optimizer import optimize
+
+        teal = optimize(teal)[0]
+    return teal
+
+
+def assemble_program(teal, algod_client=None):
+    if algod_client is None:
+        from teal_assembler import assemble
+
+        return assemble(teal)
+    return base64.b64decode(algod_client.compile(teal)["result"])
+
+
+def contract_boxes(name, module):
+    """Boxes the contract uses with the options it was built with"""
+    options = CONTRACTS[name][3]
+    return {
+        box: spec for box, spec in getattr(module, "BOXES", {}).items()
+        if options.get(spec.get("option"), True)
+    }
+
+
+def write_artifact(name, module, teals, algod_client=None, artifacts_dir=ARTIFACTS_DIR,
+                   optimized=False, template_teal=None, force=False):
+    """
+    Write TEAL, bytecode and the manifest for one contract version.
+    Published versions are immutable: an existing version directory is only
+    rewritten with force=True; otherwise bump VERSION in the contract source.
+    """
+    directory = os.path.join(artifacts_dir, name, module.VERSION)
+    if os.path.exists(os.path.join(directory, MANIFEST_NAME)) and not force:
+        raise ArtifactError(f"{name} {module.VERSION} is already published at {directory}; "
+                            f"bump VERSION in the contract source or pass --force")
+    os.makedirs(directory, exist_ok=True)
+
+    programs = {}
+    for program, teal in teals.items():
+        bytecode = assemble_program(teal, algod_client)
+        teal_file = f"{program}.teal"
+        bytecode_file = f"{program}.bin"
+        with open(os.path.join(directory, teal_file), "w") as f:
+            f.write(teal)
+        with open(os.path.join(directory, bytecode_file), "wb") as f:
+            f.write(bytecode)
+        programs[program] = {
+            "teal": teal_file,
+            "bytecode": bytecode_file,
+            "size": len(bytecode),
+            "sha256": hashlib.sha256(bytecode).hexdigest(),
+        }
+
+    template = None
+    if template_teal is not None:
+        from teal_template import build_template
+
+        with open(os.path.join(directory, TEMPLATE_NAME), "w") as f:
+            json.dump(build_template(template_teal, module.TEMPLATE_PARAMETERS), f, indent=2)
+            f.write("\n")
+        template = {"file": TEMPLATE_NAME, "parameters": sorted(module.TEMPLATE_PARAMETERS)}
+
+    with open(CONTRACTS[name][0], "rb") as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+
+    manifest = {
+        "name": name,
+        "version": module.VERSION,
+        "teal_version": module.TEAL_VERSION,
+        "assembler": "local" if algod_client is None else "algod",
+        "optimized": optimized,
+        "options": CONTRACTS[name][3],
+        "source_sha256": source_hash,
+        "schema": {"global": module.GLOBAL_SCHEMA, "local": module.LOCAL_SCHEMA},
+        "methods": module.METHODS,
+        "boxes": contract_boxes(name, module),
+        "programs": programs,
+    }
+    if template is not None:
+        manifest["template"] = template
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return directory
+
+
+def build(names=None, algod_client=None, artifacts_dir=ARTIFACTS_DIR, optimized=True,
+          jobs=None, cache=True, force=False):
+    """Build artifacts, compiling every program across a process pool first"""
+    from compile_pool import CompileCache, CompileTarget, compile_targets
+
+    names = names or list(CONTRACTS)
+    modules = {name: load_contract_module(name) for name in names}
+    targets = []
+    for name in names:
+        options = CONTRACTS[name][3]
+        targets.append(CompileTarget(name, "approval", options=options, optimized=optimized))
+        targets.append(CompileTarget(name, "clear", optimized=optimized))
+        if hasattr(modules[name], "TEMPLATE_PARAMETERS"):
+            targets.append(CompileTarget(
+                name, "approval", options={**options, "template": True}, optimized=optimized
+            ))
+    teals, _ = compile_targets(targets, jobs, CompileCache() if cache else None)
+    compiled = iter(teals)
+
+    built = []
+    for name in names:
+        module = modules[name]
+        programs = {"approval": next(compiled), "clear": next(compiled)}
+        template = next(compiled) if hasattr(module, "TEMPLATE_PARAMETERS") else None
+        directory = write_artifact(
+            name, module, programs, algod_client, artifacts_dir, optimized, template, force
+        )
+        print(f"✅ Built {name} {module.VERSION} -> {os.path.relpath(directory, HERE)}")
+        built.append(directory)
+    return built
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build versioned contract artifacts")
+    parser.add_argument("contracts", nargs="*",
+                        help=f"Contracts to build (default: all of {', '.join(CONTRACTS)})")
+    parser.add_argument("--algod-url", help="Assemble with this node's compile endpoint")
+    parser.add_argument("--algod-token", default="")
+    parser.add_argument("--output", default=ARTIFACTS_DIR)
+    parser.add_argument("--no-optimize", action="store_true",
+                        help="Keep PyTeal output as compiled")
+    parser.add_argument("--jobs", type=int, help="Compile worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Recompile every program")
+    parser.add_argument("--force", action="store_true",
+                        help="Overwrite versions that are already published")
+    args = parser.parse_args(argv)
+    unknown = set(args.contracts) - set(CONTRACTS)
+    if unknown:
+        parser.error(f"unknown contracts: {', '.join(sorted(unknown))}")
+
+    algod_client = None
+    if args.algod_url:
+        from algosdk.v2client import algod
+
+        algod_client = algod.AlgodClient(args.algod_token, args.algod_url)
+
+    print("📝 Building contract artifacts...")
+    try:
+        build(args.contracts, algod_client, args.output, not args.no_optimize, args.jobs,
+              not args.no_cache, args.force)
+    except ArtifactError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Prebuilt contract artifacts
+Loads versioned, compiled programs (TEAL, bytecode and interface JSON) that
+`cli.py build` writes under artifacts/<contract>/<version>/
+
+Runtime tools deploy from these files instead of importing PyTeal and
+compiling on every run. This module only depends on the standard library.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+MANIFEST_NAME = "contract.json"
+TEMPLATE_NAME = "approval.template.json"
+PROGRAM_PAGE_SIZE = 2048  # approval + clear bytes per page (consensus)
+
+
+class ArtifactError(Exception):
+    """Raised when an artifact is missing or does not match its manifest"""
+
+
+def _version_key(version):
+    return tuple(int(part) if part.isdigit() else part for part in version.split("."))
+
+
+class ContractArtifact:
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.name = manifest["name"]
+        self.version = manifest["version"]
+        self.teal_version = manifest["teal_version"]
+        self.methods = manifest.get("methods", {})
+        self.boxes = manifest.get("boxes", {})
+        self.global_schema = manifest["schema"]["global"]
+        self.local_schema = manifest["schema"]["local"]
+
+    def _read(self, program, kind):
+        entry = self.manifest["programs"][program]
+        mode = "rb" if kind == "bytecode" else "r"
+        with open(os.path.join(self.directory, entry[kind]), mode) as f:
+            return f.read()
+
+    def teal(self, program="approval"):
+        return self._read(program, "teal")
+
+    def bytecode(self, program="approval"):
+        """Compiled program bytes, checked against the manifest hash"""
+        code = self._read(program, "bytecode")
+        expected = self.manifest["programs"][program]["sha256"]
+        if hashlib.sha256(code).hexdigest() != expected:
+            raise ArtifactError(f"{self.name} {self.version} {program} bytecode is corrupt")
+        return code
+
+    @property
+    def approval_program(self):
+        return self.bytecode("approval")
+
+    @property
+    def clear_program(self):
+        return self.bytecode("clear")
+
+    @property
+    def extra_pages(self):
+        """Extra program pages app creation must request for these programs"""
+        size = sum(entry["size"] for entry in self.manifest["programs"].values())
+        return max(0, -(-size // PROGRAM_PAGE_SIZE) - 1)
+
+    def template(self):
+        """TMPL_ template of the approval program (teal_template.py), or None"""
+        entry = self.manifest.get("template")
+        if entry is None:
+            return None
+        with open(os.path.join(self.directory, entry["file"])) as f:
+            return json.load(f)
+
+    def variant(self, **params):
+        """Approval bytecode with template parameters replaced; defaults for the rest"""
+        from teal_template import instantiate
+
+        template = self.template()
+        if template is None:
+            raise ArtifactError(f"{self.name} {self.version} was not built as a template")
+        return instantiate(template, params)
+
+    def state_schemas(self):
+        """Global and local algosdk StateSchema objects for app creation"""
+        from algosdk.transaction import StateSchema
+
+        return StateSchema(**self.global_schema), StateSchema(**self.local_schema)
+
+
+def available_versions(name, artifacts_dir=ARTIFACTS_DIR):
+    directory = os.path.join(artifacts_dir, name)
+    if not os.path.isdir(directory):
+        return []
+    versions = [
+        entry for entry in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, entry, MANIFEST_NAME))
+    ]
+    return sorted(versions, key=_version_key)
+
+
+def load_artifact(name="virtual_card_manager", version=None, artifacts_dir=ARTIFACTS_DIR):
+    """Load a contract artifact; the newest version when none is given"""
+    if version is None:
+        versions = available_versions(name, artifacts_dir)
+        if not versions:
+            raise ArtifactError(f"No artifacts for {name}; run `python cli.py build`")
+        version = versions[-1]
+
+    directory = os.path.join(artifacts_dir, name, version)
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"No artifact for {name} {version}")
+    return ContractArtifact(directory, manifest)
+
+
+def main(argv=None):
+    """List available artifacts"""
+    names = sys.argv[1:] if argv is None else argv
+    if not names and os.path.isdir(ARTIFACTS_DIR):
+        names = sorted(os.listdir(ARTIFACTS_DIR))
+    for name in names:
+        for version in available_versions(name):
+            artifact = load_artifact(name, version)
+            sizes = ", ".join(
+                f"{program} {entry['size']} bytes"
+                for program, entry in artifact.manifest["programs"].items()
+            )
+            print(f"📦 {name} {version} (TEAL v{artifact.teal_version}): {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Parallel historical backfill of Virtual Card Manager events
+Splits a round range into chunks that worker processes fetch and decode,
+each with a few threads for the block requests. Finished chunks are
+spooled to disk and merged into the sink strictly in round order, one
+batch per chunk, so the event store and card holder index end up exactly
+as the live follower (ingest.py) would have left them.
+
+Backfills keep their own cursor per range in the sink, so an interrupted
+run resumes after the last merged chunk and reuses chunks already spooled
+instead of fetching them again.
+
+Usage:
+    python backfill.py <app_id> <start_round> [end_round] --sink sqlite:events.db [--jobs 8]
+    python backfill.py --check
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from card_events import BLOCK_DECODERS, CardEvent, events_from_block
+from ingest import DEFAULT_CURSOR, open_sink
+
+DEFAULT_CHUNK_ROUNDS = 1000
+DEFAULT_THREADS = 8
+
+
+def split_range(start, end, chunk_rounds):
+    """[(first, last)] chunks covering start..end inclusive"""
+    return [
+        (first, min(first + chunk_rounds - 1, end))
+        for first in range(start, end + 1, chunk_rounds)
+    ]
+
+
+def fetch_chunk(client_factory, app_id, first, last, threads=DEFAULT_THREADS,
+                response_format="msgpack"):
+    """Event rows of rounds first..last in order; runs in pool workers"""
+    algod_client = client_factory()
+    decode = BLOCK_DECODERS[response_format]
+
+    def fetch(round):
+        return decode(algod_client.block_info(round, response_format=response_format), app_id)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        blocks = pool.map(fetch, range(first, last + 1))
+        return [event.as_row() for events in blocks for event in events]
+
+
+class ChunkSpool:
+    """Fetched chunks on disk until they are merged; one JSONL file per chunk"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, first, last):
+        return os.path.join(self.directory, f"{first:012d}-{last:012d}.jsonl")
+
+    def get(self, first, last):
+        try:
+            with open(self._path(first, last)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return None
+
+    def put(self, first, last, rows):
+        # Written under a temporary name so a crash never leaves a partial chunk
+        temporary = f"{self._path(first, last)}.tmp"
+        with open(temporary, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":")) + "\n")
+        os.replace(temporary, self._path(first, last))
+
+    def drop(self, first, last):
+        try:
+            os.remove(self._path(first, last))
+        except FileNotFoundError:
+            pass
+
+
+def backfill_cursor(name, start, end):
+    return f"{name}:backfill:{start}-{end}"
+
+
+def backfill(client_factory, app_id, sink, start, end, spool, chunk_rounds=DEFAULT_CHUNK_ROUNDS,
+             jobs=None, threads=DEFAULT_THREADS, response_format="msgpack"):
+    """Fetch start..end across `jobs` processes and merge chunks into the sink in order
+
+    Resumes after the sink's cursor; returns the number of events merged.
+    """
+    cursor = sink.cursor()
+    if cursor is not None:
+        start = cursor + 1
+    chunks = split_range(start, end, chunk_rounds)
+    if not chunks:
+        return 0
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(chunks)))
+
+    ready = {}
+    for chunk in chunks:
+        rows = spool.get(*chunk)
+        if rows is not None:
+            ready[chunk] = rows
+    if ready:
+        print(f"♻️ Reusing {len(ready)} spooled chunks")
+    todo = iter([chunk for chunk in chunks if chunk not in ready])
+
+    merged = events = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+
+        def refill():
+            # A few chunks per worker in flight bounds memory held for out-of-order chunks
+            while len(running) < 2 * jobs:
+                chunk = next(todo, None)
+                if chunk is None:
+                    return
+                future = pool.submit(fetch_chunk, client_factory, app_id, *chunk, threads,
+                                     response_format)
+                running[future] = chunk
+
+        refill()
+        while merged < len(chunks):
+            if chunks[merged] not in ready:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                failures = []
+                for future in done:
+                    chunk = running.pop(future)
+                    if future.exception() is not None:
+                        failures.append(future.exception())
+                        continue
+                    ready[chunk] = future.result()
+                    spool.put(*chunk, ready[chunk])
+                if failures:
+                    # Chunks fetched so far stay spooled for the next run
+                    raise failures[0]
+                refill()
+            # Merge every chunk that now continues the committed prefix
+            while merged < len(chunks) and chunks[merged] in ready:
+                chunk = chunks[merged]
+                rows = ready.pop(chunk)
+                sink.write([CardEvent.from_row(row) for row in rows], chunk[1])
+                spool.drop(*chunk)
+                merged += 1
+                events += len(rows)
+                rate = (chunk[1] - start + 1) / (time.perf_counter() - started)
+                print(f"📦 Rounds {chunk[0]}-{chunk[1]}: {len(rows)} events "
+                      f"({merged}/{len(chunks)} chunks, {rate:.0f} rounds/s)")
+    return events
+
+
+def check():
+    """Backfill sample blocks through several processes, interrupt it and resume"""
+    from ingest import StaticAlgod, sample_blocks
+
+    app_id = 1
+    blocks = sample_blocks(app_id, holders=20)
+    last = max(blocks)
+    expected = [
+        event.as_row() for round in sorted(blocks)
+        for event in events_from_block(blocks[round], app_id)
+    ]
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ChunkSpool(os.path.join(directory, "spool"))
+        for spec in (f"sqlite:{directory}/events.db", f"jsonl:{directory}/events.jsonl"):
+            name = backfill_cursor(DEFAULT_CURSOR, 1, last)
+            sink = open_sink(spec, name)
+            try:
+                backfill(functools.partial(StaticAlgod, blocks, 50), app_id, sink, 1, last, spool,
+                         chunk_rounds=7, jobs=3, threads=2)
+                problems.append(f"{spec}: a failed chunk did not stop the backfill")
+            except ConnectionError:
+                pass
+            cursor = sink.cursor()
+            if cursor is None or cursor >= 50:
+                problems.append(f"{spec}: cursor {cursor} past the failed round 50")
+            sink.close()
+
+            sink = open_sink(spec, name)
+            backfill(functools.partial(StaticAlgod, blocks), app_id, sink, 1, last, spool,
+                     chunk_rounds=7, jobs=3, threads=2)
+            rows = [event.as_row() for event in sink.events()]
+            if rows != expected:
+                problems.append(f"{spec}: {len(rows)} events merged, expected {len(expected)}")
+            if sink.cursor() != last:
+                problems.append(f"{spec}: cursor {sink.cursor()}, expected {last}")
+            if hasattr(sink, "holders") and len(sink.holders()) != 20:
+                problems.append(f"{spec}: {len(sink.holders())} card holders, expected 20")
+            if os.listdir(spool.directory):
+                problems.append(f"{spec}: spool not emptied")
+            sink.close()
+    for problem in problems:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill card events over a round range")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("start_round", nargs="?", type=int)
+    parser.add_argument("end_round", nargs="?", type=int, help="Default: the latest round")
+    parser.add_argument("--sink", default=os.getenv("INGEST_SINK", "sqlite:card_events.db"),
+                        help="sqlite:<path>, jsonl:<path>, store:<directory> or postgres:<dsn>")
+    parser.add_argument("--name", default=DEFAULT_CURSOR,
+                        help="Cursor name of the live follower this backfill feeds")
+    parser.add_argument("--chunk-rounds", type=int, default=DEFAULT_CHUNK_ROUNDS)
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Block requests in flight per worker")
+    parser.add_argument("--format", choices=sorted(BLOCK_DECODERS), default="msgpack",
+                        help="Block encoding requested from algod")
+    parser.add_argument("--spool", default=".backfill", help="Directory for fetched chunks")
+    parser.add_argument("--check", action="store_true",
+                        help="Backfill sample blocks with an interruption and resume")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        if problems:
+            print(f"❌ {problems} backfill checks failed")
+            return 1
+        print("✅ Backfill merges chunks in round order and resumes after an interruption")
+        return 0
+    if args.start_round is None:
+        parser.error("app_id and start_round are required")
+
+    from instrumentation import algod_client_from_env
+
+    client_factory = algod_client_from_env
+    end = args.end_round
+    if end is None:
+        end = client_factory().status()["last-round"]
+    name = backfill_cursor(args.name, args.start_round, end)
+    try:
+        sink = open_sink(args.sink, name)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    spool = ChunkSpool(os.path.join(args.spool, f"{args.app_id}-{args.start_round}-{end}"))
+    print(f"⏪ Backfilling app {args.app_id} rounds {args.start_round}-{end} into {args.sink}")
+    started = time.perf_counter()
+    try:
+        events = backfill(client_factory, args.app_id, sink, args.start_round, end, spool,
+                          args.chunk_rounds, args.jobs, args.threads, args.format)
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Stopped after round {sink.cursor()}; rerun the same command to resume")
+        return 1
+    finally:
+        sink.close()
+    print(f"✅ {events} events in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
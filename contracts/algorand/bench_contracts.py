@@ -0,0 +1,344 @@
+"""
+PyTeal build benchmarks for the Algorand contracts
+Times program construction and compileTeal at each optimization level and
+records TEAL line count, bytecode size and per-method opcode cost
+
+Usage:
+    python bench_contracts.py                    # compare against baseline
+    python bench_contracts.py --update-baseline  # record a new baseline
+
+Exits non-zero when TEAL lines, bytecode size or a method's opcode cost
+exceeds its baseline by more than the tolerance stored in the baseline
+file. Build times are reported only; they depend on the host.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+
+from pyteal import Mode, OptimizeOptions, compileTeal
+
+from teal_assembler import OPCODE_COSTS, assemble, parse_teal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(HERE))
+DEFAULT_BASELINE = os.path.join(HERE, "benchmarks", "pyteal_baseline.json")
+
+# name: (source file, program function, TEAL version)
+TARGETS = {
+    "virtual_card_manager": (
+        os.path.join(HERE, "virtual_card_manager.py"), "approval_program", 8
+    ),
+    "legacy_contract": (
+        os.path.join(REPO_ROOT, "algorand", "contracts", "contract.py"), "approval_program", 6
+    ),
+}
+
+# OptimizeOptions() turns frame pointers on for TEAL v8, so the levels
+# without them say so explicitly
+OPTIMIZATION_LEVELS = {
+    "none": OptimizeOptions(frame_pointers=False),
+    "scratch_slots": OptimizeOptions(scratch_slots=True, frame_pointers=False),
+    "frame_pointers": OptimizeOptions(frame_pointers=True),
+    "full": OptimizeOptions(scratch_slots=True, frame_pointers=True),
+}
+# Frame pointers need TEAL v8, so older targets skip these levels
+FRAME_POINTER_LEVELS = ("frame_pointers", "full")
+FRAME_POINTER_VERSION = 8
+
+# Relative growth allowed before a metric counts as a regression. Only
+# deterministic metrics are gated; build times depend on the host and are
+# reported but never stored in or compared against the baseline.
+DEFAULT_TOLERANCES = {
+    "teal_lines": 0.02,
+    "bytecode_size": 0.02,
+    "method_cost": 0.05,
+}
+GATED_METRICS = ("teal_lines", "bytecode_size")
+TIMING_METRICS = ("build_seconds", "construct_seconds", "compile_seconds")
+
+TERMINATORS = ("return", "err", "retsub")
+UNCONDITIONAL = ("b", "return", "err", "retsub")
+
+
+def load_program(name):
+    """Import a target's module and return its program function"""
+    path, function, _ = TARGETS[name]
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, function)
+
+
+def _blocks(items):
+    """Map each label to the instruction index it starts at"""
+    labels = {}
+    instructions = []
+    for item in items:
+        if isinstance(item, str):
+            labels[item] = len(instructions)
+        else:
+            instructions.append(item)
+    return labels, instructions
+
+
+def _worst_cost(start, labels, instructions, memo, visiting):
+    """Worst-case opcode cost from instruction `start` to a terminator"""
+    if start in memo:
+        return memo[start]
+    if start in visiting:
+        return 0  # back edge; loops are costed for a single iteration
+    visiting.add(start)
+
+    cost = 0
+    index = start
+    result = cost
+    while index < len(instructions):
+        instruction = instructions[index]
+        op = instruction.op
+        cost += OPCODE_COSTS.get(op, 1)
+        if op == "callsub":
+            cost += _worst_cost(labels[instruction.args[0]], labels, instructions, memo, visiting)
+        elif op in ("bnz", "bz"):
+            taken = _worst_cost(labels[instruction.args[0]], labels, instructions, memo, visiting)
+            fallthrough = _worst_cost(index + 1, labels, instructions, memo, visiting)
+            result = cost + max(taken, fallthrough)
+            break
+        elif op in ("switch", "match"):
+            targets = [labels[label] for label in instruction.args] + [index + 1]
+            result = cost + max(
+                _worst_cost(target, labels, instructions, memo, visiting) for target in targets
+            )
+            break
+        elif op == "b":
+            result = cost + _worst_cost(labels[instruction.args[0]], labels, instructions, memo, visiting)
+            break
+        elif op in TERMINATORS:
+            result = cost
+            break
+        index += 1
+    else:
+        result = cost
+
+    visiting.discard(start)
+    memo[start] = result
+    return result
+
+
+def _method_name(instruction):
+    if instruction.op not in ("pushbytes", "byte") or not instruction.args:
+        return None
+    token = instruction.args[0]
+    if token.startswith('"'):
+        return token[1:-1]
+    try:
+        return bytes.fromhex(token[2:]).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _reach_costs(labels, instructions, memo):
+    """Worst-case cost of reaching each instruction from program start"""
+    reach = {0: 0}
+    for index, instruction in enumerate(instructions):
+        if index not in reach:
+            continue
+        op = instruction.op
+        after = reach[index] + OPCODE_COSTS.get(op, 1)
+        if op == "callsub":
+            after += _worst_cost(labels[instruction.args[0]], labels, instructions, memo, set())
+        successors = []
+        if op in ("bnz", "bz", "b"):
+            successors.append(labels[instruction.args[0]])
+        elif op in ("switch", "match"):
+            successors += [labels[label] for label in instruction.args]
+        if op not in UNCONDITIONAL:
+            successors.append(index + 1)
+        for successor in successors:
+            # Dispatch code only branches forward; back edges are loops
+            if successor > index:
+                reach[successor] = max(reach.get(successor, 0), after)
+    return reach
+
+
+def method_costs(teal):
+    """
+    Worst-case opcode cost per application method.
+
+    Methods are found from the PyTeal `Cond` dispatch pattern
+    (`txna ApplicationArgs 0; byte "name"; ==; bnz label`); each cost
+    includes the dispatch checks executed before reaching the method.
+    """
+    _, items = parse_teal(teal)
+    labels, instructions = _blocks(items)
+    memo = {}
+    reach = _reach_costs(labels, instructions, memo)
+    costs = {}
+    for index, instruction in enumerate(instructions):
+        if (
+            instruction.op in ("bnz", "bz")
+            and index in reach
+            and index >= 3
+            and instructions[index - 1].op == "=="
+            and instructions[index - 3].op == "txna"
+            and instructions[index - 3].args == ["ApplicationArgs", "0"]
+        ):
+            name = _method_name(instructions[index - 2])
+            if name:
+                body = _worst_cost(labels[instruction.args[0]], labels, instructions, memo, set())
+                costs[name] = reach[index] + 1 + body
+    return costs
+
+
+def teal_line_count(teal):
+    _, items = parse_teal(teal)
+    return sum(1 for item in items if not isinstance(item, str))
+
+
+def bench_target(name, level, repeat):
+    """Build one target at one optimization level `repeat` times"""
+    program_fn = load_program(name)
+    version = TARGETS[name][2]
+    options = OPTIMIZATION_LEVELS[level]
+
+    construct_times = []
+    compile_times = []
+    teal = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        program = program_fn()
+        built = time.perf_counter()
+        teal = compileTeal(
+            program, Mode.Application, version=version, optimize=options,
+            assembleConstants=True
+        )
+        done = time.perf_counter()
+        construct_times.append(built - start)
+        compile_times.append(done - built)
+
+    return {
+        "construct_seconds": statistics.median(construct_times),
+        "compile_seconds": statistics.median(compile_times),
+        "build_seconds": statistics.median(
+            c + t for c, t in zip(construct_times, compile_times)
+        ),
+        "teal_lines": teal_line_count(teal),
+        "bytecode_size": len(assemble(teal)),
+        "method_cost": method_costs(teal),
+    }
+
+
+def run_benchmarks(repeat=5, targets=None):
+    results = {}
+    for name in targets or TARGETS:
+        version = TARGETS[name][2]
+        results[name] = {}
+        for level in OPTIMIZATION_LEVELS:
+            if level in FRAME_POINTER_LEVELS and version < FRAME_POINTER_VERSION:
+                continue
+            results[name][level] = bench_target(name, level, repeat)
+    return results
+
+
+def _exceeds(current, baseline, tolerance):
+    return current > baseline * (1 + tolerance)
+
+
+def compare(results, baseline):
+    """List regressions of `results` against a stored baseline"""
+    tolerances = dict(DEFAULT_TOLERANCES, **baseline.get("tolerances", {}))
+    regressions = []
+    for name, levels in baseline.get("results", {}).items():
+        for level, expected in levels.items():
+            current = results.get(name, {}).get(level)
+            if current is None:
+                continue
+            label = f"{name}[{level}]"
+            for metric in GATED_METRICS:
+                if _exceeds(current[metric], expected[metric], tolerances[metric]):
+                    regressions.append(
+                        f"{label} {metric}: {current[metric]} > baseline {expected[metric]}"
+                    )
+            for method, cost in expected["method_cost"].items():
+                now = current["method_cost"].get(method)
+                if now is not None and _exceeds(now, cost, tolerances["method_cost"]):
+                    regressions.append(
+                        f"{label} method_cost.{method}: {now} > baseline {cost}"
+                    )
+    return regressions
+
+
+def print_results(results):
+    for name, levels in results.items():
+        print(f"\n📦 {name}")
+        for level, r in levels.items():
+            print(
+                f"   {level:<15} build {r['build_seconds'] * 1000:7.1f} ms "
+                f"(construct {r['construct_seconds'] * 1000:.1f} ms) | "
+                f"{r['teal_lines']} lines | {r['bytecode_size']} bytes | "
+                f"max method cost {max(r['method_cost'].values(), default=0)}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PyTeal contract builds")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Write raw results as JSON")
+    args = parser.parse_args(argv)
+
+    print("⏱️ Benchmarking PyTeal builds...")
+    results = run_benchmarks(args.repeat)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        tolerances = DEFAULT_TOLERANCES
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f).get("tolerances", {})
+            tolerances = {
+                metric: stored.get(metric, tolerance)
+                for metric, tolerance in DEFAULT_TOLERANCES.items()
+            }
+        deterministic = {
+            name: {
+                level: {metric: value for metric, value in r.items()
+                        if metric not in TIMING_METRICS}
+                for level, r in levels.items()
+            }
+            for name, levels in results.items()
+        }
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"tolerances": tolerances, "results": deterministic}, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline}; run with --update-baseline")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline)
+    if regressions:
+        print("\n❌ Regressions against baseline:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("\n✅ Within baseline tolerances")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
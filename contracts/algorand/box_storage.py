@@ -0,0 +1,15 @@
+"""
+Box minimum balance for the Algorand contracts
+An application account must hold a flat amount per box plus an amount per
+byte of box name and value (consensus box MBR). The contracts assert box
+payments with these values and the tools send them, so both import them
+from here. This module only depends on the standard library.
+"""
+
+BOX_FLAT_MIN_BALANCE = 2500  # microAlgos per box
+BOX_BYTE_MIN_BALANCE = 400  # microAlgos per byte of name and value
+
+
+def box_min_balance(name_size, size):
+    """Minimum balance the app account needs for one box"""
+    return BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (name_size + size)
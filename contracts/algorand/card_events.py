@@ -0,0 +1,254 @@
+"""
+Card event decoding for the Virtual Card Manager
+Turns the contract's CardCreated / CardFunded / CardUsed / CardClosed logs
+into CardEvent records. Log layouts follow virtual_card_manager.py: fixed
+width fields (8-byte card IDs and uint64s, 32-byte addresses) separated by
+":", with the variable-length region and currency codes last.
+
+Every event is keyed by (round, intra, log_index) - the transaction's
+position in its block and the log's position in the transaction - so
+replaying a round always produces the same keys and sinks can upsert.
+
+Blocks decode from algod's JSON or, much cheaper on busy rounds, its raw
+msgpack: events_from_msgpack_block walks the encoding with msgpack's
+streaming reader, skips every transaction that is not a call to the app
+without building it, and keeps logs as memoryview slices of the block.
+"""
+
+import base64
+import functools
+
+import msgpack
+from algosdk import encoding
+
+EVENT_KINDS = ("CardCreated", "CardFunded", "CardUsed", "CardClosed")
+ROW_FIELDS = (
+    "round", "intra", "log_index", "kind", "card_id", "address", "amount", "currency",
+    "balance", "kyc_tier", "region",
+)
+
+_CARD_ID = 8
+_ADDRESS = 32
+_UINT = 8
+
+
+class CardEvent:
+    __slots__ = ROW_FIELDS
+
+    def __init__(self, round, intra, log_index, kind, card_id, address, amount=None,
+                 currency=None, balance=None, kyc_tier=None, region=None):
+        self.round = round
+        self.intra = intra
+        self.log_index = log_index
+        self.kind = kind
+        self.card_id = card_id
+        self.address = address
+        self.amount = amount
+        self.currency = currency
+        self.balance = balance
+        self.kyc_tier = kyc_tier
+        self.region = region
+
+    @property
+    def key(self):
+        return (self.round, self.intra, self.log_index)
+
+    def as_row(self):
+        return {field: getattr(self, field) for field in ROW_FIELDS}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{field: row.get(field) for field in ROW_FIELDS})
+
+    def __repr__(self):
+        return f"CardEvent({self.kind} card={self.card_id} round={self.round} amount={self.amount})"
+
+
+@functools.lru_cache(maxsize=65536)
+def address_of(raw):
+    """Base32 address of 32 raw bytes; cached, as a card's address repeats in every event"""
+    return encoding.encode_address(raw)
+
+
+@functools.lru_cache(maxsize=65536)
+def raw_address(address):
+    return encoding.decode_address(address)
+
+
+def _uint(raw):
+    return int.from_bytes(raw, "big")
+
+
+def _text(raw):
+    return bytes(raw).decode(errors="replace")
+
+
+def _head(body, kind):
+    """card_id, address and the rest of a log body, checking the separators"""
+    if len(body) < _CARD_ID + 1 + _ADDRESS or body[_CARD_ID] != 0x3A \
+            or body[_CARD_ID + 1 + _ADDRESS:_CARD_ID + 2 + _ADDRESS] not in (b":", b""):
+        raise ValueError(f"Malformed {kind} log")
+    return (
+        _uint(body[:_CARD_ID]),
+        address_of(bytes(body[_CARD_ID + 1:_CARD_ID + 1 + _ADDRESS])),
+        body[_CARD_ID + 2 + _ADDRESS:],
+    )
+
+
+def decode_log(log):
+    """(kind, fields) for a card event log, or None for any other log
+
+    `log` may be bytes or a memoryview; variable-length fields are only
+    copied out once the prefix matched.
+    """
+    view = memoryview(log)
+    colon = bytes(view[:16]).find(b":")
+    if colon <= 0:
+        return None
+    kind = bytes(view[:colon]).decode(errors="replace")
+    if kind not in EVENT_KINDS:
+        return None
+    card_id, address, rest = _head(view[colon + 1:], kind)
+    fields = {"card_id": card_id, "address": address}
+    if kind == "CardCreated":
+        # tier(8) ":" region ":" currency
+        if len(rest) < _UINT + 1:
+            raise ValueError("Malformed CardCreated log")
+        region, _, currency = bytes(rest[_UINT + 1:]).rpartition(b":")
+        fields.update(kyc_tier=_uint(rest[:_UINT]), region=_text(region), currency=_text(currency))
+    elif kind == "CardFunded":
+        # amount(8) ":" currency
+        fields.update(amount=_uint(rest[:_UINT]), currency=_text(rest[_UINT + 1:]))
+    elif kind == "CardUsed":
+        # amount(8) ":" currency ":" new balance(8)
+        if len(rest) < 2 * _UINT + 2:
+            raise ValueError("Malformed CardUsed log")
+        fields.update(
+            amount=_uint(rest[:_UINT]),
+            currency=_text(rest[_UINT + 1:-_UINT - 1]),
+            balance=_uint(rest[-_UINT:]),
+        )
+    else:
+        # refund(8)
+        fields.update(amount=_uint(rest[:_UINT]), balance=0)
+    return kind, fields
+
+
+def events_from_logs(logs, round, intra):
+    events = []
+    for log_index, log in enumerate(logs):
+        try:
+            decoded = decode_log(log)
+        except ValueError as e:
+            print(f"⚠️ Round {round} txn {intra} log {log_index}: {e}")
+            continue
+        if decoded is not None:
+            kind, fields = decoded
+            events.append(CardEvent(round, intra, log_index, kind, **fields))
+    return events
+
+
+def events_from_block(block, app_id):
+    """Card events of one algod block (JSON format, as algosdk's block_info returns it)"""
+    header = block.get("block", block)
+    round = header.get("rnd", 0)
+    events = []
+    for intra, stxn in enumerate(header.get("txns", [])):
+        txn = stxn.get("txn", {})
+        if txn.get("type") != "appl" or txn.get("apid") != app_id:
+            continue
+        logs = [base64.b64decode(log) for log in stxn.get("dt", {}).get("lg", [])]
+        events.extend(events_from_logs(logs, round, intra))
+    return events
+
+
+def _payload_start(view, pos):
+    """Offset of the payload of the msgpack str/bin whose header is at pos"""
+    tag = view[pos]
+    if 0xA0 <= tag <= 0xBF:
+        return pos + 1
+    if tag in (0xC4, 0xD9):
+        return pos + 2
+    if tag in (0xC5, 0xDA):
+        return pos + 3
+    if tag in (0xC6, 0xDB):
+        return pos + 5
+    raise ValueError(f"Expected a msgpack str or bin at offset {pos}, got 0x{tag:02x}")
+
+
+def _unpacker(data):
+    unpacker = msgpack.Unpacker(raw=True, max_buffer_size=max(len(data), 1))
+    unpacker.feed(data)
+    return unpacker
+
+
+def _is_app_call(unpacker, app_id):
+    """Read a transaction map, building only its type and app ID"""
+    txn_type = apid = None
+    for _ in range(unpacker.read_map_header()):
+        key = unpacker.unpack()
+        if key == b"type":
+            txn_type = unpacker.unpack()
+        elif key == b"apid":
+            apid = unpacker.unpack()
+        else:
+            unpacker.skip()
+    return txn_type == b"appl" and apid == app_id
+
+
+def _apply_data_logs(view):
+    """memoryview of each log in an encoded apply data ("dt") map"""
+    unpacker = _unpacker(view)
+    logs = []
+    for _ in range(unpacker.read_map_header()):
+        if unpacker.unpack() != b"lg":
+            unpacker.skip()
+            continue
+        for _ in range(unpacker.read_array_header()):
+            start = unpacker.tell()
+            unpacker.skip()
+            logs.append(view[_payload_start(view, start):unpacker.tell()])
+    return logs
+
+
+def events_from_msgpack_block(raw, app_id):
+    """Card events of one algod block in msgpack format, as block_info returns it raw"""
+    view = memoryview(raw)
+    unpacker = _unpacker(raw)
+    round = 0
+    calls = []
+    for _ in range(unpacker.read_map_header()):
+        if unpacker.unpack() != b"block":
+            unpacker.skip()
+            continue
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if key == b"rnd":
+                round = unpacker.unpack()
+            elif key == b"txns":
+                for intra in range(unpacker.read_array_header()):
+                    # Keys are sorted, so "dt" comes before "txn": note where the
+                    # apply data is and only decode it once the call matched
+                    dt = None
+                    matched = False
+                    for _ in range(unpacker.read_map_header()):
+                        field = unpacker.unpack()
+                        if field == b"dt":
+                            start = unpacker.tell()
+                            unpacker.skip()
+                            dt = (start, unpacker.tell())
+                        elif field == b"txn":
+                            matched = _is_app_call(unpacker, app_id)
+                        else:
+                            unpacker.skip()
+                    if matched and dt is not None:
+                        calls.append((intra, _apply_data_logs(view[dt[0]:dt[1]])))
+            else:
+                unpacker.skip()
+    events = []
+    for intra, logs in calls:
+        events.extend(events_from_logs(logs, round, intra))
+    return events
+
+
+BLOCK_DECODERS = {"json": events_from_block, "msgpack": events_from_msgpack_block}
@@ -0,0 +1,141 @@
+"""
+Card ID index for the Virtual Card Manager
+Card IDs are sequential uint64 values (8 bytes big-endian on chain) taken
+from TOTAL_CARDS. Each card has a box `CARD_INDEX_PREFIX + card_id` holding
+its owner's address, so a card ID resolves to its owner with one box read
+instead of a scan over accounts or events
+
+Usage:
+    python card_index.py <app_id> <card_id>
+"""
+
+import base64
+import sys
+
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+
+from artifacts import load_artifact
+from box_storage import box_min_balance
+
+CARD_ID_SIZE = 8
+# Must match virtual_card_manager.py; kept here so tools do not import PyTeal
+CARD_INDEX_BOX_SIZE = 32
+WINDOW_BOX_SIZE = 216
+
+
+def card_id_bytes(card_id):
+    """On-chain encoding of a card ID"""
+    return card_id.to_bytes(CARD_ID_SIZE, "big")
+
+
+def card_number(raw):
+    """Card ID from its 8-byte on-chain encoding"""
+    if len(raw) != CARD_ID_SIZE:
+        raise ValueError(f"Card IDs are {CARD_ID_SIZE} bytes, got {len(raw)}")
+    return int.from_bytes(raw, "big")
+
+
+def card_box_min_balance(rolling=False):
+    """
+    Box minimum balance a new card's holder pays the app before create_card,
+    and gets back when the card is closed. The contract asserts this value.
+    """
+    name_size = 1 + CARD_ID_SIZE
+    total = box_min_balance(name_size, CARD_INDEX_BOX_SIZE)
+    if rolling:
+        total += box_min_balance(name_size, WINDOW_BOX_SIZE)
+    return total
+
+
+def card_index_prefix(artifact=None):
+    """Box name prefix of the card index, from the contract artifact"""
+    artifact = artifact or load_artifact("virtual_card_manager")
+    return bytes.fromhex(artifact.boxes["card_index"]["prefix"])
+
+
+class CardIndex:
+    """Card ID <-> owner lookups against a deployed Virtual Card Manager"""
+
+    def __init__(self, algod_client, app_id, prefix=None):
+        self.algod_client = algod_client
+        self.app_id = app_id
+        self.prefix = card_index_prefix() if prefix is None else prefix
+        # Card IDs never change owner, so owners can be cached indefinitely
+        self._owners = {}
+
+    def box_name(self, card_id):
+        return self.prefix + card_id_bytes(card_id)
+
+    def box_reference(self, card_id):
+        """(app, box name) reference for transactions touching a card's box"""
+        return (self.app_id, self.box_name(card_id))
+
+    def total_cards(self):
+        app = self.algod_client.application_info(self.app_id)
+        for entry in app["params"].get("global-state", []):
+            if base64.b64decode(entry["key"]) == b"TOTAL_CARDS":
+                return entry["value"].get("uint", 0)
+        return 0
+
+    def next_card_id(self):
+        """ID the next create_card call will assign"""
+        return self.total_cards() + 1
+
+    def owner_of(self, card_id):
+        """Owner address of a card, or None when the card does not exist"""
+        if card_id in self._owners:
+            return self._owners[card_id]
+        try:
+            box = self.algod_client.application_box_by_name(self.app_id, self.box_name(card_id))
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        owner = encoding.encode_address(base64.b64decode(box["value"]))
+        self._owners[card_id] = owner
+        return owner
+
+    def card_of(self, address):
+        """Card ID held by an account, or None when it has no card"""
+        try:
+            info = self.algod_client.account_application_info(address, self.app_id)
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        for entry in info.get("app-local-state", {}).get("key-value", []):
+            if base64.b64decode(entry["key"]) == b"card_id":
+                raw = base64.b64decode(entry["value"].get("bytes", ""))
+                return card_number(raw) if len(raw) == CARD_ID_SIZE else None
+        return None
+
+    def card_ids(self):
+        """All indexed card IDs, from the application's box list"""
+        ids = []
+        for box in self.algod_client.application_boxes(self.app_id).get("boxes", []):
+            name = base64.b64decode(box["name"])
+            if name.startswith(self.prefix) and len(name) == len(self.prefix) + CARD_ID_SIZE:
+                ids.append(card_number(name[len(self.prefix):]))
+        return sorted(ids)
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 2:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    index = CardIndex(algod_client, int(args[0]))
+    owner = index.owner_of(int(args[1]))
+    if owner is None:
+        print(f"❌ Card {args[1]} not found")
+        return 1
+    print(f"🎴 Card {args[1]} -> {owner}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+"""
+Off-chain pre-check of use_card against a cached copy of card state
+Mirrors what use_card does before it charges a card:
+- converts the spend from the card's currency at the cached price
+- applies the lazy daily (UTC day or rolling 24 hours) and monthly resets
+- runs the validate_card_usage rules: active, balance, daily and monthly
+  limits, positive amount
+
+The mirror works from a local, round-tagged copy of each card's local state
+and of the contract's price table, so a point of sale can deny a spend the
+contract would reject in microseconds, before anything is signed. Entries
+more than max_lag rounds behind the chain are re-read from algod before
+they are trusted.
+
+The conformance suite (test_card_precheck.py, also `--check` with a latency
+report) runs named cases for every rule and boundary, then randomized states
+near the limits, each through the compiled contract (plain and rolling) with
+teal_eval. The mirror must agree on approval, on the reason for a denial,
+and on the state left behind.
+
+Usage:
+    python card_precheck.py <app_id> <address> <amount> [--rolling]
+    python card_precheck.py --check [--iterations 3000]
+    python -m pytest test_card_precheck.py
+"""
+
+import argparse
+import base64
+import random
+import sys
+import time
+
+from algosdk.error import AlgodHTTPError
+
+from card_index import CARD_ID_SIZE, card_id_bytes, card_number
+from card_sweeper import decode_local_state
+from price_table import PRICE_MAX_AGE, PRICE_SCALE, prices_from_global_state
+from spend_window import SpendWindow, fetch_window, window_box_name
+
+# Must match virtual_card_manager.py; kept here so the mirror does not
+# import PyTeal
+DAY_SECONDS = 86_400
+MONTH_SECONDS = 2_592_000
+UINT64_MAX = 2 ** 64 - 1
+DEFAULT_MAX_LAG = 10
+
+# Denial reasons, in the order use_card would fail
+DENIALS = {
+    "unknown_card": "the account holds no card",
+    "invalid_amount": "the amount is not a uint64",
+    "no_price": "no cached price for the card's currency",
+    "stale_price": "the cached price is older than PRICE_MAX_AGE",
+    "overflow": "the amount overflows in base units",
+    "inactive": "the card is deactivated",
+    "insufficient_balance": "the balance is below the amount",
+    "daily_limit": "the amount exceeds the remaining daily allowance",
+    "monthly_limit": "the amount exceeds the remaining monthly allowance",
+    "zero_amount": "the amount is zero",
+}
+
+
+class Decision:
+    """Outcome of a pre-check; on approval, the card state use_card would leave"""
+
+    __slots__ = ("approved", "reason", "amount", "state", "window")
+
+    def __init__(self, approved, reason=None, amount=None, state=None, window=None):
+        self.approved = approved
+        self.reason = reason
+        self.amount = amount
+        self.state = state
+        self.window = window
+
+    def __bool__(self):
+        return self.approved
+
+    def __repr__(self):
+        if self.approved:
+            return f"Decision(approved, amount={self.amount})"
+        return f"Decision(denied: {self.reason})"
+
+
+def to_base_units(amount, currency, base_currency, prices, timestamp):
+    """(base-unit amount, None) as use_card converts it, or (None, denial reason)"""
+    if currency == base_currency:
+        return amount, None
+    entry = prices.get(currency.rstrip(b"\0").decode(errors="replace"))
+    if entry is None:
+        return None, "no_price"
+    price, observed = entry
+    if observed + PRICE_MAX_AGE > UINT64_MAX:
+        return None, "overflow"
+    if observed + PRICE_MAX_AGE < timestamp:
+        return None, "stale_price"
+    converted = amount * price // PRICE_SCALE
+    if converted > UINT64_MAX:
+        return None, "overflow"
+    return converted, None
+
+
+def evaluate_spend(state, spend_amount, timestamp, base_currency, prices, window=None):
+    """Decision for a use_card of spend_amount at timestamp against a card's local state
+
+    `state` is the decoded local state ({key: int | bytes}); `window` is
+    the card's SpendWindow for the rolling contract, None for the plain one.
+    Neither is modified.
+    """
+    if not isinstance(state.get("card_id"), bytes):
+        return Decision(False, "unknown_card")
+    if not 0 <= spend_amount <= UINT64_MAX:
+        return Decision(False, "invalid_amount")
+    amount, reason = to_base_units(spend_amount, state.get("currency", b""), base_currency,
+                                   prices, timestamp)
+    if reason:
+        return Decision(False, reason)
+
+    after = dict(state)
+    if window is not None:
+        window = window.copy()
+        after["daily_spent"] = window.advance(timestamp)
+    elif timestamp // DAY_SECONDS > state.get("last_reset_day", 0):
+        after["daily_spent"] = 0
+        after["last_reset_day"] = timestamp // DAY_SECONDS
+    if timestamp // MONTH_SECONDS > state.get("last_reset_month", 0):
+        after["monthly_spent"] = 0
+        after["last_reset_month"] = timestamp // MONTH_SECONDS
+
+    daily_spent = after.get("daily_spent", 0)
+    monthly_spent = after.get("monthly_spent", 0)
+    if after.get("is_active", 0) != 1:
+        return Decision(False, "inactive", amount)
+    if after.get("balance", 0) < amount:
+        return Decision(False, "insufficient_balance", amount)
+    if daily_spent + amount > after.get("daily_limit", 0):
+        return Decision(False, "daily_limit", amount)
+    if monthly_spent + amount > after.get("monthly_limit", 0):
+        return Decision(False, "monthly_limit", amount)
+    if amount == 0:
+        return Decision(False, "zero_amount", amount)
+    if window is not None:
+        if window.cumulative + amount > UINT64_MAX:
+            return Decision(False, "overflow", amount)
+        window.record(timestamp, amount)
+
+    after["balance"] -= amount
+    after["daily_spent"] = daily_spent + amount
+    after["monthly_spent"] = monthly_spent + amount
+    return Decision(True, None, amount, after, window)
+
+
+class CachedCard:
+    __slots__ = ("state", "round", "window")
+
+    def __init__(self, state, round, window=None):
+        self.state = state
+        self.round = round
+        self.window = window
+
+
+class CardMirror:
+    """Round-tagged cache of card local state and the price table, for pre-checks
+
+    Without an algod client the cache is fed only through load(),
+    load_globals() and events, and cards it has not seen are denied.
+    """
+
+    def __init__(self, app_id=None, algod_client=None, rolling=False, max_lag=DEFAULT_MAX_LAG):
+        self.app_id = app_id
+        self.algod_client = algod_client
+        self.rolling = rolling
+        self.max_lag = max_lag
+        self.cards = {}
+        self.base_currency = None
+        self.prices = {}
+        self.globals_round = None
+
+    # Filling the cache
+
+    def load(self, address, state, round, window=None):
+        if self.rolling and window is None:
+            window = SpendWindow()
+        self.cards[address] = CachedCard(state, round, window)
+
+    def load_globals(self, base_currency, prices, round):
+        self.base_currency = base_currency
+        self.prices = dict(prices)
+        self.globals_round = round
+
+    def fetch(self, address):
+        """Re-read a card from algod; None when the account holds no card"""
+        try:
+            info = self.algod_client.account_application_info(address, self.app_id)
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                self.cards.pop(address, None)
+                return None
+            raise
+        state = decode_local_state(info.get("app-local-state", {}).get("key-value", []))
+        raw = state.get("card_id")
+        if not isinstance(raw, bytes) or len(raw) != CARD_ID_SIZE:
+            self.cards.pop(address, None)
+            return None
+        window = fetch_window(self.algod_client, self.app_id, card_number(raw)) \
+            if self.rolling else None
+        self.load(address, state, info.get("round", 0), window)
+        return self.cards[address]
+
+    def fetch_globals(self):
+        app = self.algod_client.application_info(self.app_id)
+        entries = app["params"].get("global-state", [])
+        base_currency = b""
+        for entry in entries:
+            if base64.b64decode(entry["key"]) == b"BASE_CURRENCY":
+                base_currency = base64.b64decode(entry["value"].get("bytes", ""))
+        self.load_globals(base_currency, prices_from_global_state(entries),
+                          self.algod_client.status()["last-round"])
+
+    def _stale(self, round, current_round):
+        return round is None or (current_round is not None and current_round - round > self.max_lag)
+
+    # Keeping it current
+
+    def commit(self, address, decision):
+        """Record an approved spend that was submitted"""
+        entry = self.cards.get(address)
+        if entry is not None and decision.approved:
+            entry.state, entry.window = decision.state, decision.window
+
+    def apply_event(self, event):
+        """Fold in an ingested CardEvent newer than the cached state
+
+        Fundings add to the balance. Spends and closes drop the entry: the
+        reset a spend applied depends on its block's timestamp, which card
+        events do not carry, so the card is re-read on its next pre-check.
+        """
+        entry = self.cards.get(event.address)
+        if entry is None or event.round <= entry.round:
+            return
+        if event.kind == "CardFunded":
+            entry.state = dict(entry.state, balance=entry.state.get("balance", 0) + event.amount)
+        elif event.kind in ("CardUsed", "CardClosed"):
+            del self.cards[event.address]
+
+    # Deciding
+
+    def precheck(self, address, spend_amount, timestamp=None, current_round=None):
+        """Decision for `address` spending `spend_amount` (card currency) at `timestamp`
+
+        With current_round, cached entries more than max_lag rounds older are
+        re-read from algod first (when a client was given).
+        """
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        if self.algod_client is not None and self._stale(self.globals_round, current_round):
+            self.fetch_globals()
+        entry = self.cards.get(address)
+        if self.algod_client is not None and (
+                entry is None or self._stale(entry.round, current_round)):
+            entry = self.fetch(address)
+        if entry is None:
+            return Decision(False, "unknown_card")
+        return evaluate_spend(entry.state, spend_amount, timestamp, self.base_currency,
+                              self.prices, entry.window)
+
+
+# Conformance suite
+
+BASE = b"USD"
+FOREIGN = b"EUR"
+NOW = 1_700_000_000
+DAY = NOW // DAY_SECONDS
+MONTH = NOW // MONTH_SECONDS
+
+
+def card_state(**overrides):
+    """Local state of an active, funded card with room under both limits"""
+    state = {
+        "balance": 10 ** 9, "daily_spent": 0, "monthly_spent": 0,
+        "last_reset_day": DAY, "last_reset_month": MONTH, "kyc_tier": 2, "region": b"US",
+        "is_active": 1, "currency": BASE, "daily_limit": 5 * 10 ** 8,
+        "monthly_limit": 5 * 10 ** 9, "card_id": card_id_bytes(1),
+    }
+    state.update(overrides)
+    return state
+
+
+FRESH = {"EUR": (1_100_000, NOW - 60)}
+STALE = {"EUR": (1_100_000, NOW - PRICE_MAX_AGE - 1)}
+HUGE = {"EUR": (UINT64_MAX, NOW)}
+
+# (name, local state, prices, spend amount, expected denial or None)
+CASES = (
+    ("plain spend", card_state(), {}, 1_000, None),
+    ("whole balance", card_state(balance=4 * 10 ** 8), {}, 4 * 10 ** 8, None),
+    ("one over balance", card_state(balance=10), {}, 11, "insufficient_balance"),
+    ("exactly the daily allowance", card_state(daily_spent=4 * 10 ** 8), {}, 10 ** 8, None),
+    ("one over the daily allowance", card_state(daily_spent=4 * 10 ** 8), {}, 10 ** 8 + 1,
+     "daily_limit"),
+    ("daily reset frees the allowance",
+     card_state(daily_spent=5 * 10 ** 8, last_reset_day=DAY - 1), {}, 10 ** 8, None),
+    ("same-day spend does not reset", card_state(daily_spent=5 * 10 ** 8), {}, 1, "daily_limit"),
+    ("exactly the monthly allowance", card_state(monthly_spent=5 * 10 ** 9 - 7), {}, 7, None),
+    ("one over the monthly allowance", card_state(monthly_spent=5 * 10 ** 9 - 7), {}, 8,
+     "monthly_limit"),
+    ("monthly reset frees the allowance",
+     card_state(monthly_spent=5 * 10 ** 9, last_reset_month=MONTH - 1), {}, 10 ** 8, None),
+    ("deactivated card", card_state(is_active=0), {}, 1, "inactive"),
+    ("inactive wins over balance", card_state(is_active=0, balance=0), {}, 5, "inactive"),
+    ("zero amount", card_state(), {}, 0, "zero_amount"),
+    ("foreign currency at a fresh price", card_state(currency=FOREIGN), FRESH, 1_000, None),
+    ("conversion decides the limit", card_state(currency=FOREIGN, daily_spent=5 * 10 ** 8 - 1_100),
+     FRESH, 1_000, None),
+    ("conversion pushes over the limit",
+     card_state(currency=FOREIGN, daily_spent=5 * 10 ** 8 - 1_099), FRESH, 1_000, "daily_limit"),
+    ("conversion rounds down to zero", card_state(currency=FOREIGN), {"EUR": (1, NOW)}, 5,
+     "zero_amount"),
+    ("no price for the currency", card_state(currency=FOREIGN), {}, 1_000, "no_price"),
+    ("price exactly PRICE_MAX_AGE old", card_state(currency=FOREIGN),
+     {"EUR": (1_100_000, NOW - PRICE_MAX_AGE)}, 1_000, None),
+    ("stale price", card_state(currency=FOREIGN), STALE, 1_000, "stale_price"),
+    ("conversion overflows", card_state(currency=FOREIGN), HUGE, 10 ** 9, "overflow"),
+    ("limit at uint64 max", card_state(balance=UINT64_MAX, daily_limit=UINT64_MAX,
+                                       monthly_limit=UINT64_MAX), {}, UINT64_MAX, None),
+    ("daily sum overflows uint64", card_state(balance=UINT64_MAX, daily_spent=2,
+                                              daily_limit=UINT64_MAX, monthly_limit=UINT64_MAX),
+     {}, UINT64_MAX, "daily_limit"),
+)
+
+
+def case_window(state):
+    """Rolling window equivalent to a case's UTC-day counter: today's spend in
+    the current hour, an earlier day's spend already out of the window"""
+    window = SpendWindow()
+    if state["daily_spent"]:
+        hours_ago = 0 if state["last_reset_day"] == DAY else 25
+        window.record(NOW - hours_ago * 3_600, state["daily_spent"])
+    return window
+
+
+def random_case(rng, rolling):
+    """(local state, prices, spend amount, timestamp, window) near the rules' boundaries"""
+    timestamp = NOW + rng.randrange(0, 40 * DAY_SECONDS)
+    currency = rng.choice((BASE, BASE, FOREIGN))
+    prices = rng.choice(({}, FRESH, FRESH, STALE, HUGE, {"EUR": (rng.randrange(1, 10 ** 7),
+                                                                 timestamp - 10)}))
+    spend = rng.choice((0, 1, 999, 10 ** 6, 10 ** 8, 2 ** 63, UINT64_MAX, rng.randrange(10 ** 9)))
+    amount, _ = to_base_units(spend, currency, BASE, prices, timestamp)
+    amount = spend if amount is None else amount
+
+    def near(value):
+        return min(UINT64_MAX, max(0, value + rng.choice((-1, 0, 0, 1, 10 ** 6))))
+
+    daily_limit = near(rng.choice((amount, 2 * amount, 10 ** 12, UINT64_MAX)))
+    monthly_limit = near(rng.choice((amount, 3 * amount, 10 ** 13, UINT64_MAX)))
+    state = card_state(
+        balance=near(rng.choice((amount, 4 * amount, UINT64_MAX))),
+        daily_spent=near(rng.choice((0, daily_limit - amount, daily_limit))),
+        monthly_spent=near(rng.choice((0, monthly_limit - amount, monthly_limit))),
+        daily_limit=daily_limit, monthly_limit=monthly_limit,
+        last_reset_day=max(0, timestamp // DAY_SECONDS - rng.choice((0, 0, 1, 5))),
+        last_reset_month=max(0, timestamp // MONTH_SECONDS - rng.choice((0, 0, 1))),
+        is_active=rng.choice((0, 1, 1, 1, 1)), currency=currency,
+    )
+    window = None
+    if rolling:
+        window = SpendWindow()
+        start = timestamp - rng.choice((0, 1, 30)) * 3_600
+        for _ in range(rng.randrange(0, 4)):
+            start += rng.randrange(0, 10) * 3_600
+            spent = rng.choice((0, 1, daily_limit // 3, amount))
+            if window.cumulative + spent <= UINT64_MAX:
+                window.record(min(start, timestamp), spent)
+    return state, prices, spend, timestamp, window
+
+
+def run_contract(program, state, prices, spend, timestamp, window):
+    """use_card through teal_eval: (approved, local state after, window after)"""
+    from price_table import price_key
+    from teal_eval import Ledger, evaluate, make_txn
+
+    sender = bytes([1]) * 32
+    global_state = {b"BASE_CURRENCY": BASE}
+    for currency, (price, observed) in prices.items():
+        global_state[price_key(currency)] = price.to_bytes(8, "big") + observed.to_bytes(8, "big")
+    boxes = {}
+    if window is not None and window.cumulative:
+        boxes[window_box_name(card_number(state["card_id"]))] = window.to_box()
+    ledger = Ledger(global_state=global_state, boxes=boxes,
+                    local_state={sender: {key.encode(): value for key, value in state.items()}})
+    result = evaluate(program, ledger, [make_txn(sender, [b"use_card", spend])], 0,
+                      {"LatestTimestamp": timestamp, "Round": 1})
+    local = {key.decode(): value for key, value in result.ledger.local_state[sender].items()}
+    box = result.ledger.boxes.get(window_box_name(card_number(state["card_id"])))
+    return result.approved, local, SpendWindow.from_box(box) if box else None
+
+
+def compare_case(program, rolling, state, prices, spend, timestamp, window, expected=False):
+    """Disagreements between the pre-check and the contract's use_card on one
+    spend; `expected` is the denial reason a named case expects"""
+    decision = evaluate_spend(state, spend, timestamp, BASE, prices, window)
+    approved, local, box = run_contract(program, state, prices, spend, timestamp, window)
+    problems = []
+    if expected is not False and decision.reason != expected:
+        problems.append(f"mirror says {decision.reason}, case expects {expected}")
+    if decision.approved != approved:
+        verdict = "approved" if approved else "rejected"
+        problems.append(f"mirror {decision!r}, contract {verdict}")
+    elif approved:
+        if local != decision.state:
+            problems.append(f"state {decision.state}, contract left {local}")
+        if rolling and box.to_box() != decision.window.to_box():
+            problems.append("spend window differs")
+    return problems
+
+
+def conformance_programs():
+    """{contract: (compiled approval program, rolling)} the suite runs against"""
+    from artifact_builder import compile_programs
+    from teal_eval import Program
+
+    programs = {}
+    for contract in ("virtual_card_manager", "virtual_card_manager_rolling"):
+        _, teals = compile_programs(contract, optimized=True)
+        programs[contract] = (Program(teals["approval"]), contract.endswith("_rolling"))
+    return programs
+
+
+def conformance(iterations=3000, seed=0):
+    """Named cases, then randomized ones, for the plain and rolling contracts;
+    returns the number of disagreements with the contract"""
+    rng = random.Random(seed)
+    failures = 0
+
+    def compare(label, *case):
+        problems = compare_case(program, rolling, *case)
+        for problem in problems[:1]:
+            print(f"   - {contract} {label}: {problem}")
+        return bool(problems)
+
+    for contract, (program, rolling) in conformance_programs().items():
+        for name, state, prices, spend, expected in CASES:
+            failures += compare(name, state, prices, spend, NOW,
+                                case_window(state) if rolling else None, expected)
+        for i in range(iterations):
+            failures += compare(f"random case {i}", *random_case(rng, rolling))
+    return failures
+
+
+def check(iterations=3000):
+    failures = conformance(iterations)
+
+    # Latency on a warm cache
+    mirror = CardMirror()
+    mirror.load_globals(BASE, FRESH, 1)
+    for n in range(1000):
+        mirror.load(f"ADDR{n}", card_state(currency=FOREIGN if n % 3 else BASE), 1)
+    calls = 200_000
+    started = time.perf_counter()
+    for n in range(calls):
+        mirror.precheck(f"ADDR{n % 1000}", 1_000 + n % 7, NOW)
+    elapsed = time.perf_counter() - started
+    print(f"📋 {len(CASES)} named cases and {iterations} random cases per contract; "
+          f"{elapsed / calls * 1e6:.1f} µs per pre-check")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-check a card spend off-chain")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("address", nargs="?")
+    parser.add_argument("amount", nargs="?", type=int, help="Spend in the card's currency units")
+    parser.add_argument("--rolling", action="store_true",
+                        help="The contract uses the rolling 24-hour window")
+    parser.add_argument("--check", action="store_true",
+                        help="Run the conformance suite against the compiled contracts")
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = check(args.iterations)
+        if failures:
+            print(f"❌ {failures} cases where the pre-check disagrees with the contract")
+            return 1
+        print("✅ Pre-check matches use_card on every conformance case")
+        return 0
+    if args.amount is None:
+        parser.error("app_id, address and amount are required")
+
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    mirror = CardMirror(args.app_id, algod_client, rolling=args.rolling)
+    decision = mirror.precheck(args.address, args.amount)
+    started = time.perf_counter()
+    decision = mirror.precheck(args.address, args.amount)
+    elapsed = (time.perf_counter() - started) * 1e6
+    if decision.approved:
+        print(f"✅ Approved: {decision.amount} base units, {decision.state['balance']} left "
+              f"({elapsed:.0f} µs on the cached state)")
+        return 0
+    print(f"❌ Denied: {DENIALS[decision.reason]} ({elapsed:.0f} µs on the cached state)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Card summaries through the read-only get_card_summary method
+The contract computes a card's balance, remaining daily and monthly
+allowance (after any resets use_card would apply), KYC tier, active flag
+and currency in one call. Clients run it through algod's simulate endpoint:
+nothing is submitted, so it needs no fee payment and no signature.
+
+Usage:
+    python card_summary.py <app_id> <address> [--rolling]
+    python card_summary.py --check
+"""
+
+import argparse
+import base64
+import random
+import sys
+
+from algosdk import encoding, transaction
+from algosdk.v2client.models import SimulateRequest, SimulateRequestTransactionGroup
+
+from card_index import card_id_bytes
+from spend_window import SpendWindow, window_box_name
+
+# Must match virtual_card_manager.py; kept here so clients do not import PyTeal
+CARD_SUMMARY_PREFIX = b"CardSummary:"
+CARD_SUMMARY_FIELDS = ("balance", "daily_remaining", "monthly_remaining", "kyc_tier", "is_active")
+
+
+class CardSummaryError(Exception):
+    """Raised when the simulated call fails or returns no summary"""
+
+
+class CardSummary:
+    __slots__ = CARD_SUMMARY_FIELDS + ("currency",)
+
+    def __init__(self, balance, daily_remaining, monthly_remaining, kyc_tier, is_active, currency):
+        self.balance = balance
+        self.daily_remaining = daily_remaining
+        self.monthly_remaining = monthly_remaining
+        self.kyc_tier = kyc_tier
+        self.is_active = is_active
+        self.currency = currency
+
+    @classmethod
+    def from_log(cls, log):
+        if not log.startswith(CARD_SUMMARY_PREFIX):
+            raise CardSummaryError("Not a CardSummary log")
+        body = log[len(CARD_SUMMARY_PREFIX):]
+        size = 8 * len(CARD_SUMMARY_FIELDS)
+        if len(body) < size:
+            raise CardSummaryError(f"CardSummary logs are at least {size} bytes, got {len(body)}")
+        values = [int.from_bytes(body[i:i + 8], "big") for i in range(0, size, 8)]
+        return cls(*values[:4], bool(values[4]), body[size:].decode(errors="replace"))
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def summary_txn(sender, params, app_id, account, card_id=None):
+    """get_card_summary call; rolling-window apps need the card ID for its window box"""
+    return transaction.ApplicationCallTxn(
+        sender=sender,
+        sp=params,
+        index=app_id,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"get_card_summary", encoding.decode_address(account)],
+        accounts=[account] if account != sender else None,
+        boxes=[(app_id, window_box_name(card_id))] if card_id is not None else None,
+    )
+
+
+def simulate_card_summary(algod_client, app_id, account, card_id=None, sender=None):
+    """CardSummary of an account, computed by the contract in one simulate call"""
+    params = algod_client.suggested_params()
+    txn = summary_txn(sender or account, params, app_id, account, card_id)
+    request = SimulateRequest(
+        txn_groups=[SimulateRequestTransactionGroup(
+            txns=[transaction.SignedTransaction(txn, None)]
+        )],
+        allow_empty_signatures=True,
+    )
+    result = algod_client.simulate_transactions(request)
+    group = result["txn-groups"][0]
+    if group.get("failure-message"):
+        raise CardSummaryError(group["failure-message"])
+    for log in group["txn-results"][0]["txn-result"].get("logs", []):
+        raw = base64.b64decode(log)
+        if raw.startswith(CARD_SUMMARY_PREFIX):
+            return CardSummary.from_log(raw)
+    raise CardSummaryError("get_card_summary returned no summary")
+
+
+def check(iterations=2000, seed=0):
+    """Cross-check contract summaries against use_card outcomes and the window mirror"""
+    from artifact_builder import compile_programs
+    from teal_eval import Ledger, Program, evaluate, make_txn
+
+    rng = random.Random(seed)
+    sender = bytes([1]) * 32
+    card_id = 1
+    daily_limit = 1_000_000
+    monthly_limit = 5_000_000
+    mismatches = 0
+    for contract in ("virtual_card_manager", "virtual_card_manager_rolling"):
+        rolling = contract.endswith("_rolling")
+        _, teals = compile_programs(contract, optimized=True)
+        program = Program(teals["approval"])
+        ledger = Ledger(global_state={b"BASE_CURRENCY": b"USD"}, local_state={sender: {
+            b"balance": 10 ** 9, b"daily_spent": 0, b"monthly_spent": 0,
+            b"last_reset_day": 0, b"last_reset_month": 0, b"kyc_tier": 2, b"region": b"US",
+            b"is_active": 1, b"currency": b"USD", b"daily_limit": daily_limit,
+            b"monthly_limit": monthly_limit, b"card_id": card_id_bytes(card_id),
+        }})
+        timestamp = 1_700_000_000
+        for _ in range(iterations):
+            timestamp += rng.choice((0, 60, 1_800, 3_600, 7_200, 40_000, 90_000, 2_000_000))
+            context = {"LatestTimestamp": timestamp, "Round": 1}
+            result = evaluate(program, ledger, [make_txn(sender, [b"get_card_summary", sender])],
+                              0, context)
+            if not result.approved:
+                mismatches += 1
+                print(f"   - {contract} ts={timestamp}: summary rejected ({result.error})")
+                continue
+            summary = CardSummary.from_log(result.logs[-1])
+            local = ledger.local_state[sender]
+            if rolling:
+                box = ledger.boxes.get(window_box_name(card_id))
+                window = SpendWindow.from_box(box) if box else SpendWindow()
+                expected_daily = max(0, daily_limit - window.spent(timestamp))
+            else:
+                spent = 0 if timestamp // 86_400 > local[b"last_reset_day"] else local[b"daily_spent"]
+                expected_daily = max(0, daily_limit - spent)
+            monthly = 0 if timestamp // 2_592_000 > local[b"last_reset_month"] else \
+                local[b"monthly_spent"]
+            expected = (local[b"balance"], expected_daily, max(0, monthly_limit - monthly), 2, True,
+                        "USD")
+            actual = tuple(summary.as_dict().values())
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"   - {contract} ts={timestamp}: summary {actual}, expected {expected}")
+
+            # use_card must accept exactly the amounts within the summary's allowance
+            amount = rng.choice((1, 50_000, 250_000, 600_000, summary.daily_remaining,
+                                 summary.daily_remaining + 1))
+            spend = evaluate(program, ledger, [make_txn(sender, [b"use_card", amount])], 0, context)
+            allowed = 0 < amount <= min(summary.daily_remaining, summary.monthly_remaining,
+                                        summary.balance)
+            if spend.approved != allowed:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"   - {contract} ts={timestamp}: use_card {amount} "
+                          f"{'approved' if spend.approved else 'rejected'} with {summary.as_dict()}")
+            if spend.approved:
+                ledger = spend.ledger
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Card summary through simulate")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("address", nargs="?")
+    parser.add_argument("--rolling", action="store_true",
+                        help="The app uses rolling-window limits")
+    parser.add_argument("--check", action="store_true",
+                        help="Cross-check summaries against the contract's use_card")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = check(args.iterations)
+        if mismatches:
+            print(f"❌ {mismatches} summaries disagree with use_card")
+            return 1
+        print(f"✅ Summaries match use_card over {args.iterations} calls per contract")
+        return 0
+    if args.address is None:
+        parser.error("app_id and address are required")
+
+    from card_index import CardIndex
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    card_id = None
+    if args.rolling:
+        card_id = CardIndex(algod_client, args.app_id).card_of(args.address)
+        if card_id is None:
+            print(f"❌ {args.address} has no card")
+            return 1
+    try:
+        summary = simulate_card_summary(algod_client, args.app_id, args.address, card_id)
+    except CardSummaryError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"💳 {args.address} ({summary.currency}, tier {summary.kyc_tier}, "
+          f"{'active' if summary.is_active else 'inactive'})")
+    print(f"   Balance: {summary.balance}")
+    print(f"   Remaining today: {summary.daily_remaining}, this month: {summary.monthly_remaining}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
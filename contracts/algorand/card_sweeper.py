@@ -0,0 +1,237 @@
+"""
+Dead card sweeper for the Virtual Card Manager
+Finds deactivated (and optionally zero-balance) cards and closes them with
+sweep_card: the contract deletes the card's boxes, refunds any remaining
+balance plus the boxes' minimum balance to the holder with an inner
+payment and clears its local state.
+Sweeps go out in atomic groups of up to 16 calls whose fees, including the
+inner payments', are pooled onto the first transaction.
+
+Holders reclaim their own opt-in minimum balance by closing out, which
+refunds the card the same way; close_out_txn builds that call.
+
+Usage:
+    python card_sweeper.py <app_id> [--include-empty] [--rolling] [--dry-run]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import sys
+
+from algosdk import account, encoding, transaction
+from algosdk.error import AlgodHTTPError
+
+from card_index import (
+    CARD_ID_SIZE, CardIndex, card_box_min_balance, card_id_bytes, card_index_prefix, card_number,
+)
+from spend_window import window_box_name
+
+MAX_GROUP_SIZE = 16
+
+
+def decode_local_state(key_values):
+    """{key: int | bytes} from algod/indexer key-value entries"""
+    state = {}
+    for entry in key_values:
+        value = entry["value"]
+        state[base64.b64decode(entry["key"]).decode()] = (
+            base64.b64decode(value.get("bytes", "")) if value["type"] == 1 else value.get("uint", 0)
+        )
+    return state
+
+
+class DeadCard:
+    def __init__(self, address, card_id, balance, is_active):
+        self.address = address
+        self.card_id = card_id
+        self.balance = balance
+        self.is_active = is_active
+
+    @classmethod
+    def from_state(cls, address, state):
+        """DeadCard for an account's local state, or None when it holds no card"""
+        raw = state.get("card_id")
+        if not isinstance(raw, bytes) or len(raw) != CARD_ID_SIZE:
+            return None
+        return cls(address, card_number(raw), state.get("balance", 0), bool(state.get("is_active")))
+
+    def sweepable(self, include_empty=False):
+        return not self.is_active or (include_empty and self.balance == 0)
+
+
+def iter_local_states(algod_client, app_id, indexer_client=None, page_size=None):
+    """(address, local state) of every card holder, via the indexer when available,
+    else the card index; indexer pages are fetched one at a time"""
+    if indexer_client is not None:
+        next_token = None
+        while True:
+            response = indexer_client.accounts(
+                application_id=app_id, next_page=next_token, limit=page_size,
+                exclude="assets,created-assets,created-apps",
+            )
+            for holder in response.get("accounts", []):
+                for local in holder.get("apps-local-state", []):
+                    if local["id"] == app_id and not local.get("deleted"):
+                        yield holder["address"], decode_local_state(local.get("key-value", []))
+            next_token = response.get("next-token")
+            if not next_token:
+                return
+
+    index = CardIndex(algod_client, app_id)
+    for card_id in index.card_ids():
+        address = index.owner_of(card_id)
+        try:
+            info = algod_client.account_application_info(address, app_id)
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                continue  # closed out; its boxes are already gone or orphaned
+            raise
+        state = decode_local_state(info.get("app-local-state", {}).get("key-value", []))
+        raw = state.get("card_id")
+        if isinstance(raw, bytes) and len(raw) == CARD_ID_SIZE and card_number(raw) == card_id:
+            yield address, state
+
+
+def iter_cards(algod_client, app_id, indexer_client=None):
+    """Every card holder's state, via the indexer when available, else the card index"""
+    for address, state in iter_local_states(algod_client, app_id, indexer_client):
+        card = DeadCard.from_state(address, state)
+        if card is not None:
+            yield card
+
+
+def card_boxes(app_id, card_id, rolling=False, prefix=None):
+    prefix = card_index_prefix() if prefix is None else prefix
+    boxes = [(app_id, prefix + card_id_bytes(card_id))]
+    if rolling:
+        boxes.append((app_id, window_box_name(card_id)))
+    return boxes
+
+
+def sweep_txn(sender, params, app_id, card, rolling=False, prefix=None):
+    return transaction.ApplicationCallTxn(
+        sender=sender,
+        sp=params,
+        index=app_id,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"sweep_card", encoding.decode_address(card.address)],
+        accounts=[card.address],
+        boxes=card_boxes(app_id, card.card_id, rolling, prefix),
+    )
+
+
+def close_out_txn(sender, params, app_id, card_id=None, rolling=False, prefix=None):
+    """Holder's CloseOut; refunds the card and box balances and releases the opt-in
+    minimum balance"""
+    return transaction.ApplicationCloseOutTxn(
+        sender=sender,
+        sp=params,
+        index=app_id,
+        boxes=card_boxes(app_id, card_id, rolling, prefix) if card_id is not None else None,
+    )
+
+
+def card_refund(card, rolling=False):
+    """What sweeping `card` pays its holder: the card balance plus the box
+    minimum balance the holder paid at create_card"""
+    return card.balance + card_box_min_balance(rolling)
+
+
+class CardSweeper:
+    def __init__(self, submitter, app_id, rolling=False, prefix=None):
+        self.submitter = submitter
+        self.app_id = app_id
+        self.rolling = rolling
+        self.prefix = card_index_prefix() if prefix is None else prefix
+        self.sender = account.address_from_private_key(submitter.private_key)
+
+    def sweep_batch(self, cards):
+        """Close up to 16 cards in one group; the first call pays every fee"""
+        if not 0 < len(cards) <= MAX_GROUP_SIZE:
+            raise ValueError(f"Batches hold 1 to {MAX_GROUP_SIZE} cards")
+
+        def build(params):
+            return [
+                sweep_txn(self.sender, params, self.app_id, card, self.rolling, self.prefix)
+                for card in cards
+            ]
+
+        ids = ",".join(str(card.card_id) for card in sorted(cards, key=lambda card: card.card_id))
+        digest = hashlib.sha256(ids.encode()).hexdigest()[:16]
+        # Every card refunds at least its box balance with an inner payment
+        return self.submitter.submit(
+            f"sweep_cards:{self.app_id}:{digest}", build,
+            ["sweep_card"] * len(cards), inner_txns=[1] * len(cards),
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Close dead cards and reclaim their balances")
+    parser.add_argument("app_id", type=int)
+    parser.add_argument("--include-empty", action="store_true",
+                        help="Also sweep active cards with a zero balance")
+    parser.add_argument("--rolling", action="store_true",
+                        help="The app uses rolling-window limits (cards have a window box)")
+    parser.add_argument("--batch-size", type=int, default=MAX_GROUP_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+    batch_size = max(1, min(args.batch_size, MAX_GROUP_SIZE))
+
+    from algosdk import mnemonic
+    from algosdk.v2client import indexer
+
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    indexer_client = None
+    if os.getenv("INDEXER_ADDRESS"):
+        indexer_client = indexer.IndexerClient(
+            os.getenv("INDEXER_TOKEN", ""), os.getenv("INDEXER_ADDRESS")
+        )
+
+    dead = [
+        card for card in iter_cards(algod_client, args.app_id, indexer_client)
+        if card.sweepable(args.include_empty)
+    ]
+    balances = sum(card.balance for card in dead)
+    box_balance = card_box_min_balance(args.rolling) * len(dead)
+    print(f"📋 {len(dead)} cards to sweep, refunding {balances} microAlgos of card balance and "
+          f"{box_balance} microAlgos of box balance to their holders")
+    if args.dry_run:
+        for card in dead:
+            state = "inactive" if not card.is_active else "empty"
+            refund = card_refund(card, args.rolling)
+            print(f"   card {card.card_id} ({state}) -> {card.address}: refund {refund}")
+        return 0
+    if not dead:
+        return 0
+
+    deployer_mnemonic = os.getenv("DEPLOYER_MNEMONIC")
+    if not deployer_mnemonic:
+        print("❌ Please set DEPLOYER_MNEMONIC environment variable")
+        return 1
+    from submission import DuplicateOperation, SubmissionError, Submitter
+
+    submitter = Submitter(algod_client, mnemonic.to_private_key(deployer_mnemonic), indexer_client)
+    sweeper = CardSweeper(submitter, args.app_id, rolling=args.rolling)
+    swept = failed = 0
+    for start in range(0, len(dead), batch_size):
+        batch = dead[start:start + batch_size]
+        try:
+            sweeper.sweep_batch(batch)
+        except DuplicateOperation:
+            pass
+        except SubmissionError as e:
+            print(f"❌ Batch {start // batch_size + 1} failed: {e}")
+            failed += len(batch)
+            continue
+        swept += len(batch)
+        print(f"✅ Swept {swept}/{len(dead)}")
+    print(f"🧹 {swept} swept, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,67 +5,97 @@ Handles automated limit resets and price feed updates
 
 import os
 import json
-import time
+import hashlib
 from algosdk import account, mnemonic, transaction
-from algosdk.v2client import algod
 from datetime import datetime, timedelta
 
+from fee_policy import FeePolicy
+from instrumentation import algod_client_from_env, get_metrics, instrument_client
+from price_table import latest_timestamp, pack_prices
+from submission import DuplicateOperation, SubmissionError, Submitter
+
 class ChainlinkAutomation:
-    def __init__(self, algod_client, private_key, app_id):
-        self.algod_client = algod_client
+    def __init__(self, algod_client, private_key, app_id, fee_policy=None,
+                 indexer_client=None):
+        self.algod_client = instrument_client(algod_client)
         self.private_key = private_key
         self.sender = account.address_from_private_key(private_key)
         self.app_id = app_id
+        self.fee_policy = fee_policy or FeePolicy()
+        if indexer_client is not None:
+            indexer_client = instrument_client(indexer_client)
+        self.submitter = Submitter(self.algod_client, private_key, indexer_client, self.fee_policy)
         
     def reset_daily_limits(self):
         """Reset daily limits for all users (called by Chainlink automation)"""
         print("🔄 Resetting daily limits...")
         
-        params = self.algod_client.suggested_params()
-        
-        txn = transaction.ApplicationCallTxn(
-            sender=self.sender,
-            sp=params,
-            index=self.app_id,
-            on_complete=transaction.OnComplete.NoOpOC,
-            app_args=["reset_limits"]
-        )
+        def build(params):
+            return transaction.ApplicationCallTxn(
+                sender=self.sender,
+                sp=params,
+                index=self.app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=["reset_limits"]
+            )
         
-        signed_txn = txn.sign(self.private_key)
-        tx_id = self.algod_client.send_transaction(signed_txn)
+        # One reset per app per UTC day, however often the job is rerun
+        operation_key = f"reset_limits:{self.app_id}:{datetime.utcnow():%Y-%m-%d}"
         
         try:
-            confirmed = transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
-            print(f"✅ Daily limits reset successfully: {tx_id}")
+            confirmed = self.submitter.submit(operation_key, build, "reset_limits")
+            print(f"✅ Daily limits reset successfully in round {confirmed.get('confirmed-round')}")
             return True
-        except Exception as e:
+        except DuplicateOperation:
+            print("✅ Daily limits reset already submitted")
+            return True
+        except SubmissionError as e:
             print(f"❌ Failed to reset limits: {e}")
             return False
     
-    def update_price_feed(self, new_price):
-        """Update price feed data (called by Chainlink price feeds)"""
-        print(f"💰 Updating price feed: {new_price}")
-        
-        params = self.algod_client.suggested_params()
-        
-        txn = transaction.ApplicationCallTxn(
-            sender=self.sender,
-            sp=params,
-            index=self.app_id,
-            on_complete=transaction.OnComplete.NoOpOC,
-            app_args=["update_price_feed", int(new_price * 1000000)]  # Convert to microunits
-        )
-        
-        signed_txn = txn.sign(self.private_key)
-        tx_id = self.algod_client.send_transaction(signed_txn)
+    def update_prices(self, prices, timestamp=None):
+        """Push {currency: price} (or {currency: (price, timestamp)}) in one call per chunk"""
+        print(f"💰 Updating prices: {', '.join(sorted(prices))}")
         
+        # Stamp with chain time: the contract rejects entries newer than the
+        # last block, which is always behind wall clock
         try:
-            confirmed = transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
-            print(f"✅ Price feed updated successfully: {tx_id}")
-            return True
+            chain_time = latest_timestamp(self.algod_client)
         except Exception as e:
-            print(f"❌ Failed to update price feed: {e}")
+            print(f"❌ Failed to read the latest block time: {e}")
             return False
+        if timestamp is None:
+            timestamp = chain_time
+        
+        ok = True
+        for packed in pack_prices(prices, timestamp, not_after=chain_time):
+            def build(params, packed=packed):
+                return transaction.ApplicationCallTxn(
+                    sender=self.sender,
+                    sp=params,
+                    index=self.app_id,
+                    on_complete=transaction.OnComplete.NoOpOC,
+                    app_args=["update_prices", packed]
+                )
+            
+            # The packed entries carry their own timestamps, so a resubmitted
+            # batch is the same operation
+            digest = hashlib.sha256(packed).hexdigest()[:16]
+            operation_key = f"update_prices:{self.app_id}:{digest}"
+            
+            try:
+                confirmed = self.submitter.submit(operation_key, build, "update_prices")
+                print(f"✅ Prices updated successfully in round {confirmed.get('confirmed-round')}")
+            except DuplicateOperation:
+                print("✅ Price update already submitted")
+            except SubmissionError as e:
+                print(f"❌ Failed to update prices: {e}")
+                ok = False
+        return ok
+    
+    def update_price_feed(self, new_price, currency="USD"):
+        """Update a single currency's price (called by Chainlink price feeds)"""
+        return self.update_prices({currency: new_price})
     
     def check_and_reset_limits(self):
         """Check if limits need to be reset and perform the reset"""
@@ -97,7 +127,7 @@ def setup_chainlink_automation():
         return
     
     # Initialize Algod client
-    algod_client = algod.AlgodClient("", "https://testnet-api.algonode.cloud")
+    algod_client = algod_client_from_env()
     
     # Get automation account
     automation_mnemonic = os.getenv("CHAINLINK_AUTOMATION_MNEMONIC")
@@ -120,4 +150,7 @@ def setup_chainlink_automation():
         print("❌ Automation test failed")
 
 if __name__ == "__main__":
-    setup_chainlink_automation()
\ No newline at end of file
+    try:
+        setup_chainlink_automation()
+    finally:
+        get_metrics().export()
\ No newline at end of file
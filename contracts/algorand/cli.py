@@ -0,0 +1,71 @@
+"""
+Command line entry point for the Virtual Card Manager tools
+Each subcommand's module is imported only when that subcommand runs, so
+short-lived jobs never pay for PyTeal or unrelated algosdk imports
+
+Usage:
+    python cli.py <command> [args...]
+"""
+
+import importlib
+import sys
+
+# command: (module, function, description)
+COMMANDS = {
+    "backfill": ("backfill", "main", "Backfill card events over a round range in parallel"),
+    "build": ("artifact_builder", "main", "Compile contracts into versioned artifacts"),
+    "compile": ("compile_pool", "main", "Compile contract targets across a process pool"),
+    "artifacts": ("artifacts", "main", "List prebuilt contract artifacts"),
+    "analytics": ("spend_analytics", "main", "Spend aggregates and anomaly scores from events"),
+    "deploy": ("deploy", "main", "Deploy the Virtual Card Manager"),
+    "automation": ("chainlink_automation", "setup_chainlink_automation",
+                   "Run Chainlink limit-reset automation"),
+    "bench": ("bench_contracts", "main", "Benchmark PyTeal builds against the baseline"),
+    "card": ("card_index", "main", "Look up the owner of a card ID"),
+    "events": ("event_store", "main", "Query or tail the local card event store"),
+    "export": ("snapshot_export", "main", "Export every card's state to a columnar file"),
+    "ingest": ("ingest", "main", "Follow blocks and ingest card events into a sink"),
+    "mock-algod": ("mock_algod", "main", "Run an in-process mock algod for offline use"),
+    "cassette": ("node_cassette", "main", "Record or replay node traffic for benchmarks"),
+    "summary": ("card_summary", "main", "Show a card summary through simulate"),
+    "reconcile": ("reconcile", "main", "Reconcile Supabase cards with chain state by partition"),
+    "sweep": ("card_sweeper", "main", "Close dead cards and refund their balances"),
+    "tenant": ("tenants", "main", "Look up a tenant of the shared contract"),
+    "precheck": ("card_precheck", "main", "Pre-check a card spend against cached state"),
+    "prices": ("price_table", "main", "Show the cached price table"),
+    "push-prices": ("price_pusher", "main", "Push prices on deviation or heartbeat"),
+    "variant": ("teal_template", "main", "Per-partner bytecode from a contract template"),
+    "verify-optimizer": ("verify_optimizer", "main",
+                         "Check optimized TEAL against PyTeal output"),
+}
+
+
+def usage():
+    print(__doc__.strip().splitlines()[-1].strip())
+    print("\nCommands:")
+    for name, (_, _, description) in COMMANDS.items():
+        print(f"  {name:<18} {description}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        usage()
+        return 0 if not argv or argv[0] in ("-h", "--help") else 2
+
+    module_name, function_name, _ = COMMANDS[argv[0]]
+    function = getattr(importlib.import_module(module_name), function_name)
+    # Script-style entry points take no arguments; argparse ones take argv
+    if function.__code__.co_argcount:
+        result = function(argv[1:])
+    else:
+        result = function()
+
+    from instrumentation import get_metrics
+
+    get_metrics().export()
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
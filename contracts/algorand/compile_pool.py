@@ -0,0 +1,243 @@
+"""
+Parallel PyTeal compilation
+compileTeal is single-threaded, so build targets - a contract program at a
+TEAL version with approval options - are compiled across a process pool.
+Identical targets compile once, and results are kept in an on-disk cache
+keyed by everything that affects the output (contract source, options,
+TEAL version, PyTeal version and, for optimized builds, the optimizer).
+
+Usage:
+    python compile_pool.py virtual_card_manager shared_contract@9 --jobs 4
+    python compile_pool.py virtual_card_manager:approval,rolling_window=true,template=true
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from artifact_builder import CONTRACTS, HERE, load_contract_module
+from instrumentation import timed
+
+CACHE_DIR = os.path.join(HERE, ".build_cache")
+BUILD_MANIFEST_NAME = "build.json"
+PROGRAMS = ("approval", "clear")
+# Optimized output also depends on these
+OPTIMIZER_SOURCES = ("teal_optimizer.py", "teal_assembler.py")
+
+
+class CompileTarget:
+    """One program to compile: contract, program, TEAL version and approval options"""
+
+    __slots__ = ("contract", "program", "teal_version", "options", "optimized")
+
+    def __init__(self, contract, program="approval", teal_version=None, options=None,
+                 optimized=True):
+        if contract not in CONTRACTS:
+            raise ValueError(f"Unknown contract {contract}")
+        if program not in PROGRAMS:
+            raise ValueError(f"Program must be one of {', '.join(PROGRAMS)}, got {program}")
+        self.contract = contract
+        self.program = program
+        self.teal_version = teal_version
+        # Clear programs take no options
+        self.options = dict(options or {}) if program == "approval" else {}
+        self.optimized = optimized
+
+    @classmethod
+    def parse(cls, spec, optimized=True):
+        """contract[:program][@teal_version][,option=value...]"""
+        spec, *pairs = spec.split(",")
+        teal_version = None
+        if "@" in spec:
+            spec, version = spec.split("@", 1)
+            teal_version = int(version)
+        contract, _, program = spec.partition(":")
+        if contract not in CONTRACTS:
+            raise ValueError(f"Unknown contract {contract}")
+        options = {}
+        for pair in pairs:
+            key, _, value = pair.partition("=")
+            try:
+                options[key] = json.loads(value)
+            except ValueError:
+                options[key] = value
+        if program:
+            return [cls(contract, program, teal_version, options, optimized)]
+        return [
+            cls(contract, "approval", teal_version, {**CONTRACTS[contract][3], **options}, optimized),
+            cls(contract, "clear", teal_version, optimized=optimized),
+        ]
+
+    def describe(self):
+        version = f"@{self.teal_version}" if self.teal_version else ""
+        options = "".join(f",{key}={json.dumps(value)}" for key, value in sorted(self.options.items()))
+        return f"{self.contract}:{self.program}{version}{options}"
+
+    def key(self):
+        """Cache key; equal for targets that produce the same TEAL"""
+        import pyteal
+
+        digest = hashlib.sha256()
+        with open(CONTRACTS[self.contract][0], "rb") as f:
+            digest.update(f.read())
+        if self.optimized:
+            for source in OPTIMIZER_SOURCES:
+                with open(os.path.join(HERE, source), "rb") as f:
+                    digest.update(f.read())
+        digest.update(json.dumps([
+            self.contract, self.program, self.teal_version, self.options, self.optimized,
+            getattr(pyteal, "__version__", ""),
+        ], sort_keys=True).encode())
+        return digest.hexdigest()
+
+
+def compile_target(target):
+    """Compile one target to TEAL; runs in pool workers"""
+    from pyteal import Mode, compileTeal
+
+    module = load_contract_module(target.contract)
+    _, approval_fn, clear_fn, _ = CONTRACTS[target.contract]
+    program = getattr(module, approval_fn if target.program == "approval" else clear_fn)
+    teal = compileTeal(
+        program(**target.options), Mode.Application,
+        version=target.teal_version or module.TEAL_VERSION, assembleConstants=True
+    )
+    if target.optimized:
+        from teal_optimizer import optimize
+
+        teal = optimize(teal)[0]
+    return teal
+
+
+class CompileCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.teal")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, teal):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name so concurrent builds never read a partial file
+        temporary = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            f.write(teal)
+        os.replace(temporary, self._path(key))
+
+
+def compile_targets(targets, jobs=None, cache=None):
+    """TEAL for each target, in order, and per-key stats
+
+    Targets sharing a key compile once; cache hits skip compilation. Misses
+    go to a process pool of `jobs` workers (os.cpu_count() by default, run
+    in this process when 1).
+    """
+    keys = [target.key() for target in targets]
+    unique = {}
+    for key, target in zip(keys, targets):
+        unique.setdefault(key, target)
+
+    results = {}
+    stats = {key: {"cached": False, "seconds": 0.0} for key in unique}
+    if cache is not None:
+        for key in unique:
+            teal = cache.get(key)
+            if teal is not None:
+                results[key] = teal
+                stats[key]["cached"] = True
+    missing = [key for key in unique if key not in results]
+
+    jobs = min(jobs or os.cpu_count() or 1, len(missing))
+    with timed("compile", "pool"):
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {key: pool.submit(_timed_compile, unique[key]) for key in missing}
+                for key, future in futures.items():
+                    results[key], stats[key]["seconds"] = future.result()
+        else:
+            for key in missing:
+                results[key], stats[key]["seconds"] = _timed_compile(unique[key])
+    if cache is not None:
+        for key in missing:
+            cache.put(key, results[key])
+    return [results[key] for key in keys], stats
+
+
+def _timed_compile(target):
+    start = time.perf_counter()
+    teal = compile_target(target)
+    return teal, time.perf_counter() - start
+
+
+def write_outputs(targets, teals, stats, output_dir):
+    """Write each target's TEAL and a build.json manifest describing them"""
+    os.makedirs(output_dir, exist_ok=True)
+    entries = []
+    for target, teal in zip(targets, teals):
+        key = target.key()
+        teal_file = f"{target.contract}.{target.program}.{key[:12]}.teal"
+        with open(os.path.join(output_dir, teal_file), "w") as f:
+            f.write(teal)
+        entries.append({
+            "target": target.describe(),
+            "contract": target.contract,
+            "program": target.program,
+            "teal_version": target.teal_version,
+            "options": target.options,
+            "optimized": target.optimized,
+            "key": key,
+            "teal": teal_file,
+            "cached": stats[key]["cached"],
+            "compile_seconds": round(stats[key]["seconds"], 4),
+        })
+    path = os.path.join(output_dir, BUILD_MANIFEST_NAME)
+    with open(path, "w") as f:
+        json.dump({"targets": entries}, f, indent=2)
+        f.write("\n")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile contract targets across a process pool")
+    parser.add_argument("targets", nargs="*",
+                        help="contract[:program][@teal_version][,option=value...] (default: all)")
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", default=os.path.join(HERE, "build"))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-optimize", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        targets = [
+            target for spec in args.targets or CONTRACTS
+            for target in CompileTarget.parse(spec, not args.no_optimize)
+        ]
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    teals, stats = compile_targets(targets, args.jobs, None if args.no_cache else CompileCache())
+    elapsed = time.perf_counter() - start
+    path = write_outputs(targets, teals, stats, args.output)
+
+    cached = sum(1 for entry in stats.values() if entry["cached"])
+    print(
+        f"✅ {len(targets)} targets ({len(stats)} unique, {cached} cached) in {elapsed:.2f}s "
+        f"-> {os.path.relpath(path, HERE)}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
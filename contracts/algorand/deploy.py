@@ -6,87 +6,78 @@ Handles contract deployment, configuration, and initial setup
 import os
 import json
 import base64
-from algosdk import account, mnemonic, transaction
-from algosdk.v2client import algod, indexer
-from algosdk.future.transaction import ApplicationCreateTxn, OnComplete, StateSchema
+import hashlib
+from algosdk import account, encoding, mnemonic, transaction
+from algosdk.v2client import indexer
+from algosdk.transaction import ApplicationCreateTxn, OnComplete
 from algosdk.logic import get_application_address
 import time
 
+from artifacts import ArtifactError, load_artifact
+from card_index import CARD_ID_SIZE, CardIndex, card_box_min_balance, card_number
+from fee_policy import FeePolicy
+from instrumentation import (
+    DEFAULT_ALGOD_ADDRESS, algod_client_from_env, get_metrics, instrument_client,
+)
+from submission import DuplicateOperation, SubmissionError, Submitter
+
 class VirtualCardManagerDeployer:
-    def __init__(self, algod_client, private_key, network="testnet"):
+    def __init__(self, algod_client, private_key, network="testnet", indexer_client=None):
         self.algod_client = algod_client
         self.private_key = private_key
         self.sender = account.address_from_private_key(private_key)
         self.network = network
         self.app_id = None
         self.app_address = None
+        self.contract_version = None
+        self.fee_policy = FeePolicy()
+        self.submitter = Submitter(algod_client, private_key, indexer_client, self.fee_policy)
         
-    def compile_contract(self, teal_source):
-        """Compile TEAL source code"""
-        try:
-            compile_response = self.algod_client.compile(teal_source)
-            return base64.b64decode(compile_response['result'])
-        except Exception as e:
-            print(f"❌ Compilation error: {e}")
-            raise
+    def submit(self, operation_key, operation, build_txn):
+        """Submit one logical operation idempotently, priced by the fee policy"""
+        return self.submitter.submit(operation_key, build_txn, operation)
     
     def deploy_contract(self):
         """Deploy the Virtual Card Manager contract"""
         print("🚀 Deploying Virtual Card Manager to Algorand...")
         
-        # Read TEAL files
+        # Load the prebuilt artifact instead of compiling on every deploy
         try:
-            with open("virtual_card_manager_approval.teal", "r") as f:
-                approval_teal = f.read()
-            with open("virtual_card_manager_clear_state.teal", "r") as f:
-                clear_state_teal = f.read()
-        except FileNotFoundError:
-            print("❌ TEAL files not found. Please run the contract compilation first.")
+            artifact = load_artifact("virtual_card_manager")
+        except ArtifactError as e:
+            print(f"❌ {e}")
             return None
         
-        # Compile contracts
-        print("📝 Compiling smart contracts...")
-        approval_program = self.compile_contract(approval_teal)
-        clear_state_program = self.compile_contract(clear_state_teal)
-        
-        # Define state schema
-        global_schema = StateSchema(
-            num_uints=10,  # ASA_ID, OWNER, CHAINLINK_FEED, TOTAL_CARDS, etc.
-            num_byte_slices=10  # BASE_CURRENCY, CONTRACT_VERSION, etc.
-        )
-        
-        local_schema = StateSchema(
-            num_uints=10,  # balance, daily_spent, monthly_spent, etc.
-            num_byte_slices=5   # region, currency, card_id, etc.
-        )
-        
-        # Get suggested parameters
-        params = self.algod_client.suggested_params()
-        
-        # Create application transaction
-        txn = ApplicationCreateTxn(
-            sender=self.sender,
-            sp=params,
-            on_complete=OnComplete.NoOpOC,
-            approval_program=approval_program,
-            clear_program=clear_state_program,
-            global_schema=global_schema,
-            local_schema=local_schema,
-            app_args=[]
-        )
+        print(f"📦 Using contract artifact {artifact.version}")
+        approval_program = artifact.approval_program
+        clear_state_program = artifact.clear_program
+        global_schema, local_schema = artifact.state_schemas()
+        self.contract_version = artifact.version
+        
+        # Create application transaction, keyed by program. With an indexer
+        # a rerun returns the existing deployment; without one the lease only
+        # refuses a second app until the first's validity window closes
+        def build_txn(params):
+            return ApplicationCreateTxn(
+                sender=self.sender,
+                sp=params,
+                on_complete=OnComplete.NoOpOC,
+                approval_program=approval_program,
+                clear_program=clear_state_program,
+                global_schema=global_schema,
+                local_schema=local_schema,
+                app_args=[],
+                extra_pages=artifact.extra_pages
+            )
         
-        # Sign and submit transaction
-        signed_txn = txn.sign(self.private_key)
-        tx_id = self.algod_client.send_transaction(signed_txn)
+        program_hash = hashlib.sha256(approval_program).hexdigest()[:16]
+        operation_key = f"app_create:{self.network}:{program_hash}"
         
-        print(f"📤 Transaction submitted: {tx_id}")
+        print("📤 Submitting application create transaction...")
         print("⏳ Waiting for confirmation...")
         
-        # Wait for confirmation
         try:
-            confirmed_txn = transaction.wait_for_confirmation(
-                self.algod_client, tx_id, 4
-            )
+            confirmed_txn = self.submit(operation_key, "app_create", build_txn)
             
             # Get application ID
             self.app_id = confirmed_txn["application-index"]
@@ -98,7 +89,7 @@ class VirtualCardManagerDeployer:
             
             return self.app_id
             
-        except Exception as e:
+        except SubmissionError as e:
             print(f"❌ Deployment failed: {e}")
             return None
     
@@ -110,24 +101,24 @@ class VirtualCardManagerDeployer:
         
         print(f"💰 Funding contract with {amount_algos} ALGO...")
         
-        params = self.algod_client.suggested_params()
         amount_microalgos = amount_algos * 1_000_000
         
-        txn = transaction.PaymentTxn(
-            sender=self.sender,
-            sp=params,
-            receiver=self.app_address,
-            amt=amount_microalgos
-        )
-        
-        signed_txn = txn.sign(self.private_key)
-        tx_id = self.algod_client.send_transaction(signed_txn)
+        def build_txn(params):
+            return transaction.PaymentTxn(
+                sender=self.sender,
+                sp=params,
+                receiver=self.app_address,
+                amt=amount_microalgos
+            )
         
         try:
-            transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
+            self.submit(f"fund_contract:{self.app_id}", "payment", build_txn)
             print(f"✅ Contract funded with {amount_algos} ALGO")
             return True
-        except Exception as e:
+        except DuplicateOperation:
+            print("✅ Contract funding already submitted")
+            return True
+        except SubmissionError as e:
             print(f"❌ Funding failed: {e}")
             return False
     
@@ -143,27 +134,60 @@ class VirtualCardManagerDeployer:
         # In production, this would be the actual Chainlink feed ID
         feed_id = chainlink_feed_id or 12345  # Placeholder
         
-        params = self.algod_client.suggested_params()
-        
-        txn = transaction.ApplicationCallTxn(
-            sender=self.sender,
-            sp=params,
-            index=self.app_id,
-            on_complete=OnComplete.NoOpOC,
-            app_args=["update_chainlink_feed", feed_id]
-        )
-        
-        signed_txn = txn.sign(self.private_key)
-        tx_id = self.algod_client.send_transaction(signed_txn)
+        def build_txn(params):
+            return transaction.ApplicationCallTxn(
+                sender=self.sender,
+                sp=params,
+                index=self.app_id,
+                on_complete=OnComplete.NoOpOC,
+                app_args=["update_chainlink_feed", feed_id]
+            )
         
         try:
-            transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
+            self.submit(
+                f"update_chainlink_feed:{self.app_id}:{feed_id}",
+                "update_chainlink_feed",
+                build_txn
+            )
             print(f"✅ Chainlink feed configured: {feed_id}")
             return True
-        except Exception as e:
+        except DuplicateOperation:
+            print(f"✅ Chainlink feed {feed_id} already being configured")
+            return True
+        except SubmissionError as e:
             print(f"❌ Chainlink setup failed: {e}")
             return False
     
+    def set_price_updater(self, updater_address):
+        """Allow an automation account to push update_prices batches"""
+        if not self.app_id:
+            print("❌ Contract not deployed yet")
+            return False
+        
+        def build_txn(params):
+            return transaction.ApplicationCallTxn(
+                sender=self.sender,
+                sp=params,
+                index=self.app_id,
+                on_complete=OnComplete.NoOpOC,
+                app_args=["set_price_updater", encoding.decode_address(updater_address)]
+            )
+        
+        try:
+            self.submit(
+                f"set_price_updater:{self.app_id}:{updater_address}",
+                "set_price_updater",
+                build_txn
+            )
+            print(f"✅ Price updater set: {updater_address}")
+            return True
+        except DuplicateOperation:
+            print(f"✅ Price updater {updater_address} already being set")
+            return True
+        except SubmissionError as e:
+            print(f"❌ Setting price updater failed: {e}")
+            return False
+    
     def create_test_card(self, kyc_tier=1, region="samoa", currency="ALGO"):
         """Create a test virtual card"""
         if not self.app_id:
@@ -173,49 +197,65 @@ class VirtualCardManagerDeployer:
         print(f"🎴 Creating test card (KYC: {kyc_tier}, Region: {region}, Currency: {currency})...")
         
         # First, opt into the application
-        params = self.algod_client.suggested_params()
-        
-        opt_in_txn = transaction.ApplicationOptInTxn(
-            sender=self.sender,
-            sp=params,
-            index=self.app_id
-        )
-        
-        signed_opt_in = opt_in_txn.sign(self.private_key)
-        opt_in_id = self.algod_client.send_transaction(signed_opt_in)
+        def build_opt_in(params):
+            return transaction.ApplicationOptInTxn(
+                sender=self.sender,
+                sp=params,
+                index=self.app_id
+            )
         
         try:
-            transaction.wait_for_confirmation(self.algod_client, opt_in_id, 4)
+            self.submit(f"opt_in:{self.app_id}:{self.sender}", "opt_in", build_opt_in)
             print("✅ Opted into application")
-        except Exception as e:
+        except DuplicateOperation:
+            print("✅ Opt-in already submitted")
+        except SubmissionError as e:
             print(f"❌ Opt-in failed: {e}")
             return False
         
-        # Create the card
-        create_txn = transaction.ApplicationCallTxn(
-            sender=self.sender,
-            sp=params,
-            index=self.app_id,
-            on_complete=OnComplete.NoOpOC,
-            app_args=["create_card", kyc_tier, region, currency]
-        )
-        
-        signed_create = create_txn.sign(self.private_key)
-        create_id = self.algod_client.send_transaction(signed_create)
+        # Create the card; the call must reference the index box of the ID
+        # it will be assigned, so that is re-read on every rebuild. A new
+        # card's boxes are paid for by a payment right before the call.
+        card_index = CardIndex(self.algod_client, self.app_id)
+        needs_boxes = card_index.card_of(self.sender) is None
+        
+        def build_create(params):
+            create = transaction.ApplicationCallTxn(
+                sender=self.sender,
+                sp=params,
+                index=self.app_id,
+                on_complete=OnComplete.NoOpOC,
+                app_args=["create_card", kyc_tier, region, currency],
+                boxes=[card_index.box_reference(card_index.next_card_id())]
+            )
+            if not needs_boxes:
+                return create
+            payment = transaction.PaymentTxn(
+                self.sender, params, self.app_address, card_box_min_balance()
+            )
+            return [payment, create]
         
         try:
-            confirmed = transaction.wait_for_confirmation(self.algod_client, create_id, 4)
+            confirmed = self.submitter.submit(
+                f"create_card:{self.app_id}:{self.sender}", build_create,
+                ["payment", "create_card"] if needs_boxes else "create_card"
+            )
+            if isinstance(confirmed, list):
+                confirmed = confirmed[-1]
             print("✅ Test card created successfully!")
             
             # Parse logs for card ID
-            if 'logs' in confirmed:
-                for log in confirmed['logs']:
-                    decoded_log = base64.b64decode(log).decode('utf-8')
-                    if 'CardCreated:' in decoded_log:
-                        print(f"📋 Card details: {decoded_log}")
+            for log in confirmed.get('logs', []):
+                raw = base64.b64decode(log)
+                if raw.startswith(b'CardCreated:'):
+                    card_id = card_number(raw[len(b'CardCreated:'):][:CARD_ID_SIZE])
+                    print(f"📋 Card ID: {card_id}")
             
             return True
-        except Exception as e:
+        except DuplicateOperation:
+            print("✅ Card creation already submitted")
+            return True
+        except SubmissionError as e:
             print(f"❌ Card creation failed: {e}")
             return False
     
@@ -231,7 +271,7 @@ class VirtualCardManagerDeployer:
             "app_address": self.app_address,
             "deployer_address": self.sender,
             "deployment_time": int(time.time()),
-            "contract_version": "1.0.0"
+            "contract_version": self.contract_version
         }
         
         filename = f"deployment_{self.network}_{self.app_id}.json"
@@ -248,17 +288,16 @@ def main():
     # Configuration
     NETWORK = "testnet"  # Change to "mainnet" for production
     
-    # Algorand node configuration
+    # Algorand node configuration; ALGOD_ADDRESS overrides it, e.g. to
+    # deploy against mock_algod.py offline
     if NETWORK == "testnet":
-        ALGOD_ADDRESS = "https://testnet-api.algonode.cloud"
-        ALGOD_TOKEN = ""
+        default_address = DEFAULT_ALGOD_ADDRESS
     else:
         # Configure for mainnet
-        ALGOD_ADDRESS = "https://mainnet-api.algonode.cloud"
-        ALGOD_TOKEN = ""
+        default_address = "https://mainnet-api.algonode.cloud"
     
     # Initialize Algod client
-    algod_client = algod.AlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS)
+    algod_client = instrument_client(algod_client_from_env(default_address))
     
     # Get deployer account
     # In production, use environment variables or secure key management
@@ -287,8 +326,18 @@ def main():
         print(f"❌ Invalid mnemonic: {e}")
         return
     
+    # Reruns find operations that already confirmed through the indexer
+    indexer_client = None
+    if os.getenv("INDEXER_ADDRESS"):
+        indexer_client = indexer.IndexerClient(
+            os.getenv("INDEXER_TOKEN", ""), os.getenv("INDEXER_ADDRESS")
+        )
+    else:
+        print("⚠️ INDEXER_ADDRESS is not set: a rerun cannot find earlier operations, "
+              "and after their validity window it repeats them")
+    
     # Initialize deployer
-    deployer = VirtualCardManagerDeployer(algod_client, private_key, NETWORK)
+    deployer = VirtualCardManagerDeployer(algod_client, private_key, NETWORK, indexer_client)
     
     # Deploy contract
     app_id = deployer.deploy_contract()
@@ -303,6 +352,11 @@ def main():
     if not deployer.setup_chainlink_integration():
         return
     
+    # Let the automation account push prices
+    updater_address = os.getenv("CHAINLINK_AUTOMATION_ADDRESS")
+    if updater_address and not deployer.set_price_updater(updater_address):
+        return
+    
     # Create test card
     if not deployer.create_test_card():
         return
@@ -324,4 +378,7 @@ def main():
         print(f"   https://algoexplorer.io/application/{app_id}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        get_metrics().export()
\ No newline at end of file
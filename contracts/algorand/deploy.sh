@@ -63,9 +63,7 @@ fi
 
 # Compile smart contract
 echo -e "${YELLOW}📝 Compiling smart contract...${NC}"
-python3 virtual_card_manager.py
-
-if [ ! -f "virtual_card_manager_approval.teal" ] || [ ! -f "virtual_card_manager_clear_state.teal" ]; then
+if ! python3 cli.py build virtual_card_manager; then
     echo -e "${RED}❌ Contract compilation failed${NC}"
     exit 1
 fi
@@ -74,7 +72,7 @@ echo -e "${GREEN}✅ Smart contract compiled successfully${NC}"
 
 # Deploy contract
 echo -e "${YELLOW}🚀 Deploying to $NETWORK...${NC}"
-python3 deploy.py
+python3 cli.py deploy
 
 # Check if deployment was successful
 if [ $? -eq 0 ]; then
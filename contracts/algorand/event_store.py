@@ -0,0 +1,570 @@
+"""
+Append-only event store for decoded card events
+Events are kept in round order as fixed-width binary records in segment
+files of SEGMENT_RECORDS records each, read through mmap. A full segment
+is sealed with one sidecar index file holding three sorted arrays: card
+ID -> record, address prefix -> record and round -> first record. The
+open segment's indexes live in memory and are rebuilt from it on open.
+
+Lookups by card, address or round range bisect the sealed indexes, so
+"all spends for card X between two rounds" touches only that card's
+records. Readers in other processes see appends with refresh(), and
+follow() tails the store as the ingest sink writes to it.
+
+The store is also an ingest sink (`store:<directory>`): appends must come
+in key order, records at or before the last stored key are skipped, and
+the cursor is replaced atomically after the records are synced.
+
+Usage:
+    python event_store.py <directory> [--card ID | --address ADDR] [--from-round N] [--to-round N]
+    python event_store.py <directory> --follow
+    python event_store.py --check
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+
+from card_events import EVENT_KINDS, CardEvent, address_of, raw_address
+
+SEGMENT_RECORDS = 1 << 20
+CURRENCY_SIZE = 8
+REGION_SIZE = 16
+# round, intra, log_index, kind, presence flags, card_id, address, amount,
+# balance, kyc_tier, currency, region; padded to 104 bytes
+RECORD = struct.Struct(f"<QIHBBQ32sQQB{CURRENCY_SIZE}s{REGION_SIZE}s7x")
+INDEX_ENTRY = struct.Struct("<QI")
+INDEX_HEADER = struct.Struct("<4sIII")
+INDEX_MAGIC = b"CEIX"
+SEGMENT_SUFFIX = ".evt"
+INDEX_SUFFIX = ".idx"
+CURSOR_NAME = "cursor.json"
+
+# Optional fields, in flag bit order
+_OPTIONAL = ("amount", "balance", "kyc_tier", "currency", "region")
+_KIND_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+
+def address_prefix(raw):
+    """Index key of a raw 32-byte address; matches are confirmed against the record"""
+    return int.from_bytes(raw[:8], "little")
+
+
+def pack_event(event):
+    """Fixed-width record of a CardEvent; currency and region are cut to their field sizes"""
+    flags = 0
+    for bit, field in enumerate(_OPTIONAL):
+        if getattr(event, field) is not None:
+            flags |= 1 << bit
+    return RECORD.pack(
+        event.round, event.intra, event.log_index, _KIND_CODES[event.kind], flags,
+        event.card_id, raw_address(event.address), event.amount or 0,
+        event.balance or 0, event.kyc_tier or 0,
+        (event.currency or "").encode()[:CURRENCY_SIZE],
+        (event.region or "").encode()[:REGION_SIZE],
+    )
+
+
+def unpack_event(buffer, offset=0):
+    (round, intra, log_index, kind, flags, card_id, address, amount, balance, kyc_tier,
+     currency, region) = RECORD.unpack_from(buffer, offset)
+    values = {
+        "amount": amount, "balance": balance, "kyc_tier": kyc_tier,
+        "currency": currency.rstrip(b"\0").decode(errors="replace"),
+        "region": region.rstrip(b"\0").decode(errors="replace"),
+    }
+    optional = {
+        field: values[field] if flags & (1 << bit) else None for bit, field in enumerate(_OPTIONAL)
+    }
+    return CardEvent(round, intra, log_index, EVENT_KINDS[kind], card_id,
+                     address_of(address), **optional)
+
+
+class _SortedEntries:
+    """Sequence view of a packed, sorted (key, record) array for bisect"""
+
+    def __init__(self, buffer, offset, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return INDEX_ENTRY.unpack_from(self.buffer, self.offset + i * INDEX_ENTRY.size)
+
+    def records(self, key):
+        """Records with this key, in record order"""
+        i = bisect_left(self, (key, 0))
+        while i < self.count:
+            entry_key, record = self[i]
+            if entry_key != key:
+                return
+            yield record
+            i += 1
+
+    def ceiling(self, key):
+        """Record of the first entry with a key >= key, or None"""
+        i = bisect_left(self, (key, 0))
+        return self[i][1] if i < self.count else None
+
+
+class _MemoryIndex:
+    """Indexes of the open segment, grown as records are read or appended"""
+
+    def __init__(self):
+        self.cards = {}
+        self.addresses = {}
+        self.rounds = []  # (round, first record)
+
+    def add(self, record, round, card_id, raw_address):
+        self.cards.setdefault(card_id, []).append(record)
+        self.addresses.setdefault(address_prefix(raw_address), []).append(record)
+        if not self.rounds or self.rounds[-1][0] != round:
+            self.rounds.append((round, record))
+
+    def card_records(self, card_id):
+        return self.cards.get(card_id, ())
+
+    def address_records(self, prefix):
+        return self.addresses.get(prefix, ())
+
+    def round_ceiling(self, round):
+        i = bisect_left(self.rounds, (round, 0))
+        return self.rounds[i][1] if i < len(self.rounds) else None
+
+    def pack(self):
+        sections = [
+            sorted((key, record) for key, records in self.cards.items() for record in records),
+            sorted((key, record) for key, records in self.addresses.items() for record in records),
+            self.rounds,
+        ]
+        header = INDEX_HEADER.pack(INDEX_MAGIC, *(len(section) for section in sections))
+        return header + b"".join(
+            INDEX_ENTRY.pack(*entry) for section in sections for entry in section
+        )
+
+
+class _SealedIndex:
+    def __init__(self, buffer):
+        magic, cards, addresses, rounds = INDEX_HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not an event store index")
+        offset = INDEX_HEADER.size
+        self.cards = _SortedEntries(buffer, offset, cards)
+        offset += cards * INDEX_ENTRY.size
+        self.addresses = _SortedEntries(buffer, offset, addresses)
+        offset += addresses * INDEX_ENTRY.size
+        self.rounds = _SortedEntries(buffer, offset, rounds)
+
+    def card_records(self, card_id):
+        return self.cards.records(card_id)
+
+    def address_records(self, prefix):
+        return self.addresses.records(prefix)
+
+    def round_ceiling(self, round):
+        return self.rounds.ceiling(round)
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _Segment:
+    def __init__(self, directory, number):
+        self.number = number
+        self.path = os.path.join(directory, f"{number:08d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{number:08d}{INDEX_SUFFIX}")
+        self.buffer = b""
+        self.count = 0
+        self.index = None
+        self.sealed = False
+
+    def refresh(self):
+        """Map records appended since the last refresh; True when any were"""
+        if self.sealed:
+            return False
+        if os.path.exists(self.index_path):
+            self.buffer = _map(self.path)
+            self.count = len(self.buffer) // RECORD.size
+            self.index = _SealedIndex(_map(self.index_path))
+            self.sealed = True
+            return True
+        count = os.path.getsize(self.path) // RECORD.size
+        if count == self.count:
+            return False
+        self.buffer = _map(self.path)
+        if self.index is None:
+            self.index = _MemoryIndex()
+        for record in range(self.count, count):
+            self._index(record)
+        self.count = count
+        return True
+
+    def _index(self, record):
+        round, _, _, _, _, card_id, address = struct.unpack_from(
+            "<QIHBBQ32s", self.buffer, record * RECORD.size
+        )
+        self.index.add(record, round, card_id, address)
+
+    def round_of(self, record):
+        return struct.unpack_from("<Q", self.buffer, record * RECORD.size)[0]
+
+    def key_of(self, record):
+        return struct.unpack_from("<QIH", self.buffer, record * RECORD.size)
+
+    def event(self, record):
+        return unpack_event(self.buffer, record * RECORD.size)
+
+    def start_record(self, round):
+        """First record at or after `round`"""
+        record = self.index.round_ceiling(round)
+        return self.count if record is None else record
+
+
+class EventStore:
+    """Segments of card event records in a directory; writable stores own the tail segment"""
+
+    def __init__(self, directory, writable=False, segment_records=SEGMENT_RECORDS):
+        self.directory = directory
+        self.writable = writable
+        self.segment_records = segment_records
+        self.segments = []
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+            self._repair()
+        self.refresh()
+
+    def _segment_numbers(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in names
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def _repair(self):
+        """Drop a partial record a crash left at the end of the tail segment"""
+        numbers = self._segment_numbers()
+        if not numbers:
+            return
+        path = os.path.join(self.directory, f"{numbers[-1]:08d}{SEGMENT_SUFFIX}")
+        size = os.path.getsize(path)
+        if size % RECORD.size:
+            with open(path, "r+b") as f:
+                f.truncate(size - size % RECORD.size)
+
+    def refresh(self):
+        """Pick up segments and records written since the last call (by any process)"""
+        known = {segment.number for segment in self.segments}
+        for number in self._segment_numbers():
+            if number not in known:
+                self.segments.append(_Segment(self.directory, number))
+        for segment in self.segments:
+            segment.refresh()
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def last_key(self):
+        for segment in reversed(self.segments):
+            if segment.count:
+                return segment.key_of(segment.count - 1)
+        return None
+
+    # Writing
+
+    def append(self, events):
+        """Append events in key order, skipping any at or before the last stored key;
+        returns the number appended"""
+        if not self.writable:
+            raise PermissionError("EventStore opened read-only")
+        last = self.last_key()
+        records = []
+        for event in events:
+            if last is not None and event.key <= last:
+                continue
+            records.append(pack_event(event))
+            last = event.key
+        written = 0
+        while written < len(records):
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.count >= self.segment_records:
+                segment = self._roll(segment)
+            chunk = records[written:written + self.segment_records - segment.count]
+            with open(segment.path, "ab") as f:
+                f.write(b"".join(chunk))
+                f.flush()
+                os.fsync(f.fileno())
+            segment.refresh()
+            written += len(chunk)
+        return written
+
+    def _roll(self, segment):
+        """Seal the tail segment and start the next one"""
+        if segment is not None:
+            self._seal(segment)
+        number = segment.number + 1 if segment is not None else 0
+        path = os.path.join(self.directory, f"{number:08d}{SEGMENT_SUFFIX}")
+        open(path, "ab").close()
+        new = _Segment(self.directory, number)
+        self.segments.append(new)
+        return new
+
+    def _seal(self, segment):
+        segment.refresh()
+        temporary = f"{segment.index_path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(segment.index.pack())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, segment.index_path)
+        segment.refresh()
+
+    # Ingest sink interface
+
+    def cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_NAME)) as f:
+                return json.load(f)["round"]
+        except FileNotFoundError:
+            return None
+
+    def write(self, events, cursor_round):
+        self.append(events)
+        path = os.path.join(self.directory, CURSOR_NAME)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"round": cursor_round}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def events(self):
+        return list(self.scan())
+
+    def close(self):
+        self.segments = []
+
+    # Reading
+
+    def _segments_in(self, start_round, end_round):
+        for segment in self.segments:
+            if not segment.count:
+                continue
+            if end_round is not None and segment.round_of(0) > end_round:
+                return
+            if start_round is not None and segment.round_of(segment.count - 1) < start_round:
+                continue
+            yield segment
+
+    def scan(self, start_round=None, end_round=None, kinds=None):
+        """Events with start_round <= round <= end_round, in key order"""
+        for segment in self._segments_in(start_round, end_round):
+            record = segment.start_record(start_round) if start_round else 0
+            for record in range(record, segment.count):
+                if end_round is not None and segment.round_of(record) > end_round:
+                    return
+                event = segment.event(record)
+                if kinds is None or event.kind in kinds:
+                    yield event
+
+    def record_slices(self, position=None):
+        """(next position, packed RECORD bytes) for each segment's records after `position`
+
+        Positions are (segment number, record) pairs, so a columnar reader
+        can resume where it stopped; slices are memoryviews of the maps.
+        """
+        for segment in self.segments:
+            first = 0
+            if position is not None:
+                if segment.number < position[0]:
+                    continue
+                if segment.number == position[0]:
+                    first = position[1]
+            if segment.count > first:
+                view = memoryview(segment.buffer)[first * RECORD.size:segment.count * RECORD.size]
+                yield (segment.number, segment.count), view
+
+    def _lookup(self, records_of, start_round, end_round, kinds, accept=None):
+        for segment in self._segments_in(start_round, end_round):
+            for record in records_of(segment.index):
+                round = segment.round_of(record)
+                if start_round is not None and round < start_round:
+                    continue
+                if end_round is not None and round > end_round:
+                    break
+                event = segment.event(record)
+                if (kinds is None or event.kind in kinds) and (accept is None or accept(event)):
+                    yield event
+
+    def by_card(self, card_id, start_round=None, end_round=None, kinds=None):
+        """A card's events in key order, through the card index"""
+        return self._lookup(
+            lambda index: index.card_records(card_id), start_round, end_round, kinds
+        )
+
+    def by_address(self, address, start_round=None, end_round=None, kinds=None):
+        """An address's events in key order, through the address index"""
+        prefix = address_prefix(raw_address(address))
+        return self._lookup(
+            lambda index: index.address_records(prefix), start_round, end_round, kinds,
+            lambda event: event.address == address,
+        )
+
+    def follow(self, after=None, poll_seconds=1.0, idle_timeout=None):
+        """Yield events after key `after` (default: the current end) as they are appended
+
+        Stops once nothing new arrived for idle_timeout seconds, if given.
+        """
+        last = self.last_key() if after is None else after
+        idle_since = time.monotonic()
+        while True:
+            self.refresh()
+            start_round = last[0] if last is not None else None
+            new = False
+            for event in self.scan(start_round):
+                if last is None or event.key > last:
+                    last = event.key
+                    new = True
+                    yield event
+            if new:
+                idle_since = time.monotonic()
+            elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                return
+            time.sleep(poll_seconds)
+
+
+def check():
+    """Append sample events across small segments and compare every query with a list scan"""
+    import random
+
+    from ingest import sample_blocks
+    from card_events import events_from_block
+
+    rng = random.Random(0)
+    blocks = sample_blocks(1, holders=12)
+    base = [event for round in sorted(blocks) for event in events_from_block(blocks[round], 1)]
+    # Spread copies of the sample over more rounds so segments hold many rounds and cards
+    events = []
+    for copy in range(40):
+        for event in base:
+            row = event.as_row()
+            row["round"] += copy * 1000 + rng.randrange(0, 3)
+            row["card_id"] += copy * 100
+            events.append(CardEvent.from_row(row))
+    events.sort(key=lambda event: event.key)
+    # Keys must be unique; the random round shifts may collide
+    events = [event for i, event in enumerate(events) if i == 0 or event.key != events[i - 1].key]
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        store = EventStore(directory, writable=True, segment_records=37)
+        half = len(events) // 2
+        store.write(events[:half], events[half - 1].round)
+        # Replayed batches are skipped
+        store.write(events[:half + 5], events[half + 4].round)
+        store.write(events[half:], events[-1].round)
+        reader = EventStore(directory)
+        if [e.as_row() for e in reader.scan()] != [e.as_row() for e in events]:
+            problems.append(f"scan returned {len(reader)} events, expected {len(events)}")
+        sealed = sum(1 for segment in reader.segments if segment.sealed)
+        if sealed != len(events) // 37:
+            problems.append(f"{sealed} sealed segments, expected {len(events) // 37}")
+
+        for _ in range(200):
+            start = rng.randrange(0, events[-1].round)
+            end = start + rng.randrange(0, 5000)
+            card = rng.choice(events).card_id
+            address = rng.choice(events).address
+            kinds = rng.choice((None, {"CardUsed"}, {"CardCreated", "CardClosed"}))
+            queries = {
+                "scan": (reader.scan(start, end, kinds),
+                         lambda e: start <= e.round <= end),
+                "card": (reader.by_card(card, start, end, kinds),
+                         lambda e: e.card_id == card and start <= e.round <= end),
+                "address": (reader.by_address(address, start, end, kinds),
+                            lambda e: e.address == address and start <= e.round <= end),
+            }
+            for name, (result, predicate) in queries.items():
+                expected = [e.as_row() for e in events
+                            if predicate(e) and (kinds is None or e.kind in kinds)]
+                if [e.as_row() for e in result] != expected:
+                    problems.append(f"{name} query {start}-{end} disagrees with a full scan")
+
+        # A reopened writer drops a torn record, and a reader tails new appends
+        tail = events[-1]
+        extra = [CardEvent.from_row({**tail.as_row(), "round": tail.round + n}) for n in (1, 2)]
+        with open(reader.segments[-1].path, "ab") as f:
+            f.write(pack_event(extra[0])[:50])
+        store = EventStore(directory, writable=True, segment_records=37)
+        store.write(extra, extra[-1].round)
+        followed = list(reader.follow(after=tail.key, poll_seconds=0, idle_timeout=0))
+        if [e.as_row() for e in followed] != [e.as_row() for e in extra]:
+            problems.append(f"follow returned {followed}, expected {extra}")
+    for problem in problems[:10]:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the local card event store")
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--card", type=int)
+    parser.add_argument("--address")
+    parser.add_argument("--from-round", type=int)
+    parser.add_argument("--to-round", type=int)
+    parser.add_argument("--kind", action="append", choices=EVENT_KINDS)
+    parser.add_argument("--follow", action="store_true", help="Print new events as they arrive")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare indexed queries with full scans on sample events")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        if problems:
+            print(f"❌ {problems} event store checks failed")
+            return 1
+        print("✅ Indexed queries, replays, torn writes and tailing behave")
+        return 0
+    if args.directory is None:
+        parser.error("directory is required")
+
+    store = EventStore(args.directory)
+    kinds = set(args.kind) if args.kind else None
+    if args.follow:
+        try:
+            for event in store.follow():
+                print(json.dumps(event.as_row()))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    start = time.perf_counter()
+    if args.card is not None:
+        events = store.by_card(args.card, args.from_round, args.to_round, kinds)
+    elif args.address:
+        events = store.by_address(args.address, args.from_round, args.to_round, kinds)
+    else:
+        events = store.scan(args.from_round, args.to_round, kinds)
+    count = 0
+    for event in events:
+        print(json.dumps(event.as_row()))
+        count += 1
+    print(f"📋 {count} of {len(store)} events in {(time.perf_counter() - start) * 1000:.1f} ms",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
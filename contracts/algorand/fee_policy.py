@@ -0,0 +1,160 @@
+"""
+Congestion-aware fee policy for Virtual Card Manager transactions
+Tracks recent block fullness and observed fees, prices each operation
+by priority and pools fees across atomic groups
+
+Priorities:
+- HIGH: card spends and funding, never left behind congestion
+- NORMAL: card lifecycle and admin calls
+- LOW: limit resets and feed maintenance, always pay the minimum
+"""
+
+from collections import deque
+
+# Priority levels
+LOW = "low"
+NORMAL = "normal"
+HIGH = "high"
+
+# How strongly each priority bids up the fee as congestion rises.
+# A multiplier of 0 means the operation always pays the required minimum.
+PRIORITY_MULTIPLIERS = {
+    LOW: 0,
+    NORMAL: 1,
+    HIGH: 4,
+}
+
+# Priority per logical operation (application method or transaction kind)
+OPERATION_PRIORITIES = {
+    "use_card": HIGH,
+    "fund_card": HIGH,
+    "emergency_pause": HIGH,
+    "create_card": NORMAL,
+    "activate_card": NORMAL,
+    "deactivate_card": NORMAL,
+    "update_limits": NORMAL,
+    "app_create": NORMAL,
+    "opt_in": NORMAL,
+    "payment": NORMAL,
+    "reset_limits": LOW,
+    "update_chainlink_feed": LOW,
+    "set_price_updater": NORMAL,
+    # Late prices make use_card reject non-base-currency spends
+    "update_prices": NORMAL,
+    "register": NORMAL,
+    "import_tenant": LOW,
+    "sweep_card": LOW,
+}
+
+DEFAULT_MIN_FEE = 1000  # microAlgos
+MAX_TXN_BYTES_PER_BLOCK = 5_242_880  # consensus block payset limit
+WIDEST_FEE = 2 ** 32 - 1  # largest fee with the same msgpack width as any fee we set
+
+
+def signed_size(txn):
+    """Encoded size of `txn` once signed, with its fee field at its widest"""
+    fee = txn.fee
+    txn.fee = WIDEST_FEE
+    try:
+        return txn.estimate_size()
+    finally:
+        txn.fee = fee
+
+
+class FeePolicy:
+    def __init__(self, window=20, max_fee=100_000, priorities=None):
+        self.window = window
+        self.max_fee = max_fee
+        self.priorities = dict(OPERATION_PRIORITIES)
+        if priorities:
+            self.priorities.update(priorities)
+
+        self.min_fee = DEFAULT_MIN_FEE
+        self.fee_per_byte = 0
+        self._fullness = deque(maxlen=window)
+        self._per_byte = deque(maxlen=window)
+
+    def observe_params(self, params):
+        """Record the fee fields of a SuggestedParams returned by algod"""
+        if params.min_fee:
+            self.min_fee = params.min_fee
+        # When flat_fee is False algod's `fee` is a per-byte fee, which only
+        # rises above zero while the transaction pool is congested
+        per_byte = 0 if params.flat_fee else params.fee
+        self.fee_per_byte = per_byte
+        self._per_byte.append(per_byte)
+
+    def observe_block(self, block_size, capacity=MAX_TXN_BYTES_PER_BLOCK):
+        """Record how full a block was, given its encoded size in bytes"""
+        self._fullness.append(min(1.0, block_size / capacity))
+
+    def refresh(self, algod_client):
+        """Sample current params and the latest block from algod"""
+        params = algod_client.suggested_params()
+        self.observe_params(params)
+        try:
+            # algod suggests the last round as the first valid round
+            raw_block = algod_client.block_info(params.first, response_format="msgpack")
+            self.observe_block(len(raw_block))
+        except Exception as e:
+            print(f"⚠️ Could not sample block fullness: {e}")
+        return params
+
+    @property
+    def congestion(self):
+        """Congestion estimate in [0, 1] over the recent window"""
+        fullness = sum(self._fullness) / len(self._fullness) if self._fullness else 0.0
+        congested = sum(1 for fee in self._per_byte if fee > 0)
+        pool_pressure = congested / len(self._per_byte) if self._per_byte else 0.0
+        return max(fullness, pool_pressure)
+
+    def priority_for(self, operation):
+        return self.priorities.get(operation, NORMAL)
+
+    def required_fee(self, txn=None):
+        """
+        Minimum fee the network will accept for a single transaction.
+
+        Price `txn` with every field it will be signed with (lease, note,
+        group); while congested the fee is charged per signed byte.
+        """
+        if txn is None or not self.fee_per_byte:
+            return self.min_fee
+        return max(self.min_fee, self.fee_per_byte * signed_size(txn))
+
+    def fee_for(self, operation, txn=None):
+        """Fee in microAlgos for one transaction performing `operation`"""
+        required = self.required_fee(txn)
+        multiplier = PRIORITY_MULTIPLIERS[self.priority_for(operation)]
+        fee = int(required * (1 + multiplier * self.congestion))
+        return max(required, min(fee, self.max_fee))
+
+    def apply(self, txn, operation, inner_txns=0):
+        """Set a flat fee on `txn`, covering any inner transactions it issues"""
+        txn.fee = self.fee_for(operation, txn) + inner_txns * self.min_fee
+        return txn
+
+    def apply_group(self, txns, operations, payer=0, inner_txns=None):
+        """
+        Pool fees for an atomic group onto a single payer transaction.
+
+        The group only lands as a whole, so every member is priced at the
+        highest priority in the group and the payer covers the total while
+        the remaining members pay nothing.
+        """
+        if len(txns) != len(operations):
+            raise ValueError("Each transaction in the group needs an operation")
+        inner_txns = inner_txns or [0] * len(txns)
+
+        group_operation = max(
+            operations,
+            key=lambda op: PRIORITY_MULTIPLIERS[self.priority_for(op)],
+        )
+        total = sum(
+            self.fee_for(group_operation, txn) + inner * self.min_fee
+            for txn, inner in zip(txns, inner_txns)
+        )
+
+        for index, txn in enumerate(txns):
+            txn.fee = total if index == payer else 0
+        return txns
@@ -0,0 +1,520 @@
+"""
+Block-follower ingest for Virtual Card Manager events
+Follows algod block by block, keeps the app calls of one app and decodes
+their card event logs (card_events.py) into a sink. Blocks are fetched
+ahead of the cursor by a small thread pool and consumed in round order;
+events are written in batches, each batch together with the cursor, so a
+restart resumes exactly after the last committed round. Once caught up,
+the follower long-polls algod for the next round instead of sleeping.
+Blocks are requested as msgpack and decoded lazily unless --format json.
+
+Sinks:
+    sqlite:<path>       card_events, card_holders and ingest_cursors tables
+    jsonl:<path>        one event per line, cursor in <path>.cursor
+    store:<directory>   memory-mapped event store (event_store.py)
+    postgres:<dsn>      same tables as SQLite (supabase/migrations), via psycopg
+
+Usage:
+    python ingest.py <app_id> --sink sqlite:events.db [--from-round N] [--once]
+    python ingest.py --check
+"""
+
+import argparse
+import base64
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+
+from card_events import BLOCK_DECODERS, ROW_FIELDS, CardEvent, events_from_block
+from instrumentation import algod_client_from_env, instrument_client, timed
+
+DEFAULT_CURSOR = "virtual_card_manager"
+# Rounds the follower starts behind the tip when neither the sink nor the
+# command line has a starting round; matches algorandEventListener.js
+DEFAULT_LOOKBACK = 100
+
+_PLACEHOLDERS = ", ".join("?" for _ in ROW_FIELDS)
+_UPDATES = ", ".join(f"{field} = excluded.{field}" for field in ROW_FIELDS[3:])
+UPSERT_EVENT = (
+    f"INSERT INTO card_events ({', '.join(ROW_FIELDS)}) VALUES ({_PLACEHOLDERS}) "
+    f"ON CONFLICT (round, intra, log_index) DO UPDATE SET {_UPDATES}"
+)
+# Card IDs are never reused, so creation and closing are independent upserts
+# and a backfill may apply them after the live follower without undoing it
+UPSERT_HOLDER = (
+    "INSERT INTO card_holders (card_id, address, created_round) VALUES (?, ?, ?) "
+    "ON CONFLICT (card_id) DO UPDATE SET address = excluded.address, "
+    "created_round = excluded.created_round"
+)
+CLOSE_HOLDER = (
+    "INSERT INTO card_holders (card_id, address, closed_round) VALUES (?, ?, ?) "
+    "ON CONFLICT (card_id) DO UPDATE SET closed_round = excluded.closed_round"
+)
+UPSERT_CURSOR = (
+    "INSERT INTO ingest_cursors (name, round) VALUES (?, ?) "
+    "ON CONFLICT (name) DO UPDATE SET round = excluded.round"
+)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS card_events (
+    round INTEGER NOT NULL,
+    intra INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    card_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    amount INTEGER,
+    currency TEXT,
+    balance INTEGER,
+    kyc_tier INTEGER,
+    region TEXT,
+    PRIMARY KEY (round, intra, log_index)
+);
+CREATE INDEX IF NOT EXISTS card_events_card_id ON card_events (card_id, round);
+CREATE INDEX IF NOT EXISTS card_events_address ON card_events (address, round);
+CREATE TABLE IF NOT EXISTS card_holders (
+    card_id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL,
+    created_round INTEGER,
+    closed_round INTEGER
+);
+CREATE INDEX IF NOT EXISTS card_holders_address ON card_holders (address);
+CREATE TABLE IF NOT EXISTS ingest_cursors (
+    name TEXT PRIMARY KEY,
+    round INTEGER NOT NULL
+);
+"""
+
+
+def holder_updates(events):
+    """(statement, params) for the card holder index, in event order"""
+    for event in events:
+        if event.kind == "CardCreated":
+            yield UPSERT_HOLDER, (event.card_id, event.address, event.round)
+        elif event.kind == "CardClosed":
+            yield CLOSE_HOLDER, (event.card_id, event.address, event.round)
+
+
+def _row(event):
+    return tuple(getattr(event, field) for field in ROW_FIELDS)
+
+
+class SQLiteSink:
+    """Events, card holders and the cursor in one SQLite database"""
+
+    def __init__(self, path, name=DEFAULT_CURSOR):
+        self.path = path
+        self.name = name
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+
+    def cursor(self):
+        row = self.conn.execute(
+            "SELECT round FROM ingest_cursors WHERE name = ?", (self.name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def write(self, events, cursor_round):
+        """Upsert a batch and move the cursor in one transaction"""
+        with self.conn:
+            self.conn.executemany(UPSERT_EVENT, [_row(event) for event in events])
+            for statement, params in holder_updates(events):
+                self.conn.execute(statement, params)
+            self.conn.execute(UPSERT_CURSOR, (self.name, cursor_round))
+
+    def events(self, card_id=None):
+        query = f"SELECT {', '.join(ROW_FIELDS)} FROM card_events"
+        params = ()
+        if card_id is not None:
+            query += " WHERE card_id = ?"
+            params = (card_id,)
+        rows = self.conn.execute(query + " ORDER BY round, intra, log_index", params)
+        return [CardEvent(*row) for row in rows]
+
+    def holders(self):
+        """{card_id: (address, created_round, closed_round)}"""
+        rows = self.conn.execute(
+            "SELECT card_id, address, created_round, closed_round FROM card_holders"
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class JSONLSink:
+    """Append-only event lines with a sidecar cursor file
+
+    The cursor records the file size at each commit, and opening the sink
+    truncates anything written after it, so a crash between appending a
+    batch and moving the cursor never leaves duplicate lines behind.
+    """
+
+    def __init__(self, path, name=DEFAULT_CURSOR):
+        self.path = path
+        self.name = name
+        self.cursor_path = f"{path}.cursor"
+        state = self._state()
+        offset = state.get("offset", 0)
+        self.file = open(path, "ab")
+        if self.file.tell() > offset:
+            self.file.truncate(offset)
+            self.file.seek(offset)
+
+    def _state(self):
+        try:
+            with open(self.cursor_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def cursor(self):
+        return self._state().get("round")
+
+    def write(self, events, cursor_round):
+        for event in events:
+            self.file.write(json.dumps(event.as_row(), separators=(",", ":")).encode() + b"\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        state = {"name": self.name, "round": cursor_round, "offset": self.file.tell()}
+        temporary = f"{self.cursor_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.cursor_path)
+
+    def events(self):
+        with open(self.path) as f:
+            return [CardEvent.from_row(json.loads(line)) for line in f if line.strip()]
+
+    def close(self):
+        self.file.close()
+
+
+class PostgresSink:
+    """Supabase/Postgres tables from supabase/migrations, through psycopg"""
+
+    def __init__(self, dsn, name=DEFAULT_CURSOR):
+        try:
+            import psycopg
+        except ImportError:
+            raise RuntimeError("The postgres sink needs psycopg (pip install 'psycopg[binary]')")
+        self.name = name
+        self.conn = psycopg.connect(dsn)
+
+    @staticmethod
+    def _sql(statement):
+        return statement.replace("?", "%s")
+
+    def cursor(self):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT round FROM ingest_cursors WHERE name = %s", (self.name,))
+            row = cur.fetchone()
+        self.conn.commit()
+        return row[0] if row else None
+
+    def write(self, events, cursor_round):
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            cur.executemany(self._sql(UPSERT_EVENT), [_row(event) for event in events])
+            for statement, params in holder_updates(events):
+                cur.execute(self._sql(statement), params)
+            cur.execute(self._sql(UPSERT_CURSOR), (self.name, cursor_round))
+
+    def close(self):
+        self.conn.close()
+
+
+def open_sink(spec, name=DEFAULT_CURSOR):
+    """Sink for a `kind:target` spec; postgres:// URLs are taken as they are"""
+    if spec.startswith(("postgres://", "postgresql://")):
+        return PostgresSink(spec, name)
+    kind, _, target = spec.partition(":")
+    if not target:
+        raise ValueError(f"Sink spec must look like kind:target, got {spec}")
+    if kind == "sqlite":
+        return SQLiteSink(target, name)
+    if kind == "jsonl":
+        return JSONLSink(target, name)
+    if kind == "store":
+        from event_store import EventStore
+
+        return EventStore(target, writable=True)
+    if kind in ("postgres", "postgresql", "supabase"):
+        return PostgresSink(target, name)
+    raise ValueError(f"Unknown sink {kind}; expected sqlite, jsonl, store or postgres")
+
+
+class BlockFollower:
+    def __init__(self, algod_client, app_id, sink, batch_rounds=200, batch_events=2000,
+                 prefetch=8, response_format="msgpack"):
+        self.algod_client = instrument_client(algod_client)
+        self.app_id = app_id
+        self.sink = sink
+        self.batch_rounds = batch_rounds
+        self.batch_events = batch_events
+        self.prefetch = prefetch
+        self.response_format = response_format
+        self.decode = BLOCK_DECODERS[response_format]
+
+    def fetch(self, round):
+        block = self.algod_client.block_info(round, response_format=self.response_format)
+        return self.decode(block, self.app_id)
+
+    def blocks(self, start, end):
+        """(round, events) for start..end in order, fetching up to `prefetch` rounds ahead"""
+        with ThreadPoolExecutor(max_workers=self.prefetch) as pool:
+            pending = deque()
+            next_round = start
+            while next_round <= end or pending:
+                while next_round <= end and len(pending) < self.prefetch:
+                    pending.append((next_round, pool.submit(self.fetch, next_round)))
+                    next_round += 1
+                round, future = pending.popleft()
+                yield round, future.result()
+
+    def ingest(self, start, end):
+        """Ingest start..end, committing a batch every batch_rounds rounds or batch_events
+        events; returns the number of events written"""
+        batch = []
+        batch_start = start
+        written = 0
+        for round, events in self.blocks(start, end):
+            batch.extend(events)
+            if round == end or round - batch_start + 1 >= self.batch_rounds \
+                    or len(batch) >= self.batch_events:
+                with timed("ingest", "sink"):
+                    self.sink.write(batch, round)
+                written += len(batch)
+                if batch:
+                    print(f"📥 Rounds {batch_start}-{round}: {len(batch)} events")
+                batch = []
+                batch_start = round + 1
+        return written
+
+    def start_round(self, from_round=None):
+        cursor = self.sink.cursor()
+        if cursor is not None:
+            return cursor + 1
+        if from_round is not None:
+            return from_round
+        return max(0, self.algod_client.status()["last-round"] - DEFAULT_LOOKBACK)
+
+    def follow(self, from_round=None, once=False, retry_seconds=5):
+        """Ingest up to the tip, then keep following it; `once` stops at the tip"""
+        next_round = self.start_round(from_round)
+        last_round = self.algod_client.status()["last-round"]
+        while True:
+            if next_round <= last_round:
+                try:
+                    self.ingest(next_round, last_round)
+                except Exception as e:
+                    # Resume from the last committed batch
+                    print(f"⚠️ Ingest failed after round {self.sink.cursor()}: {e}")
+                    time.sleep(retry_seconds)
+                cursor = self.sink.cursor()
+                next_round = next_round if cursor is None else cursor + 1
+                if next_round <= last_round:
+                    continue
+            if once:
+                return next_round - 1
+            # Returns as soon as the round after last_round is committed
+            status = self.algod_client.status_after_block(last_round)
+            last_round = status["last-round"]
+
+
+def pack_block(block):
+    """algod's msgpack encoding of a JSON block: raw logs and sorted keys"""
+    def canonical(value, key=None):
+        if isinstance(value, dict):
+            return {k: canonical(value[k], k) for k in sorted(value)}
+        if isinstance(value, list):
+            return [canonical(item, key) for item in value]
+        if key == "lg":
+            return base64.b64decode(value)
+        return value
+
+    return msgpack.packb(canonical(block), use_bin_type=True)
+
+
+class StaticAlgod:
+    """algod stand-in serving prebuilt JSON blocks; `fail_at` makes one round fail"""
+
+    def __init__(self, blocks, fail_at=None):
+        self.blocks = blocks
+        self.fail_at = fail_at
+
+    def block_info(self, round, response_format="json"):
+        if round == self.fail_at:
+            raise ConnectionError(f"round {round} unavailable")
+        if response_format == "msgpack":
+            return pack_block(self.blocks[round])
+        return self.blocks[round]
+
+    def status(self):
+        return {"last-round": max(self.blocks)}
+
+
+def sample_blocks(app_id=1, holders=3):
+    """JSON blocks carrying real contract logs from teal_eval
+
+    Each holder creates, funds and spends from a card, and the first holder
+    closes out; every other round is an app call, next to a payment and a
+    call to another app with the same logs.
+    """
+    from algosdk import encoding
+    from algosdk.logic import get_application_address
+
+    from artifact_builder import compile_programs
+    from card_index import card_box_min_balance
+    from teal_eval import Ledger, Program, evaluate, make_payment, make_txn
+
+    _, teals = compile_programs("virtual_card_manager", optimized=True)
+    program = Program(teals["approval"])
+    app_address = encoding.decode_address(get_application_address(app_id))
+    accounts = [bytes([n]) * 32 for n in range(1, holders + 1)]
+    ledger = Ledger(app_id=app_id, global_state={b"TOTAL_CARDS": 0, b"BASE_CURRENCY": b"USD"},
+                    local_state={holder: {} for holder in accounts},
+                    balances={app_address: 10 ** 12})
+    context = {"LatestTimestamp": 1_700_000_000, "Round": 1}
+
+    def call(sender, args, payment=None, on_completion=0):
+        nonlocal ledger
+        group = [make_txn(sender, args, on_completion, app_id)]
+        if payment:
+            group.insert(0, make_payment(sender, app_address, payment))
+        result = evaluate(program, ledger, group, len(group) - 1, context)
+        if not result.approved:
+            raise AssertionError(f"{args[:1]} rejected: {result.error}")
+        ledger = result.ledger
+        return result.logs
+
+    calls = []
+    for n, holder in enumerate(accounts):
+        calls.append(call(holder, [b"create_card", n % 3 + 1, b"US", b"USD"],
+                          payment=card_box_min_balance()))
+        calls.append(call(holder, [b"fund_card"], payment=1_000_000 * (n + 1)))
+        calls.append(call(holder, [b"use_card", 250_000]))
+    calls.append(call(accounts[0], [], on_completion=2))
+
+    blocks = {}
+    for round in range(1, 2 * len(calls) + 2):
+        txns = [{"txn": {"type": "pay"}}]
+        if round % 2 == 0:
+            logs = [base64.b64encode(log).decode() for log in calls[round // 2 - 1]]
+            txns.append({"txn": {"type": "appl", "apid": app_id}, "dt": {"lg": logs}})
+            txns.append({"txn": {"type": "appl", "apid": app_id + 1}, "dt": {"lg": logs}})
+        blocks[round] = {"block": {"rnd": round, "txns": txns}}
+    return blocks
+
+
+def check():
+    """Ingest contract-generated logs into each local sink, with a crash and resume"""
+    app_id = 1
+    blocks = sample_blocks(app_id)
+    last = max(blocks)
+    expected = [
+        event for round in sorted(blocks) for event in events_from_block(blocks[round], app_id)
+    ]
+    problems = []
+    if [event.kind for event in expected] != \
+            ["CardCreated", "CardFunded", "CardUsed"] * 3 + ["CardClosed"]:
+        problems.append(f"decoded kinds {[event.kind for event in expected]}")
+    packed = [
+        event for round in sorted(blocks)
+        for event in BLOCK_DECODERS["msgpack"](pack_block(blocks[round]), app_id)
+    ]
+    if [event.as_row() for event in packed] != [event.as_row() for event in expected]:
+        problems.append("msgpack and JSON blocks decode differently")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for spec in (f"sqlite:{directory}/events.db", f"jsonl:{directory}/events.jsonl",
+                     f"store:{directory}/store"):
+            algod_client = StaticAlgod(blocks, fail_at=9)
+            sink = open_sink(spec)
+            follower = BlockFollower(algod_client, app_id, sink, batch_rounds=4, prefetch=3)
+            try:
+                follower.ingest(1, last)
+            except ConnectionError:
+                pass
+            if sink.cursor() != 8:
+                problems.append(f"{spec}: cursor {sink.cursor()} after a failure at round 9")
+            sink.close()
+
+            # Reopen, as a restarted process would, and finish from the cursor
+            algod_client.fail_at = None
+            sink = open_sink(spec)
+            follower = BlockFollower(algod_client, app_id, sink, batch_rounds=4, prefetch=3)
+            follower.follow(from_round=1, once=True)
+            follower.follow(once=True)  # nothing left; must not duplicate
+            rows = [event.as_row() for event in sink.events()]
+            if rows != [event.as_row() for event in expected]:
+                problems.append(f"{spec}: {len(rows)} events stored, expected {len(expected)}")
+            if isinstance(sink, SQLiteSink):
+                holders_index = sink.holders()
+                closed = [card_id for card_id, (_, _, closed) in holders_index.items() if closed]
+                if len(holders_index) != 3 or closed != [1]:
+                    problems.append(f"{spec}: holder index {holders_index}")
+            sink.close()
+    for problem in problems:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Follow blocks and ingest card events")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("--sink", default=os.getenv("INGEST_SINK", "sqlite:card_events.db"),
+                        help="sqlite:<path>, jsonl:<path>, store:<directory> or postgres:<dsn>")
+    parser.add_argument("--name", default=DEFAULT_CURSOR, help="Cursor name in the sink")
+    parser.add_argument("--from-round", type=int,
+                        help="First round when the sink has no cursor yet")
+    parser.add_argument("--once", action="store_true", help="Stop once caught up")
+    parser.add_argument("--batch-rounds", type=int, default=200)
+    parser.add_argument("--batch-events", type=int, default=2000)
+    parser.add_argument("--prefetch", type=int, default=8, help="Blocks fetched ahead")
+    parser.add_argument("--format", choices=sorted(BLOCK_DECODERS), default="msgpack",
+                        help="Block encoding requested from algod")
+    parser.add_argument("--check", action="store_true",
+                        help="Ingest contract-generated events into local sinks")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        if problems:
+            print(f"❌ {problems} ingest checks failed")
+            return 1
+        print("✅ Local sinks ingest and resume without gaps or duplicates")
+        return 0
+    if args.app_id is None:
+        parser.error("app_id is required")
+
+    algod_client = algod_client_from_env()
+    try:
+        sink = open_sink(args.sink, args.name)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    follower = BlockFollower(algod_client, args.app_id, sink, args.batch_rounds,
+                             args.batch_events, args.prefetch, args.format)
+    print(f"🎧 Following app {args.app_id} into {args.sink}")
+    try:
+        last = follower.follow(args.from_round, args.once)
+        print(f"✅ Caught up at round {last}")
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Stopped at round {sink.cursor()}")
+    finally:
+        sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
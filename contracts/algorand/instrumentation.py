@@ -0,0 +1,228 @@
+"""
+Instrumentation for Virtual Card Manager tooling
+Counts and times every algod/indexer RPC and every compile, sign, submit
+and confirm step, tagged by operation and endpoint
+
+Enable with VCM_METRICS=1; VCM_METRICS_FILE=metrics.prom (Prometheus text)
+or metrics.json (JSON summary) writes the results when a tool exits.
+Disabled instrumentation hands out a shared no-op timer and leaves clients
+unwrapped, so it costs a single attribute check per step.
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Latency bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DEFAULT_ALGOD_ADDRESS = "https://testnet-api.algonode.cloud"
+
+
+class _Timer:
+    __slots__ = ("metrics", "operation", "endpoint", "start")
+
+    def __init__(self, metrics, operation, endpoint):
+        self.metrics = metrics
+        self.operation = operation
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(
+            self.operation, self.endpoint, time.perf_counter() - self.start,
+            ok=exc_type is None
+        )
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Series:
+    __slots__ = ("count", "errors", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last bucket is +Inf
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def timed(self, operation, endpoint="local"):
+        """Context manager timing one step; a shared no-op when disabled"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, operation, endpoint)
+
+    def observe(self, operation, endpoint, seconds, ok=True):
+        """Record one completed step"""
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+
+        with self._lock:
+            series = self._series.get((operation, endpoint))
+            if series is None:
+                series = self._series[(operation, endpoint)] = _Series()
+            series.count += 1
+            series.total += seconds
+            series.buckets[index] += 1
+            if not ok:
+                series.errors += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(self._series.items())
+
+    def to_prometheus(self):
+        """Render counters and latency histograms in Prometheus text format"""
+        lines = [
+            "# HELP vcm_operations_total Completed operations by outcome",
+            "# TYPE vcm_operations_total counter",
+        ]
+        snapshot = self._snapshot()
+        for (operation, endpoint), series in snapshot:
+            labels = f'operation="{operation}",endpoint="{endpoint}"'
+            lines.append(f'vcm_operations_total{{{labels},status="ok"}} {series.count - series.errors}')
+            lines.append(f'vcm_operations_total{{{labels},status="error"}} {series.errors}')
+
+        lines += [
+            "# HELP vcm_operation_latency_seconds Operation latency",
+            "# TYPE vcm_operation_latency_seconds histogram",
+        ]
+        for (operation, endpoint), series in snapshot:
+            labels = f'operation="{operation}",endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), series.buckets):
+                cumulative += count
+                lines.append(f'vcm_operation_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"vcm_operation_latency_seconds_sum{{{labels}}} {series.total:.6f}")
+            lines.append(f"vcm_operation_latency_seconds_count{{{labels}}} {series.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Per operation/endpoint counts, errors and latency percentiles"""
+        result = []
+        for (operation, endpoint), series in self._snapshot():
+            result.append({
+                "operation": operation,
+                "endpoint": endpoint,
+                "count": series.count,
+                "errors": series.errors,
+                "mean_seconds": series.total / series.count if series.count else 0.0,
+                "p50_seconds": _quantile(series, 0.50),
+                "p95_seconds": _quantile(series, 0.95),
+                "p99_seconds": _quantile(series, 0.99),
+            })
+        return result
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+    def export(self, path=None):
+        """Write metrics to `path` (or VCM_METRICS_FILE), format chosen by extension"""
+        path = path or os.getenv("VCM_METRICS_FILE")
+        if not self.enabled or not path:
+            return None
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w") as f:
+            f.write(content)
+        print(f"📈 Metrics written to {path}")
+        return path
+
+
+def _quantile(series, q):
+    """Upper bucket bound containing the q-quantile (None if in +Inf)"""
+    if not series.count:
+        return 0.0
+    target = q * series.count
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, series.buckets):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return None
+
+
+class InstrumentedClient:
+    """Proxy timing every public method call on an algod or indexer client"""
+
+    def __init__(self, client, endpoint, metrics):
+        self._client = client
+        self._endpoint = endpoint
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._metrics.timed(f"rpc.{name}", self._endpoint):
+                return attr(*args, **kwargs)
+
+        return call
+
+
+def endpoint_label(client):
+    """Short endpoint tag (host) for an algod or indexer client"""
+    address = getattr(client, "algod_address", None) or getattr(client, "indexer_address", "")
+    return urlparse(address).netloc or address or "unknown"
+
+
+def algod_client_from_env(default_address=DEFAULT_ALGOD_ADDRESS):
+    """algod client for ALGOD_ADDRESS and ALGOD_TOKEN, public testnet by default"""
+    from algosdk.v2client import algod
+
+    return algod.AlgodClient(
+        os.getenv("ALGOD_TOKEN", ""), os.getenv("ALGOD_ADDRESS", default_address)
+    )
+
+
+def instrument_client(client, metrics=None):
+    """Wrap a client so its RPCs are timed; returns it untouched when disabled"""
+    metrics = metrics or get_metrics()
+    if not metrics.enabled or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client, endpoint_label(client), metrics)
+
+
+_metrics = Metrics(enabled=os.getenv("VCM_METRICS") == "1")
+
+
+def get_metrics():
+    """Process-wide metrics registry"""
+    return _metrics
+
+
+def timed(operation, endpoint="local"):
+    """Time a step against the process-wide registry"""
+    return _metrics.timed(operation, endpoint)
@@ -0,0 +1,1142 @@
+"""
+In-process mock algod for offline runs and benchmarks
+Serves the algod v2 endpoints our tools call (status, wait-for-block-after,
+transaction params, raw transaction submission, pending info, accounts,
+applications and boxes, compile, simulate and blocks) from an in-memory
+chain, so deploy, automation, ingest and tester code can run without a
+network, and their own throughput can be measured against a node that is
+never the bottleneck.
+
+Transactions are applied when they are submitted, in pool order, and a
+block producer moves the pool into a block every --block-seconds (0 makes
+one block per submission, like algod's dev mode). App calls are run by a
+pluggable evaluator:
+    teal        teal_eval.py on the TEAL behind the bytecode; programs are
+                known from the contract artifacts and from /v2/teal/compile
+    accept      approves every call without running it (raw node overhead)
+
+Not modelled: signatures (present but not verified), minimum balances,
+assets, state schema limits and state deltas in pending info.
+
+Usage:
+    python mock_algod.py [--port 4001] [--block-seconds 0] [--fund ADDRESS[=MICROALGOS]]
+    ALGOD_ADDRESS=http://127.0.0.1:4001 python deploy.py
+    python mock_algod.py --check
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import warnings
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import msgpack
+from algosdk import encoding
+
+from artifacts import ARTIFACTS_DIR, ArtifactError, available_versions, load_artifact
+from teal_assembler import TealAssemblyError, assemble
+from teal_eval import (ON_COMPLETION, TYPE_ENUM, ZERO_ADDRESS, EvalResult, Ledger, Program,
+                       application_address, evaluate)
+
+GENESIS_ID = "mocknet-v1"
+GENESIS_HASH = hashlib.sha256(GENESIS_ID.encode()).digest()
+CONSENSUS_VERSION = "mock"
+MIN_FEE = 1000
+MIN_BALANCE = 100_000
+MAX_GROUP_SIZE = 16
+FIRST_APP_ID = 1001
+DEFAULT_PORT = 4001
+DEFAULT_FUNDING = 1_000_000 * 1_000_000  # microalgos for --fund without an amount
+WAIT_TIMEOUT = 60.0  # algod's wait-for-block-after gives up after a minute
+BENCHMARK_CHUNK = 500  # calls signed per suggested params, well inside the validity window
+# Accounts of these mnemonics are funded at startup when no --fund is given
+FUND_MNEMONICS = ("DEPLOYER_MNEMONIC", "CHAINLINK_AUTOMATION_MNEMONIC", "ALGORAND_MNEMONIC")
+# Transaction fields holding addresses; algod's JSON renders them in base32
+ADDRESS_FIELDS = {"snd", "rcv", "close", "rekey", "apat"}
+
+
+class TransactionRejected(Exception):
+    """A transaction group the node refuses; `index` is the failing transaction"""
+
+    def __init__(self, message, index=0):
+        super().__init__(message)
+        self.index = index
+
+
+def txid_of(txn):
+    """algod transaction ID of a decoded (canonically ordered) transaction map"""
+    digest = hashlib.new("sha512_256", b"TX" + msgpack.packb(txn, use_bin_type=True)).digest()
+    return base64.b32encode(digest).decode().rstrip("=")
+
+
+def jsonable(value, key=None):
+    """algod's JSON rendering of msgpack data: bytes in base64, addresses in base32"""
+    if isinstance(value, dict):
+        return {k: jsonable(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [jsonable(item, key) for item in value]
+    if isinstance(value, bytes):
+        if key in ADDRESS_FIELDS and len(value) == 32:
+            return encoding.encode_address(value)
+        return base64.b64encode(value).decode()
+    return value
+
+
+def state_json(state):
+    """algod key-value entries of a teal_eval state dict"""
+    entries = []
+    for key, value in sorted(state.items()):
+        if isinstance(value, int):
+            entry = {"type": 2, "uint": value, "bytes": ""}
+        else:
+            entry = {"type": 1, "uint": 0, "bytes": base64.b64encode(value).decode()}
+        entries.append({"key": base64.b64encode(key).decode(), "value": entry})
+    return entries
+
+
+def eval_txn(txn, txid):
+    """teal_eval transaction dict of a decoded transaction map"""
+    kind = txn.get("type", "")
+    fields = {
+        "Sender": txn.get("snd", ZERO_ADDRESS), "Fee": txn.get("fee", 0),
+        "FirstValid": txn.get("fv", 0), "LastValid": txn.get("lv", 0),
+        "Note": txn.get("note", b""), "Lease": txn.get("lx", bytes(32)),
+        "RekeyTo": txn.get("rekey", ZERO_ADDRESS), "TxID": base64.b32decode(txid + "===="),
+        "Type": kind.encode(), "TypeEnum": TYPE_ENUM.get(kind, 0),
+    }
+    if kind == "pay":
+        fields.update(Receiver=txn.get("rcv", ZERO_ADDRESS), Amount=txn.get("amt", 0),
+                      CloseRemainderTo=txn.get("close", ZERO_ADDRESS))
+    elif kind == "appl":
+        global_schema, local_schema = txn.get("apgs", {}), txn.get("apls", {})
+        fields.update(
+            ApplicationID=txn.get("apid", 0), OnCompletion=txn.get("apan", 0),
+            ApplicationArgs=list(txn.get("apaa", [])), Accounts=list(txn.get("apat", [])),
+            Applications=list(txn.get("apfa", [])), Assets=list(txn.get("apas", [])),
+            ApprovalProgram=txn.get("apap", b""), ClearStateProgram=txn.get("apsu", b""),
+            GlobalNumUint=global_schema.get("nui", 0),
+            GlobalNumByteSlice=global_schema.get("nbs", 0),
+            LocalNumUint=local_schema.get("nui", 0), LocalNumByteSlice=local_schema.get("nbs", 0),
+            ExtraProgramPages=txn.get("apep", 0),
+        )
+    return fields
+
+
+def inner_txn(inner):
+    """Transaction map of a teal_eval inner payment"""
+    txn = {"type": "pay", "snd": inner["Sender"], "rcv": inner.get("Receiver", ZERO_ADDRESS),
+           "amt": inner.get("Amount", 0), "fee": inner.get("Fee", 0)}
+    return {key: value for key, value in txn.items() if value}
+
+
+# Evaluators
+
+class TealEvaluator:
+    """Runs programs with teal_eval; bytecode is mapped back to the TEAL it came from"""
+
+    def __init__(self, artifacts_dir=ARTIFACTS_DIR):
+        self.sources = {}
+        self.programs = {}
+        names = sorted(os.listdir(artifacts_dir)) if os.path.isdir(artifacts_dir) else []
+        for name in names:
+            for version in available_versions(name, artifacts_dir):
+                try:
+                    artifact = load_artifact(name, version, artifacts_dir)
+                    for program in artifact.manifest["programs"]:
+                        self.register(artifact.teal(program), artifact.bytecode(program))
+                except ArtifactError as e:
+                    print(f"⚠️ Skipping artifact: {e}")
+
+    def register(self, source, bytecode=None):
+        self.sources[assemble(source) if bytecode is None else bytecode] = source
+
+    def __call__(self, bytecode, ledger, group, index, globals_):
+        program = self.programs.get(bytecode)
+        if program is None:
+            source = self.sources.get(bytecode)
+            if source is None:
+                return EvalResult(False, "program unknown to the mock node; compile it "
+                                  "through /v2/teal/compile first", [], 0, ledger)
+            program = self.programs[bytecode] = Program(source)
+        return evaluate(program, ledger, group, index, globals_)
+
+
+class AcceptEvaluator:
+    """Approves every program without running it, so benchmarks see only node overhead"""
+
+    def register(self, source, bytecode=None):
+        pass
+
+    def __call__(self, bytecode, ledger, group, index, globals_):
+        txn = group[index]
+        if txn.get("OnCompletion") in (ON_COMPLETION["OptIn"], ON_COMPLETION["CloseOut"]):
+            ledger = ledger.copy()
+            if txn["OnCompletion"] == ON_COMPLETION["OptIn"]:
+                ledger.local_state.setdefault(txn["Sender"], {})
+            else:
+                ledger.local_state.pop(txn["Sender"], None)
+        return EvalResult(True, None, [], 0, ledger)
+
+
+EVALUATORS = {"teal": TealEvaluator, "accept": AcceptEvaluator}
+
+
+# Chain
+
+class _Overlay(dict):
+    """Changes on top of a base mapping; keys not changed read through to it"""
+
+    def __init__(self, base, default):
+        super().__init__()
+        self.base = base
+        self.default = default
+
+    def __missing__(self, key):
+        return self.base.get(key, self.default)
+
+
+class _GroupState:
+    """Uncommitted effects of the groups being applied"""
+
+    def __init__(self, chain):
+        self.balances = _Overlay(chain.balances, 0)
+        self.apps = _Overlay(chain.apps, None)  # None marks a deleted app
+        self.next_app_id = chain.next_app_id
+
+
+class MockChain:
+    """Accounts, applications, the transaction pool and blocks of the mock node"""
+
+    def __init__(self, evaluator=None, block_seconds=0.0, clock=time.time, min_fee=MIN_FEE,
+                 fee_per_byte=0):
+        self.evaluator = evaluator or TealEvaluator()
+        self.block_seconds = block_seconds
+        self.clock = clock
+        self.min_fee = min_fee
+        self.fee_per_byte = fee_per_byte  # nonzero while the pool is congested
+        self.condition = threading.Condition()
+        self.closed = False
+        self.balances = {}  # address bytes -> microalgos
+        self.apps = {}  # app ID -> params dict with its teal_eval Ledger
+        self.next_app_id = FIRST_APP_ID
+        self.pool = []  # applied transaction records waiting for a block
+        self.transactions = {}  # txid -> record, pending or confirmed
+        self.leases = {}  # (sender, lease) -> last valid round
+        self.blocks = [{"rnd": 0, "ts": int(clock()), "records": []}]
+        self.last_block_time = time.monotonic()
+
+    @property
+    def round(self):
+        return len(self.blocks) - 1
+
+    def fund(self, address, amount=DEFAULT_FUNDING):
+        with self.condition:
+            key = encoding.decode_address(address)
+            self.balances[key] = self.balances.get(key, 0) + amount
+
+    def close(self):
+        """Release requests waiting for blocks"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    # Transactions
+
+    def submit(self, stxns):
+        """Apply a signed group to the pool; returns the first transaction ID"""
+        with self.condition:
+            state = _GroupState(self)
+            records = self._apply_group(stxns, state)
+            self._commit(state, records)
+            if not self.block_seconds:
+                self.produce_block()
+            return records[0]["txid"]
+
+    def simulate(self, request):
+        """algod simulate response for a decoded SimulateRequest; nothing is committed"""
+        allow_unsigned = request.get("allow-empty-signatures", False)
+        groups = []
+        with self.condition:
+            state = _GroupState(self)
+            for group in request.get("txn-groups", []):
+                stxns = group.get("txns", [])
+                try:
+                    records = self._apply_group(stxns, state, allow_unsigned)
+                except TransactionRejected as e:
+                    groups.append({
+                        "txn-results": [{"txn-result": {"txn": jsonable(stxn), "pool-error": ""}}
+                                        for stxn in stxns],
+                        "failure-message": str(e), "failed-at": [e.index],
+                    })
+                    break
+                results = [{"txn-result": self._info(record),
+                            "app-budget-consumed": record["apply"].get("cost", 0)}
+                           for record in records]
+                calls = sum(1 for stxn in stxns if stxn["txn"].get("type") == "appl")
+                groups.append({
+                    "txn-results": results,
+                    "app-budget-added": 700 * calls,
+                    "app-budget-consumed": sum(result["app-budget-consumed"] for result in results),
+                })
+            response = {"version": 2, "last-round": self.round, "txn-groups": groups}
+        if allow_unsigned:
+            response["eval-overrides"] = {"allow-empty-signatures": True}
+        return response
+
+    def _apply_group(self, stxns, state, allow_unsigned=False):
+        if not stxns or len(stxns) > MAX_GROUP_SIZE:
+            raise TransactionRejected(f"group size {len(stxns)} outside of 1--{MAX_GROUP_SIZE}")
+        txns = [stxn["txn"] for stxn in stxns]
+        txids = [txid_of(txn) for txn in txns]
+        fees = sum(txn.get("fee", 0) for txn in txns)
+        needed = sum(max(self.min_fee, self.fee_per_byte * len(msgpack.packb(stxn)))
+                     for stxn in stxns)
+        if fees < needed:
+            raise TransactionRejected(f"transaction {txids[0]}: fee too small: group pays "
+                                      f"{fees}, needs {needed}")
+        if len(txns) > 1 and len({txn.get("grp") for txn in txns}) != 1:
+            raise TransactionRejected(f"transaction {txids[0]}: inconsistent group values")
+        group = [eval_txn(txn, txid) for txn, txid in zip(txns, txids)]
+        records = []
+        for index, stxn in enumerate(stxns):
+            try:
+                apply = self._apply(stxn, txids[index], group, index, state, allow_unsigned)
+            except TransactionRejected as e:
+                e.index = index
+                raise
+            records.append({"txid": txids[index], "stxn": stxn, "apply": apply, "round": None})
+        return records
+
+    def _apply(self, stxn, txid, group, index, state, allow_unsigned):
+        txn = stxn["txn"]
+        next_round = self.round + 1
+        if not allow_unsigned and not {"sig", "msig", "lsig"} & set(stxn):
+            raise TransactionRejected(f"transaction {txid}: signedtxn has no sig")
+        if txn.get("gen", GENESIS_ID) != GENESIS_ID or txn.get("gh", GENESIS_HASH) != GENESIS_HASH:
+            raise TransactionRejected(f"transaction {txid}: genesis mismatch, expected "
+                                      f"{GENESIS_ID}")
+        first, last = txn.get("fv", 0), txn.get("lv", 0)
+        if not first <= next_round <= last:
+            raise TransactionRejected(f"transaction {txid}: txn dead: round {next_round} "
+                                      f"outside of {first}--{last}")
+        known = self.transactions.get(txid)
+        if known is not None:
+            where = "ledger" if known["round"] else "pool"
+            raise TransactionRejected(f"transaction already in {where}: {txid}")
+        sender = txn.get("snd", ZERO_ADDRESS)
+        lease = txn.get("lx")
+        if lease and self.leases.get((sender, lease), 0) >= next_round:
+            raise TransactionRejected(f"transaction {txid} using an overlapping lease "
+                                      f"(sender, lease): ({encoding.encode_address(sender)}, "
+                                      f"{base64.b64encode(lease).decode()})")
+
+        balances = state.balances
+
+        def debit(address, amount):
+            if balances[address] < amount:
+                raise TransactionRejected(
+                    f"transaction {txid}: overspend (account "
+                    f"{encoding.encode_address(address)}, balance {balances[address]}, "
+                    f"tried to spend {amount})")
+            balances[address] -= amount
+
+        debit(sender, txn.get("fee", 0))
+        kind = txn.get("type")
+        if kind == "pay":
+            amount = txn.get("amt", 0)
+            debit(sender, amount)
+            balances[txn.get("rcv", ZERO_ADDRESS)] += amount
+            close = txn.get("close")
+            if close:
+                closing = balances[sender]
+                balances[close] += closing
+                balances[sender] = 0
+                return {"closing-amount": closing}
+            return {}
+        if kind == "appl":
+            return self._app_call(txn, txid, group, index, state)
+        raise TransactionRejected(f"transaction {txid}: {kind} transactions are not "
+                                  "supported by the mock node")
+
+    def _app_call(self, txn, txid, group, index, state):
+        sender = txn["snd"]
+        on_completion = txn.get("apan", 0)
+        app_id = txn.get("apid", 0)
+        apply = {}
+        if app_id == 0:
+            app_id = apply["application-index"] = state.next_app_id
+            state.next_app_id += 1
+            app = {
+                "creator": sender, "approval": txn.get("apap", b""), "clear": txn.get("apsu", b""),
+                "global-schema": txn.get("apgs", {}), "local-schema": txn.get("apls", {}),
+                "extra-pages": txn.get("apep", 0), "ledger": Ledger(app_id=app_id, creator=sender),
+            }
+        else:
+            app = state.apps[app_id]
+            if app is None:
+                raise TransactionRejected(f"transaction {txid}: application {app_id} does "
+                                          "not exist")
+        ledger = app["ledger"]
+        # Scratch balances the program can read; evaluate() copies the ledger,
+        # so committed state is untouched until the result is kept
+        visible = [sender, application_address(app_id), *txn.get("apat", [])]
+        ledger.balances = {address: state.balances[address] for address in visible}
+        globals_ = {"Round": self.round + 1, "LatestTimestamp": self.blocks[-1]["ts"],
+                    "GroupID": txn.get("grp", bytes(32))}
+
+        clear = on_completion == ON_COMPLETION["ClearState"]
+        result = self.evaluator(app["clear"] if clear else app["approval"], ledger, group,
+                                index, globals_)
+        if clear:
+            # Clearing state always succeeds; a rejecting program only loses its effects
+            kept = result.ledger if result.approved else ledger.copy()
+            kept.local_state.pop(sender, None)
+        elif result.approved:
+            kept = result.ledger
+        else:
+            reason = result.error or "transaction rejected by ApprovalProgram"
+            raise TransactionRejected(f"transaction {txid}: logic eval error: {reason}")
+
+        for address, amount in kept.balances.items():
+            state.balances[address] = amount
+        if on_completion == ON_COMPLETION["UpdateApplication"]:
+            app = dict(app, approval=txn.get("apap", b""), clear=txn.get("apsu", b""))
+        deleted = on_completion == ON_COMPLETION["DeleteApplication"] and not clear
+        state.apps[app_id] = None if deleted else dict(app, ledger=kept)
+        apply.update(logs=result.logs, cost=result.cost,
+                     inner=[inner_txn(inner) for inner in result.inner_txns])
+        return apply
+
+    def _commit(self, state, records):
+        self.balances.update(state.balances)
+        for app_id, app in state.apps.items():
+            if app is None:
+                self.apps.pop(app_id, None)
+            else:
+                self.apps[app_id] = app
+        self.next_app_id = state.next_app_id
+        for record in records:
+            txn = record["stxn"]["txn"]
+            if txn.get("lx"):
+                self.leases[(txn["snd"], txn["lx"])] = txn.get("lv", 0)
+            self.transactions[record["txid"]] = record
+        self.pool.extend(records)
+
+    # Blocks
+
+    def produce_block(self):
+        """Move the pool into the next block; the caller holds the condition"""
+        round = self.round + 1
+        for record in self.pool:
+            record["round"] = round
+        timestamp = max(int(self.clock()), self.blocks[-1]["ts"])
+        self.blocks.append({"rnd": round, "ts": timestamp, "records": self.pool})
+        self.pool = []
+        self.last_block_time = time.monotonic()
+        self.condition.notify_all()
+
+    def run_producer(self, stop):
+        """Produce a block every block_seconds until `stop` is set"""
+        while not stop.wait(self.block_seconds):
+            with self.condition:
+                self.produce_block()
+
+    def wait_for_block_after(self, round, timeout=WAIT_TIMEOUT):
+        with self.condition:
+            self.condition.wait_for(lambda: self.round > round or self.closed, timeout)
+            return self.status()
+
+    def block(self, round):
+        """Block `round` as algod's msgpack structure (raw bytes), or None"""
+        if round > self.round:
+            return None
+        block = self.blocks[round]
+        txns = []
+        for record in block["records"]:
+            entry = dict(record["stxn"], hgi=True)
+            apply = record["apply"]
+            if "application-index" in apply:
+                entry["apid"] = apply["application-index"]
+            if "closing-amount" in apply:
+                entry["ca"] = apply["closing-amount"]
+            delta = {}
+            if apply.get("logs"):
+                delta["lg"] = list(apply["logs"])
+            if apply.get("inner"):
+                delta["itx"] = [{"txn": inner} for inner in apply["inner"]]
+            if delta:
+                entry["dt"] = delta
+            txns.append(entry)
+        header = {"rnd": round, "ts": block["ts"], "gen": GENESIS_ID, "gh": GENESIS_HASH}
+        if txns:
+            header["txns"] = txns
+        return {"block": header}
+
+    # Queries
+
+    def status(self):
+        return {
+            "last-round": self.round, "last-version": CONSENSUS_VERSION,
+            "next-version": CONSENSUS_VERSION, "next-version-round": self.round + 1,
+            "next-version-supported": True, "catchup-time": 0,
+            "stopped-at-unsupported-round": False,
+            "time-since-last-round": int((time.monotonic() - self.last_block_time) * 1e9),
+        }
+
+    def params(self):
+        return {
+            "consensus-version": CONSENSUS_VERSION, "fee": self.fee_per_byte,
+            "min-fee": self.min_fee,
+            "genesis-hash": base64.b64encode(GENESIS_HASH).decode(), "genesis-id": GENESIS_ID,
+            "last-round": self.round,
+        }
+
+    def pending_info(self, txid):
+        record = self.transactions.get(txid)
+        return None if record is None else self._info(record)
+
+    def _info(self, record):
+        info = {"txn": jsonable(record["stxn"]), "pool-error": ""}
+        apply = record["apply"]
+        if record["round"]:
+            info["confirmed-round"] = record["round"]
+        if "application-index" in apply:
+            info["application-index"] = apply["application-index"]
+        if "closing-amount" in apply:
+            info["closing-amount"] = apply["closing-amount"]
+        if apply.get("logs"):
+            info["logs"] = [base64.b64encode(log).decode() for log in apply["logs"]]
+        if apply.get("inner"):
+            info["inner-txns"] = [{"txn": {"txn": jsonable(inner)}, "pool-error": ""}
+                                  for inner in apply["inner"]]
+        return info
+
+    def pending(self, limit=0):
+        records = self.pool[:limit] if limit else self.pool
+        return {"top-transactions": [jsonable(record["stxn"]) for record in records],
+                "total-transactions": len(self.pool)}
+
+    def _schema(self, schema):
+        return {"num-uint": schema.get("nui", 0), "num-byte-slice": schema.get("nbs", 0)}
+
+    def _app_params(self, app):
+        return {
+            "creator": encoding.encode_address(app["creator"]),
+            "approval-program": base64.b64encode(app["approval"]).decode(),
+            "clear-state-program": base64.b64encode(app["clear"]).decode(),
+            "extra-program-pages": app["extra-pages"],
+            "global-state": state_json(app["ledger"].global_state),
+            "global-state-schema": self._schema(app["global-schema"]),
+            "local-state-schema": self._schema(app["local-schema"]),
+        }
+
+    def _local_state(self, app_id, app, address):
+        return {"id": app_id, "key-value": state_json(app["ledger"].local_state[address]),
+                "schema": self._schema(app["local-schema"])}
+
+    def account_info(self, address):
+        key = encoding.decode_address(address)
+        amount = self.balances.get(key, 0)
+        local = [self._local_state(app_id, app, key) for app_id, app in sorted(self.apps.items())
+                 if key in app["ledger"].local_state]
+        created = [{"id": app_id, "params": self._app_params(app)}
+                   for app_id, app in sorted(self.apps.items()) if app["creator"] == key]
+        return {
+            "address": address, "amount": amount, "amount-without-pending-rewards": amount,
+            "min-balance": MIN_BALANCE, "pending-rewards": 0, "rewards": 0, "reward-base": 0,
+            "round": self.round, "status": "Offline", "apps-local-state": local,
+            "created-apps": created, "total-apps-opted-in": len(local),
+            "total-created-apps": len(created), "assets": [], "total-assets-opted-in": 0,
+            "created-assets": [], "total-created-assets": 0,
+        }
+
+    def account_application_info(self, address, app_id):
+        key = encoding.decode_address(address)
+        app = self.apps.get(app_id)
+        if app is None:
+            return None
+        info = {"round": self.round}
+        if key in app["ledger"].local_state:
+            info["app-local-state"] = self._local_state(app_id, app, key)
+        if app["creator"] == key:
+            info["created-app"] = self._app_params(app)
+        return info if len(info) > 1 else None
+
+    def application_info(self, app_id):
+        app = self.apps.get(app_id)
+        return None if app is None else {"id": app_id, "params": self._app_params(app)}
+
+
+# HTTP
+
+def _box_name(spec):
+    """Box name bytes of algod's `encoding:value` name parameter"""
+    kind, _, value = spec.partition(":")
+    if kind == "b64":
+        return base64.b64decode(value)
+    if kind == "str":
+        return value.encode()
+    if kind == "int":
+        return int(value).to_bytes(8, "big")
+    if kind == "addr":
+        return encoding.decode_address(value)
+    raise ValueError(f"unsupported box name encoding {kind}")
+
+
+def _health(chain, query, body):
+    return 200, None
+
+
+def _versions(chain, query, body):
+    return 200, {"genesis_id": GENESIS_ID,
+                 "genesis_hash_b64": base64.b64encode(GENESIS_HASH).decode(),
+                 "versions": ["v2"], "build": {"channel": "mock"}}
+
+
+def _status(chain, query, body):
+    with chain.condition:
+        return 200, chain.status()
+
+
+def _wait_for_block(chain, query, body, round):
+    return 200, chain.wait_for_block_after(int(round))
+
+
+def _params(chain, query, body):
+    with chain.condition:
+        return 200, chain.params()
+
+
+def _send(chain, query, body):
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(body)
+    return 200, {"txId": chain.submit(list(unpacker))}
+
+
+def _pending(chain, query, body):
+    with chain.condition:
+        return 200, chain.pending(int(query.get("max", 0)))
+
+
+def _pending_info(chain, query, body, txid):
+    with chain.condition:
+        info = chain.pending_info(txid)
+    if info is None:
+        return 404, {"message": "txn does not exist"}
+    return 200, info
+
+
+def _account(chain, query, body, address):
+    with chain.condition:
+        return 200, chain.account_info(address)
+
+
+def _account_application(chain, query, body, address, app_id):
+    with chain.condition:
+        info = chain.account_application_info(address, int(app_id))
+    if info is None:
+        return 404, {"message": "account application info not found"}
+    return 200, info
+
+
+def _application(chain, query, body, app_id):
+    with chain.condition:
+        info = chain.application_info(int(app_id))
+    if info is None:
+        return 404, {"message": "application does not exist"}
+    return 200, info
+
+
+def _box(chain, query, body, app_id):
+    name = _box_name(query.get("name", ""))
+    with chain.condition:
+        app = chain.apps.get(int(app_id))
+        value = None if app is None else app["ledger"].boxes.get(name)
+        round = chain.round
+    if value is None:
+        return 404, {"message": "box not found"}
+    return 200, {"name": base64.b64encode(name).decode(),
+                 "value": base64.b64encode(value).decode(), "round": round}
+
+
+def _boxes(chain, query, body, app_id):
+    with chain.condition:
+        app = chain.apps.get(int(app_id))
+        if app is None:
+            return 404, {"message": "application does not exist"}
+        names = sorted(app["ledger"].boxes)
+    limit = int(query.get("max", 0))
+    names = names[:limit] if limit else names
+    return 200, {"boxes": [{"name": base64.b64encode(name).decode()} for name in names]}
+
+
+def _compile(chain, query, body):
+    source = body.decode()
+    try:
+        bytecode = assemble(source)
+    except TealAssemblyError as e:
+        return 400, {"message": str(e)}
+    with chain.condition:
+        chain.evaluator.register(source, bytecode)
+    digest = hashlib.new("sha512_256", b"Program" + bytecode).digest()
+    return 200, {"hash": encoding.encode_address(digest),
+                 "result": base64.b64encode(bytecode).decode()}
+
+
+def _simulate(chain, query, body):
+    return 200, chain.simulate(msgpack.unpackb(body, raw=False))
+
+
+def _block(chain, query, body, round):
+    with chain.condition:
+        block = chain.block(int(round))
+    if block is None:
+        return 404, {"message": f"ledger does not have entry {round}"}
+    if query.get("format") == "msgpack":
+        return 200, msgpack.packb(_sorted(block), use_bin_type=True)
+    return 200, jsonable(block)
+
+
+def _sorted(value):
+    if isinstance(value, dict):
+        return {key: _sorted(value[key]) for key in sorted(value)}
+    if isinstance(value, list):
+        return [_sorted(item) for item in value]
+    return value
+
+
+ROUTES = [(method, re.compile(pattern), handler) for method, pattern, handler in [
+    ("GET", r"/health", _health),
+    ("GET", r"/versions", _versions),
+    ("GET", r"/v2/status", _status),
+    ("GET", r"/v2/status/wait-for-block-after/(\d+)", _wait_for_block),
+    ("GET", r"/v2/transactions/params", _params),
+    ("POST", r"/v2/transactions", _send),
+    ("GET", r"/v2/transactions/pending", _pending),
+    ("GET", r"/v2/transactions/pending/([A-Z2-7]+)", _pending_info),
+    ("POST", r"/v2/transactions/simulate", _simulate),
+    ("GET", r"/v2/accounts/([A-Z2-7]{58})", _account),
+    ("GET", r"/v2/accounts/([A-Z2-7]{58})/applications/(\d+)", _account_application),
+    ("GET", r"/v2/applications/(\d+)", _application),
+    ("GET", r"/v2/applications/(\d+)/box", _box),
+    ("GET", r"/v2/applications/(\d+)/boxes", _boxes),
+    ("POST", r"/v2/teal/compile", _compile),
+    ("GET", r"/v2/blocks/(\d+)", _block),
+]]
+NO_AUTH = {"/health", "/versions"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "mock-algod"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        token = self.server.token
+        if token and url.path not in NO_AUTH and self.headers.get("X-Algo-API-Token") != token:
+            return self.reply(401, {"message": "Invalid API Token"})
+        for verb, pattern, handler in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match and verb == method:
+                break
+        else:
+            return self.reply(404, {"message": f"unknown endpoint {method} {url.path}"})
+        try:
+            status, payload = handler(self.server.chain, query, body, *match.groups())
+        except TransactionRejected as e:
+            status, payload = 400, {"message": str(e)}
+        except (ValueError, KeyError, TypeError, msgpack.UnpackException) as e:
+            status, payload = 400, {"message": f"bad request: {e}"}
+        self.reply(status, payload)
+
+    def reply(self, status, payload):
+        if isinstance(payload, bytes):
+            body, content_type = payload, "application/msgpack"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockAlgod:
+    """HTTP server and block producer around a MockChain, in background threads"""
+
+    def __init__(self, chain=None, host="127.0.0.1", port=0, token="", verbose=False):
+        self.chain = chain or MockChain()
+        self.token = token
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.chain = self.chain
+        self.server.token = token
+        self.server.verbose = verbose
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client(self):
+        from algosdk.v2client import algod
+
+        return algod.AlgodClient(self.token, self.address)
+
+    def start(self):
+        self._threads = [threading.Thread(target=self.server.serve_forever, daemon=True)]
+        if self.chain.block_seconds:
+            self._threads.append(threading.Thread(target=self.chain.run_producer,
+                                                  args=(self._stop,), daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.chain.close()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Checks
+
+def quietly(function, *args, **kwargs):
+    """Call a chatty tool function; its output is printed only if it fails"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            sys.stdout.write(output.getvalue())
+            raise
+    if not result:
+        sys.stdout.write(output.getvalue())
+    return result
+
+
+def _call(submitter, operation_key, sender, app_id, args, payment=0):
+    """Submit an app call, preceded by a payment to the app in the same group"""
+    from algosdk import transaction
+    from algosdk.logic import get_application_address
+
+    def build(params):
+        call = transaction.ApplicationCallTxn(sender, params, app_id,
+                                              transaction.OnComplete.NoOpOC, app_args=args)
+        if not payment:
+            return call
+        return [transaction.PaymentTxn(sender, params, get_application_address(app_id), payment),
+                call]
+
+    return submitter.submit(operation_key, build)
+
+
+def check_tools():
+    """Deploy, automation, precheck, summary and ingest flows against the mock node"""
+    import tempfile
+
+    from algosdk import account, transaction
+    from algosdk.error import AlgodHTTPError
+    from algosdk.logic import get_application_address
+
+    from card_index import CardIndex, card_box_min_balance
+    from card_precheck import CardMirror
+    from card_summary import simulate_card_summary
+    from card_sweeper import CardSweeper, DeadCard
+    from chainlink_automation import ChainlinkAutomation
+    from deploy import VirtualCardManagerDeployer
+    from ingest import BlockFollower, open_sink
+    from price_pusher import MockFeed, PricePusher
+    from submission import SubmissionError, Submitter
+
+    problems = []
+    with MockAlgod() as node:
+        client = node.client()
+        private_key, address = account.generate_account()
+        node.chain.fund(address)
+
+        deployer = VirtualCardManagerDeployer(client, private_key, network="mocknet")
+        steps = [deployer.deploy_contract, lambda: deployer.fund_contract(5),
+                 deployer.setup_chainlink_integration,
+                 lambda: deployer.set_price_updater(address), deployer.create_test_card]
+        if not all(quietly(step) for step in steps):
+            return ["deployment flow failed"]
+        app_id = deployer.app_id
+
+        automation = ChainlinkAutomation(client, private_key, app_id)
+        if not quietly(automation.update_prices, {"USD": 0.25}):
+            problems.append("update_prices was not confirmed")
+        if not quietly(automation.reset_daily_limits):
+            problems.append("reset_limits was not confirmed")
+
+        submitter = Submitter(client, private_key)
+        quietly(_call, submitter, "fund", address, app_id, ["fund_card"], payment=3_000_000)
+        quietly(_call, submitter, "use", address, app_id, ["use_card", 1_000_000])
+        try:
+            quietly(_call, submitter, "overspend", address, app_id, ["use_card", 10 ** 12])
+            problems.append("an overspending use_card was accepted")
+        except SubmissionError as e:
+            if "logic eval error" not in str(e):
+                problems.append(f"overspend failed for the wrong reason: {e}")
+
+        params = client.suggested_params()
+        params.first, params.last = 1, 2
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            stale = transaction.PaymentTxn(address, params, address, 0).sign(private_key)
+        try:
+            client.send_transaction(stale)
+            problems.append("a transaction past its last valid round was accepted")
+        except AlgodHTTPError as e:
+            if e.code != 400 or "txn dead" not in str(e):
+                problems.append(f"stale transaction failed with {e.code}: {e}")
+
+        holder_key, holder = account.generate_account()
+        node.chain.fund(holder)
+        holder_submitter = Submitter(client, holder_key)
+        quietly(holder_submitter.submit, "opt-in",
+                lambda params: transaction.ApplicationOptInTxn(holder, params, app_id))
+        try:
+            quietly(_call, holder_submitter, "long-currency", holder, app_id,
+                    ["create_card", 1, "US", "NINEBYTES"], payment=card_box_min_balance())
+            problems.append("a card with a 9-byte currency code was created")
+        except SubmissionError as e:
+            if "logic eval error" not in str(e):
+                problems.append(f"long currency failed for the wrong reason: {e}")
+
+        if CardIndex(client, app_id).owner_of(1) != address:
+            problems.append("card index box does not name the holder")
+        mirror = CardMirror(app_id, client)
+        card = mirror.fetch(address)
+        if card is None or card.state["balance"] != 2_000_000:
+            problems.append(f"mirrored card state is wrong: {card and card.state}")
+        elif not mirror.precheck(address, 500_000).approved:
+            problems.append("pre-check denied an affordable spend")
+        summary = simulate_card_summary(client, app_id, address)
+        if summary.balance != 2_000_000:
+            problems.append(f"simulated summary balance is {summary.balance}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for response_format in ("json", "msgpack"):
+                sink = open_sink(f"jsonl:{os.path.join(directory, response_format)}.jsonl")
+                follower = BlockFollower(client, app_id, sink, response_format=response_format)
+                quietly(lambda: follower.follow(from_round=1, once=True) or True)
+                kinds = [event.kind for event in sink.events()]
+                sink.close()
+                if kinds != ["CardCreated", "CardFunded", "CardUsed"]:
+                    problems.append(f"{response_format} blocks ingested as {kinds}")
+
+        # New cards pay for their boxes; a recreated card keeps its ID and boxes
+        try:
+            quietly(_call, holder_submitter, "unpaid-card", holder, app_id,
+                    ["create_card", 1, "US", "USD"])
+            problems.append("a card was created without paying for its boxes")
+        except SubmissionError as e:
+            if "logic eval error" not in str(e):
+                problems.append(f"unpaid card failed for the wrong reason: {e}")
+        quietly(_call, submitter, "deactivate", address, app_id, ["deactivate_card"])
+        quietly(_call, submitter, "recreate", address, app_id, ["create_card", 2, "US", "ALGO"])
+        index = CardIndex(client, app_id)
+        if index.total_cards() != 1 or index.card_of(address) != 1:
+            problems.append("recreating a deactivated card assigned a new card ID")
+
+        # Sweeping refunds the card balance and the box balance the holder paid
+        quietly(_call, submitter, "deactivate-again", address, app_id, ["deactivate_card"])
+        app_address = get_application_address(app_id)
+        before = client.account_info(app_address)["amount"]
+        balance = mirror.fetch(address).state.get("balance", 0)
+        try:
+            quietly(CardSweeper(submitter, app_id).sweep_batch,
+                    [DeadCard(address, 1, balance, False)])
+        except SubmissionError as e:
+            problems.append(f"sweeping a deactivated card failed: {e}")
+        refunded = before - client.account_info(app_address)["amount"]
+        if refunded != balance + card_box_min_balance():
+            problems.append(f"sweeping refunded {refunded}, not the card and box balance")
+
+    # Block timestamps a minute behind wall clock: price entries must be
+    # stamped with chain time to pass the contract's freshness bound
+    with MockAlgod(MockChain(clock=lambda: time.time() - 60)) as node:
+        client = node.client()
+        private_key, address = account.generate_account()
+        node.chain.fund(address)
+        deployer = VirtualCardManagerDeployer(client, private_key, network="mocknet")
+        if not all(quietly(step) for step in (deployer.deploy_contract,
+                                               deployer.setup_chainlink_integration)):
+            problems.append("deployment on a lagging chain failed")
+        else:
+            automation = ChainlinkAutomation(client, private_key, deployer.app_id)
+            if not quietly(automation.update_price_feed, 0.25):
+                problems.append("price update was rejected on a chain behind wall clock")
+            pusher = PricePusher(automation)
+            stats = quietly(lambda: pusher.run(MockFeed(seed=1), interval=0, iterations=3))
+            if stats["failed"] or not stats["pushes"]:
+                problems.append(f"price pusher batches were rejected: {stats}")
+
+    # A congested pool charges per signed byte: fees must be priced with the
+    # lease, note and group fields the submitter adds, even at LOW priority
+    with MockAlgod(MockChain(fee_per_byte=20)) as node:
+        client = node.client()
+        private_key, address = account.generate_account()
+        node.chain.fund(address)
+        deployer = VirtualCardManagerDeployer(client, private_key, network="mocknet")
+        steps = [deployer.deploy_contract, lambda: deployer.fund_contract(5),
+                 deployer.create_test_card]
+        if not all(quietly(step) for step in steps):
+            problems.append("deployment on a congested chain failed")
+        elif not deployer.fee_policy._fullness:
+            problems.append("the fee policy never sampled block fullness")
+        elif not quietly(ChainlinkAutomation(client, private_key,
+                                             deployer.app_id).reset_daily_limits):
+            problems.append("a LOW priority call was underpriced on a congested chain")
+
+    with MockAlgod(MockChain(block_seconds=0.05)) as node:
+        client = node.client()
+        private_key, address = account.generate_account()
+        node.chain.fund(address)
+        confirmed = quietly(Submitter(client, private_key).submit, "timed",
+                             lambda params: transaction.PaymentTxn(address, params, address, 1))
+        if not confirmed.get("confirmed-round"):
+            problems.append("payment was not confirmed by the block producer")
+    return problems
+
+
+def benchmark(evaluator, transactions):
+    """Signed use_card calls per second, submitted over HTTP and confirmed"""
+    from algosdk import account, transaction
+
+    from deploy import VirtualCardManagerDeployer
+    from submission import Submitter
+
+    with MockAlgod(MockChain(EVALUATORS[evaluator]())) as node:
+        client = node.client()
+        private_key, address = account.generate_account()
+        node.chain.fund(address)
+        deployer = VirtualCardManagerDeployer(client, private_key, network="mocknet")
+        quietly(lambda: deployer.deploy_contract() and deployer.create_test_card())
+        quietly(_call, Submitter(client, private_key), "fund", address, deployer.app_id,
+                 ["fund_card"], payment=10 ** 9)
+
+        # Signing is left out of the timing; chunks are signed with fresh
+        # params because every submission advances a round
+        elapsed = 0.0
+        for start in range(0, transactions, BENCHMARK_CHUNK):
+            params = client.suggested_params()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)
+                signed = [
+                    transaction.ApplicationCallTxn(
+                        address, params, deployer.app_id, transaction.OnComplete.NoOpOC,
+                        app_args=["use_card", 1], note=n.to_bytes(8, "big"),
+                    ).sign(private_key)
+                    for n in range(start, min(start + BENCHMARK_CHUNK, transactions))
+                ]
+            started = time.perf_counter()
+            for stxn in signed:
+                client.send_transaction(stxn)
+            last = transaction.wait_for_confirmation(client, signed[-1].get_txid(), 4)
+            elapsed += time.perf_counter() - started
+            if not last.get("confirmed-round"):
+                raise AssertionError("benchmark transactions were not confirmed")
+        return transactions / elapsed
+
+
+def check(transactions=2000):
+    problems = check_tools()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Deploy, automation, pre-check, summary and ingest run against the mock node")
+    for evaluator in sorted(EVALUATORS):
+        rate = benchmark(evaluator, transactions)
+        print(f"📊 {evaluator:<6} {rate:8.0f} use_card calls/s over HTTP ({transactions} calls)")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an in-process mock algod")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", default="", help="Require this X-Algo-API-Token")
+    parser.add_argument("--block-seconds", type=float, default=0.0,
+                        help="Block cadence; 0 makes one block per submission")
+    parser.add_argument("--evaluator", choices=sorted(EVALUATORS), default="teal")
+    parser.add_argument("--fund", action="append", default=[], metavar="ADDRESS[=MICROALGOS]",
+                        help="Genesis balance for an account (repeatable)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    parser.add_argument("--check", action="store_true",
+                        help="Run the tools against the mock node and benchmark it")
+    parser.add_argument("--transactions", type=int, default=2000,
+                        help="Calls submitted by the --check benchmark")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = check(args.transactions)
+        if failures:
+            print(f"❌ {failures} mock node checks failed")
+            return 1
+        return 0
+
+    chain = MockChain(EVALUATORS[args.evaluator](), args.block_seconds)
+    funded = []
+    for entry in args.fund:
+        address, _, amount = entry.partition("=")
+        funded.append((address, int(amount) if amount else DEFAULT_FUNDING))
+    if not funded:
+        from algosdk import account, mnemonic
+
+        for variable in FUND_MNEMONICS:
+            if os.getenv(variable):
+                private_key = mnemonic.to_private_key(os.getenv(variable))
+                funded.append((account.address_from_private_key(private_key), DEFAULT_FUNDING))
+    for address, amount in funded:
+        chain.fund(address, amount)
+        print(f"💰 Funded {address} with {amount / 1_000_000:,.0f} ALGO")
+
+    node = MockAlgod(chain, args.host, args.port, args.token, args.verbose).start()
+    cadence = f"every {args.block_seconds}s" if args.block_seconds else "per submission"
+    print(f"🧪 Mock algod on {node.address} ({args.evaluator} evaluator, one block {cadence})")
+    print(f"💡 export ALGOD_ADDRESS={node.address} ALGOD_TOKEN={args.token}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n📋 Stopped at round {chain.round} after {len(chain.transactions)} transactions")
+    finally:
+        node.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
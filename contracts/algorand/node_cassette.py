@@ -0,0 +1,477 @@
+"""
+Record/replay proxy for algod and indexer traffic
+Records every request the Python tools make to a node, with its response
+and latency, into a cassette file; a replay server later answers the same
+requests from the cassette, either at the recorded latency or as fast as
+possible. Profiling the deployer, the Chainlink automation or the ingest
+path against a replay is repeatable and offline, so runs before and after
+a change can be compared without network jitter.
+
+Cassettes are gzip-compressed msgpack streams: a header, then one map per
+exchange (service, method, path, request body, status, content type,
+response body, start offset and latency). Auth headers are not recorded.
+
+Replay matching, per service:
+    exact       same method, path with query and request body, in recorded order
+    path        same method and path, in recorded order (bodies that embed
+                a timestamp, for example)
+    repeat      the last response served for that path, once the recording
+                has run out (status polling beyond the recorded session)
+Anything else is a miss and gets a 404.
+
+Usage:
+    python node_cassette.py record run.cassette [--algod URL] [--indexer URL] [--port 4101]
+    ALGOD_ADDRESS=http://127.0.0.1:4101 python deploy.py
+    python node_cassette.py replay run.cassette [--speed 1] [--port 4101]
+    python node_cassette.py info run.cassette
+    python node_cassette.py --check
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import msgpack
+
+from instrumentation import DEFAULT_ALGOD_ADDRESS
+
+CASSETTE_FORMAT = "vcm-cassette"
+CASSETTE_VERSION = 1
+DEFAULT_PORTS = {"algod": 4101, "indexer": 4102}
+UPSTREAM_TIMEOUT = 90  # longer than algod's one-minute wait-for-block-after
+# Request headers passed on to the node; everything else is hop-by-hop or noise
+FORWARD_HEADERS = ("X-Algo-API-Token", "X-Indexer-API-Token", "X-API-Key", "Content-Type",
+                   "Accept", "User-Agent")
+MATCH_KINDS = ("exact", "path", "repeat", "miss")
+
+
+class CassetteError(Exception):
+    """Raised when a cassette file is missing or not a cassette"""
+
+
+def _digest(body):
+    return hashlib.sha256(body).hexdigest()[:16] if body else ""
+
+
+class CassetteWriter:
+    """Appends exchanges to a cassette as they happen"""
+
+    def __init__(self, path, services):
+        self.file = gzip.open(path, "wb")
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file.write(self.packer.pack({
+            "format": CASSETTE_FORMAT, "version": CASSETTE_VERSION,
+            "recorded": int(time.time()), "services": services,
+        }))
+
+    def write(self, entry):
+        with self.lock:
+            self.file.write(self.packer.pack(entry))
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_cassette(path):
+    """(header, exchanges) of a cassette; a recording cut short keeps what was written"""
+    if not os.path.exists(path):
+        raise CassetteError(f"Cassette {path} not found")
+    unpacker = msgpack.Unpacker(raw=False)
+    with gzip.open(path, "rb") as f:
+        try:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                unpacker.feed(chunk)
+        except (EOFError, gzip.BadGzipFile) as e:
+            if isinstance(e, gzip.BadGzipFile):
+                raise CassetteError(f"{path} is not a cassette: {e}") from e
+    items = iter(unpacker)
+    header = next(items, None)
+    if not isinstance(header, dict) or header.get("format") != CASSETTE_FORMAT:
+        raise CassetteError(f"{path} is not a cassette")
+    if header["version"] > CASSETTE_VERSION:
+        raise CassetteError(f"{path} has cassette version {header['version']}, "
+                            f"this tool reads up to {CASSETTE_VERSION}")
+    return header, list(items)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.exchange("GET")
+
+    def do_POST(self):
+        self.exchange("POST")
+
+    def do_DELETE(self):
+        self.exchange("DELETE")
+
+    def log_message(self, format, *args):
+        if self.server.owner.verbose:
+            super().log_message(format, *args)
+
+    def exchange(self, method):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, content_type, payload = self.server.owner.respond(
+            self.server.service, method, self.path, self.headers, body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _Proxy:
+    """One HTTP server per service, each answering through `respond`"""
+
+    def __init__(self, ports, host="127.0.0.1", verbose=False):
+        self.verbose = verbose
+        self.servers = {}
+        for service, port in ports.items():
+            server = ThreadingHTTPServer((host, port), _Handler)
+            server.daemon_threads = True
+            server.owner = self
+            server.service = service
+            self.servers[service] = server
+        self._threads = []
+
+    def address(self, service="algod"):
+        host, port = self.servers[service].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._threads = [threading.Thread(target=server.serve_forever, daemon=True)
+                         for server in self.servers.values()]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def error(status, message):
+        return status, "application/json", json.dumps({"message": message}).encode()
+
+
+class Recorder(_Proxy):
+    """Forwards requests to the upstream nodes and records each exchange"""
+
+    def __init__(self, path, upstreams, ports=None, host="127.0.0.1", verbose=False):
+        ports = ports or {service: 0 for service in upstreams}
+        super().__init__({service: ports[service] for service in upstreams}, host, verbose)
+        self.upstreams = {service: url.rstrip("/") for service, url in upstreams.items()}
+        self.writer = CassetteWriter(path, self.upstreams)
+        self.started = time.monotonic()
+
+    def respond(self, service, method, path, headers, body):
+        forwarded = {name: headers[name] for name in FORWARD_HEADERS if name in headers}
+        request = Request(self.upstreams[service] + path, data=body if method != "GET" else None,
+                          headers=forwarded, method=method)
+        at = time.monotonic() - self.started
+        try:
+            with urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+                status, content_type = response.status, response.headers.get("Content-Type", "")
+                payload = response.read()
+        except HTTPError as e:
+            status, content_type = e.code, e.headers.get("Content-Type", "")
+            payload = e.read()
+        except (URLError, OSError) as e:
+            # Not recorded: a replay should not reproduce the proxy's own failures
+            return self.error(502, f"upstream {service} unavailable: {e}")
+        latency = time.monotonic() - self.started - at
+        self.writer.write({
+            "service": service, "method": method, "path": path, "body": body,
+            "status": status, "type": content_type, "response": payload,
+            "at": round(at, 6), "latency": round(latency, 6),
+        })
+        return status, content_type or "application/octet-stream", payload
+
+    def stop(self):
+        super().stop()
+        self.writer.close()
+
+
+class Replayer(_Proxy):
+    """Serves recorded responses; `speed` 0 answers at once, 1 at the recorded latency"""
+
+    def __init__(self, path, speed=0.0, ports=None, host="127.0.0.1", verbose=False):
+        self.header, entries = read_cassette(path)
+        services = sorted(self.header["services"])
+        ports = ports or {service: 0 for service in services}
+        super().__init__({service: ports.get(service, 0) for service in services}, host, verbose)
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.exact = defaultdict(deque)
+        self.by_path = defaultdict(deque)
+        self.last = {}
+        self.stats = Counter()
+        self.misses = []
+        for entry in entries:
+            entry["used"] = False
+            route = (entry["service"], entry["method"], entry["path"])
+            self.exact[route + (_digest(entry["body"]),)].append(entry)
+            self.by_path[route].append(entry)
+
+    @staticmethod
+    def _next(queue):
+        while queue and queue[0]["used"]:
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def match(self, service, method, path, body):
+        """(kind, entry) for a request; entry is None on a miss"""
+        route = (service, method, path)
+        with self.lock:
+            entry, kind = self._next(self.exact[route + (_digest(body),)]), "exact"
+            if entry is None:
+                entry, kind = self._next(self.by_path[route]), "path"
+            if entry is None:
+                entry, kind = self.last.get(route), "repeat"
+            if entry is None:
+                kind = "miss"
+                self.misses.append(f"{method} {path}")
+            else:
+                entry["used"] = True
+                self.last[route] = entry
+            self.stats[kind] += 1
+        return kind, entry
+
+    def respond(self, service, method, path, headers, body):
+        kind, entry = self.match(service, method, path, body)
+        if entry is None:
+            return self.error(404, f"not in cassette: {method} {path}")
+        if self.speed:
+            time.sleep(entry["latency"] / self.speed)
+        return entry["status"], entry["type"] or "application/octet-stream", entry["response"]
+
+    def summary(self):
+        served = ", ".join(f"{self.stats[kind]} {kind}" for kind in MATCH_KINDS)
+        return f"{sum(self.stats.values())} requests: {served}"
+
+
+_ID = re.compile(r"/(?:\d+|[A-Z2-7]{52}|[A-Z2-7]{58})(?=/|$)")
+
+
+def endpoint_of(entry):
+    """Path template of an exchange: query dropped, rounds, IDs and addresses elided"""
+    return f"{entry['service']} {entry['method']} {_ID.sub('/{id}', entry['path'].split('?')[0])}"
+
+
+def info(path):
+    """Per-endpoint request counts, bytes and node time of a cassette"""
+    header, entries = read_cassette(path)
+    rows = defaultdict(lambda: [0, 0, 0.0])
+    for entry in entries:
+        row = rows[endpoint_of(entry)]
+        row[0] += 1
+        row[1] += len(entry["response"])
+        row[2] += entry["latency"]
+    span = max((entry["at"] + entry["latency"] for entry in entries), default=0.0)
+    recorded = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(header["recorded"]))
+    print(f"📼 {path}: {len(entries)} exchanges over {span:.2f}s, recorded {recorded} UTC")
+    for service, url in sorted(header["services"].items()):
+        print(f"   {service}: {url}")
+    print(f"{'endpoint':<58} {'requests':>8} {'bytes':>10} {'node ms':>9}")
+    for endpoint, (count, size, latency) in sorted(rows.items(), key=lambda item: -item[1][2]):
+        print(f"{endpoint:<58} {count:>8} {size:>10} {latency * 1000:>9.1f}")
+
+
+# Checks
+
+CHECK_SEED = bytes(range(32))
+CHECK_TIMESTAMP = 1_700_000_000
+
+
+def _fixed_account(seed):
+    """(private key, address) from a fixed seed, so replayed signatures match"""
+    import base64
+
+    from algosdk import account
+    from nacl.signing import SigningKey
+
+    key = SigningKey(seed)
+    private_key = base64.b64encode(bytes(key) + bytes(key.verify_key)).decode()
+    return private_key, account.address_from_private_key(private_key)
+
+
+def workload(algod_address, private_key, directory):
+    """Deploy, automation and ingest against one node; returns what they observed"""
+    from algosdk.v2client import algod
+
+    from chainlink_automation import ChainlinkAutomation
+    from deploy import VirtualCardManagerDeployer
+    from ingest import BlockFollower, open_sink
+    from mock_algod import quietly
+
+    client = algod.AlgodClient("", algod_address)
+    deployer = VirtualCardManagerDeployer(client, private_key, network="cassette")
+    steps = [deployer.deploy_contract, lambda: deployer.fund_contract(5),
+             deployer.setup_chainlink_integration, deployer.create_test_card]
+    if not all(quietly(step) for step in steps):
+        raise AssertionError("deployment failed")
+    automation = ChainlinkAutomation(client, private_key, deployer.app_id)
+    if not quietly(automation.update_prices, {"USD": 0.25}, CHECK_TIMESTAMP):
+        raise AssertionError("price update failed")
+
+    sink = open_sink(f"jsonl:{os.path.join(directory, 'events')}-{time.monotonic_ns()}.jsonl")
+    follower = BlockFollower(client, deployer.app_id, sink)
+    tip = quietly(lambda: follower.follow(from_round=1, once=True))
+    kinds = [event.kind for event in sink.events()]
+    sink.close()
+    return {"app_id": deployer.app_id, "tip": tip, "events": kinds}
+
+
+def check():
+    import tempfile
+
+    from mock_algod import MockAlgod
+
+    problems = []
+    private_key, address = _fixed_account(CHECK_SEED)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.cassette")
+        with MockAlgod() as node:
+            node.chain.fund(address)
+            with Recorder(path, {"algod": node.address}) as recorder:
+                started = time.perf_counter()
+                recorded = workload(recorder.address(), private_key, directory)
+                recorded_seconds = time.perf_counter() - started
+        size = os.path.getsize(path)
+        _, entries = read_cassette(path)
+        print(f"📼 Recorded {len(entries)} exchanges ({size / 1024:.1f} KiB) "
+              f"in {recorded_seconds:.2f}s")
+
+        for speed in (0.0, 1.0):
+            with Replayer(path, speed) as replayer:
+                started = time.perf_counter()
+                try:
+                    replayed = workload(replayer.address(), private_key, directory)
+                except AssertionError as e:
+                    replayed = {"error": str(e)}
+                seconds = time.perf_counter() - started
+            label = "as fast as possible" if not speed else "at recorded latency"
+            print(f"🔄 Replayed {label} in {seconds:.2f}s ({replayer.summary()})")
+            if replayed != recorded:
+                problems.append(f"replay at speed {speed} observed {replayed}, "
+                                f"recorded {recorded}")
+            if replayer.stats["miss"] or replayer.stats["path"]:
+                problems.append(f"replay at speed {speed} did not match exactly: "
+                                f"{replayer.summary()} {replayer.misses[:3]}")
+            if speed and seconds < sum(entry["latency"] for entry in entries) * 0.9:
+                problems.append("replay at recorded latency ran faster than the recording")
+
+        # Past the end of the recording: polls repeat the last answer, and
+        # requests that were never recorded are misses
+        with Replayer(path) as replayer:
+            from algosdk.error import AlgodHTTPError
+            from algosdk.v2client import algod
+
+            workload(replayer.address(), private_key, directory)
+            client = algod.AlgodClient("", replayer.address())
+            try:
+                client.application_info(recorded["app_id"] + 1)
+                problems.append("an unrecorded request was answered")
+            except AlgodHTTPError as e:
+                if e.code != 404 or replayer.stats["miss"] != 1:
+                    problems.append(f"unrecorded request failed with {e.code}: {e}")
+            statuses = [client.status()["last-round"] for _ in range(3)]
+            if statuses != [recorded["tip"]] * 3 or replayer.stats["repeat"] != 3:
+                problems.append(f"status polled past the recording returned {statuses}")
+    for problem in problems:
+        print(f"❌ {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or replay algod/indexer traffic")
+    parser.add_argument("mode", nargs="?", choices=("record", "replay", "info"))
+    parser.add_argument("cassette", nargs="?")
+    parser.add_argument("--algod", default=os.getenv("ALGOD_ADDRESS", DEFAULT_ALGOD_ADDRESS),
+                        help="Node to record (default: ALGOD_ADDRESS or TestNet)")
+    parser.add_argument("--indexer", default=os.getenv("INDEXER_ADDRESS"),
+                        help="Indexer to record as well (default: INDEXER_ADDRESS)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORTS["algod"])
+    parser.add_argument("--indexer-port", type=int, default=DEFAULT_PORTS["indexer"])
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay speed: 1 keeps recorded latencies, 0 answers at once")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    parser.add_argument("--check", action="store_true",
+                        help="Record a deploy/automation/ingest run against mock_algod.py "
+                             "and replay it")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = check()
+        if failures:
+            print(f"❌ {failures} cassette checks failed")
+            return 1
+        print("✅ Replays reproduce the recorded deploy, automation and ingest run")
+        return 0
+    if args.mode is None or args.cassette is None:
+        parser.error("mode and cassette are required")
+
+    try:
+        if args.mode == "info":
+            info(args.cassette)
+            return 0
+        ports = {"algod": args.port, "indexer": args.indexer_port}
+        if args.mode == "record":
+            upstreams = {"algod": args.algod}
+            if args.indexer:
+                upstreams["indexer"] = args.indexer
+            proxy = Recorder(args.cassette, upstreams, ports, args.host, args.verbose)
+            print(f"🔴 Recording into {args.cassette}")
+        else:
+            proxy = Replayer(args.cassette, args.speed, ports, args.host, args.verbose)
+            timing = f"{args.speed}x recorded latency" if args.speed else "no delay"
+            print(f"▶️ Replaying {args.cassette} ({timing})")
+    except (CassetteError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    proxy.start()
+    for service in sorted(proxy.servers):
+        variable = "ALGOD_ADDRESS" if service == "algod" else "INDEXER_ADDRESS"
+        print(f"💡 export {variable}={proxy.address(service)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.stop()
+    if args.mode == "record":
+        print(f"\n📼 Recorded {proxy.writer.count} exchanges into {args.cassette}")
+    else:
+        print(f"\n📋 Replayed {proxy.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Deviation-threshold price pusher for the Virtual Card Manager
+Watches a price source and pushes through ChainlinkAutomation.update_prices
+only when a currency moved more than the deviation threshold since its last
+push, or its heartbeat is due. Observations between pushes are coalesced to
+the latest per currency, and everything due goes out in one batched call.
+
+Usage:
+    python price_pusher.py --source mock --dry-run
+    python price_pusher.py --source prices.json --deviation 0.005 --heartbeat 1800
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from price_table import (
+    PRICE_MAX_AGE, PRICE_SCALE, SUPPORTED_CURRENCIES, latest_timestamp, read_price_table,
+)
+
+DEFAULT_DEVIATION = 0.005  # 0.5%
+DEFAULT_HEARTBEAT = PRICE_MAX_AGE // 2
+# Once a batch is going out anyway, currencies this far into their heartbeat
+# or deviation threshold ride along instead of needing their own transaction
+# soon after
+PIGGYBACK_FRACTION = 0.5
+
+
+class MockFeed:
+    """Random-walk prices, for local runs and dry runs"""
+
+    def __init__(self, prices=None, volatility=0.002, seed=None):
+        self.prices = dict(prices or {
+            "USDC": 5.0, "USD": 5.0, "WST": 1.85, "NZD": 3.0, "AUD": 3.3, "FJD": 2.25,
+        })
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+
+    def read(self):
+        for currency, price in self.prices.items():
+            self.prices[currency] = price * (1 + self.rng.gauss(0, self.volatility))
+        return dict(self.prices)
+
+
+class FileFeed:
+    """Prices from a JSON file ({currency: price}) that another process rewrites"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                prices = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read {self.path}: {e}")
+            return {}
+        return {currency: float(price) for currency, price in prices.items()}
+
+
+class PricePusher:
+    def __init__(self, automation=None, deviation=DEFAULT_DEVIATION, heartbeat=DEFAULT_HEARTBEAT,
+                 currencies=SUPPORTED_CURRENCIES, clock=None):
+        if heartbeat >= PRICE_MAX_AGE:
+            raise ValueError(
+                f"Heartbeat must be shorter than the contract's {PRICE_MAX_AGE}s price max age"
+            )
+        self.automation = automation
+        self.deviation = deviation
+        self.heartbeat = heartbeat
+        self.currencies = set(currencies)
+        # When pushing, observations are stamped and aged in chain time: the
+        # contract rejects entries newer than the last block, which lags
+        # wall clock
+        if clock is None:
+            clock = time.time if automation is None else self._chain_time
+        self.clock = clock
+        # currency -> (price, observed at) of the last push, and latest observation
+        self.pushed = {}
+        self.pending = {}
+        self.stats = {"observations": 0, "pushes": 0, "entries": 0, "failed": 0}
+
+    def _chain_time(self):
+        return latest_timestamp(self.automation.algod_client)
+
+    def load_pushed(self, algod_client, app_id):
+        """Start from the prices already cached on chain"""
+        for currency, (units, timestamp) in read_price_table(algod_client, app_id).items():
+            if currency in self.currencies:
+                self.pushed[currency] = (units / PRICE_SCALE, timestamp)
+
+    def observe(self, prices, timestamp=None):
+        timestamp = int(self.clock()) if timestamp is None else timestamp
+        for currency, price in prices.items():
+            if currency in self.currencies and price > 0:
+                self.pending[currency] = (price, timestamp)
+                self.stats["observations"] += 1
+
+    def _moved(self, currency, fraction=1.0):
+        price, _ = self.pending[currency]
+        last_price, _ = self.pushed[currency]
+        return abs(price - last_price) / last_price >= self.deviation * fraction
+
+    def _age(self, currency, now):
+        return now - self.pushed[currency][1]
+
+    def due(self, now=None):
+        """Currencies to push now; empty when nothing crossed a threshold"""
+        now = int(self.clock()) if now is None else now
+        triggered = [
+            currency for currency in self.pending
+            if currency not in self.pushed
+            or self._age(currency, now) >= self.heartbeat
+            or self._moved(currency)
+        ]
+        if not triggered:
+            return []
+        riders = [
+            currency for currency in self.pending
+            if currency not in triggered
+            and (self._age(currency, now) >= self.heartbeat * PIGGYBACK_FRACTION
+                 or self._moved(currency, PIGGYBACK_FRACTION))
+        ]
+        return sorted(triggered + riders)
+
+    def flush(self, now=None):
+        """Push everything due in one batch; returns the currencies pushed"""
+        batch = {currency: self.pending[currency] for currency in self.due(now)}
+        if not batch:
+            return []
+        if self.automation is None:
+            print("🧪 Would push " + ", ".join(
+                f"{currency}={price:.6f}" for currency, (price, _) in sorted(batch.items())
+            ))
+        elif not self.automation.update_prices(batch):
+            self.stats["failed"] += 1
+            return []
+        self.pushed.update(batch)
+        for currency in batch:
+            del self.pending[currency]
+        self.stats["pushes"] += 1
+        self.stats["entries"] += len(batch)
+        return sorted(batch)
+
+    def run(self, source, interval=10, iterations=None):
+        count = 0
+        while iterations is None or count < iterations:
+            self.observe(source.read())
+            self.flush()
+            count += 1
+            if iterations is None or count < iterations:
+                time.sleep(interval)
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Push prices on deviation or heartbeat")
+    parser.add_argument("--source", default="mock", help="'mock' or a JSON price file")
+    parser.add_argument("--deviation", type=float, default=DEFAULT_DEVIATION)
+    parser.add_argument("--heartbeat", type=int, default=DEFAULT_HEARTBEAT)
+    parser.add_argument("--interval", type=float, default=10)
+    parser.add_argument("--iterations", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="Print batches instead of pushing")
+    args = parser.parse_args(argv)
+
+    source = MockFeed() if args.source == "mock" else FileFeed(args.source)
+    automation = None
+    if not args.dry_run:
+        from algosdk import mnemonic
+
+        from chainlink_automation import ChainlinkAutomation
+        from instrumentation import algod_client_from_env
+
+        automation_mnemonic = os.getenv("CHAINLINK_AUTOMATION_MNEMONIC")
+        if not automation_mnemonic:
+            print("❌ Please set CHAINLINK_AUTOMATION_MNEMONIC environment variable")
+            return 1
+        try:
+            with open("deployment_testnet.json", "r") as f:
+                app_id = json.load(f)["app_id"]
+        except FileNotFoundError:
+            print("❌ Deployment file not found. Please deploy the contract first.")
+            return 1
+        algod_client = algod_client_from_env()
+        automation = ChainlinkAutomation(
+            algod_client, mnemonic.to_private_key(automation_mnemonic), app_id
+        )
+
+    pusher = PricePusher(automation, args.deviation, args.heartbeat)
+    if automation is not None:
+        pusher.load_pushed(automation.algod_client, automation.app_id)
+    print(f"📡 Pushing on {args.deviation:.2%} deviation or {args.heartbeat}s heartbeat")
+    try:
+        stats = pusher.run(source, args.interval, args.iterations)
+    except KeyboardInterrupt:
+        stats = pusher.stats
+    print(
+        f"📊 {stats['observations']} observations -> {stats['pushes']} pushes "
+        f"({stats['entries']} entries, {stats['failed']} failed)"
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Price table encoding for the Virtual Card Manager
+update_prices takes every currency's (price, timestamp) in one packed
+argument, and the contract caches each in a global "px" + currency entry
+that use_card converts card-currency spends with. These helpers pack
+updates and read the cached table back
+
+Usage:
+    python price_table.py <app_id>
+"""
+
+import base64
+import sys
+import time
+
+# Must match virtual_card_manager.py; kept here so tools do not import PyTeal
+PRICE_KEY_PREFIX = b"px"
+CURRENCY_CODE_SIZE = 8
+PRICE_ENTRY_SIZE = CURRENCY_CODE_SIZE + 16
+MAX_PRICE_ENTRIES = 8
+PRICE_SCALE = 1_000_000
+PRICE_MAX_AGE = 3600
+
+SUPPORTED_CURRENCIES = ("USDC", "WST", "USD", "NZD", "AUD", "FJD")
+
+
+def currency_code(currency):
+    """Zero-padded on-chain currency code"""
+    raw = currency.encode() if isinstance(currency, str) else bytes(currency)
+    if not raw or len(raw) > CURRENCY_CODE_SIZE:
+        raise ValueError(f"Currency codes are 1-{CURRENCY_CODE_SIZE} bytes, got {raw!r}")
+    return raw.ljust(CURRENCY_CODE_SIZE, b"\0")
+
+
+def price_key(currency):
+    return PRICE_KEY_PREFIX + currency_code(currency)
+
+
+def price_units(price):
+    """Scaled integer price from a float or Decimal quote"""
+    units = int(round(price * PRICE_SCALE))
+    if units <= 0:
+        raise ValueError(f"Prices must be positive, got {price}")
+    return units
+
+
+def latest_timestamp(algod_client):
+    """
+    Timestamp of the last block. The contract rejects entries newer than
+    Global.latest_timestamp(), which lags wall clock by up to a block
+    """
+    last_round = algod_client.status()["last-round"]
+    return algod_client.block_info(last_round)["block"]["ts"]
+
+
+def pack_prices(prices, timestamp=None, not_after=None):
+    """
+    Packed update_prices argument(s) from {currency: price} or
+    {currency: (price, timestamp)}; returns one chunk per call.
+    Timestamps are clamped to `not_after` (see latest_timestamp)
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    entries = []
+    for currency, quote in sorted(prices.items()):
+        price, observed = quote if isinstance(quote, tuple) else (quote, timestamp)
+        if not_after is not None:
+            observed = min(int(observed), not_after)
+        entries.append(
+            currency_code(currency)
+            + price_units(price).to_bytes(8, "big")
+            + int(observed).to_bytes(8, "big")
+        )
+    return [
+        b"".join(entries[i:i + MAX_PRICE_ENTRIES])
+        for i in range(0, len(entries), MAX_PRICE_ENTRIES)
+    ]
+
+
+def unpack_prices(packed):
+    """{currency: (price units, timestamp)} from a packed argument or log"""
+    if len(packed) % PRICE_ENTRY_SIZE:
+        raise ValueError(f"Packed prices must be a multiple of {PRICE_ENTRY_SIZE} bytes")
+    prices = {}
+    for offset in range(0, len(packed), PRICE_ENTRY_SIZE):
+        entry = packed[offset:offset + PRICE_ENTRY_SIZE]
+        currency = entry[:CURRENCY_CODE_SIZE].rstrip(b"\0").decode()
+        prices[currency] = (
+            int.from_bytes(entry[CURRENCY_CODE_SIZE:CURRENCY_CODE_SIZE + 8], "big"),
+            int.from_bytes(entry[CURRENCY_CODE_SIZE + 8:], "big"),
+        )
+    return prices
+
+
+def prices_from_global_state(entries):
+    """{currency: (price units, timestamp)} from algod global-state entries"""
+    table = {}
+    for entry in entries:
+        key = base64.b64decode(entry["key"])
+        if key.startswith(PRICE_KEY_PREFIX) and len(key) == len(PRICE_KEY_PREFIX) + CURRENCY_CODE_SIZE:
+            value = base64.b64decode(entry["value"].get("bytes", ""))
+            currency = key[len(PRICE_KEY_PREFIX):].rstrip(b"\0").decode()
+            table[currency] = (int.from_bytes(value[:8], "big"), int.from_bytes(value[8:16], "big"))
+    return table
+
+
+def read_price_table(algod_client, app_id):
+    """Cached {currency: (price units, timestamp)} from the application's global state"""
+    app = algod_client.application_info(app_id)
+    return prices_from_global_state(app["params"].get("global-state", []))
+
+
+def is_stale(timestamp, now=None):
+    now = int(time.time()) if now is None else now
+    return timestamp + PRICE_MAX_AGE < now
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 1:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    table = read_price_table(algod_client, int(args[0]))
+    if not table:
+        print("❌ No cached prices")
+        return 1
+    now = int(time.time())
+    for currency, (price, timestamp) in sorted(table.items()):
+        status = "⚠️ stale" if is_stale(timestamp, now) else "✅"
+        print(f"{status} {currency:<8} {price / PRICE_SCALE:>14.6f}  {now - timestamp}s old")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,508 @@
+"""
+Chain <-> Supabase card reconciliation by hash partitions
+Card state is bucketed into partitions by a hash of the holder address,
+and each partition is summarized by its row count and two sums of 32-bit
+row digests. Both sides compute the same digests: the chain side from a
+local cache of card local state, the database side in SQL through the
+card_partition / card_digest functions (supabase/migrations, or Python
+functions registered on the SQLite stand-in). One GROUP BY query compares
+the whole fleet, and only partitions whose digests differ are re-read from
+algod and fetched from the database, then fixed by upserting chain state.
+
+The chain cache stays current incrementally: addresses with events in the
+local event store since the last run are re-read from algod; --full
+re-reads every card holder.
+
+Usage:
+    python reconcile.py <app_id> --db postgres:<dsn> [--events <store>] [--full] [--dry-run]
+    python reconcile.py --check
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal
+
+from algosdk.error import AlgodHTTPError
+
+from card_index import CARD_ID_SIZE, card_number
+from card_sweeper import decode_local_state
+
+DEFAULT_PARTITIONS = 256
+# virtual_cards.kyc_tier values for the contract's tiers 1-3
+KYC_TIERS = {1: "BASIC", 2: "STANDARD", 3: "ENHANCED"}
+CARD_FIELDS = ("address", "card_id", "balance", "currency", "kyc_tier", "region", "is_active")
+
+
+def _whole(value):
+    """Balance as an integer, rounded half up like Postgres round(numeric)"""
+    return int(Decimal(str(value)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def card_partition(address, partitions):
+    """Partition of an address; matches card_partition() in SQL"""
+    return int(_md5(address)[:8], 16) % partitions
+
+
+def card_digest(part, address, card_id, balance, currency, kyc_tier, region, is_active):
+    """32-bit digest `part` (0 or 1) of a card row; matches card_digest() in SQL"""
+    canonical = "|".join((
+        address, str(card_id), str(_whole(balance or 0)), currency or "", kyc_tier or "",
+        region or "", "1" if is_active else "0",
+    ))
+    return int(_md5(canonical)[8 * part:8 * part + 8], 16)
+
+
+class CardRow:
+    __slots__ = CARD_FIELDS
+
+    def __init__(self, address, card_id, balance, currency, kyc_tier, region, is_active):
+        self.address = address
+        self.card_id = str(card_id)
+        self.balance = _whole(balance or 0)
+        self.currency = currency
+        self.kyc_tier = kyc_tier
+        self.region = region
+        self.is_active = bool(is_active)
+
+    @classmethod
+    def from_local_state(cls, address, state):
+        """Row for an account's local state, or None when it holds no card"""
+        raw = state.get("card_id")
+        if not isinstance(raw, bytes) or len(raw) != CARD_ID_SIZE:
+            return None
+
+        def text(key):
+            value = state.get(key, b"")
+            return value.decode(errors="replace") if isinstance(value, bytes) else str(value)
+
+        tier = state.get("kyc_tier", 0)
+        return cls(address, card_number(raw), state.get("balance", 0), text("currency"),
+                   KYC_TIERS.get(tier, str(tier)), text("region"), state.get("is_active", 0))
+
+    def fields(self):
+        return tuple(getattr(self, field) for field in CARD_FIELDS)
+
+    @property
+    def counted(self):
+        """Inactive, empty cards are left out of digests on both sides"""
+        return self.is_active or self.balance > 0
+
+    def digests(self):
+        return card_digest(0, *self.fields()), card_digest(1, *self.fields())
+
+    def __repr__(self):
+        return f"CardRow({', '.join(f'{field}={getattr(self, field)!r}' for field in CARD_FIELDS)})"
+
+
+def _digest_map(rows):
+    return {part: (count, int(d0 or 0), int(d1 or 0)) for part, count, d0, d1 in rows}
+
+
+class ChainState:
+    """Local SQLite cache of card local state, with stored partitions and digests"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chain_cards (
+        address TEXT PRIMARY KEY,
+        card_id TEXT NOT NULL,
+        balance INTEGER NOT NULL,
+        currency TEXT,
+        kyc_tier TEXT,
+        region TEXT,
+        is_active INTEGER NOT NULL,
+        part INTEGER NOT NULL,
+        counted INTEGER NOT NULL,
+        d0 INTEGER NOT NULL,
+        d1 INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS chain_cards_part ON chain_cards (part);
+    CREATE TABLE IF NOT EXISTS chain_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """
+
+    def __init__(self, path, algod_client, app_id, partitions=DEFAULT_PARTITIONS, threads=8):
+        self.algod_client = algod_client
+        self.app_id = app_id
+        self.partitions = partitions
+        self.threads = threads
+        self.fetches = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        if self._meta("partitions") not in (None, partitions):
+            # Partition count changed; restamp every cached row
+            with self.conn:
+                for address, in self.conn.execute("SELECT address FROM chain_cards").fetchall():
+                    self.conn.execute("UPDATE chain_cards SET part = ? WHERE address = ?",
+                                      (card_partition(address, partitions), address))
+        self._set_meta("partitions", partitions)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM chain_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO chain_meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value)
+            )
+
+    @property
+    def round(self):
+        """Last event store round the cache was brought up to"""
+        return self._meta("round")
+
+    def fetch(self, address):
+        self.fetches += 1
+        try:
+            info = self.algod_client.account_application_info(address, self.app_id)
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        state = decode_local_state(info.get("app-local-state", {}).get("key-value", []))
+        return CardRow.from_local_state(address, state)
+
+    def refresh(self, addresses):
+        """Re-read addresses from algod; returns how many were read"""
+        addresses = sorted(set(addresses))
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            rows = list(pool.map(self.fetch, addresses))
+        with self.conn:
+            for address, row in zip(addresses, rows):
+                if row is None:
+                    self.conn.execute("DELETE FROM chain_cards WHERE address = ?", (address,))
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO chain_cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row.fields() + (card_partition(address, self.partitions), row.counted,
+                                    *row.digests()),
+                )
+        return len(addresses)
+
+    def refresh_from_events(self, store):
+        """Re-read every address with events after the cache's round"""
+        after = self.round
+        addresses = set()
+        last = after
+        for event in store.scan(after + 1 if after is not None else None):
+            addresses.add(event.address)
+            last = event.round
+        self.refresh(addresses)
+        if last is not None:
+            self._set_meta("round", last)
+        return len(addresses)
+
+    def addresses(self, part=None):
+        if part is None:
+            return [row[0] for row in self.conn.execute("SELECT address FROM chain_cards")]
+        return [row[0] for row in self.conn.execute(
+            "SELECT address FROM chain_cards WHERE part = ?", (part,)
+        )]
+
+    def digests(self):
+        return _digest_map(self.conn.execute(
+            "SELECT part, count(*), sum(d0), sum(d1) FROM chain_cards WHERE counted GROUP BY part"
+        ))
+
+    def rows(self, part):
+        columns = ", ".join(CARD_FIELDS)
+        return [CardRow(*row) for row in self.conn.execute(
+            f"SELECT {columns} FROM chain_cards WHERE part = ?", (part,)
+        )]
+
+    def close(self):
+        self.conn.close()
+
+
+class CardTable:
+    """The virtual_cards table kept by algorand-sync, in Postgres or a SQLite stand-in"""
+
+    # Same table shape as the Supabase one, for local runs and checks
+    SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS virtual_cards (
+        id TEXT PRIMARY KEY,
+        user_id TEXT,
+        user_address TEXT NOT NULL,
+        currency TEXT DEFAULT 'ALGO',
+        balance NUMERIC DEFAULT 0,
+        kyc_tier TEXT DEFAULT 'BASIC',
+        region TEXT DEFAULT 'samoa',
+        is_active BOOLEAN DEFAULT 1,
+        last_synced_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    ROW_COLUMNS = "user_address, id, balance, currency, kyc_tier, region, is_active"
+
+    def __init__(self, conn, postgres=False):
+        self.conn = conn
+        self.postgres = postgres
+        self.queries = 0
+
+    @classmethod
+    def open(cls, spec):
+        """CardTable for sqlite:<path> or postgres:<dsn>"""
+        kind, _, target = spec.partition(":")
+        if kind == "sqlite":
+            conn = sqlite3.connect(target)
+            conn.create_function("card_partition", 2, card_partition, deterministic=True)
+            conn.create_function("card_digest", 8, card_digest, deterministic=True)
+            conn.executescript(cls.SQLITE_SCHEMA)
+            return cls(conn)
+        if kind in ("postgres", "postgresql", "supabase"):
+            try:
+                import psycopg
+            except ImportError:
+                raise RuntimeError(
+                    "The postgres database needs psycopg (pip install 'psycopg[binary]')"
+                )
+            return cls(psycopg.connect(target), postgres=True)
+        raise ValueError(f"Database spec must be sqlite:<path> or postgres:<dsn>, got {spec}")
+
+    def _execute(self, statement, params=()):
+        self.queries += 1
+        if self.postgres:
+            statement = statement.replace("?", "%s")
+        cursor = self.conn.cursor()
+        cursor.execute(statement, params)
+        return cursor
+
+    def digests(self, partitions):
+        columns = self.ROW_COLUMNS
+        return _digest_map(self._execute(
+            f"SELECT card_partition(user_address, ?) AS part, count(*), "
+            f"sum(card_digest(0, {columns})), sum(card_digest(1, {columns})) "
+            f"FROM virtual_cards WHERE is_active OR balance > 0 GROUP BY part",
+            (partitions,),
+        ).fetchall())
+
+    def rows(self, part, partitions):
+        return [CardRow(*row) for row in self._execute(
+            f"SELECT {self.ROW_COLUMNS} FROM virtual_cards "
+            f"WHERE card_partition(user_address, ?) = ?", (partitions, part)
+        ).fetchall()]
+
+    def apply(self, upserts, retired):
+        """Write chain state for `upserts` and retire card IDs no longer on chain"""
+        for row in upserts:
+            self._execute(
+                "INSERT INTO virtual_cards (id, user_address, balance, currency, kyc_tier, region, "
+                "is_active) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "user_address = excluded.user_address, balance = excluded.balance, "
+                "currency = excluded.currency, kyc_tier = excluded.kyc_tier, "
+                "region = excluded.region, is_active = excluded.is_active, "
+                "last_synced_at = CURRENT_TIMESTAMP",
+                (row.card_id, row.address, row.balance, row.currency, row.kyc_tier, row.region,
+                 row.is_active),
+            )
+        for card_id in retired:
+            self._execute(
+                "UPDATE virtual_cards SET is_active = false, balance = 0, "
+                "last_synced_at = CURRENT_TIMESTAMP WHERE id = ?", (card_id,)
+            )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def diff_partition(chain_rows, db_rows):
+    """(upserts, retired card IDs) that make the database rows match the chain"""
+    chain = {row.card_id: row for row in chain_rows}
+    db = {row.card_id: row for row in db_rows}
+    upserts = [
+        row for card_id, row in chain.items()
+        if (row.counted or (card_id in db and db[card_id].counted))
+        and (card_id not in db or db[card_id].fields() != row.fields())
+    ]
+    retired = [card_id for card_id, row in db.items() if row.counted and card_id not in chain]
+    return upserts, retired
+
+
+def reconcile(chain, table, fix=True):
+    """Compare partition digests and repair the partitions that differ; returns a report"""
+    partitions = chain.partitions
+    chain_digests = chain.digests()
+    db_digests = table.digests(partitions)
+    differing = sorted(
+        part for part in set(chain_digests) | set(db_digests)
+        if chain_digests.get(part) != db_digests.get(part)
+    )
+    report = {"partitions": partitions, "differing": differing, "upserts": [], "retired": []}
+    for part in differing:
+        db_rows = table.rows(part, partitions)
+        # The cache may be stale too: re-read every address either side knows in this partition
+        chain.refresh(set(chain.addresses(part)) | {row.address for row in db_rows})
+        upserts, retired = diff_partition(chain.rows(part), db_rows)
+        report["upserts"].extend(upserts)
+        report["retired"].extend(retired)
+        if fix and (upserts or retired):
+            table.apply(upserts, retired)
+    return report
+
+
+def encode_local_state(state):
+    """algod key-value entries for {key: int | bytes}"""
+    entries = []
+    for key, value in state.items():
+        encoded = {"type": 1, "bytes": base64.b64encode(value).decode()} \
+            if isinstance(value, bytes) else {"type": 2, "uint": value}
+        entries.append({"key": base64.b64encode(key.encode()).decode(), "value": encoded})
+    return entries
+
+
+class StaticLedger:
+    """algod stand-in answering account_application_info from {address: local state}"""
+
+    def __init__(self, states):
+        self.states = states
+
+    def account_application_info(self, address, app_id):
+        if address not in self.states:
+            raise AlgodHTTPError("account application info not found", 404)
+        key_values = encode_local_state(self.states[address])
+        return {"app-local-state": {"id": app_id, "key-value": key_values}}
+
+
+def check(cards=2000, partitions=64, seed=0):
+    """Drift a SQLite copy of a synthetic fleet and reconcile it back"""
+    import random
+
+    from algosdk import account
+
+    from card_index import card_id_bytes
+
+    rng = random.Random(seed)
+    addresses = [account.generate_account()[1] for _ in range(cards)]
+    states = {}
+    for n, address in enumerate(addresses, 1):
+        states[address] = {
+            "card_id": card_id_bytes(n), "balance": rng.randrange(0, 10 ** 9),
+            "currency": b"USD", "kyc_tier": rng.randint(1, 3), "region": b"samoa",
+            "is_active": 1 if rng.random() < 0.9 else 0,
+        }
+    ledger = StaticLedger(states)
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        chain = ChainState(os.path.join(directory, "chain.db"), ledger, 1, partitions)
+        chain.refresh(addresses)
+        table = CardTable.open(f"sqlite:{os.path.join(directory, 'supabase.db')}")
+        table.apply([row for part in range(partitions) for row in chain.rows(part)], [])
+
+        report = reconcile(chain, table)
+        if report["differing"]:
+            problems.append(f"in-sync copies differ in partitions {report['differing']}")
+
+        # Drift: a missed spend, a missed card, a card closed on chain, a missed deactivation
+        spent, stale, closed, deactivated = rng.sample(addresses, 4)
+        states[spent]["balance"] -= 1
+        states[deactivated]["is_active"] = 0
+        del states[closed]
+        extra = account.generate_account()[1]
+        states[extra] = {"card_id": card_id_bytes(cards + 1), "balance": 5, "currency": b"USD",
+                         "kyc_tier": 1, "region": b"samoa", "is_active": 1}
+        chain.refresh([spent, deactivated, closed, extra])
+        # ...and a change the database has but the chain cache missed
+        states[stale]["balance"] += 7
+        table._execute("UPDATE virtual_cards SET balance = balance + 7 WHERE user_address = ?",
+                       (stale,))
+        table.conn.commit()
+
+        chain.fetches = table.queries = 0
+        report = reconcile(chain, table)
+        touched = {card_partition(address, partitions)
+                   for address in (spent, deactivated, closed, extra, stale)}
+        if set(report["differing"]) != touched:
+            problems.append(
+                f"differing partitions {report['differing']}, expected {sorted(touched)}"
+            )
+        per_partition = cards / partitions
+        if chain.fetches > 2 * len(touched) * per_partition + 10:
+            problems.append(f"{chain.fetches} algod reads for {len(touched)} partitions")
+        print(f"   {len(report['differing'])}/{partitions} partitions differed: "
+              f"{len(report['upserts'])} upserts, {len(report['retired'])} retired, "
+              f"{chain.fetches} algod reads, {table.queries} database queries")
+
+        final = reconcile(chain, table)
+        if final["differing"]:
+            problems.append(f"partitions {final['differing']} still differ after fixing")
+        chain.close()
+        table.close()
+    for problem in problems:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile Supabase cards with chain state")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("--db", default=os.getenv("RECONCILE_DB"),
+                        help="sqlite:<path> or postgres:<dsn> holding virtual_cards")
+    parser.add_argument("--cache", default="reconcile_chain.db", help="Chain state cache")
+    parser.add_argument("--events", help="Event store directory for incremental refreshes")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS)
+    parser.add_argument("--full", action="store_true", help="Re-read every card holder first")
+    parser.add_argument("--dry-run", action="store_true", help="Report differences only")
+    parser.add_argument("--check", action="store_true",
+                        help="Reconcile a drifted local stand-in of a synthetic fleet")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        if problems:
+            print(f"❌ {problems} reconciliation checks failed")
+            return 1
+        print("✅ Only drifted partitions were fetched, and fixing them synced both sides")
+        return 0
+    if args.app_id is None or not args.db:
+        parser.error("app_id and --db are required")
+
+    from algosdk.v2client import indexer
+
+    from card_sweeper import iter_cards
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    try:
+        table = CardTable.open(args.db)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    chain = ChainState(args.cache, algod_client, args.app_id, args.partitions)
+    if args.full:
+        indexer_client = None
+        if os.getenv("INDEXER_ADDRESS"):
+            indexer_client = indexer.IndexerClient(
+                os.getenv("INDEXER_TOKEN", ""), os.getenv("INDEXER_ADDRESS")
+            )
+        holders = {card.address for card in iter_cards(algod_client, args.app_id, indexer_client)}
+        print(f"🔄 Re-read {chain.refresh(holders | set(chain.addresses()))} accounts")
+    if args.events:
+        from event_store import EventStore
+
+        refreshed = chain.refresh_from_events(EventStore(args.events))
+        print(f"🔄 Re-read {refreshed} accounts with new events")
+
+    report = reconcile(chain, table, fix=not args.dry_run)
+    print(f"📋 {len(report['differing'])}/{args.partitions} partitions differ "
+          f"({table.queries} database queries)")
+    for row in report["upserts"]:
+        print(f"   {'would fix' if args.dry_run else 'fixed'} card {row.card_id} ({row.address})")
+    for card_id in report["retired"]:
+        print(f"   {'would retire' if args.dry_run else 'retired'} card {card_id} (not on chain)")
+    chain.close()
+    table.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Columnar snapshot export of every card's state
+Streams card holders' decoded local state from the indexer (or the card
+index) in chunks, joins each chunk with per-card event aggregates from the
+local event store, and writes columns: Parquet or Arrow IPC when pyarrow is
+installed, otherwise .npz. Only one chunk of rows is in memory at a time;
+the .npz writer spools columns to disk and needs no third-party packages
+to write (numpy.load reads the result).
+
+Usage:
+    python snapshot_export.py <app_id> <output.parquet|.arrow|.npz> [--events <store>]
+    python snapshot_export.py --check
+"""
+
+import argparse
+import ast
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+
+from card_index import CARD_ID_SIZE, card_number
+
+DEFAULT_CHUNK_ROWS = 10_000
+
+# (column, type); "u64", "u8", "bool" or "str:<bytes>"
+STATE_COLUMNS = (
+    ("card_id", "u64"),
+    ("address", "str:58"),
+    ("balance", "u64"),
+    ("daily_spent", "u64"),
+    ("monthly_spent", "u64"),
+    ("daily_limit", "u64"),
+    ("monthly_limit", "u64"),
+    ("last_reset_day", "u64"),
+    ("last_reset_month", "u64"),
+    ("kyc_tier", "u8"),
+    ("region", "str:16"),
+    ("currency", "str:8"),
+    ("is_active", "bool"),
+)
+EVENT_COLUMNS = (
+    ("funded_count", "u64"),
+    ("funded_total", "u64"),
+    ("spent_count", "u64"),
+    ("spent_total", "u64"),
+    ("first_round", "u64"),
+    ("last_round", "u64"),
+)
+COLUMNS = STATE_COLUMNS + EVENT_COLUMNS
+
+_NPY_DESCR = {"u64": "<u8", "u8": "|u1", "bool": "|b1"}
+_STRUCT_CODES = {"u64": "Q", "u8": "B", "bool": "?"}
+
+
+class CardAggregates:
+    """Per-card event counts and totals, built in one pass over the event store"""
+
+    def __init__(self):
+        self.cards = {}
+
+    @classmethod
+    def from_store(cls, store):
+        aggregates = cls()
+        for event in store.scan():
+            aggregates.add(event)
+        return aggregates
+
+    def add(self, event):
+        entry = self.cards.get(event.card_id)
+        if entry is None:
+            entry = self.cards[event.card_id] = [0, 0, 0, 0, event.round, event.round]
+        if event.kind == "CardFunded":
+            entry[0] += 1
+            entry[1] += event.amount
+        elif event.kind == "CardUsed":
+            entry[2] += 1
+            entry[3] += event.amount
+        entry[5] = event.round
+
+    def row(self, card_id):
+        return self.cards.get(card_id, (0, 0, 0, 0, 0, 0))
+
+
+def card_row(address, state, aggregates=None):
+    """Export row for a holder's local state, or None when it holds no card"""
+    raw = state.get("card_id")
+    if not isinstance(raw, bytes) or len(raw) != CARD_ID_SIZE:
+        return None
+    card_id = card_number(raw)
+    row = [card_id, address]
+    for name, kind in STATE_COLUMNS[2:]:
+        value = state.get(name, b"" if kind.startswith("str") else 0)
+        if kind.startswith("str"):
+            value = value.decode(errors="replace") if isinstance(value, bytes) else str(value)
+        elif kind == "bool":
+            value = bool(value)
+        row.append(value)
+    row.extend((aggregates or CardAggregates()).row(card_id))
+    return row
+
+
+def iter_chunks(rows, chunk_rows):
+    """{column: [values]} for each chunk of rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield _columns(chunk)
+            chunk = []
+    if chunk:
+        yield _columns(chunk)
+
+
+def _columns(rows):
+    return {name: [row[i] for row in rows] for i, (name, _) in enumerate(COLUMNS)}
+
+
+class ArrowWriter:
+    """Parquet (row group per chunk) or Arrow IPC file (record batch per chunk)"""
+
+    def __init__(self, path, ipc=False):
+        import pyarrow as pa
+
+        self.pa = pa
+        types = {"u64": pa.uint64(), "u8": pa.uint8(), "bool": pa.bool_()}
+        self.schema = pa.schema([
+            (name, pa.string() if kind.startswith("str") else types[kind]) for name, kind in COLUMNS
+        ])
+        if ipc:
+            self.writer = pa.ipc.new_file(path, self.schema)
+            self.write_batch = self.writer.write_batch
+        else:
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+            self.write_batch = lambda batch: self.writer.write_table(
+                self.pa.Table.from_batches([batch])
+            )
+        self.rows = 0
+
+    def write(self, columns):
+        batch = self.pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        self.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self.writer.close()
+
+
+class NpzWriter:
+    """numpy .npz archive written without numpy: each column is spooled as raw
+    fixed-width values, then stored as one .npy member once the row count is known"""
+
+    def __init__(self, path):
+        self.path = path
+        self.spool = tempfile.mkdtemp(prefix="snapshot-", dir=os.path.dirname(path) or ".")
+        self.files = {name: open(os.path.join(self.spool, name), "wb") for name, _ in COLUMNS}
+        self.rows = 0
+
+    @staticmethod
+    def _descr(kind):
+        return f"|S{kind.split(':')[1]}" if kind.startswith("str") else _NPY_DESCR[kind]
+
+    def write(self, columns):
+        count = len(columns[COLUMNS[0][0]])
+        for name, kind in COLUMNS:
+            values = columns[name]
+            if kind.startswith("str"):
+                width = int(kind.split(":")[1])
+                data = b"".join(str(value).encode()[:width].ljust(width, b"\0") for value in values)
+            else:
+                data = struct.pack(f"<{count}{_STRUCT_CODES[kind]}", *values)
+            self.files[name].write(data)
+        self.rows += count
+
+    def _header(self, kind):
+        header = repr({"descr": self._descr(kind), "fortran_order": False, "shape": (self.rows,)})
+        # Magic, version and length take 10 bytes; pad so the data starts 64-byte aligned
+        padding = -(10 + len(header) + 1) % 64
+        header = (header + " " * padding + "\n").encode("latin1")
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
+
+    def close(self):
+        try:
+            temporary = f"{self.path}.tmp"
+            with zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                for name, kind in COLUMNS:
+                    self.files[name].close()
+                    with archive.open(f"{name}.npy", "w", force_zip64=True) as member, \
+                            open(os.path.join(self.spool, name), "rb") as raw:
+                        member.write(self._header(kind))
+                        shutil.copyfileobj(raw, member, 1 << 20)
+            os.replace(temporary, self.path)
+        finally:
+            shutil.rmtree(self.spool, ignore_errors=True)
+
+
+def read_npz(path):
+    """{column: [values]} of an .npz written by NpzWriter, without numpy"""
+    columns = {}
+    with zipfile.ZipFile(path) as archive:
+        for name, kind in COLUMNS:
+            data = archive.read(f"{name}.npy")
+            header_size = struct.unpack_from("<H", data, 8)[0]
+            header = ast.literal_eval(data[10:10 + header_size].decode("latin1"))
+            body = data[10 + header_size:]
+            count = header["shape"][0]
+            if kind.startswith("str"):
+                width = int(kind.split(":")[1])
+                columns[name] = [
+                    body[i * width:(i + 1) * width].rstrip(b"\0").decode() for i in range(count)
+                ]
+            else:
+                columns[name] = list(struct.unpack(f"<{count}{_STRUCT_CODES[kind]}", body))
+    return columns
+
+
+def open_writer(path, output_format=None):
+    """Writer for the output's format: parquet, arrow or npz (from the extension by default)"""
+    output_format = output_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if output_format in ("arrow", "feather", "ipc"):
+        return ArrowWriter(path, ipc=True)
+    if output_format == "parquet":
+        return ArrowWriter(path)
+    if output_format == "npz":
+        return NpzWriter(path)
+    raise ValueError(f"Unknown export format {output_format}; use .parquet, .arrow or .npz")
+
+
+def export(states, writer, aggregates=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write (address, local state) pairs through `writer` in chunks; returns the row count"""
+    rows = (card_row(address, state, aggregates) for address, state in states)
+    try:
+        for columns in iter_chunks((row for row in rows if row is not None), chunk_rows):
+            writer.write(columns)
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def check(cards=50_000, chunk_rows=5_000):
+    """Export a synthetic fleet to .npz in chunks and read it back"""
+    import random
+    import tracemalloc
+
+    from card_events import CardEvent
+    from card_index import card_id_bytes
+
+    rng = random.Random(0)
+
+    def states():
+        for n in range(1, cards + 1):
+            yield f"ADDR{n:054d}", {
+                "card_id": card_id_bytes(n), "balance": rng.randrange(10 ** 9),
+                "daily_spent": n % 1000, "monthly_spent": n % 5000, "daily_limit": 1_000_000,
+                "monthly_limit": 5_000_000, "last_reset_day": 19_000, "last_reset_month": 630,
+                "kyc_tier": n % 3 + 1, "region": b"samoa", "currency": b"USD",
+                "is_active": n % 7 != 0,
+            }
+        yield "NOCARD", {"balance": 5}
+
+    aggregates = CardAggregates()
+    for n in range(1, 2001):
+        aggregates.add(CardEvent(n, 0, 0, "CardFunded", n % 100 + 1, "", amount=10))
+        aggregates.add(CardEvent(n, 0, 1, "CardUsed", n % 100 + 1, "", amount=3))
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cards.npz")
+        tracemalloc.start()
+        start = time.perf_counter()
+        rows = export(states(), NpzWriter(path), aggregates, chunk_rows)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        columns = read_npz(path)
+        size = os.path.getsize(path)
+    print(f"   {rows} cards in {elapsed:.2f}s, peak {peak / 2 ** 20:.1f} MiB traced, "
+          f"{size / 2 ** 20:.1f} MiB written")
+    if rows != cards or len(columns["card_id"]) != cards:
+        problems.append(f"exported {rows} rows, read back {len(columns['card_id'])}")
+    if columns["card_id"][:3] != [1, 2, 3] or columns["address"][1] != f"ADDR{2:054d}":
+        problems.append("card IDs or addresses did not round-trip")
+    if columns["is_active"][6] is not False or columns["region"][0] != "samoa":
+        problems.append("flags or strings did not round-trip")
+    if columns["funded_total"][0] != 200 or columns["spent_count"][0] != 20 or \
+            columns["first_round"][0] != 100:
+        problems.append(f"card 1 aggregates {[columns[n][0] for n, _ in EVENT_COLUMNS]}")
+    # Memory should follow the chunk, not the fleet
+    if peak > 64 * 2 ** 20:
+        problems.append(f"peak traced memory {peak / 2 ** 20:.1f} MiB")
+    for problem in problems:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every card's state to a columnar file")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("output", nargs="?", help=".parquet or .arrow (pyarrow), or .npz")
+    parser.add_argument("--format", choices=("parquet", "arrow", "npz"),
+                        help="Default: from the output's extension")
+    parser.add_argument("--events", help="Event store directory for per-card aggregates")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--check", action="store_true",
+                        help="Export a synthetic fleet in chunks and read it back")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        if problems:
+            print(f"❌ {problems} export checks failed")
+            return 1
+        print("✅ Chunked export round-trips with bounded memory")
+        return 0
+    if args.output is None:
+        parser.error("app_id and output are required")
+
+    try:
+        writer = open_writer(args.output, args.format)
+    except ImportError:
+        print("❌ Parquet and Arrow output need pyarrow (pip install pyarrow); "
+              "use a .npz output instead")
+        return 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    from algosdk.v2client import indexer
+
+    from card_sweeper import iter_local_states
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    indexer_client = None
+    if os.getenv("INDEXER_ADDRESS"):
+        indexer_client = indexer.IndexerClient(
+            os.getenv("INDEXER_TOKEN", ""), os.getenv("INDEXER_ADDRESS")
+        )
+    else:
+        print("⚠️ INDEXER_ADDRESS not set; reading cards one by one through the card index")
+    aggregates = None
+    if args.events:
+        from event_store import EventStore
+
+        aggregates = CardAggregates.from_store(EventStore(args.events))
+        print(f"📋 Aggregated events of {len(aggregates.cards)} cards")
+
+    start = time.perf_counter()
+    states = iter_local_states(algod_client, args.app_id, indexer_client,
+                               page_size=min(args.chunk_rows, 1000))
+    rows = export(states, writer, aggregates, args.chunk_rows)
+    print(f"✅ {rows} cards -> {args.output} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,745 @@
+"""
+Vectorized spend analytics and anomaly scores over card events
+Reads the event store's fixed-width records straight into NumPy arrays, so
+no per-event Python objects are built, and keeps running state per card in
+arrays indexed by card ID. One pass covers millions of events. With a
+saved state, later runs fold in only the records appended since.
+
+Spends are measured in base units. CardUsed logs the amount in the card's
+currency and the balance left afterwards. The base amount is therefore
+the balance before the spend minus the balance after. The balance before
+comes from the card's previous events and fundings. Spends of cards whose
+history starts before the store are unpriced until their first CardUsed.
+
+Rounds stand in for time: HOUR_ROUNDS and DAY_ROUNDS approximate an hour
+and a day of blocks.
+
+Reports:
+- per region, KYC tier and currency: cards, spends, base total, largest
+  spend, and totals in the currency's own units
+- daily limit utilization: each card-day's spend over its tier's limit,
+  bucketed per tier
+- anomaly scores per card:
+  - burst: most spends within BURST_ROUNDS
+  - near-limit: days spent at NEAR_LIMIT of the daily limit or more
+  - velocity: z-score of the current hour's spend against the card's
+    earlier hours
+
+Usage:
+    python spend_analytics.py <store_dir> [--state analytics.npz] [--top 20] [--json]
+    python spend_analytics.py --check [--events 200000]
+"""
+
+import argparse
+import functools
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from card_events import EVENT_KINDS
+from event_store import CURRENCY_SIZE, RECORD, REGION_SIZE
+from reconcile import KYC_TIERS
+
+try:
+    import numpy as np
+except ImportError:  # reported by main()
+    np = None
+
+ROUND_SECONDS = 2.8
+HOUR_ROUNDS = round(3600 / ROUND_SECONDS)
+DAY_ROUNDS = 24 * HOUR_ROUNDS
+BURST_ROUNDS = 20
+BURST_ALERT = 5
+NEAR_LIMIT = 0.9
+NEAR_ALERT_DAYS = 3
+VELOCITY_ALERT = 3.0
+VELOCITY_MIN_HOURS = 4
+UTILIZATION_BINS = 11  # tenths of the daily limit, the last one at or over it
+BATCH_RECORDS = 1 << 20
+
+# Must match the TMPL_*_DAILY_LIMIT defaults in virtual_card_manager.py
+DAILY_LIMITS = {1: 100_000_000, 2: 500_000_000, 3: 2_500_000_000}
+
+CREATED, FUNDED, USED, CLOSED = (
+    EVENT_KINDS.index(kind) for kind in ("CardCreated", "CardFunded", "CardUsed", "CardClosed")
+)
+
+# (field, dtype, initial value) of the per-card state arrays
+CARD_FIELDS = (
+    ("tier", "u1", 0),
+    ("region", "i4", -1),
+    ("currency", "i4", -1),
+    ("balance", "i8", 0),
+    ("balance_known", "?", False),
+    ("spends", "i8", 0),
+    ("amount_total", "i8", 0),
+    ("priced", "i8", 0),
+    ("base_total", "i8", 0),
+    ("largest", "i8", 0),
+    ("last_round", "i8", -1),
+    ("burst", "i8", 0),
+    ("day", "i8", -1),
+    ("day_spent", "i8", 0),
+    ("days", "i8", 0),
+    ("near_days", "i8", 0),
+    ("hour", "i8", -1),
+    ("hour_spent", "i8", 0),
+    ("hours", "i8", 0),
+    ("hour_sum", "f8", 0),
+    ("hour_sq", "f8", 0),
+)
+PARAMETERS = ("day_rounds", "hour_rounds", "burst_rounds", "daily_limits")
+
+
+@functools.lru_cache(maxsize=None)
+def record_dtype():
+    """NumPy view of event_store.RECORD"""
+    dtype = np.dtype([
+        ("round", "<u8"), ("intra", "<u4"), ("log_index", "<u2"), ("kind", "u1"),
+        ("flags", "u1"), ("card_id", "<u8"), ("address", "S32"), ("amount", "<u8"),
+        ("balance", "<u8"), ("kyc_tier", "u1"), ("currency", f"S{CURRENCY_SIZE}"),
+        ("region", f"S{REGION_SIZE}"), ("padding", "V7"),
+    ])
+    assert dtype.itemsize == RECORD.size
+    return dtype
+
+
+def records_from_events(events):
+    """Record array of CardEvents, as the store would hold them"""
+    from event_store import pack_event
+
+    return np.frombuffer(b"".join(pack_event(event) for event in events), record_dtype())
+
+
+def _starts(*keys):
+    """Indexes where any of the (sorted) key arrays changes value"""
+    change = np.zeros(len(keys[0]), bool)
+    change[:1] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+class SpendAnalytics:
+    """Running spend aggregates and anomaly inputs, updated batch by batch in key order"""
+
+    def __init__(self, day_rounds=DAY_ROUNDS, hour_rounds=HOUR_ROUNDS, burst_rounds=BURST_ROUNDS,
+                 daily_limits=None):
+        self.day_rounds = day_rounds
+        self.hour_rounds = hour_rounds
+        self.burst_rounds = burst_rounds
+        self.daily_limits = dict(daily_limits or DAILY_LIMITS)
+        # Tier 0 means the card's CardCreated has not been seen
+        self.limits = np.zeros(256, np.int64)
+        for tier, limit in self.daily_limits.items():
+            self.limits[tier] = limit
+        self.card = {name: np.full(0, initial, dtype) for name, dtype, initial in CARD_FIELDS}
+        self.utilization = np.zeros((4, UTILIZATION_BINS), np.int64)
+        # Spends close enough to the latest round to count towards a future burst
+        self.recent_card = np.zeros(0, np.int64)
+        self.recent_round = np.zeros(0, np.int64)
+        self.labels = {"region": [], "currency": []}
+        self.codes = {"region": {}, "currency": {}}
+        self.events = 0
+        self.latest_round = -1
+        self.position = None
+
+    def _grow(self, size):
+        if size <= len(self.card["tier"]):
+            return
+        size = max(size, 2 * len(self.card["tier"]))
+        for name, dtype, initial in CARD_FIELDS:
+            grown = np.full(size, initial, dtype)
+            grown[:len(self.card[name])] = self.card[name]
+            self.card[name] = grown
+
+    def _encode(self, dimension, values):
+        """Codes of byte strings, adding new labels; loops over distinct values only"""
+        distinct, inverse = np.unique(values, return_inverse=True)
+        codes, labels = self.codes[dimension], self.labels[dimension]
+        for value in distinct:
+            label = value.decode(errors="replace")
+            if label not in codes:
+                codes[label] = len(labels)
+                labels.append(label)
+        mapped = np.array([codes[value.decode(errors="replace")] for value in distinct], np.int32)
+        return mapped[inverse]
+
+    # Updating
+
+    def update(self, records):
+        """Fold a record array (event_store.RECORD layout, key order) into the state"""
+        if not len(records):
+            return
+        cards = records["card_id"].astype(np.int64)
+        kinds = records["kind"]
+        self._grow(int(cards.max()) + 1)
+
+        created = kinds == CREATED
+        if created.any():
+            ids = cards[created]
+            self.card["tier"][ids] = records["kyc_tier"][created]
+            self.card["region"][ids] = self._encode("region", records["region"][created])
+            self.card["currency"][ids] = self._encode("currency", records["currency"][created])
+
+        # Each card's events together, in key order
+        order = np.argsort(cards, kind="stable")
+        cards, kinds = cards[order], kinds[order]
+        rounds = records["round"][order].astype(np.int64)
+        amounts = records["amount"][order].astype(np.int64)
+        base = self._base_amounts(cards, kinds, amounts, records["balance"][order].astype(np.int64))
+
+        used = kinds == USED
+        cards, rounds, amounts, base = cards[used], rounds[used], amounts[used], base[used]
+        if len(cards):
+            self._add_spends(cards, rounds, amounts, base)
+            self._burst(cards, rounds)
+            priced = base >= 0
+            cards, rounds, base = cards[priced], rounds[priced], base[priced]
+            self._close_days(*self._windows(cards, rounds, base, self.day_rounds, "day"))
+            self._close_hours(*self._windows(cards, rounds, base, self.hour_rounds, "hour"))
+        self.events += len(records)
+        self.latest_round = max(self.latest_round, int(records["round"][-1]))
+
+    def _base_amounts(self, cards, kinds, amounts, logged):
+        """Base-unit amount of each CardUsed (-1 when the balance before it is unknown)
+
+        CardCreated, CardUsed and CardClosed set the balance (0, the logged
+        balance, 0); CardFunded adds to it. The balance after an event is the
+        last set value plus the fundings since, found with running sums.
+        """
+        count = len(cards)
+        index = np.arange(count)
+        starts = _starts(cards)
+        first = np.repeat(starts, np.diff(np.append(starts, count)))
+        funding = np.where(kinds == FUNDED, amounts, 0)
+        funded = np.cumsum(funding)
+        last_set = np.maximum.accumulate(np.where(kinds != FUNDED, index, -1))
+        own = last_set >= first
+        last_set = np.maximum(last_set, 0)
+
+        carried = self.card["balance"][cards]
+        carried_known = self.card["balance_known"][cards]
+        after = np.where(
+            own,
+            logged[last_set] + funded - funded[last_set],
+            carried + funded - (funded[first] - funding[first]),
+        )
+        known_after = own | carried_known
+
+        at_first = index == first
+        before = np.where(at_first, carried, np.roll(after, 1))
+        known_before = np.where(at_first, carried_known, np.roll(known_after, 1))
+        base = before - logged
+        base[(kinds != USED) | ~known_before | (base < 0)] = -1
+
+        last = np.append(starts[1:], count) - 1
+        self.card["balance"][cards[last]] = after[last]
+        self.card["balance_known"][cards[last]] = known_after[last]
+        return base
+
+    def _add_spends(self, cards, rounds, amounts, base):
+        starts = _starts(cards)
+        ids = cards[starts]
+        priced = base >= 0
+        self.card["spends"][ids] += np.diff(np.append(starts, len(cards)))
+        self.card["amount_total"][ids] += np.add.reduceat(amounts, starts)
+        self.card["priced"][ids] += np.add.reduceat(priced.astype(np.int64), starts)
+        self.card["base_total"][ids] += np.add.reduceat(np.where(priced, base, 0), starts)
+        self.card["largest"][ids] = np.maximum(
+            self.card["largest"][ids], np.maximum.reduceat(base, starts)
+        )
+        self.card["last_round"][ids] = rounds[np.append(starts[1:], len(cards)) - 1]
+
+    def _burst(self, cards, rounds):
+        """Most spends of each card within any BURST_ROUNDS window"""
+        carried = len(self.recent_card)
+        cards = np.concatenate([self.recent_card, cards])
+        rounds = np.concatenate([self.recent_round, rounds])
+        # Carried spends precede the batch's, so a stable sort by card keeps rounds in order
+        order = np.argsort(cards, kind="stable")
+        cards, rounds = cards[order], rounds[order]
+        new = order >= carried
+
+        # One sorted key per (card, round) so a single searchsorted finds each window
+        starts = _starts(cards)
+        rank = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(cards))))
+        offset = rounds - rounds.min()
+        key = rank * (int(offset.max()) + self.burst_rounds + 1) + offset
+        inside = np.arange(len(key)) - np.searchsorted(key, key - self.burst_rounds, "right") + 1
+        inside[~new] = 0
+        ids = cards[starts]
+        self.card["burst"][ids] = np.maximum(
+            self.card["burst"][ids], np.maximum.reduceat(inside, starts)
+        )
+
+        # Later spends are at or after the latest round
+        keep = rounds > rounds.max() - self.burst_rounds
+        self.recent_card, self.recent_round = cards[keep], rounds[keep]
+
+    def _windows(self, cards, rounds, amounts, width, field):
+        """Add spends to each card's open window of `width` rounds; returns the
+        (cards, spent) of windows that closed"""
+        if not len(cards):
+            return cards, amounts
+        opened, spent = self.card[field], self.card[field + "_spent"]
+        window = rounds // width
+        starts = _starts(cards, window)
+        window_cards, windows = cards[starts], window[starts]
+        totals = np.add.reduceat(amounts, starts)
+
+        first = np.ones(len(starts), bool)
+        first[1:] = window_cards[1:] != window_cards[:-1]
+        last = np.ones(len(starts), bool)
+        last[:-1] = first[1:]
+        carried_window, carried = opened[window_cards], spent[window_cards]
+        continued = first & (carried_window == windows)
+        totals = totals + np.where(continued, carried, 0)
+        ended = first & (carried_window >= 0) & ~continued
+
+        opened[window_cards[last]] = windows[last]
+        spent[window_cards[last]] = totals[last]
+        return (
+            np.concatenate([window_cards[ended], window_cards[~last]]),
+            np.concatenate([carried[ended], totals[~last]]),
+        )
+
+    def _utilization(self, cards, spent):
+        """(tiers, utilization) of card-days whose tier and limit are known"""
+        tiers = self.card["tier"][cards].astype(np.int64)
+        limits = self.limits[tiers]
+        known = limits > 0
+        return tiers[known], cards[known], spent[known] / limits[known]
+
+    def _close_days(self, cards, spent):
+        tiers, cards, utilization = self._utilization(cards, spent)
+        if not len(cards):
+            return
+        bins = np.minimum((utilization * 10).astype(np.int64), UTILIZATION_BINS - 1)
+        self.utilization += np.bincount(
+            np.minimum(tiers, 3) * UTILIZATION_BINS + bins, minlength=self.utilization.size
+        ).reshape(self.utilization.shape)
+        size = len(self.card["days"])
+        self.card["days"] += np.bincount(cards, minlength=size)
+        self.card["near_days"] += np.bincount(cards[utilization >= NEAR_LIMIT], minlength=size)
+
+    def _close_hours(self, cards, spent):
+        if not len(cards):
+            return
+        size = len(self.card["hours"])
+        spent = spent.astype(np.float64)
+        self.card["hours"] += np.bincount(cards, minlength=size)
+        self.card["hour_sum"] += np.bincount(cards, spent, minlength=size)
+        self.card["hour_sq"] += np.bincount(cards, spent * spent, minlength=size)
+
+    def update_from_store(self, store, batch_records=BATCH_RECORDS):
+        """Fold in the store's records after the saved position; returns how many"""
+        before = self.events
+        store.refresh()
+        for position, view in store.record_slices(self.position):
+            records = np.frombuffer(view, record_dtype())
+            for first in range(0, len(records), batch_records):
+                self.update(records[first:first + batch_records])
+            self.position = list(position)
+        return self.events - before
+
+    # Reports
+
+    def groups(self):
+        """{dimension: [rows]} of spend aggregates by region, KYC tier and currency"""
+        card = self.card
+        spending = card["spends"] > 0
+        labels = {
+            "region": lambda code: self.labels["region"][code] if code >= 0 else "unknown",
+            "tier": lambda code: KYC_TIERS.get(code, "unknown"),
+            "currency": lambda code: self.labels["currency"][code] if code >= 0 else "unknown",
+        }
+        report = {}
+        for dimension, label in labels.items():
+            # Shifted by one so unknown regions and currencies (-1) get a bucket
+            shifted = card[dimension][spending].astype(np.int64) + 1
+            size = int(shifted.max()) + 1 if len(shifted) else 0
+            columns = {
+                "cards": np.bincount(shifted, minlength=size),
+                "spends": np.bincount(shifted, card["spends"][spending], size),
+                "priced": np.bincount(shifted, card["priced"][spending], size),
+                "base_total": np.bincount(shifted, card["base_total"][spending], size),
+            }
+            if dimension == "currency":
+                columns["amount_total"] = np.bincount(shifted, card["amount_total"][spending], size)
+            largest = np.zeros(size, np.int64)
+            np.maximum.at(largest, shifted, card["largest"][spending])
+            rows = []
+            for code in np.flatnonzero(columns["cards"]):
+                row = {dimension: label(int(code) - 1)}
+                row.update({name: int(values[code]) for name, values in columns.items()})
+                row["largest"] = int(largest[code])
+                row["average"] = row["base_total"] // row["priced"] if row["priced"] else 0
+                rows.append(row)
+            report[dimension] = sorted(rows, key=lambda row: -row["base_total"])
+        return report
+
+    def utilization_report(self):
+        """{tier: counts per tenth of the daily limit} over closed and open card-days"""
+        counts = self.utilization.copy()
+        open_days = np.flatnonzero(self.card["day"] >= 0)
+        tiers, _, utilization = self._utilization(open_days, self.card["day_spent"][open_days])
+        bins = np.minimum((utilization * 10).astype(np.int64), UTILIZATION_BINS - 1)
+        np.add.at(counts, (np.minimum(tiers, 3), bins), 1)
+        return {
+            KYC_TIERS[tier]: counts[tier].tolist() for tier in range(1, 4) if counts[tier].any()
+        }
+
+    def velocity(self):
+        """Per card z-score of this hour's spend against its earlier active hours
+
+        The spread is floored at a quarter of the mean, so cards with very
+        regular spending do not score on small changes.
+        """
+        card = self.card
+        hours = card["hours"].astype(np.float64)
+        current = (card["hour"] == self.latest_round // self.hour_rounds) \
+            & (card["hours"] >= VELOCITY_MIN_HOURS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = card["hour_sum"] / hours
+            spread = np.sqrt(np.maximum(card["hour_sq"] / hours - mean * mean, 0))
+            z = (card["hour_spent"] - mean) / np.maximum(spread, mean / 4)
+        return np.where(current & np.isfinite(z), z, 0.0)
+
+    def anomalies(self, top=20):
+        """Cards whose burst, near-limit or velocity score reaches its alert level,
+        highest first; a score of 1 is exactly at the alert level"""
+        card = self.card
+        scores = {
+            "burst": card["burst"] / BURST_ALERT,
+            "near_limit": card["near_days"] / NEAR_ALERT_DAYS,
+            "velocity": self.velocity() / VELOCITY_ALERT,
+        }
+        score = np.maximum.reduce(list(scores.values()))
+        flagged = np.flatnonzero(score >= 1)
+        flagged = flagged[np.argsort(-score[flagged], kind="stable")][:top]
+        return [{
+            "card_id": int(card_id),
+            "score": round(float(score[card_id]), 2),
+            "reason": max(scores, key=lambda name: scores[name][card_id]),
+            "burst": int(card["burst"][card_id]),
+            "near_days": int(card["near_days"][card_id]),
+            "days": int(card["days"][card_id]),
+            "velocity": round(float(scores["velocity"][card_id] * VELOCITY_ALERT), 2),
+            "last_round": int(card["last_round"][card_id]),
+        } for card_id in flagged]
+
+    def report(self, top=20):
+        return {
+            "events": self.events,
+            "latest_round": self.latest_round,
+            "groups": self.groups(),
+            "utilization": self.utilization_report(),
+            "anomalies": self.anomalies(top),
+        }
+
+    # Persistence
+
+    def save(self, path):
+        """Write the state to an .npz file atomically"""
+        meta = {name: getattr(self, name) for name in PARAMETERS}
+        meta.update(events=self.events, latest_round=self.latest_round, position=self.position,
+                    labels=self.labels)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer, meta=np.array(json.dumps(meta)), utilization=self.utilization,
+            recent_card=self.recent_card, recent_round=self.recent_round,
+            **{f"card_{name}": values for name, values in self.card.items()},
+        )
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            meta = json.loads(str(saved["meta"]))
+            analytics = cls(meta["day_rounds"], meta["hour_rounds"], meta["burst_rounds"],
+                            {int(tier): limit for tier, limit in meta["daily_limits"].items()})
+            analytics.card = {name: saved[f"card_{name}"] for name, _, _ in CARD_FIELDS}
+            analytics.utilization = saved["utilization"]
+            analytics.recent_card = saved["recent_card"]
+            analytics.recent_round = saved["recent_round"]
+        analytics.events = meta["events"]
+        analytics.latest_round = meta["latest_round"]
+        analytics.position = meta["position"]
+        analytics.labels = meta["labels"]
+        analytics.codes = {
+            dimension: {label: code for code, label in enumerate(labels)}
+            for dimension, labels in analytics.labels.items()
+        }
+        return analytics
+
+
+def reference(events, day_rounds=DAY_ROUNDS, hour_rounds=HOUR_ROUNDS, burst_rounds=BURST_ROUNDS):
+    """Per-card state and utilization counts computed event by event, for checks"""
+    limits = DAILY_LIMITS
+    cards = {}
+    utilization = [[0] * UTILIZATION_BINS for _ in range(4)]
+
+    def close_day(card, spent):
+        limit = limits.get(card["tier"], 0)
+        if limit:
+            value = spent / limit
+            utilization[min(card["tier"], 3)][min(int(value * 10), UTILIZATION_BINS - 1)] += 1
+            card["days"] += 1
+            card["near_days"] += value >= NEAR_LIMIT
+
+    def close_hour(card, spent):
+        card["hours"] += 1
+        card["hour_sum"] += spent
+        card["hour_sq"] += float(spent) * spent
+
+    for event in events:
+        card = cards.setdefault(event.card_id, dict(
+            {name: initial for name, _, initial in CARD_FIELDS}, recent=[]
+        ))
+        if event.kind == "CardCreated":
+            card.update(tier=event.kyc_tier, region=event.region, currency=event.currency,
+                        balance=0, balance_known=True)
+        elif event.kind == "CardFunded":
+            card["balance"] += event.amount
+        elif event.kind == "CardClosed":
+            card.update(balance=0, balance_known=True)
+        else:
+            base = card["balance"] - event.balance
+            priced = card["balance_known"] and base >= 0
+            card.update(balance=event.balance, balance_known=True, last_round=event.round)
+            card["spends"] += 1
+            card["amount_total"] += event.amount
+            card["recent"] = [r for r in card["recent"] if r > event.round - burst_rounds]
+            card["recent"].append(event.round)
+            card["burst"] = max(card["burst"], len(card["recent"]))
+            if priced:
+                card["priced"] += 1
+                card["base_total"] += base
+                card["largest"] = max(card["largest"], base)
+                for field, width, close in (("day", day_rounds, close_day),
+                                            ("hour", hour_rounds, close_hour)):
+                    window = event.round // width
+                    if card[field] == window:
+                        card[field + "_spent"] += base
+                    else:
+                        if card[field] >= 0:
+                            close(card, card[field + "_spent"])
+                        card[field], card[field + "_spent"] = window, base
+    return cards, utilization
+
+
+def sample_events(count, cards=2000, seed=0):
+    """Synthetic card events in key order: fundings and spends with some bursts and
+    cards that spend close to their daily limit; a tenth of the cards were created
+    before the sample starts"""
+    import random
+
+    from card_events import CardEvent, address_of
+
+    rng = random.Random(seed)
+    regions = ("US", "EU", "APAC", "LATAM")
+    currencies = ("ALGO", "USD", "EUR")
+    state = {}
+    closed = set()
+    events = []
+    round = 1
+    while len(events) < count:
+        round += rng.randrange(1, 40)
+        for intra in range(rng.randrange(1, 8)):
+            card_id = rng.randrange(1, cards + 1)
+            if card_id in closed:
+                continue
+            address = address_of(card_id.to_bytes(32, "big"))
+            card = state.get(card_id)
+            if card is None:
+                card = state[card_id] = {"tier": rng.randrange(1, 4), "balance": 0}
+                if card_id % 10:
+                    events.append(CardEvent(round, intra, 0, "CardCreated", card_id, address,
+                                            kyc_tier=card["tier"],
+                                            region=rng.choice(regions),
+                                            currency=rng.choice(currencies)))
+                    continue
+                card["balance"] = 10 ** 9
+            limit = DAILY_LIMITS[card["tier"]]
+            if card["balance"] < limit:
+                amount = rng.randrange(limit, 3 * limit)
+                card["balance"] += amount
+                events.append(CardEvent(round, intra, 0, "CardFunded", card_id, address,
+                                        amount=amount, currency="ALGO"))
+                continue
+            # Near-limit cards make few spends of nearly the whole daily limit
+            heavy = card_id % 97 == 0
+            spends = rng.randrange(6, 10) if card_id % 89 == 0 else 1
+            offset = 0
+            for log_index in range(spends):
+                base = int(limit * rng.uniform(0.9, 0.99)) if heavy \
+                    else rng.randrange(1, limit // 20)
+                base = min(base, card["balance"])
+                card["balance"] -= base
+                # Uneven gaps put some spends exactly BURST_ROUNDS apart
+                offset += rng.randrange(0, 5)
+                events.append(CardEvent(round + offset, intra, log_index, "CardUsed",
+                                        card_id, address, amount=base // 3 or 1,
+                                        currency="USD", balance=card["balance"]))
+            if rng.random() < 0.002:
+                events.append(CardEvent(round + 40, intra, 0, "CardClosed", card_id, address,
+                                        amount=card["balance"], balance=0))
+                del state[card_id]
+                closed.add(card_id)
+        round += 40
+    events.sort(key=lambda event: event.key)
+    return events
+
+
+def _compare(analytics, expected, utilization, label):
+    problems = []
+    card = analytics.card
+    integers = [name for name, dtype, _ in CARD_FIELDS if dtype in ("i8", "u1", "?")]
+    for card_id, state in expected.items():
+        for name in integers:
+            if card[name][card_id] != state[name]:
+                problems.append(f"{label}: card {card_id} {name} {card[name][card_id]}, "
+                                f"expected {state[name]}")
+                break
+        else:
+            for name in ("hour_sum", "hour_sq"):
+                if not np.isclose(card[name][card_id], state[name], rtol=1e-9):
+                    problems.append(f"{label}: card {card_id} {name} differs")
+            for name in ("region", "currency"):
+                code = card[name][card_id]
+                got = analytics.labels[name][code] if code >= 0 else -1
+                if got != state[name]:
+                    problems.append(f"{label}: card {card_id} {name} {got}, "
+                                    f"expected {state[name]}")
+    if analytics.utilization.tolist() != utilization:
+        problems.append(f"{label}: utilization counts differ")
+    return problems[:10]
+
+
+def check(count=200_000):
+    """Compare one vectorized pass, small batches and a save/resume with an
+    event-by-event reference"""
+    from event_store import EventStore
+
+    events = sample_events(count)
+    started = time.perf_counter()
+    expected, utilization = reference(events)
+    reference_seconds = time.perf_counter() - started
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        store = EventStore(os.path.join(directory, "store"), writable=True,
+                           segment_records=count // 3 + 7)
+        half = len(events) // 2
+        store.append(events[:half])
+
+        path = os.path.join(directory, "analytics.npz")
+        partial = SpendAnalytics()
+        partial.update_from_store(EventStore(store.directory))
+        partial.save(path)
+        store.append(events[half:])
+        resumed = SpendAnalytics.load(path)
+        if resumed.update_from_store(EventStore(store.directory)) != len(events) - half:
+            problems.append("resume did not pick up exactly the appended records")
+        problems += _compare(resumed, expected, utilization, "resumed")
+
+        reader = EventStore(store.directory)
+        started = time.perf_counter()
+        analytics = SpendAnalytics()
+        analytics.update_from_store(reader)
+        vectorized_seconds = time.perf_counter() - started
+        problems += _compare(analytics, expected, utilization, "one pass")
+        report = analytics.report()
+        if resumed.report() != report:
+            problems.append("resumed report differs from the one-pass report")
+
+        # A wide burst window makes the burst maxima sensitive to window edges
+        # and to spends carried across batches
+        wide = 16 * BURST_ROUNDS
+        batched = SpendAnalytics(burst_rounds=wide)
+        batched.update_from_store(reader, batch_records=997)
+        problems += _compare(batched, *reference(events, burst_rounds=wide), "997-record batches")
+
+    reasons = {row["reason"] for row in analytics.anomalies(top=None)}
+    if not {"burst", "near_limit"} <= reasons:
+        problems.append(f"sample anomalies flagged only for {sorted(reasons)}")
+    print(f"📋 {len(events)} events: {vectorized_seconds * 1000:.0f} ms vectorized, "
+          f"{reference_seconds * 1000:.0f} ms event by event "
+          f"({len(events) / vectorized_seconds / 1e6:.1f}M events/s)")
+    for problem in problems:
+        print(f"   - {problem}")
+    return len(problems)
+
+
+def print_report(report):
+    print(f"📋 {report['events']} events up to round {report['latest_round']}")
+    for dimension, rows in report["groups"].items():
+        print(f"\n{dimension.title():<10} {'cards':>8} {'spends':>10} {'base total':>18} "
+              f"{'average':>14} {'largest':>14}")
+        for row in rows:
+            print(f"{row[dimension]:<10} {row['cards']:>8} {row['spends']:>10} "
+                  f"{row['base_total']:>18} {row['average']:>14} {row['largest']:>14}")
+    print("\nDaily limit utilization (card-days per tenth of the limit, last: at or over)")
+    for tier, counts in report["utilization"].items():
+        print(f"{tier:<10} {' '.join(f'{count:>7}' for count in counts)}")
+    print(f"\n⚠️ {len(report['anomalies'])} cards at or above an alert level")
+    for row in report["anomalies"]:
+        print(f"   card {row['card_id']:>10}  score {row['score']:>6.2f} ({row['reason']})  "
+              f"burst {row['burst']}  near-limit days {row['near_days']}/{row['days']}  "
+              f"velocity {row['velocity']:+.1f}  last round {row['last_round']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spend aggregates and anomaly scores")
+    parser.add_argument("directory", nargs="?", help="Event store directory")
+    parser.add_argument("--state", help="Saved analytics (.npz); updated with new records only")
+    parser.add_argument("--top", type=int, default=20, help="Flagged cards to list")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--events", type=int, default=200_000, help="Sample size for --check")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the vectorized pass with an event-by-event reference")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("❌ Spend analytics needs numpy (pip install numpy)")
+        return 1
+    if args.check:
+        problems = check(args.events)
+        if problems:
+            print(f"❌ {problems} analytics checks failed")
+            return 1
+        print("✅ Vectorized analytics match the event-by-event reference, in batches and resumed")
+        return 0
+    if args.directory is None:
+        parser.error("directory is required")
+
+    from event_store import EventStore
+
+    if args.state and os.path.exists(args.state):
+        analytics = SpendAnalytics.load(args.state)
+    else:
+        analytics = SpendAnalytics()
+    start = time.perf_counter()
+    added = analytics.update_from_store(EventStore(args.directory))
+    print(f"🔄 Folded in {added} events in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    if args.state:
+        analytics.save(args.state)
+    report = analytics.report(args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Rolling 24-hour spend window for the Virtual Card Manager
+Mirrors the contract's hourly ring (box `SPEND_WINDOW_PREFIX + card_id`,
+built with rolling_window=True) so wallets and backends can show the
+remaining allowance and when it frees up without replaying past spends.
+Each slot holds the card's cumulative spend at the end of an hour, so the
+last 24 hours spent `cumulative - slot[hour - 24]`
+
+Usage:
+    python spend_window.py <app_id> <card_id> [daily_limit]
+    python spend_window.py --check [--iterations 2000]
+"""
+
+import argparse
+import base64
+import random
+import sys
+
+from algosdk.error import AlgodHTTPError
+
+from card_index import card_id_bytes
+
+# Must match virtual_card_manager.py; kept here so the mirror does not
+# import PyTeal
+WINDOW_HOURS = 24
+WINDOW_BUCKET_SECONDS = 3600
+WINDOW_SLOTS = WINDOW_HOURS + 1
+WINDOW_HEADER_SIZE = 16
+WINDOW_BOX_SIZE = WINDOW_HEADER_SIZE + WINDOW_SLOTS * 8
+SPEND_WINDOW_PREFIX = b"w"
+
+
+def window_box_name(card_id, prefix=SPEND_WINDOW_PREFIX):
+    return prefix + card_id_bytes(card_id)
+
+
+class SpendWindow:
+    """Cumulative spend at the end of each of the last WINDOW_SLOTS hours"""
+
+    def __init__(self, last_hour=0, cumulative=0, slots=None):
+        self.last_hour = last_hour
+        self.cumulative = cumulative
+        self.slots = list(slots) if slots is not None else [0] * WINDOW_SLOTS
+
+    @classmethod
+    def from_box(cls, value):
+        if len(value) != WINDOW_BOX_SIZE:
+            raise ValueError(f"Window boxes are {WINDOW_BOX_SIZE} bytes, got {len(value)}")
+        words = [int.from_bytes(value[i:i + 8], "big") for i in range(0, WINDOW_BOX_SIZE, 8)]
+        return cls(words[0], words[1], words[2:])
+
+    def to_box(self):
+        return b"".join(word.to_bytes(8, "big")
+                        for word in [self.last_hour, self.cumulative] + self.slots)
+
+    def copy(self):
+        return SpendWindow(self.last_hour, self.cumulative, self.slots)
+
+    @staticmethod
+    def hour_of(timestamp):
+        return timestamp // WINDOW_BUCKET_SECONDS
+
+    def advance(self, timestamp):
+        """Move the window to timestamp's hour; returns the spend within it"""
+        hour = self.hour_of(timestamp)
+        if hour > self.last_hour:
+            # Nothing was spent in the skipped hours, so they all end at the
+            # current cumulative; at most every slot is rewritten once
+            for skipped in range(max(self.last_hour + 1, hour - WINDOW_HOURS), hour + 1):
+                self.slots[skipped % WINDOW_SLOTS] = self.cumulative
+            self.last_hour = hour
+        return self.cumulative - self.slots[(self.last_hour + 1) % WINDOW_SLOTS]
+
+    def record(self, timestamp, amount):
+        self.advance(timestamp)
+        self.cumulative += amount
+        self.slots[self.last_hour % WINDOW_SLOTS] = self.cumulative
+
+    def spent(self, timestamp):
+        """Spend within the window ending at timestamp, without mutating the window"""
+        return self.copy().advance(timestamp)
+
+    def remaining(self, daily_limit, timestamp):
+        return max(0, daily_limit - self.spent(timestamp))
+
+    def releases(self, timestamp):
+        """(timestamp, amount) pairs at which spend drops out of the window"""
+        window = self.copy()
+        window.advance(timestamp)
+        hour = window.last_hour
+        pending = []
+        for spent_hour in range(hour - WINDOW_HOURS + 1, hour + 1):
+            amount = (window.slots[spent_hour % WINDOW_SLOTS]
+                      - window.slots[(spent_hour - 1) % WINDOW_SLOTS])
+            if amount:
+                pending.append(((spent_hour + WINDOW_HOURS) * WINDOW_BUCKET_SECONDS, amount))
+        return pending
+
+    def next_release(self, timestamp):
+        """Earliest (timestamp, amount) at which allowance frees up, or None"""
+        pending = self.releases(timestamp)
+        return pending[0] if pending else None
+
+
+def fetch_window(algod_client, app_id, card_id):
+    """Current window of a card, empty if it has not spent in rolling mode yet"""
+    try:
+        box = algod_client.application_box_by_name(app_id, window_box_name(card_id))
+    except AlgodHTTPError as e:
+        if e.code == 404:
+            return SpendWindow()
+        raise
+    return SpendWindow.from_box(base64.b64decode(box["value"]))
+
+
+def check(iterations=2000, seed=0):
+    """Cross-check the mirror against the rolling contract's use_card"""
+    from artifact_builder import compile_programs
+    from teal_eval import Ledger, Program, evaluate, make_txn
+
+    _, teals = compile_programs("virtual_card_manager_rolling", optimized=True)
+    program = Program(teals["approval"])
+    rng = random.Random(seed)
+    sender = bytes([1]) * 32
+    card_id = 1
+    daily_limit = 1_000_000
+    local = {
+        b"balance": 10 ** 15, b"daily_spent": 0, b"monthly_spent": 0,
+        b"last_reset_day": 0, b"last_reset_month": 0, b"kyc_tier": 1, b"region": b"US",
+        b"is_active": 1, b"currency": b"USD", b"daily_limit": daily_limit,
+        b"monthly_limit": 10 ** 15, b"card_id": card_id_bytes(card_id),
+    }
+    ledger = Ledger(global_state={b"BASE_CURRENCY": b"USD"}, local_state={sender: local})
+    mirror = SpendWindow()
+    timestamp = 1_700_000_000
+    mismatches = 0
+    for _ in range(iterations):
+        timestamp += rng.choice((0, 60, 1_800, 3_600, 7_200, 40_000, 90_000))
+        amount = rng.choice((1, 1_000, 50_000, 250_000, 600_000))
+        # Keep the monthly counter out of the way
+        ledger.local_state[sender][b"last_reset_month"] = timestamp // 2_592_000
+        call = make_txn(sender, [b"use_card", amount])
+        result = evaluate(program, ledger, [call], 0,
+                          {"LatestTimestamp": timestamp, "Round": 1})
+        expected = amount <= mirror.remaining(daily_limit, timestamp)
+        if expected:
+            mirror.record(timestamp, amount)
+        box = result.ledger.boxes.get(window_box_name(card_id))
+        if result.approved != expected or (box is not None and box != mirror.to_box()):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"   - ts={timestamp} amount={amount} contract={result.approved} "
+                      f"mirror={expected} error={result.error}")
+        ledger = result.ledger
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling spend window of a card")
+    parser.add_argument("app_id", nargs="?", type=int)
+    parser.add_argument("card_id", nargs="?", type=int)
+    parser.add_argument("daily_limit", nargs="?", type=int)
+    parser.add_argument("--check", action="store_true",
+                        help="Cross-check the mirror against the contract")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = check(args.iterations)
+        if mismatches:
+            print(f"❌ {mismatches} calls where the mirror disagrees with the contract")
+            return 1
+        print(f"✅ Mirror matches the contract over {args.iterations} calls")
+        return 0
+    if args.card_id is None:
+        parser.error("app_id and card_id are required")
+
+    import time
+
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    window = fetch_window(algod_client, args.app_id, args.card_id)
+    now = int(time.time())
+    print(f"💳 Card {args.card_id}: {window.spent(now)} spent in the last {WINDOW_HOURS}h")
+    if args.daily_limit is not None:
+        print(f"   Remaining: {window.remaining(args.daily_limit, now)}")
+    release = window.next_release(now)
+    if release:
+        print(f"   Next release: {release[1]} at {time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(release[0]))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
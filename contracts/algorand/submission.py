@@ -0,0 +1,249 @@
+"""
+Idempotent transaction submission for Virtual Card Manager tooling
+Every logical operation gets a deterministic lease and note, so retries
+can never execute the same operation twice. Manual reruns are only
+idempotent with an indexer client, which finds the confirmed operation by
+its note; without one the lease blocks a rerun only until the first
+attempt's validity window closes
+
+Retry rules:
+- "already in ledger" / "already in pool" means an earlier attempt landed
+- "overlapping lease" means another submission of this operation is live
+- timeouts are retried with jittered backoff until the validity window ends
+- an expired, unconfirmed transaction can never land, so it is rebuilt
+"""
+
+import base64
+import hashlib
+import random
+import time
+
+from algosdk import account, error, transaction
+
+from fee_policy import FeePolicy
+from instrumentation import timed
+
+NOTE_PREFIX = b"vcm:"
+
+
+class SubmissionError(Exception):
+    """Raised when an operation could not be confirmed"""
+
+
+class DuplicateOperation(SubmissionError):
+    """Raised when another submission of the same operation holds the lease"""
+
+
+def operation_note(operation_key):
+    """Note recorded on-chain so an operation can be found again later"""
+    return NOTE_PREFIX + operation_key.encode()
+
+
+def operation_lease(operation_key, index=0):
+    """Deterministic 32-byte lease for the `index`-th transaction of an operation"""
+    return hashlib.sha256(operation_note(operation_key) + bytes([index])).digest()
+
+
+def _is_already_submitted(message):
+    return "already in ledger" in message or "already in pool" in message
+
+
+def _is_retriable(exc):
+    # OSError covers connection resets, socket timeouts and urllib's URLError
+    if isinstance(exc, (error.ConfirmationTimeoutError, OSError)):
+        return True
+    if isinstance(exc, error.AlgodHTTPError):
+        return exc.code is None or exc.code >= 500 or exc.code == 429
+    return False
+
+
+class Submitter:
+    def __init__(self, algod_client, private_key, indexer_client=None, fee_policy=None,
+                 max_attempts=8, max_rebuilds=1, base_delay=0.5, max_delay=8.0,
+                 wait_rounds=4):
+        self.algod_client = algod_client
+        self.private_key = private_key
+        self.indexer_client = indexer_client
+        self.fee_policy = fee_policy or FeePolicy()
+        self.max_attempts = max_attempts
+        self.max_rebuilds = max_rebuilds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.wait_rounds = wait_rounds
+
+    def submit(self, operation_key, build, operations=None, inner_txns=None):
+        """
+        Submit the transaction(s) returned by `build(params)` exactly once.
+
+        `build` may return a single transaction or a list forming an atomic
+        group. Returns the confirmed transaction info (a list for groups).
+
+        With `operations` (one name for a single transaction, a list for a
+        group) the fee policy prices the transactions once their lease, note
+        and group fields are set, so per-byte fees cover the signed size; a
+        group's fees are pooled onto its first transaction. `inner_txns` is
+        the inner transaction count to cover (a list for groups).
+        """
+        previous = self.find_confirmed(operation_key)
+        if previous is not None:
+            print(f"♻️ Operation already confirmed: {operation_key}")
+            return previous
+
+        for _ in range(self.max_rebuilds + 1):
+            if operations is None:
+                params = self.algod_client.suggested_params()
+            else:
+                # Also samples the latest block so congestion tracks its fullness
+                params = self.fee_policy.refresh(self.algod_client)
+            txns = build(params)
+            is_group = isinstance(txns, (list, tuple))
+            txns = list(txns) if is_group else [txns]
+            signed = self._prepare(operation_key, txns, operations, inner_txns)
+
+            result = self._submit_signed(operation_key, signed)
+            if result is not None:
+                return result if is_group else result[0]
+            print(f"🔁 Validity window expired for {operation_key}, rebuilding...")
+
+        raise SubmissionError(f"Operation {operation_key} did not confirm")
+
+    def find_confirmed(self, operation_key):
+        """
+        Look up an earlier confirmed submission of the operation via the
+        indexer: the transaction info, or a list of them for a group
+        """
+        if self.indexer_client is None:
+            return None
+        note = operation_note(operation_key)
+        # note_prefix also matches longer keys ("fund:1" finds "fund:12"), so
+        # only an exact note is the same operation
+        matches = []
+        next_page = None
+        while True:
+            response = self.indexer_client.search_transactions(
+                address=account.address_from_private_key(self.private_key),
+                address_role="sender",
+                note_prefix=note,
+                next_page=next_page,
+            )
+            transactions = response.get("transactions", [])
+            matches.extend(
+                found for found in transactions
+                if base64.b64decode(found.get("note", "")) == note
+            )
+            next_page = response.get("next-token")
+            if matches or not transactions or not next_page:
+                break
+        if not matches:
+            return None
+
+        first = matches[0]
+        if "group" in first:
+            group = sorted(
+                (found for found in matches
+                 if found.get("group") == first["group"]
+                 and found.get("confirmed-round") == first.get("confirmed-round")),
+                key=lambda found: found.get("intra-round-offset", 0),
+            )
+            return [self._pending_shape(found) for found in group]
+        return self._pending_shape(first)
+
+    @staticmethod
+    def _pending_shape(found):
+        # Match the algod pending-info shape callers already read
+        if "created-application-index" in found:
+            found["application-index"] = found["created-application-index"]
+        return found
+
+    def _prepare(self, operation_key, txns, operations=None, inner_txns=None):
+        grouped = len(txns) > 1
+        for index, txn in enumerate(txns):
+            txn.lease = operation_lease(operation_key, index)
+            txn.note = operation_note(operation_key)
+            if grouped:
+                txn.group = bytes(32)  # stand-in so fees price the group field
+        if operations is not None:
+            if isinstance(operations, str):
+                self.fee_policy.apply(txns[0], operations, inner_txns or 0)
+            else:
+                self.fee_policy.apply_group(txns, operations, inner_txns=inner_txns)
+        if grouped:
+            for txn in txns:
+                txn.group = None
+            transaction.assign_group_id(txns)
+        with timed("sign"):
+            return [txn.sign(self.private_key) for txn in txns]
+
+    def _submit_signed(self, operation_key, signed):
+        """Send and confirm within the validity window; None once it has expired"""
+        txids = [stxn.get_txid() for stxn in signed]
+        last_valid = signed[0].transaction.last_valid_round
+
+        for attempt in range(self.max_attempts):
+            try:
+                with timed("submit"):
+                    self._send(operation_key, signed)
+                with timed("confirm"):
+                    return [
+                        transaction.wait_for_confirmation(
+                            self.algod_client, txid, self.wait_rounds
+                        )
+                        for txid in txids
+                    ]
+            except DuplicateOperation:
+                raise
+            except Exception as e:
+                if not _is_retriable(e):
+                    raise SubmissionError(f"{operation_key} failed: {e}") from e
+                print(f"⚠️ Attempt {attempt + 1} for {operation_key} failed: {e}")
+
+            if self.algod_client.status()["last-round"] > last_valid:
+                return self._confirmed_info(operation_key, txids)
+            self._backoff(attempt)
+
+        raise SubmissionError(
+            f"{operation_key} not confirmed after {self.max_attempts} attempts"
+        )
+
+    def _send(self, operation_key, signed):
+        try:
+            if len(signed) > 1:
+                self.algod_client.send_transactions(signed)
+            else:
+                self.algod_client.send_transaction(signed[0])
+        except error.AlgodHTTPError as e:
+            message = str(e)
+            if _is_already_submitted(message):
+                return
+            if "overlapping lease" in message:
+                hint = "" if self.indexer_client else (
+                    "; set INDEXER_ADDRESS so a rerun can find it once confirmed"
+                )
+                raise DuplicateOperation(
+                    f"{operation_key} is already being processed by another submission{hint}"
+                ) from e
+            raise
+
+    def _confirmed_info(self, operation_key, txids):
+        """Confirmed info after the window closed, or None if it provably never landed"""
+        try:
+            infos = [self.algod_client.pending_transaction_info(txid) for txid in txids]
+        except error.AlgodHTTPError as e:
+            # The node no longer remembers the txid, so only the indexer can
+            # tell whether it landed; without one a rebuild could duplicate it
+            if self.indexer_client is None:
+                raise SubmissionError(
+                    f"Cannot tell whether {operation_key} landed; "
+                    "check the sender's history before rerunning"
+                ) from e
+            previous = self.find_confirmed(operation_key)
+            if previous is None:
+                return None
+            return previous if isinstance(previous, list) else [previous]
+        if all(info.get("confirmed-round") for info in infos):
+            return infos
+        return None
+
+    def _backoff(self, attempt):
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
@@ -0,0 +1,417 @@
+"""
+Offline TEAL assembler for Virtual Card Manager tooling
+Turns the TEAL produced by PyTeal into AVM bytecode without an algod
+`compile` round trip, so sizes and artifacts can be measured locally
+
+Covers the opcodes and pseudo-ops PyTeal emits up to TEAL v8. Pseudo-ops
+`int`, `byte` and `addr` assemble to `pushint`/`pushbytes`; PyTeal's
+`assembleConstants=True` output is assembled as written.
+"""
+
+import base64
+import hashlib
+import re
+
+# name: (opcode, immediate kinds)
+OPCODES = {
+    "err": (0x00, ()), "sha256": (0x01, ()), "keccak256": (0x02, ()),
+    "sha512_256": (0x03, ()), "ed25519verify": (0x04, ()),
+    "ecdsa_verify": (0x05, ("curve",)), "ecdsa_pk_decompress": (0x06, ("curve",)),
+    "ecdsa_pk_recover": (0x07, ("curve",)),
+    "+": (0x08, ()), "-": (0x09, ()), "/": (0x0a, ()), "*": (0x0b, ()),
+    "<": (0x0c, ()), ">": (0x0d, ()), "<=": (0x0e, ()), ">=": (0x0f, ()),
+    "&&": (0x10, ()), "||": (0x11, ()), "==": (0x12, ()), "!=": (0x13, ()),
+    "!": (0x14, ()), "len": (0x15, ()), "itob": (0x16, ()), "btoi": (0x17, ()),
+    "%": (0x18, ()), "|": (0x19, ()), "&": (0x1a, ()), "^": (0x1b, ()),
+    "~": (0x1c, ()), "mulw": (0x1d, ()), "addw": (0x1e, ()), "divmodw": (0x1f, ()),
+    "intcblock": (0x20, ("intcblock",)), "intc": (0x21, ("u8",)),
+    "intc_0": (0x22, ()), "intc_1": (0x23, ()), "intc_2": (0x24, ()), "intc_3": (0x25, ()),
+    "bytecblock": (0x26, ("bytecblock",)), "bytec": (0x27, ("u8",)),
+    "bytec_0": (0x28, ()), "bytec_1": (0x29, ()), "bytec_2": (0x2a, ()), "bytec_3": (0x2b, ()),
+    "arg": (0x2c, ("u8",)), "arg_0": (0x2d, ()), "arg_1": (0x2e, ()),
+    "arg_2": (0x2f, ()), "arg_3": (0x30, ()),
+    "txn": (0x31, ("txn_field",)), "global": (0x32, ("global_field",)),
+    "gtxn": (0x33, ("u8", "txn_field")), "load": (0x34, ("u8",)), "store": (0x35, ("u8",)),
+    "txna": (0x36, ("txn_field", "u8")), "gtxna": (0x37, ("u8", "txn_field", "u8")),
+    "gtxns": (0x38, ("txn_field",)), "gtxnsa": (0x39, ("txn_field", "u8")),
+    "gload": (0x3a, ("u8", "u8")), "gloads": (0x3b, ("u8",)), "gaid": (0x3c, ("u8",)),
+    "gaids": (0x3d, ()), "loads": (0x3e, ()), "stores": (0x3f, ()),
+    "bnz": (0x40, ("label",)), "bz": (0x41, ("label",)), "b": (0x42, ("label",)),
+    "return": (0x43, ()), "assert": (0x44, ()), "bury": (0x45, ("u8",)),
+    "popn": (0x46, ("u8",)), "dupn": (0x47, ("u8",)), "pop": (0x48, ()),
+    "dup": (0x49, ()), "dup2": (0x4a, ()), "dig": (0x4b, ("u8",)), "swap": (0x4c, ()),
+    "select": (0x4d, ()), "cover": (0x4e, ("u8",)), "uncover": (0x4f, ("u8",)),
+    "concat": (0x50, ()), "substring": (0x51, ("u8", "u8")), "substring3": (0x52, ()),
+    "getbit": (0x53, ()), "setbit": (0x54, ()), "getbyte": (0x55, ()), "setbyte": (0x56, ()),
+    "extract": (0x57, ("u8", "u8")), "extract3": (0x58, ()),
+    "extract_uint16": (0x59, ()), "extract_uint32": (0x5a, ()), "extract_uint64": (0x5b, ()),
+    "replace2": (0x5c, ("u8",)), "replace3": (0x5d, ()),
+    "base64_decode": (0x5e, ("base64_encoding",)), "json_ref": (0x5f, ("json_type",)),
+    "balance": (0x60, ()), "app_opted_in": (0x61, ()), "app_local_get": (0x62, ()),
+    "app_local_get_ex": (0x63, ()), "app_global_get": (0x64, ()),
+    "app_global_get_ex": (0x65, ()), "app_local_put": (0x66, ()),
+    "app_global_put": (0x67, ()), "app_local_del": (0x68, ()), "app_global_del": (0x69, ()),
+    "asset_holding_get": (0x70, ("asset_holding_field",)),
+    "asset_params_get": (0x71, ("asset_params_field",)),
+    "app_params_get": (0x72, ("app_params_field",)),
+    "acct_params_get": (0x73, ("acct_params_field",)),
+    "min_balance": (0x78, ()),
+    "pushbytes": (0x80, ("bytes",)), "pushint": (0x81, ("varuint",)),
+    "pushbytess": (0x82, ("bytes_list",)), "pushints": (0x83, ("varuint_list",)),
+    "ed25519verify_bare": (0x84, ()),
+    "callsub": (0x88, ("label",)), "retsub": (0x89, ()),
+    "proto": (0x8a, ("u8", "u8")), "frame_dig": (0x8b, ("i8",)), "frame_bury": (0x8c, ("i8",)),
+    "switch": (0x8d, ("labels",)), "match": (0x8e, ("labels",)),
+    "shl": (0x90, ()), "shr": (0x91, ()), "sqrt": (0x92, ()), "bitlen": (0x93, ()),
+    "exp": (0x94, ()), "expw": (0x95, ()), "bsqrt": (0x96, ()), "divw": (0x97, ()),
+    "sha3_256": (0x98, ()),
+    "b+": (0xa0, ()), "b-": (0xa1, ()), "b/": (0xa2, ()), "b*": (0xa3, ()),
+    "b<": (0xa4, ()), "b>": (0xa5, ()), "b<=": (0xa6, ()), "b>=": (0xa7, ()),
+    "b==": (0xa8, ()), "b!=": (0xa9, ()), "b%": (0xaa, ()), "b|": (0xab, ()),
+    "b&": (0xac, ()), "b^": (0xad, ()), "b~": (0xae, ()), "bzero": (0xaf, ()),
+    "log": (0xb0, ()), "itxn_begin": (0xb1, ()), "itxn_field": (0xb2, ("txn_field",)),
+    "itxn_submit": (0xb3, ()), "itxn": (0xb4, ("txn_field",)),
+    "itxna": (0xb5, ("txn_field", "u8")), "itxn_next": (0xb6, ()),
+    "gitxn": (0xb7, ("u8", "txn_field")), "gitxna": (0xb8, ("u8", "txn_field", "u8")),
+    "box_create": (0xb9, ()), "box_extract": (0xba, ()), "box_replace": (0xbb, ()),
+    "box_del": (0xbc, ()), "box_len": (0xbd, ()), "box_get": (0xbe, ()), "box_put": (0xbf, ()),
+    "txnas": (0xc0, ("txn_field",)), "gtxnas": (0xc1, ("u8", "txn_field")),
+    "gtxnsas": (0xc2, ("txn_field",)), "args": (0xc3, ()), "gloadss": (0xc4, ()),
+    "itxnas": (0xc5, ("txn_field",)), "gitxnas": (0xc6, ("u8", "txn_field")),
+    "vrf_verify": (0xd0, ("vrf_standard",)), "block": (0xd1, ("block_field",)),
+}
+
+TXN_FIELDS = [
+    "Sender", "Fee", "FirstValid", "FirstValidTime", "LastValid", "Note", "Lease",
+    "Receiver", "Amount", "CloseRemainderTo", "VotePK", "SelectionPK", "VoteFirst",
+    "VoteLast", "VoteKeyDilution", "Type", "TypeEnum", "XferAsset", "AssetAmount",
+    "AssetSender", "AssetReceiver", "AssetCloseTo", "GroupIndex", "TxID",
+    "ApplicationID", "OnCompletion", "ApplicationArgs", "NumAppArgs", "Accounts",
+    "NumAccounts", "ApprovalProgram", "ClearStateProgram", "RekeyTo", "ConfigAsset",
+    "ConfigAssetTotal", "ConfigAssetDecimals", "ConfigAssetDefaultFrozen",
+    "ConfigAssetUnitName", "ConfigAssetName", "ConfigAssetURL",
+    "ConfigAssetMetadataHash", "ConfigAssetManager", "ConfigAssetReserve",
+    "ConfigAssetFreeze", "ConfigAssetClawback", "FreezeAsset", "FreezeAssetAccount",
+    "FreezeAssetFrozen", "Assets", "NumAssets", "Applications", "NumApplications",
+    "GlobalNumUint", "GlobalNumByteSlice", "LocalNumUint", "LocalNumByteSlice",
+    "ExtraProgramPages", "Nonparticipation", "Logs", "NumLogs", "CreatedAssetID",
+    "CreatedApplicationID", "LastLog", "StateProofPK", "ApprovalProgramPages",
+    "NumApprovalProgramPages", "ClearStateProgramPages", "NumClearStateProgramPages",
+]
+
+GLOBAL_FIELDS = [
+    "MinTxnFee", "MinBalance", "MaxTxnLife", "ZeroAddress", "GroupSize",
+    "LogicSigVersion", "Round", "LatestTimestamp", "CurrentApplicationID",
+    "CreatorAddress", "CurrentApplicationAddress", "GroupID", "OpcodeBudget",
+    "CallerApplicationID", "CallerApplicationAddress",
+]
+
+ENUM_FIELDS = {
+    "txn_field": TXN_FIELDS,
+    "global_field": GLOBAL_FIELDS,
+    "asset_holding_field": ["AssetBalance", "AssetFrozen"],
+    "asset_params_field": [
+        "AssetTotal", "AssetDecimals", "AssetDefaultFrozen", "AssetUnitName",
+        "AssetName", "AssetURL", "AssetMetadataHash", "AssetManager", "AssetReserve",
+        "AssetFreeze", "AssetClawback", "AssetCreator",
+    ],
+    "app_params_field": [
+        "AppApprovalProgram", "AppClearStateProgram", "AppGlobalNumUint",
+        "AppGlobalNumByteSlice", "AppLocalNumUint", "AppLocalNumByteSlice",
+        "AppExtraProgramPages", "AppCreator", "AppAddress",
+    ],
+    "acct_params_field": [
+        "AcctBalance", "AcctMinBalance", "AcctAuthAddr", "AcctTotalNumUint",
+        "AcctTotalNumByteSlice", "AcctTotalExtraAppPages", "AcctTotalAppsCreated",
+        "AcctTotalAppsOptedIn", "AcctTotalAssetsCreated", "AcctTotalAssets",
+        "AcctTotalBoxes", "AcctTotalBoxBytes",
+    ],
+    "base64_encoding": ["URLEncoding", "StdEncoding"],
+    "json_type": ["JSONString", "JSONUint64", "JSONObject"],
+    "curve": ["Secp256k1", "Secp256r1"],
+    "vrf_standard": ["VrfAlgorand"],
+    "block_field": ["BlkSeed", "BlkTimestamp"],
+}
+
+# Opcodes costing more than 1 unit of the opcode budget
+OPCODE_COSTS = {
+    "sha256": 35, "keccak256": 130, "sha512_256": 45, "sha3_256": 130,
+    "ed25519verify": 1900, "ed25519verify_bare": 1900, "ecdsa_verify": 1700,
+    "ecdsa_pk_decompress": 650, "ecdsa_pk_recover": 2000, "vrf_verify": 5700,
+    "bsqrt": 40, "b+": 10, "b-": 10, "b/": 20, "b*": 20, "b%": 20,
+    "b|": 6, "b&": 6, "b^": 6, "b~": 4, "divw": 1, "divmodw": 20,
+}
+
+# Named integer constants accepted by `int`
+NAMED_INTS = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3,
+    "UpdateApplication": 4, "DeleteApplication": 5,
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+}
+
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\S+')
+
+
+class TealAssemblyError(Exception):
+    """Raised when TEAL source cannot be assembled"""
+
+
+class Instruction:
+    __slots__ = ("op", "args", "line")
+
+    def __init__(self, op, args, line):
+        self.op = op
+        self.args = args
+        self.line = line
+
+    def __repr__(self):
+        return " ".join([self.op] + self.args)
+
+
+def _strip_comment(line):
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(line):
+        if escaped:
+            escaped = False
+        elif ch == "\\" and in_string:
+            escaped = True
+        elif ch == '"':
+            in_string = not in_string
+        elif ch == "/" and not in_string and line[i:i + 2] == "//":
+            return line[:i]
+    return line
+
+
+def parse_teal(source):
+    """Split TEAL source into (version, [Instruction | label string])"""
+    version = 1
+    items = []
+    for number, raw in enumerate(source.splitlines(), start=1):
+        line = raw.strip()
+        if line.startswith("#pragma"):
+            parts = line.split()
+            if len(parts) == 3 and parts[1] == "version":
+                version = int(parts[2])
+            continue
+        line = _strip_comment(line).strip()
+        if not line:
+            continue
+        if line.endswith(":") and " " not in line:
+            items.append(line[:-1])
+            continue
+        tokens = _TOKEN.findall(line)
+        items.append(Instruction(tokens[0], tokens[1:], number))
+    return version, items
+
+
+def encode_varuint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+TEMPLATE_PREFIX = "TMPL_"
+
+
+def is_template(token):
+    """Whether a constant is a TMPL_ placeholder, substituted after assembly"""
+    return token.startswith(TEMPLATE_PREFIX)
+
+
+def parse_int(token):
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    try:
+        return int(token, 0)
+    except ValueError:
+        raise TealAssemblyError(f"Invalid integer constant: {token}")
+
+
+def _unescape(body):
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch != "\\":
+            out += ch.encode()
+            i += 1
+            continue
+        nxt = body[i + 1]
+        if nxt == "x":
+            out.append(int(body[i + 2:i + 4], 16))
+            i += 4
+            continue
+        out += {"n": b"\n", "r": b"\r", "t": b"\t", "\\": b"\\", '"': b'"'}[nxt]
+        i += 2
+    return bytes(out)
+
+
+def parse_bytes(tokens):
+    """Decode a TEAL byte constant; returns (value, tokens consumed)"""
+    first = tokens[0]
+    if first.startswith("0x"):
+        return bytes.fromhex(first[2:]), 1
+    if first.startswith('"'):
+        return _unescape(first[1:-1]), 1
+    if first in ("base64", "b64"):
+        return base64.b64decode(tokens[1]), 2
+    if first in ("base32", "b32"):
+        return base64.b32decode(tokens[1] + "=" * (-len(tokens[1]) % 8)), 2
+    for prefix, decode in (("base64(", base64.b64decode), ("b64(", base64.b64decode)):
+        if first.startswith(prefix):
+            return decode(first[len(prefix):-1]), 1
+    raise TealAssemblyError(f"Invalid byte constant: {' '.join(tokens)}")
+
+
+def decode_address(address):
+    """32-byte public key for a base32 Algorand address"""
+    raw = base64.b32decode(address + "=" * (-len(address) % 8))
+    return raw[:32]
+
+
+def _field_index(kind, token):
+    if token.isdigit():
+        return int(token)
+    try:
+        return ENUM_FIELDS[kind].index(token)
+    except ValueError:
+        raise TealAssemblyError(f"Unknown {kind} {token}")
+
+
+def _normalize(instruction):
+    """Rewrite pseudo-ops into real opcodes"""
+    op, args = instruction.op, instruction.args
+    if op in ("int", "byte") and is_template(args[0]):
+        return "push" + ("int" if op == "int" else "bytes"), args
+    if op == "int":
+        return "pushint", [str(parse_int(args[0]))]
+    if op == "byte":
+        return "pushbytes", ["0x" + parse_bytes(args)[0].hex()]
+    if op == "addr":
+        return "pushbytes", ["0x" + decode_address(args[0]).hex()]
+    if op == "method":
+        selector = hashlib.new("sha512_256", parse_bytes(args)[0]).digest()[:4]
+        return "pushbytes", ["0x" + selector.hex()]
+    return op, args
+
+
+def _encode_immediates(kinds, args):
+    """Encode immediates; label kinds return placeholders resolved later"""
+    out = bytearray()
+    fixups = []
+    position = 0
+    for kind in kinds:
+        if kind == "u8":
+            out.append(parse_int(args[position]) & 0xFF)
+            position += 1
+        elif kind == "i8":
+            out.append(parse_int(args[position]) & 0xFF)
+            position += 1
+        # Template placeholders assemble as 0 / empty bytes (see teal_template.py)
+        elif kind == "varuint":
+            token = args[position]
+            out += encode_varuint(0 if is_template(token) else parse_int(token))
+            position += 1
+        elif kind == "bytes":
+            value, used = (b"", 1) if is_template(args[position]) else parse_bytes(args[position:])
+            out += encode_varuint(len(value)) + value
+            position += used
+        elif kind in ("intcblock", "varuint_list"):
+            values = [0 if is_template(token) else parse_int(token) for token in args]
+            out += encode_varuint(len(values))
+            for value in values:
+                out += encode_varuint(value)
+            position = len(args)
+        elif kind in ("bytecblock", "bytes_list"):
+            values = []
+            while position < len(args):
+                value, used = (b"", 1) if is_template(args[position]) else parse_bytes(args[position:])
+                values.append(value)
+                position += used
+            out += encode_varuint(len(values))
+            for value in values:
+                out += encode_varuint(len(value)) + value
+        elif kind == "label":
+            fixups.append((len(out), args[position]))
+            out += b"\x00\x00"
+            position += 1
+        elif kind == "labels":
+            out.append(len(args))
+            for label in args:
+                fixups.append((len(out), label))
+                out += b"\x00\x00"
+            position = len(args)
+        else:
+            out.append(_field_index(kind, args[position]))
+            position += 1
+    return bytes(out), fixups
+
+
+def instruction_size(instruction):
+    """Encoded size in bytes of one instruction; label offsets count 2 bytes"""
+    op, args = _normalize(instruction)
+    if op not in OPCODES:
+        raise TealAssemblyError(f"Unknown opcode `{instruction.op}` on line {instruction.line}")
+    immediates, _ = _encode_immediates(OPCODES[op][1], args)
+    return 1 + len(immediates)
+
+
+class Assembly:
+    """Assembled program with its pc-to-line source map"""
+
+    def __init__(self, version, bytecode, pc_to_line):
+        self.version = version
+        self.bytecode = bytecode
+        self.pc_to_line = pc_to_line
+
+    def __len__(self):
+        return len(self.bytecode)
+
+
+def assemble_with_map(source):
+    version, items = parse_teal(source)
+    code = bytearray([version])
+    labels = {}
+    fixups = []  # (offset position, label, offset base)
+    pc_to_line = {}
+
+    for item in items:
+        if isinstance(item, str):
+            labels[item] = len(code)
+            continue
+        op, args = _normalize(item)
+        if op not in OPCODES:
+            raise TealAssemblyError(f"Unknown opcode `{item.op}` on line {item.line}")
+        opcode, kinds = OPCODES[op]
+        try:
+            immediates, label_fixups = _encode_immediates(kinds, args)
+        except (IndexError, ValueError) as e:
+            raise TealAssemblyError(f"Bad immediates on line {item.line}: {item}") from e
+        pc = len(code)
+        pc_to_line[pc] = item.line
+        code.append(opcode)
+        # Branch offsets are relative to the end of the whole instruction
+        end = pc + 1 + len(immediates)
+        for position, label in label_fixups:
+            fixups.append((pc + 1 + position, label, end))
+        code += immediates
+
+    for position, label, base in fixups:
+        if label not in labels:
+            raise TealAssemblyError(f"Undefined label `{label}`")
+        offset = labels[label] - base
+        code[position:position + 2] = (offset & 0xFFFF).to_bytes(2, "big")
+
+    return Assembly(version, bytes(code), pc_to_line)
+
+
+def assemble(source):
+    """Assemble TEAL source into AVM bytecode"""
+    return assemble_with_map(source).bytecode
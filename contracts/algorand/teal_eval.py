@@ -0,0 +1,1067 @@
+"""
+TEAL evaluator for Virtual Card Manager tooling
+Runs application programs against an in-memory ledger so compiled contracts
+can be exercised without a node: optimizer equivalence checks, precheck
+conformance and local simulation all share this interpreter
+
+Covers the AVM subset PyTeal emits for our contracts (stateful application
+mode, TEAL v6-v8, inner payments). Failures raise TealError inside `evaluate`, which turns
+them into a rejected EvalResult and leaves the ledger untouched.
+"""
+
+import base64
+import copy
+import hashlib
+
+from teal_assembler import OPCODE_COSTS, decode_address, parse_bytes, parse_int, parse_teal
+
+MAX_UINT64 = 2 ** 64 - 1
+MAX_STACK = 1000
+MAX_BYTES = 4096
+MAX_LOGS = 32
+MAX_LOG_BYTES = 1024
+APP_CALL_BUDGET = 700
+ZERO_ADDRESS = bytes(32)
+
+ON_COMPLETION = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3,
+    "UpdateApplication": 4, "DeleteApplication": 5,
+}
+TYPE_ENUM = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+
+# Transaction fields read from the txn dict; everything else defaults to 0
+TXN_DEFAULTS = {
+    "Sender": ZERO_ADDRESS, "Receiver": ZERO_ADDRESS, "CloseRemainderTo": ZERO_ADDRESS,
+    "RekeyTo": ZERO_ADDRESS, "Note": b"", "Lease": bytes(32), "TxID": bytes(32),
+    "Type": b"appl", "TypeEnum": 6,
+}
+# Inner payment fields the evaluator supports, by value type. Inner payments
+# move ledger.balances; minimum balances are not enforced.
+INNER_FIELDS = {
+    "Type": "bytes", "TypeEnum": "uint64", "Sender": "address", "Receiver": "address",
+    "Amount": "uint64", "CloseRemainderTo": "address", "Fee": "uint64", "Note": "bytes",
+}
+MAX_INNER_TXNS = 256
+ARRAY_FIELDS = {
+    "ApplicationArgs": "NumAppArgs", "Accounts": "NumAccounts",
+    "Assets": "NumAssets", "Applications": "NumApplications",
+}
+
+
+class TealError(Exception):
+    """Raised when program execution fails"""
+
+
+def application_address(app_id):
+    """Escrow address bytes of an application"""
+    return hashlib.new("sha512_256", b"appID" + app_id.to_bytes(8, "big")).digest()
+
+
+class Ledger:
+    """In-memory application state: global, per-account local and boxes"""
+
+    def __init__(self, app_id=1, global_state=None, local_state=None, boxes=None,
+                 balances=None, creator=ZERO_ADDRESS):
+        self.app_id = app_id
+        self.creator = creator
+        self.global_state = dict(global_state or {})
+        # address -> {key: value}; an entry means the account is opted in
+        self.local_state = {addr: dict(state) for addr, state in (local_state or {}).items()}
+        self.boxes = dict(boxes or {})
+        self.balances = dict(balances or {})
+
+    @property
+    def address(self):
+        return application_address(self.app_id)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def snapshot(self):
+        """Comparable view of all state"""
+        return {
+            "global": dict(self.global_state),
+            "local": {addr: dict(state) for addr, state in self.local_state.items()},
+            "boxes": dict(self.boxes),
+            "balances": dict(self.balances),
+        }
+
+
+class EvalResult:
+    def __init__(self, approved, error, logs, cost, ledger, inner_txns=()):
+        self.approved = approved
+        self.error = error
+        self.logs = logs
+        self.cost = cost
+        self.ledger = ledger
+        self.inner_txns = list(inner_txns)
+
+    def outcome(self):
+        """What an observer of the chain sees: verdict, logs and final state"""
+        return {
+            "approved": self.approved,
+            "failed": self.error is not None,
+            "logs": list(self.logs),
+            "inner_txns": list(self.inner_txns),
+            "state": self.ledger.snapshot(),
+        }
+
+    def __repr__(self):
+        status = "approved" if self.approved else f"rejected ({self.error or 'returned 0'})"
+        return f"EvalResult({status}, cost={self.cost}, logs={len(self.logs)})"
+
+
+class Program:
+    """Parsed TEAL with resolved labels and constant blocks"""
+
+    def __init__(self, source):
+        self.version, items = parse_teal(source)
+        self.labels = {}
+        self.instructions = []
+        for item in items:
+            if isinstance(item, str):
+                self.labels[item] = len(self.instructions)
+            else:
+                self.instructions.append(item)
+
+
+def make_txn(sender, app_args=(), on_completion=0, application_id=1, **fields):
+    """Application call transaction dict; app args may be bytes, str or int"""
+    args = []
+    for arg in app_args:
+        if isinstance(arg, int):
+            arg = arg.to_bytes(8, "big")
+        elif isinstance(arg, str):
+            arg = arg.encode()
+        args.append(arg)
+    txn = {
+        "Sender": sender, "ApplicationID": application_id, "OnCompletion": on_completion,
+        "ApplicationArgs": args, "Type": b"appl", "TypeEnum": TYPE_ENUM["appl"],
+    }
+    txn.update(fields)
+    return txn
+
+
+def make_payment(sender, receiver, amount, **fields):
+    txn = {
+        "Sender": sender, "Receiver": receiver, "Amount": amount,
+        "Type": b"pay", "TypeEnum": TYPE_ENUM["pay"],
+    }
+    txn.update(fields)
+    return txn
+
+
+class _Frame:
+    __slots__ = ("return_pc", "height", "args", "returns")
+
+    def __init__(self, return_pc, height):
+        self.return_pc = return_pc
+        self.height = height
+        self.args = None
+        self.returns = None
+
+
+class _Machine:
+    def __init__(self, program, ledger, group, index, globals_, budget):
+        self.program = program
+        self.ledger = ledger
+        self.group = group
+        self.index = index
+        self.txn = group[index]
+        self.globals = globals_
+        self.budget = budget
+        self.cost = 0
+        self.stack = []
+        self.scratch = [0] * 256
+        self.frames = []
+        self.logs = []
+        self.intcblock = []
+        self.bytecblock = []
+        self.inner = None  # inner transaction being built
+        self.inner_txns = []
+
+    # -- stack helpers -------------------------------------------------
+    def push(self, value):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            if not 0 <= value <= MAX_UINT64:
+                raise TealError(f"uint64 overflow: {value}")
+        elif len(value) > MAX_BYTES:
+            raise TealError("byte value exceeds 4096 bytes")
+        if len(self.stack) >= MAX_STACK:
+            raise TealError("stack overflow")
+        self.stack.append(value)
+
+    def pop(self):
+        if not self.stack:
+            raise TealError("stack underflow")
+        return self.stack.pop()
+
+    def pop_int(self):
+        value = self.pop()
+        if not isinstance(value, int):
+            raise TealError("expected uint64, got bytes")
+        return value
+
+    def pop_bytes(self):
+        value = self.pop()
+        if not isinstance(value, bytes):
+            raise TealError("expected bytes, got uint64")
+        return value
+
+    # -- field access --------------------------------------------------
+    def txn_field(self, txn, field, index=None):
+        if field in ARRAY_FIELDS:
+            values = txn.get(field, [])
+            if field == "Accounts":
+                values = [txn.get("Sender", ZERO_ADDRESS)] + list(values)
+            if field == "Applications":
+                values = [self.ledger.app_id] + list(values)
+            if index is None or index >= len(values):
+                raise TealError(f"{field} index {index} out of range")
+            return values[index]
+        for array, count in ARRAY_FIELDS.items():
+            if field == count:
+                return len(txn.get(array, []))
+        if field == "GroupIndex":
+            return next(i for i, member in enumerate(self.group) if member is txn)
+        if field == "TxID" and "TxID" not in txn:
+            return hashlib.sha256(repr(sorted(txn.items())).encode()).digest()
+        return txn.get(field, TXN_DEFAULTS.get(field, 0))
+
+    def global_field(self, field):
+        if field == "GroupSize":
+            return len(self.group)
+        if field == "OpcodeBudget":
+            return self.budget - self.cost
+        if field == "CurrentApplicationID":
+            return self.ledger.app_id
+        if field == "CurrentApplicationAddress":
+            return self.ledger.address
+        if field == "CreatorAddress":
+            return self.ledger.creator
+        if field == "ZeroAddress":
+            return ZERO_ADDRESS
+        if field in self.globals:
+            return self.globals[field]
+        raise TealError(f"unsupported global {field}")
+
+    def account(self, ref):
+        """Resolve an account reference: address bytes or Accounts index"""
+        if isinstance(ref, int):
+            return self.txn_field(self.txn, "Accounts", ref)
+        if len(ref) != 32:
+            raise TealError("invalid account reference")
+        return ref
+
+    def local_state(self, ref, create=False):
+        address = self.account(ref)
+        state = self.ledger.local_state.get(address)
+        if state is None and create:
+            raise TealError("account is not opted in to the application")
+        return state
+
+    # -- execution -----------------------------------------------------
+    def run(self):
+        instructions = self.program.instructions
+        pc = 0
+        while pc < len(instructions):
+            instruction = instructions[pc]
+            self.cost += OPCODE_COSTS.get(instruction.op, 1)
+            if self.cost > self.budget:
+                raise TealError("dynamic cost budget exceeded")
+            try:
+                result = self.step(instruction, pc)
+            except (IndexError, KeyError, ValueError) as e:
+                raise TealError(f"line {instruction.line}: {instruction}: {e}") from e
+            if result is _RETURN:
+                break
+            pc = pc + 1 if result is None else result
+        else:
+            if len(self.stack) != 1:
+                raise TealError(f"stack has {len(self.stack)} values at program end")
+        value = self.pop()
+        if not isinstance(value, int):
+            raise TealError("program returned bytes")
+        return value != 0
+
+    def branch(self, label):
+        return self.program.labels[label]
+
+    def step(self, instruction, pc):
+        op, args = instruction.op, instruction.args
+        handler = _BINARY_INT.get(op)
+        if handler is not None:
+            b = self.pop_int()
+            a = self.pop_int()
+            self.push(handler(a, b))
+            return None
+        handler = _OPS.get(op)
+        if handler is None:
+            raise TealError(f"unsupported opcode {op}")
+        return handler(self, args, pc)
+
+
+_RETURN = object()
+
+
+def _checked_div(a, b):
+    if b == 0:
+        raise TealError("division by zero")
+    return a // b
+
+
+def _checked_mod(a, b):
+    if b == 0:
+        raise TealError("modulo by zero")
+    return a % b
+
+
+def _checked_sub(a, b):
+    if b > a:
+        raise TealError("uint64 underflow")
+    return a - b
+
+
+_BINARY_INT = {
+    "+": lambda a, b: a + b,
+    "-": _checked_sub,
+    "*": lambda a, b: a * b,
+    "/": _checked_div,
+    "%": _checked_mod,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+    "&&": lambda a, b: bool(a and b),
+    "||": lambda a, b: bool(a or b),
+    "|": lambda a, b: a | b,
+    "&": lambda a, b: a & b,
+    "^": lambda a, b: a ^ b,
+    "shl": lambda a, b: (a << b) & MAX_UINT64 if b < 64 else _fail("shl by 64 or more"),
+    "shr": lambda a, b: a >> b if b < 64 else _fail("shr by 64 or more"),
+    "exp": lambda a, b: _fail("0^0 is undefined") if a == b == 0 else a ** b,
+}
+
+
+def _fail(message):
+    raise TealError(message)
+
+
+def _compare(negate):
+    def handler(m, args, pc):
+        b = m.pop()
+        a = m.pop()
+        if type(a) is not type(b):
+            raise TealError("comparing uint64 with bytes")
+        m.push((a != b) if negate else (a == b))
+    return handler
+
+
+def _op_not(m, args, pc):
+    m.push(m.pop_int() == 0)
+
+
+def _op_bnot(m, args, pc):
+    m.push(m.pop_int() ^ MAX_UINT64)
+
+
+def _op_len(m, args, pc):
+    m.push(len(m.pop_bytes()))
+
+
+def _op_itob(m, args, pc):
+    m.push(m.pop_int().to_bytes(8, "big"))
+
+
+def _op_btoi(m, args, pc):
+    value = m.pop_bytes()
+    if len(value) > 8:
+        raise TealError("btoi of more than 8 bytes")
+    m.push(int.from_bytes(value, "big"))
+
+
+def _op_mulw(m, args, pc):
+    b = m.pop_int()
+    a = m.pop_int()
+    product = a * b
+    m.push(product >> 64)
+    m.push(product & MAX_UINT64)
+
+
+def _op_addw(m, args, pc):
+    b = m.pop_int()
+    a = m.pop_int()
+    total = a + b
+    m.push(total >> 64)
+    m.push(total & MAX_UINT64)
+
+
+def _op_divw(m, args, pc):
+    c = m.pop_int()
+    lo = m.pop_int()
+    hi = m.pop_int()
+    if c == 0:
+        raise TealError("division by zero")
+    quotient = ((hi << 64) | lo) // c
+    if quotient > MAX_UINT64:
+        raise TealError("divw overflow")
+    m.push(quotient)
+
+
+def _op_divmodw(m, args, pc):
+    divisor_lo = m.pop_int()
+    divisor_hi = m.pop_int()
+    lo = m.pop_int()
+    hi = m.pop_int()
+    divisor = (divisor_hi << 64) | divisor_lo
+    if divisor == 0:
+        raise TealError("division by zero")
+    quotient, remainder = divmod((hi << 64) | lo, divisor)
+    m.push(quotient >> 64)
+    m.push(quotient & MAX_UINT64)
+    m.push(remainder >> 64)
+    m.push(remainder & MAX_UINT64)
+
+
+def _op_sqrt(m, args, pc):
+    value = m.pop_int()
+    root = int(value ** 0.5)
+    while root * root > value:
+        root -= 1
+    while (root + 1) * (root + 1) <= value:
+        root += 1
+    m.push(root)
+
+
+def _op_bitlen(m, args, pc):
+    value = m.pop()
+    m.push(value.bit_length() if isinstance(value, int) else int.from_bytes(value, "big").bit_length())
+
+
+def _op_intcblock(m, args, pc):
+    m.intcblock = [parse_int(token) for token in args]
+
+
+def _op_bytecblock(m, args, pc):
+    values = []
+    position = 0
+    while position < len(args):
+        value, used = parse_bytes(args[position:])
+        values.append(value)
+        position += used
+    m.bytecblock = values
+
+
+def _intc(index):
+    def handler(m, args, pc):
+        m.push(m.intcblock[index if index is not None else parse_int(args[0])])
+    return handler
+
+
+def _bytec(index):
+    def handler(m, args, pc):
+        m.push(m.bytecblock[index if index is not None else parse_int(args[0])])
+    return handler
+
+
+def _op_pushint(m, args, pc):
+    m.push(parse_int(args[0]))
+
+
+def _op_pushbytes(m, args, pc):
+    m.push(parse_bytes(args)[0])
+
+
+def _op_addr(m, args, pc):
+    m.push(decode_address(args[0]))
+
+
+def _op_method(m, args, pc):
+    m.push(hashlib.new("sha512_256", parse_bytes(args)[0]).digest()[:4])
+
+
+def _op_txn(m, args, pc):
+    index = parse_int(args[1]) if len(args) > 1 else None
+    m.push(m.txn_field(m.txn, args[0], index))
+
+
+def _op_txna(m, args, pc):
+    m.push(m.txn_field(m.txn, args[0], parse_int(args[1])))
+
+
+def _op_txnas(m, args, pc):
+    m.push(m.txn_field(m.txn, args[0], m.pop_int()))
+
+
+def _op_gtxn(m, args, pc):
+    txn = m.group[parse_int(args[0])]
+    index = parse_int(args[2]) if len(args) > 2 else None
+    m.push(m.txn_field(txn, args[1], index))
+
+
+def _op_gtxna(m, args, pc):
+    m.push(m.txn_field(m.group[parse_int(args[0])], args[1], parse_int(args[2])))
+
+
+def _op_gtxns(m, args, pc):
+    txn = m.group[m.pop_int()]
+    index = parse_int(args[1]) if len(args) > 1 else None
+    m.push(m.txn_field(txn, args[0], index))
+
+
+def _op_gtxnsa(m, args, pc):
+    txn = m.group[m.pop_int()]
+    m.push(m.txn_field(txn, args[0], parse_int(args[1])))
+
+
+def _op_global(m, args, pc):
+    m.push(m.global_field(args[0]))
+
+
+def _op_load(m, args, pc):
+    m.push(m.scratch[parse_int(args[0])])
+
+
+def _op_store(m, args, pc):
+    m.scratch[parse_int(args[0])] = m.pop()
+
+
+def _op_loads(m, args, pc):
+    m.push(m.scratch[m.pop_int()])
+
+
+def _op_stores(m, args, pc):
+    value = m.pop()
+    m.scratch[m.pop_int()] = value
+
+
+def _op_bnz(m, args, pc):
+    return m.branch(args[0]) if m.pop_int() else None
+
+
+def _op_bz(m, args, pc):
+    return None if m.pop_int() else m.branch(args[0])
+
+
+def _op_b(m, args, pc):
+    return m.branch(args[0])
+
+
+def _op_return(m, args, pc):
+    value = m.pop()
+    m.stack = [value]
+    return _RETURN
+
+
+def _op_err(m, args, pc):
+    raise TealError("err opcode executed")
+
+
+def _op_assert(m, args, pc):
+    if not m.pop_int():
+        raise TealError(f"assert failed on line {m.program.instructions[pc].line}")
+
+
+def _op_pop(m, args, pc):
+    m.pop()
+
+
+def _op_popn(m, args, pc):
+    for _ in range(parse_int(args[0])):
+        m.pop()
+
+
+def _op_dup(m, args, pc):
+    value = m.pop()
+    m.push(value)
+    m.push(value)
+
+
+def _op_dup2(m, args, pc):
+    b = m.pop()
+    a = m.pop()
+    for value in (a, b, a, b):
+        m.push(value)
+
+
+def _op_dupn(m, args, pc):
+    value = m.pop()
+    for _ in range(parse_int(args[0]) + 1):
+        m.push(value)
+
+
+def _op_dig(m, args, pc):
+    depth = parse_int(args[0])
+    if depth >= len(m.stack):
+        raise TealError("dig below stack")
+    m.push(m.stack[-1 - depth])
+
+
+def _op_bury(m, args, pc):
+    depth = parse_int(args[0])
+    if depth == 0 or depth >= len(m.stack):
+        raise TealError("bury below stack")
+    m.stack[-1 - depth] = m.stack[-1]
+    m.pop()
+
+
+def _op_swap(m, args, pc):
+    b = m.pop()
+    a = m.pop()
+    m.push(b)
+    m.push(a)
+
+
+def _op_select(m, args, pc):
+    c = m.pop_int()
+    b = m.pop()
+    a = m.pop()
+    m.push(b if c else a)
+
+
+def _op_cover(m, args, pc):
+    depth = parse_int(args[0])
+    if depth >= len(m.stack):
+        raise TealError("cover below stack")
+    m.stack.insert(len(m.stack) - 1 - depth, m.stack.pop())
+
+
+def _op_uncover(m, args, pc):
+    depth = parse_int(args[0])
+    if depth >= len(m.stack):
+        raise TealError("uncover below stack")
+    m.stack.append(m.stack.pop(-1 - depth))
+
+
+def _op_concat(m, args, pc):
+    b = m.pop_bytes()
+    a = m.pop_bytes()
+    m.push(a + b)
+
+
+def _slice(value, start, end):
+    if start > end or end > len(value):
+        raise TealError("substring out of range")
+    return value[start:end]
+
+
+def _op_substring(m, args, pc):
+    m.push(_slice(m.pop_bytes(), parse_int(args[0]), parse_int(args[1])))
+
+
+def _op_substring3(m, args, pc):
+    end = m.pop_int()
+    start = m.pop_int()
+    m.push(_slice(m.pop_bytes(), start, end))
+
+
+def _op_extract(m, args, pc):
+    value = m.pop_bytes()
+    start, length = parse_int(args[0]), parse_int(args[1])
+    if length == 0:
+        length = len(value) - start
+    m.push(_slice(value, start, start + length))
+
+
+def _op_extract3(m, args, pc):
+    length = m.pop_int()
+    start = m.pop_int()
+    m.push(_slice(m.pop_bytes(), start, start + length))
+
+
+def _extract_uint(width):
+    def handler(m, args, pc):
+        start = m.pop_int()
+        m.push(int.from_bytes(_slice(m.pop_bytes(), start, start + width), "big"))
+    return handler
+
+
+def _op_replace2(m, args, pc):
+    replacement = m.pop_bytes()
+    value = m.pop_bytes()
+    start = parse_int(args[0])
+    _slice(value, start, start + len(replacement))
+    m.push(value[:start] + replacement + value[start + len(replacement):])
+
+
+def _op_replace3(m, args, pc):
+    replacement = m.pop_bytes()
+    start = m.pop_int()
+    value = m.pop_bytes()
+    _slice(value, start, start + len(replacement))
+    m.push(value[:start] + replacement + value[start + len(replacement):])
+
+
+def _op_getbyte(m, args, pc):
+    index = m.pop_int()
+    m.push(_slice(m.pop_bytes(), index, index + 1)[0])
+
+
+def _op_setbyte(m, args, pc):
+    byte = m.pop_int()
+    index = m.pop_int()
+    value = bytearray(m.pop_bytes())
+    if index >= len(value) or byte > 255:
+        raise TealError("setbyte out of range")
+    value[index] = byte
+    m.push(bytes(value))
+
+
+def _op_bzero(m, args, pc):
+    m.push(bytes(m.pop_int()))
+
+
+def _hash(name):
+    def handler(m, args, pc):
+        value = m.pop_bytes()
+        if name == "keccak256":
+            raise TealError("keccak256 is not supported by the evaluator")
+        m.push(hashlib.new(name, value).digest())
+    return handler
+
+
+def _op_base64_decode(m, args, pc):
+    value = m.pop_bytes()
+    decode = base64.urlsafe_b64decode if args[0] == "URLEncoding" else base64.b64decode
+    m.push(decode(value))
+
+
+def _op_log(m, args, pc):
+    value = m.pop_bytes()
+    if len(m.logs) >= MAX_LOGS or sum(map(len, m.logs)) + len(value) > MAX_LOG_BYTES:
+        raise TealError("log limit exceeded")
+    m.logs.append(value)
+
+
+def _op_balance(m, args, pc):
+    m.push(m.ledger.balances.get(m.account(m.pop()), 0))
+
+
+def _op_min_balance(m, args, pc):
+    m.account(m.pop())
+    m.push(m.globals.get("MinBalance", 100_000))
+
+
+def _op_app_opted_in(m, args, pc):
+    app = m.pop_int()
+    address = m.account(m.pop())
+    m.push(app in (m.ledger.app_id, 0) and address in m.ledger.local_state)
+
+
+def _op_app_local_get(m, args, pc):
+    key = m.pop_bytes()
+    state = m.local_state(m.pop())
+    m.push((state or {}).get(key, 0))
+
+
+def _op_app_local_get_ex(m, args, pc):
+    key = m.pop_bytes()
+    m.pop_int()
+    state = m.local_state(m.pop())
+    exists = state is not None and key in state
+    m.push(state[key] if exists else 0)
+    m.push(exists)
+
+
+def _op_app_global_get(m, args, pc):
+    m.push(m.ledger.global_state.get(m.pop_bytes(), 0))
+
+
+def _op_app_global_get_ex(m, args, pc):
+    key = m.pop_bytes()
+    m.pop_int()
+    exists = key in m.ledger.global_state
+    m.push(m.ledger.global_state.get(key, 0))
+    m.push(exists)
+
+
+def _op_app_local_put(m, args, pc):
+    value = m.pop()
+    key = m.pop_bytes()
+    if len(key) > 64:
+        raise TealError("state key exceeds 64 bytes")
+    m.local_state(m.pop(), create=True)[key] = value
+
+
+def _op_app_global_put(m, args, pc):
+    value = m.pop()
+    key = m.pop_bytes()
+    if len(key) > 64:
+        raise TealError("state key exceeds 64 bytes")
+    m.ledger.global_state[key] = value
+
+
+def _op_app_local_del(m, args, pc):
+    key = m.pop_bytes()
+    m.local_state(m.pop(), create=True).pop(key, None)
+
+
+def _op_app_global_del(m, args, pc):
+    m.ledger.global_state.pop(m.pop_bytes(), None)
+
+
+def _op_callsub(m, args, pc):
+    if len(m.frames) >= 1024:
+        raise TealError("callsub depth exceeded")
+    m.frames.append(_Frame(pc + 1, len(m.stack)))
+    return m.branch(args[0])
+
+
+def _op_proto(m, args, pc):
+    if not m.frames:
+        raise TealError("proto outside subroutine")
+    frame = m.frames[-1]
+    frame.args = parse_int(args[0])
+    frame.returns = parse_int(args[1])
+    if frame.args > len(m.stack):
+        raise TealError("proto arguments below stack")
+
+
+def _op_retsub(m, args, pc):
+    if not m.frames:
+        raise TealError("retsub outside subroutine")
+    frame = m.frames.pop()
+    if frame.args is not None:
+        if len(m.stack) < frame.height + frame.returns:
+            raise TealError("retsub without declared return values")
+        returns = m.stack[len(m.stack) - frame.returns:] if frame.returns else []
+        del m.stack[frame.height - frame.args:]
+        m.stack.extend(returns)
+    return frame.return_pc
+
+
+def _frame_index(m, offset):
+    if not m.frames or m.frames[-1].args is None:
+        raise TealError("frame access without proto")
+    frame = m.frames[-1]
+    index = frame.height + offset
+    if offset < 0 and -offset > frame.args:
+        raise TealError("frame_dig below arguments")
+    if index >= len(m.stack):
+        raise TealError("frame access above stack")
+    return index
+
+
+def _op_frame_dig(m, args, pc):
+    m.push(m.stack[_frame_index(m, parse_int(args[0]))])
+
+
+def _op_frame_bury(m, args, pc):
+    index = _frame_index(m, parse_int(args[0]))
+    m.stack[index] = m.pop()
+
+
+def _op_switch(m, args, pc):
+    index = m.pop_int()
+    return m.branch(args[index]) if index < len(args) else None
+
+
+def _op_match(m, args, pc):
+    value = m.pop()
+    candidates = [m.pop() for _ in args][::-1]
+    for label, candidate in zip(args, candidates):
+        if candidate == value:
+            return m.branch(label)
+    return None
+
+
+def _op_itxn_begin(m, args, pc):
+    if m.inner is not None:
+        raise TealError("itxn_begin without itxn_submit")
+    if len(m.inner_txns) >= MAX_INNER_TXNS:
+        raise TealError("too many inner transactions")
+    m.inner = {"Sender": m.ledger.address, "Fee": m.globals["MinTxnFee"]}
+
+
+def _op_itxn_field(m, args, pc):
+    if m.inner is None:
+        raise TealError("itxn_field without itxn_begin")
+    field = args[0]
+    if field not in INNER_FIELDS:
+        raise TealError(f"unsupported inner transaction field {field}")
+    value = m.pop()
+    if isinstance(value, int) != (INNER_FIELDS[field] == "uint64"):
+        raise TealError(f"{field} has the wrong type")
+    if INNER_FIELDS[field] == "address":
+        value = m.account(value)
+    if field == "Sender" and value != m.ledger.address:
+        raise TealError("inner transactions must be sent by the application")
+    m.inner[field] = value
+
+
+def _op_itxn_submit(m, args, pc):
+    inner = m.inner
+    if inner is None:
+        raise TealError("itxn_submit without itxn_begin")
+    m.inner = None
+    kind = inner.get("TypeEnum") or TYPE_ENUM.get(inner.get("Type", b"").decode(errors="replace"))
+    if kind != TYPE_ENUM["pay"]:
+        raise TealError("only payment inner transactions are supported")
+    inner["Type"], inner["TypeEnum"] = b"pay", TYPE_ENUM["pay"]
+    balances = m.ledger.balances
+    sender, receiver = inner["Sender"], inner.get("Receiver", ZERO_ADDRESS)
+    amount = inner.get("Amount", 0)
+    # Fees below the minimum must be covered by the outer group (fee pooling)
+    debit = amount + inner["Fee"]
+    if balances.get(sender, 0) < debit:
+        raise TealError("inner payment overspends the application account")
+    balances[sender] = balances.get(sender, 0) - debit
+    balances[receiver] = balances.get(receiver, 0) + amount
+    close_to = inner.get("CloseRemainderTo", ZERO_ADDRESS)
+    if close_to != ZERO_ADDRESS:
+        balances[close_to] = balances.get(close_to, 0) + balances.pop(sender)
+    m.inner_txns.append(inner)
+
+
+def _op_itxn(m, args, pc):
+    if not m.inner_txns:
+        raise TealError("no inner transaction submitted")
+    m.push(m.inner_txns[-1].get(args[0], TXN_DEFAULTS.get(args[0], 0)))
+
+
+def _op_box_create(m, args, pc):
+    size = m.pop_int()
+    name = m.pop_bytes()
+    if not 0 < len(name) <= 64 or size > 32768:
+        raise TealError("invalid box")
+    if name in m.ledger.boxes:
+        if len(m.ledger.boxes[name]) != size:
+            raise TealError("box_create with a different size")
+        m.push(0)
+        return
+    m.ledger.boxes[name] = bytes(size)
+    m.push(1)
+
+
+def _box(m, name):
+    if name not in m.ledger.boxes:
+        raise TealError(f"no such box {name!r}")
+    return m.ledger.boxes[name]
+
+
+def _op_box_extract(m, args, pc):
+    length = m.pop_int()
+    start = m.pop_int()
+    m.push(_slice(_box(m, m.pop_bytes()), start, start + length))
+
+
+def _op_box_replace(m, args, pc):
+    replacement = m.pop_bytes()
+    start = m.pop_int()
+    name = m.pop_bytes()
+    value = _box(m, name)
+    _slice(value, start, start + len(replacement))
+    m.ledger.boxes[name] = value[:start] + replacement + value[start + len(replacement):]
+
+
+def _op_box_del(m, args, pc):
+    m.push(m.ledger.boxes.pop(m.pop_bytes(), None) is not None)
+
+
+def _op_box_len(m, args, pc):
+    value = m.ledger.boxes.get(m.pop_bytes())
+    m.push(0 if value is None else len(value))
+    m.push(value is not None)
+
+
+def _op_box_get(m, args, pc):
+    value = m.ledger.boxes.get(m.pop_bytes())
+    m.push(b"" if value is None else value)
+    m.push(value is not None)
+
+
+def _op_box_put(m, args, pc):
+    value = m.pop_bytes()
+    name = m.pop_bytes()
+    if name in m.ledger.boxes and len(m.ledger.boxes[name]) != len(value):
+        raise TealError("box_put changes box size")
+    m.ledger.boxes[name] = value
+
+
+_OPS = {
+    "==": _compare(False), "!=": _compare(True), "!": _op_not, "~": _op_bnot,
+    "len": _op_len, "itob": _op_itob, "btoi": _op_btoi,
+    "mulw": _op_mulw, "addw": _op_addw, "divw": _op_divw, "divmodw": _op_divmodw,
+    "sqrt": _op_sqrt, "bitlen": _op_bitlen,
+    "intcblock": _op_intcblock, "intc": _intc(None),
+    "intc_0": _intc(0), "intc_1": _intc(1), "intc_2": _intc(2), "intc_3": _intc(3),
+    "bytecblock": _op_bytecblock, "bytec": _bytec(None),
+    "bytec_0": _bytec(0), "bytec_1": _bytec(1), "bytec_2": _bytec(2), "bytec_3": _bytec(3),
+    "pushint": _op_pushint, "int": _op_pushint,
+    "pushbytes": _op_pushbytes, "byte": _op_pushbytes,
+    "addr": _op_addr, "method": _op_method,
+    "txn": _op_txn, "txna": _op_txna, "txnas": _op_txnas,
+    "gtxn": _op_gtxn, "gtxna": _op_gtxna, "gtxns": _op_gtxns, "gtxnsa": _op_gtxnsa,
+    "global": _op_global,
+    "load": _op_load, "store": _op_store, "loads": _op_loads, "stores": _op_stores,
+    "bnz": _op_bnz, "bz": _op_bz, "b": _op_b,
+    "return": _op_return, "err": _op_err, "assert": _op_assert,
+    "pop": _op_pop, "popn": _op_popn, "dup": _op_dup, "dup2": _op_dup2, "dupn": _op_dupn,
+    "dig": _op_dig, "bury": _op_bury, "swap": _op_swap, "select": _op_select,
+    "cover": _op_cover, "uncover": _op_uncover,
+    "concat": _op_concat, "substring": _op_substring, "substring3": _op_substring3,
+    "extract": _op_extract, "extract3": _op_extract3,
+    "extract_uint16": _extract_uint(2), "extract_uint32": _extract_uint(4),
+    "extract_uint64": _extract_uint(8),
+    "replace2": _op_replace2, "replace3": _op_replace3,
+    "getbyte": _op_getbyte, "setbyte": _op_setbyte, "bzero": _op_bzero,
+    "sha256": _hash("sha256"), "sha512_256": _hash("sha512_256"),
+    "sha3_256": _hash("sha3_256"), "keccak256": _hash("keccak256"),
+    "base64_decode": _op_base64_decode,
+    "log": _op_log,
+    "balance": _op_balance, "min_balance": _op_min_balance,
+    "app_opted_in": _op_app_opted_in,
+    "app_local_get": _op_app_local_get, "app_local_get_ex": _op_app_local_get_ex,
+    "app_global_get": _op_app_global_get, "app_global_get_ex": _op_app_global_get_ex,
+    "app_local_put": _op_app_local_put, "app_global_put": _op_app_global_put,
+    "app_local_del": _op_app_local_del, "app_global_del": _op_app_global_del,
+    "callsub": _op_callsub, "proto": _op_proto, "retsub": _op_retsub,
+    "frame_dig": _op_frame_dig, "frame_bury": _op_frame_bury,
+    "switch": _op_switch, "match": _op_match,
+    "box_create": _op_box_create, "box_extract": _op_box_extract,
+    "box_replace": _op_box_replace, "box_del": _op_box_del, "box_len": _op_box_len,
+    "box_get": _op_box_get, "box_put": _op_box_put,
+    "itxn_begin": _op_itxn_begin, "itxn_field": _op_itxn_field,
+    "itxn_submit": _op_itxn_submit, "itxn": _op_itxn,
+}
+
+
+def evaluate(program, ledger, group, index=0, globals_=None, budget=None):
+    """
+    Run an application program for `group[index]` against `ledger`.
+
+    `program` is TEAL source or a Program. The ledger is not modified; the
+    returned EvalResult carries a copy with the call's effects applied when
+    it was approved.
+    """
+    if isinstance(program, str):
+        program = Program(program)
+    if budget is None:
+        app_calls = sum(1 for txn in group if txn.get("TypeEnum") == TYPE_ENUM["appl"])
+        budget = APP_CALL_BUDGET * max(app_calls, 1)
+    globals_ = dict({"MinTxnFee": 1000, "MinBalance": 100_000, "MaxTxnLife": 1000,
+                     "Round": 1, "LatestTimestamp": 0, "LogicSigVersion": 8,
+                     "GroupID": bytes(32), "CallerApplicationID": 0,
+                     "CallerApplicationAddress": ZERO_ADDRESS}, **(globals_ or {}))
+
+    working = ledger.copy()
+    txn = group[index]
+    if txn.get("OnCompletion") == ON_COMPLETION["OptIn"]:
+        working.local_state.setdefault(txn["Sender"], {})
+
+    machine = _Machine(program, working, group, index, globals_, budget)
+    try:
+        approved = machine.run()
+    except TealError as e:
+        return EvalResult(False, str(e), machine.logs, machine.cost, ledger.copy())
+
+    if not approved:
+        return EvalResult(False, None, machine.logs, machine.cost, ledger.copy())
+    if machine.inner is not None:
+        return EvalResult(False, "itxn_begin without itxn_submit", machine.logs, machine.cost,
+                          ledger.copy())
+    if txn.get("OnCompletion") == ON_COMPLETION["CloseOut"]:
+        working.local_state.pop(txn["Sender"], None)
+    return EvalResult(True, None, machine.logs, machine.cost, working, machine.inner_txns)
@@ -0,0 +1,907 @@
+"""
+TEAL peephole optimizer for the Virtual Card Manager contracts
+Post-compile pass over PyTeal output that removes work the AVM would
+otherwise repeat on every call
+
+Passes:
+- constant folding: arithmetic, comparisons and byte ops on constants,
+  constant branch conditions and `x == 0` tests
+- dead-branch removal: unreachable code and subroutines, jumps to the next
+  instruction, jump chains, `If(c, Approve(), Reject())` shapes and unused
+  constant block entries
+- redundant-load elimination: a pure expression (state read, txn arg
+  decode, side-effect free subroutine call) computed more than once in an
+  extended basic block is kept in a free scratch slot after its first use
+
+Every rewrite preserves the verdict, logs and state changes of the original
+program; verify_optimizer.py checks this on generated transactions.
+"""
+
+import sys
+
+from teal_assembler import (
+    OPCODE_COSTS, Instruction, TealAssemblyError, instruction_size, parse_bytes, parse_int,
+    parse_teal,
+)
+
+MAX_UINT64 = 2 ** 64 - 1
+
+TERMINATORS = ("return", "err", "retsub")
+UNCONDITIONAL = ("b",) + TERMINATORS
+CONDITIONAL = ("bnz", "bz")
+
+# Ops whose result depends only on their operands; (pops, pushes)
+PURE_OPS = {
+    "+": 2, "-": 2, "*": 2, "/": 2, "%": 2, "<": 2, ">": 2, "<=": 2, ">=": 2,
+    "==": 2, "!=": 2, "&&": 2, "||": 2, "|": 2, "&": 2, "^": 2, "shl": 2, "shr": 2,
+    "exp": 2, "concat": 2, "getbyte": 2, "getbit": 2, "extract_uint16": 2,
+    "extract_uint32": 2, "extract_uint64": 2, "substring3": 3, "extract3": 3,
+    "!": 1, "~": 1, "len": 1, "itob": 1, "btoi": 1, "sqrt": 1, "bitlen": 1,
+    "sha256": 1, "sha512_256": 1, "sha3_256": 1, "keccak256": 1,
+    "extract": 1, "substring": 1,
+}
+# Ops reading transaction data that is fixed for the whole evaluation
+TXN_READS = ("txn", "txna", "gtxn", "gtxna")
+VOLATILE_GLOBALS = ("OpcodeBudget",)
+# State reads: op -> (pops, state read)
+STATE_READS = {"app_local_get": (2, "local"), "app_global_get": (1, "global")}
+# State writes: op -> state written
+STATE_WRITES = {
+    "app_local_put": "local", "app_local_del": "local",
+    "app_global_put": "global", "app_global_del": "global",
+    "box_create": "box", "box_put": "box", "box_replace": "box", "box_del": "box",
+    "itxn_submit": "*",
+}
+# Stack effects of the remaining ops: (pops, pushes)
+STACK_EFFECTS = {
+    "pop": (1, 0), "dup": (1, 2), "dup2": (2, 4), "swap": (2, 2), "select": (3, 1),
+    "assert": (1, 0), "bnz": (1, 0), "bz": (1, 0), "b": (0, 0), "log": (1, 0),
+    "store": (1, 0), "load": (0, 1), "app_opted_in": (2, 1), "balance": (1, 1),
+    "min_balance": (1, 1), "app_local_get_ex": (3, 2), "app_global_get_ex": (2, 2),
+    "app_local_put": (3, 0), "app_local_del": (2, 0), "app_global_put": (2, 0),
+    "app_global_del": (1, 0), "box_create": (2, 1), "box_put": (2, 0),
+    "box_replace": (3, 0), "box_del": (1, 1), "box_len": (1, 2), "box_get": (1, 2),
+    "box_extract": (3, 1), "replace2": (2, 1), "replace3": (3, 1), "setbyte": (3, 1),
+    "setbit": (3, 1), "bzero": (1, 1), "mulw": (2, 2), "addw": (2, 2),
+    "divw": (3, 1), "divmodw": (4, 4), "gtxns": (1, 1), "gtxnsa": (1, 1),
+    "txnas": (1, 1), "frame_dig": (0, 1), "frame_bury": (1, 0),
+    "itxn_begin": (0, 0), "itxn_next": (0, 0), "itxn_field": (1, 0),
+    "itxn_submit": (0, 0), "itxn": (0, 1), "itxna": (0, 1), "gitxn": (0, 1),
+    "global": (0, 1), "proto": (0, 0), "intcblock": (0, 0), "bytecblock": (0, 0),
+}
+
+INT_CONSTANTS = ("intc", "intc_0", "intc_1", "intc_2", "intc_3", "pushint", "int")
+BYTE_CONSTANTS = ("bytec", "bytec_0", "bytec_1", "bytec_2", "bytec_3", "pushbytes", "byte")
+
+
+def _fold_binary(op, a, b):
+    """Result of a constant binary op, or None when it would fail at runtime"""
+    if isinstance(a, int) and isinstance(b, int):
+        if op == "+":
+            result = a + b
+        elif op == "-":
+            result = a - b
+        elif op == "*":
+            result = a * b
+        elif op in ("/", "%"):
+            if b == 0:
+                return None
+            result = a // b if op == "/" else a % b
+        elif op in ("shl", "shr"):
+            if b >= 64:
+                return None
+            result = (a << b) & MAX_UINT64 if op == "shl" else a >> b
+        elif op == "exp":
+            if a == b == 0 or (a > 1 and b >= 64):
+                return None
+            result = a ** b
+        else:
+            result = {
+                "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b,
+                "==": a == b, "!=": a != b, "&&": bool(a and b), "||": bool(a or b),
+                "|": a | b, "&": a & b, "^": a ^ b,
+            }.get(op)
+            if result is None:
+                return None
+        result = int(result)
+        return result if 0 <= result <= MAX_UINT64 else None
+    if isinstance(a, bytes) and isinstance(b, bytes):
+        if op == "concat" and len(a) + len(b) <= 4096:
+            return a + b
+        if op in ("==", "!="):
+            return int((a == b) == (op == "=="))
+    return None
+
+
+def _fold_unary(op, a):
+    if isinstance(a, int):
+        if op == "!":
+            return int(a == 0)
+        if op == "~":
+            return a ^ MAX_UINT64
+        if op == "itob":
+            return a.to_bytes(8, "big")
+    elif op == "len":
+        return len(a)
+    elif op == "btoi" and len(a) <= 8:
+        return int.from_bytes(a, "big")
+    return None
+
+
+class _Program:
+    """Mutable instruction list with labels, constants and source comments"""
+
+    def __init__(self, source):
+        self.version, self.items = parse_teal(source)
+        self.raw = source.splitlines()
+        self.intcblock = []
+        self.bytecblock = []
+        for item in self.items:
+            if isinstance(item, Instruction) and item.op == "intcblock":
+                self.intcblock = [parse_int(token) for token in item.args]
+            elif isinstance(item, Instruction) and item.op == "bytecblock":
+                position = 0
+                while position < len(item.args):
+                    value, used = parse_bytes(item.args[position:])
+                    self.bytecblock.append(value)
+                    position += used
+        # Comment lines directly above a label (PyTeal's subroutine names)
+        self.label_comments = {}
+        pending = []
+        for raw in self.raw:
+            line = raw.strip()
+            if line.startswith("//"):
+                pending.append(line)
+            elif line.endswith(":") and " " not in line:
+                if pending:
+                    self.label_comments[line[:-1]] = pending
+                pending = []
+            elif line:
+                pending = []
+
+    def constant(self, item):
+        """Value pushed by a constant instruction, or None"""
+        if not isinstance(item, Instruction):
+            return None
+        op, args = item.op, item.args
+        try:
+            if op in ("intc_0", "intc_1", "intc_2", "intc_3"):
+                return self.intcblock[int(op[-1])]
+            if op == "intc":
+                return self.intcblock[parse_int(args[0])]
+            if op in ("pushint", "int"):
+                return parse_int(args[0])
+            if op in ("bytec_0", "bytec_1", "bytec_2", "bytec_3"):
+                return self.bytecblock[int(op[-1])]
+            if op == "bytec":
+                return self.bytecblock[parse_int(args[0])]
+            if op in ("pushbytes", "byte"):
+                return parse_bytes(args)[0]
+        except (IndexError, ValueError, TealAssemblyError):
+            # Includes TMPL_ placeholders, whose value is unknown until substitution
+            return None
+        return None
+
+    def push_constant(self, value):
+        """Shortest instruction pushing `value`"""
+        if isinstance(value, int):
+            candidates = [_Emitted("pushint", [str(value)])]
+            if value in self.intcblock:
+                index = self.intcblock.index(value)
+                candidates.append(_constant_ref("intc", index))
+            comment = str(value)
+        else:
+            candidates = [_Emitted("pushbytes", ["0x" + value.hex()])]
+            if value in self.bytecblock:
+                candidates.append(_constant_ref("bytec", self.bytecblock.index(value)))
+            comment = _describe_bytes(value)
+        best = min(candidates, key=instruction_size)
+        best.comment = comment
+        return best
+
+    def render(self):
+        lines = [f"#pragma version {self.version}"]
+        for item in self.items:
+            if isinstance(item, str):
+                comments = self.label_comments.get(item)
+                if comments:
+                    lines.append("")
+                    lines.extend(comments)
+                lines.append(f"{item}:")
+            elif item.line is not None:
+                lines.append(self.raw[item.line - 1].strip())
+            else:
+                text = " ".join([item.op] + item.args)
+                comment = getattr(item, "comment", None)
+                lines.append(f"{text} // {comment}" if comment else text)
+        return "\n".join(lines)
+
+
+class _Emitted(Instruction):
+    """Instruction created by the optimizer, rendered from op and args"""
+
+    __slots__ = ("comment",)
+
+    def __init__(self, op, args, comment=None):
+        super().__init__(op, args, None)
+        self.comment = comment
+
+
+def _constant_ref(kind, index):
+    if index < 4:
+        return _Emitted(f"{kind}_{index}", [])
+    return _Emitted(kind, [str(index)])
+
+
+def _describe_bytes(value):
+    try:
+        text = value.decode()
+    except UnicodeDecodeError:
+        return None
+    return f'"{text}"' if text.isprintable() else None
+
+
+def _instructions_at(items, start, count):
+    """Indices of `count` consecutive instructions from `start`, or None at a label"""
+    indices = []
+    index = start
+    while len(indices) < count:
+        if index >= len(items) or isinstance(items[index], str):
+            return None
+        indices.append(index)
+        index += 1
+    return indices
+
+
+def _label_positions(items):
+    """Map each label to the index of the first instruction after it"""
+    positions = {}
+    pending = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            pending.append(item)
+        else:
+            for label in pending:
+                positions[label] = index
+            pending = []
+    for label in pending:
+        positions[label] = len(items)
+    return positions
+
+
+def _branch_targets(instruction):
+    if instruction.op in ("b", "bnz", "bz", "callsub"):
+        return [instruction.args[0]]
+    if instruction.op in ("switch", "match"):
+        return list(instruction.args)
+    return []
+
+
+# -- constant folding --------------------------------------------------
+
+def fold_constants(program, stats):
+    """One sweep of constant folding; returns whether anything changed"""
+    items = program.items
+    positions = _label_positions(items)
+    changed = False
+    index = 0
+    while index < len(items):
+        replacement = _fold_at(program, items, index, positions)
+        if replacement is None:
+            index += 1
+            continue
+        count, new = replacement
+        items[index:index + count] = new
+        stats["constants_folded"] += 1
+        changed = True
+        positions = _label_positions(items)
+    return changed
+
+
+def _fold_at(program, items, index, positions):
+    """(instructions consumed, replacement) for a foldable window at index"""
+    window = _instructions_at(items, index, 3)
+    first = items[index]
+    if not isinstance(first, Instruction):
+        return None
+    a = program.constant(first)
+
+    if window:
+        second, third = items[window[1]], items[window[2]]
+        b = program.constant(second)
+        if a is not None and b is not None and not third.args:
+            result = _fold_binary(third.op, a, b)
+            if result is not None:
+                return 3, [program.push_constant(result)]
+        # x != 0 feeding a branch or assert only needs x's truth
+        if isinstance(a, int) and a == 0 and second.op == "!=" and third.op in (
+            CONDITIONAL + ("assert",)
+        ):
+            return 2, []
+    pair = _instructions_at(items, index, 2)
+    if not pair:
+        return None
+    second = items[pair[1]]
+    if a is not None:
+        if not second.args and second.op in ("!", "~", "itob", "len", "btoi"):
+            result = _fold_unary(second.op, a)
+            if result is not None:
+                return 2, [program.push_constant(result)]
+        if second.op == "pop":
+            return 2, []
+        if isinstance(a, int) and second.op in CONDITIONAL:
+            taken = (a != 0) == (second.op == "bnz")
+            return 2, [_Emitted("b", list(second.args))] if taken else []
+        if isinstance(a, int) and a != 0 and second.op == "assert":
+            return 2, []
+        if isinstance(a, int) and a == 0 and second.op == "==":
+            return 2, [_Emitted("!", [])]
+    if first.op == "!" and second.op in CONDITIONAL:
+        flipped = "bz" if second.op == "bnz" else "bnz"
+        return 2, [_Emitted(flipped, list(second.args))]
+    if first.op == "dup" and second.op == "pop":
+        return 2, []
+    return None
+
+
+# -- dead-branch removal -----------------------------------------------
+
+def _reachable(items, positions):
+    reached = set()
+    work = [0]
+    while work:
+        index = work.pop()
+        while index < len(items) and index not in reached:
+            item = items[index]
+            if isinstance(item, str):
+                index += 1
+                continue
+            reached.add(index)
+            for label in _branch_targets(item):
+                work.append(positions[label])
+            if item.op in UNCONDITIONAL:
+                break
+            index += 1
+    return reached
+
+
+def _block_at(items, positions, label, limit=3):
+    """Instructions from `label` up to the first terminator, or None"""
+    block = []
+    index = positions[label]
+    while index < len(items) and len(block) < limit:
+        item = items[index]
+        if isinstance(item, Instruction):
+            block.append(item)
+            if item.op in UNCONDITIONAL or item.op in CONDITIONAL:
+                return block
+        index += 1
+    return None
+
+
+def remove_dead_code(program, stats):
+    """Drop unreachable code and simplify jumps; returns whether anything changed"""
+    items = program.items
+    changed = False
+
+    positions = _label_positions(items)
+    reached = _reachable(items, positions)
+    kept = [
+        item for index, item in enumerate(items)
+        if isinstance(item, str) or index in reached
+    ]
+    removed = len(items) - len(kept)
+    if removed:
+        stats["instructions_removed"] += removed
+        items[:] = kept
+        changed = True
+
+    positions = _label_positions(items)
+    index = 0
+    while index < len(items):
+        item = items[index]
+        if not isinstance(item, Instruction):
+            index += 1
+            continue
+        rewrite = _simplify_jump(program, items, index, positions)
+        if rewrite is None:
+            index += 1
+            continue
+        count, new = rewrite
+        items[index:index + count] = new
+        stats["branches_simplified"] += 1
+        changed = True
+        positions = _label_positions(items)
+
+    referenced = {
+        label for item in items if isinstance(item, Instruction)
+        for label in _branch_targets(item)
+    }
+    labels = [item for item in items if isinstance(item, str) and item not in referenced]
+    if labels:
+        items[:] = [item for item in items if not (isinstance(item, str) and item not in referenced)]
+        changed = True
+
+    return _compact_constants(program) or changed
+
+
+def _next_instruction(items, index):
+    index += 1
+    while index < len(items) and isinstance(items[index], str):
+        index += 1
+    return index
+
+
+def _simplify_jump(program, items, index, positions):
+    item = items[index]
+    op = item.op
+    if op not in ("b",) + CONDITIONAL:
+        return None
+    target = item.args[0]
+    # Jump to the very next instruction
+    if positions[target] == _next_instruction(items, index):
+        return 1, [] if op == "b" else [_Emitted("pop", [])]
+
+    block = _block_at(items, positions, target)
+    if block is None:
+        return None
+    # Jump chains: retarget to the final destination
+    if block[0].op == "b" and block[0].args[0] != target:
+        return 1, [_Emitted(op, [block[0].args[0]])]
+    # A jump to a short exit block is replaced by a copy of the block
+    if op == "b" and block[-1].op in TERMINATORS and all(
+        not _branch_targets(instruction) for instruction in block
+    ):
+        size = sum(instruction_size(instruction) for instruction in block)
+        if size <= instruction_size(item):
+            return 1, [Instruction(i.op, list(i.args), i.line) for i in block]
+    # bnz L; <0>; return ... L: <nonzero>; return  =>  return
+    if op in CONDITIONAL:
+        fallthrough = _instructions_at(items, index + 1, 2)
+        if fallthrough and len(block) == 2 and block[1].op == "return":
+            first, second = items[fallthrough[0]], items[fallthrough[1]]
+            taken_value = program.constant(block[0])
+            fallthrough_value = program.constant(first)
+            if (
+                second.op == "return"
+                and isinstance(taken_value, int) and isinstance(fallthrough_value, int)
+                and (taken_value != 0) != (fallthrough_value != 0)
+                and (taken_value != 0) == (op == "bnz")
+            ):
+                return 3, [_Emitted("return", [])] if op == "bnz" else [
+                    _Emitted("!", []), _Emitted("return", [])
+                ]
+    return None
+
+
+def _compact_constants(program):
+    """Remove constant block entries nothing references any more"""
+    items = program.items
+    changed = False
+    for kind, values in (("intc", program.intcblock), ("bytec", program.bytecblock)):
+        used = set()
+        for item in items:
+            if isinstance(item, Instruction):
+                if item.op.startswith(kind + "_"):
+                    used.add(int(item.op[-1]))
+                elif item.op == kind:
+                    used.add(parse_int(item.args[0]))
+        if len(used) == len(values):
+            continue
+        order = [index for index in range(len(values)) if index in used]
+        remap = {old: new for new, old in enumerate(order)}
+        new_values = [values[old] for old in order]
+        for position, item in enumerate(items):
+            if not isinstance(item, Instruction):
+                continue
+            if item.op.startswith(kind + "_") or item.op == kind:
+                old = int(item.op[-1]) if item.op != kind else parse_int(item.args[0])
+                ref = _constant_ref(kind, remap[old])
+                ref.comment = str(new_values[remap[old]]) if kind == "intc" else \
+                    _describe_bytes(new_values[remap[old]])
+                items[position] = ref
+            elif item.op == kind + "block":
+                if new_values:
+                    tokens = [str(v) for v in new_values] if kind == "intc" else \
+                        ["0x" + v.hex() for v in new_values]
+                    items[position] = _Emitted(item.op, tokens)
+                else:
+                    items[position] = None
+        items[:] = [item for item in items if item is not None]
+        values[:] = new_values
+        changed = True
+    return changed
+
+
+# -- redundant-load elimination ----------------------------------------
+
+class _Value:
+    """Symbolic stack entry for a pure expression spanning items[start:end + 1]"""
+
+    __slots__ = ("key", "start", "end", "reads", "cost", "block")
+
+    def __init__(self, key, start, end, reads, cost):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.reads = reads
+        self.cost = cost
+        self.block = 0  # conditional exits passed within the region
+
+
+class _Subroutine:
+    def __init__(self, label):
+        self.label = label
+        self.args = None
+        self.returns = None
+        self.reads = set()
+        self.writes = set()
+        self.cost = 0
+        self.pure = False
+
+
+def _analyze_subroutines(items, positions):
+    """Effects, purity and worst-case cost of every callsub target"""
+    labels = {
+        item.args[0] for item in items
+        if isinstance(item, Instruction) and item.op == "callsub"
+    }
+    subs = {label: _Subroutine(label) for label in labels}
+    callees = {}
+    for label, sub in subs.items():
+        start = positions[label]
+        first = items[start] if start < len(items) else None
+        if isinstance(first, Instruction) and first.op == "proto":
+            sub.args, sub.returns = parse_int(first.args[0]), parse_int(first.args[1])
+        calls = set()
+        ok = sub.returns == 1
+        seen = set()
+        work = [start]
+        while work:
+            index = work.pop()
+            while index < len(items) and index not in seen:
+                item = items[index]
+                if isinstance(item, str):
+                    index += 1
+                    continue
+                seen.add(index)
+                op = item.op
+                if op in STATE_WRITES:
+                    sub.writes.add(STATE_WRITES[op])
+                elif op in ("store", "stores", "log") or op.startswith("itxn"):
+                    sub.writes.add("*" if op.startswith("itxn") else op)
+                if op in STATE_READS:
+                    sub.reads.add(STATE_READS[op][1])
+                if op == "callsub":
+                    calls.add(item.args[0])
+                if op in ("load", "loads", "return", "frame_bury") or op not in (
+                    set(PURE_OPS) | set(STACK_EFFECTS) | set(STATE_READS) | set(TXN_READS)
+                    | set(INT_CONSTANTS) | set(BYTE_CONSTANTS) | {"callsub", "retsub", "err"}
+                ):
+                    ok = False
+                if op == "global" and item.args[0] in VOLATILE_GLOBALS:
+                    ok = False
+                for target in _branch_targets(item):
+                    if op != "callsub":
+                        if positions[target] <= index:
+                            ok = False  # loops are never treated as pure
+                        work.append(positions[target])
+                if op in UNCONDITIONAL:
+                    break
+                index += 1
+        sub.pure = ok
+        callees[label] = calls
+        sub.cost = _subroutine_cost(items, positions, start)
+
+    # Propagate effects and purity through the call graph
+    changed = True
+    while changed:
+        changed = False
+        for label, sub in subs.items():
+            for callee in callees[label]:
+                other = subs[callee]
+                before = (len(sub.reads), len(sub.writes), sub.pure, sub.cost)
+                sub.reads |= other.reads
+                sub.writes |= other.writes
+                sub.pure = sub.pure and other.pure and callee != label
+                after = (len(sub.reads), len(sub.writes), sub.pure, sub.cost)
+                changed = changed or before != after
+    for sub in subs.values():
+        if sub.writes:
+            sub.pure = False
+    return subs
+
+
+def _subroutine_cost(items, positions, start, depth=0):
+    """Worst-case cost of a subroutine body, including nested calls"""
+    memo = {}
+
+    def walk(index, visiting):
+        if index in memo:
+            return memo[index]
+        if index in visiting or depth > 16:
+            return 0
+        visiting = visiting | {index}
+        cost = 0
+        while index < len(items):
+            item = items[index]
+            if isinstance(item, str):
+                index += 1
+                continue
+            cost += OPCODE_COSTS.get(item.op, 1)
+            if item.op == "callsub":
+                cost += _subroutine_cost(items, positions, positions[item.args[0]], depth + 1)
+            elif item.op in CONDITIONAL:
+                result = cost + max(
+                    walk(positions[item.args[0]], visiting), walk(index + 1, visiting)
+                )
+                memo[index] = result
+                return result
+            elif item.op == "b":
+                return cost + walk(positions[item.args[0]], visiting)
+            elif item.op in TERMINATORS:
+                return cost
+            index += 1
+        return cost
+
+    return walk(start, frozenset())
+
+
+def _regions(items):
+    """Extended basic blocks: runs of instructions with no label inside"""
+    region = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            if region:
+                yield region
+            region = []
+            continue
+        region.append(index)
+        if item.op in UNCONDITIONAL:
+            yield region
+            region = []
+    if region:
+        yield region
+
+
+def _scan_region(program, items, region, subs, occurrences):
+    """Value-number one region, appending (key, epoch, value) occurrences"""
+    versions = {}
+    stack = []
+    block = 0
+
+    def epoch(reads):
+        return tuple(sorted(((read, versions.get(read, 0)) for read in reads), key=repr)) + (
+            versions.get("*", 0),
+        )
+
+    def invalidate(write):
+        versions[write] = versions.get(write, 0) + 1
+
+    for index in region:
+        item = items[index]
+        op, args = item.op, item.args
+        value = None
+        pops, pushes = None, None
+
+        constant = program.constant(item)
+        if constant is not None:
+            value = _Value(("const", constant), index, index, frozenset(), 1)
+        elif op in TXN_READS or (op == "global" and args[0] not in VOLATILE_GLOBALS):
+            value = _Value((op,) + tuple(args), index, index, frozenset(), 1)
+        elif op == "load":
+            slot = ("scratch", args[0])
+            value = _Value(("load", args[0]), index, index, frozenset([slot]), 1)
+        elif op in PURE_OPS or op in STATE_READS:
+            count = PURE_OPS[op] if op in PURE_OPS else STATE_READS[op][0]
+            value = _combine(stack, count, op, args, index, OPCODE_COSTS.get(op, 1))
+            if value is not None and op in STATE_READS:
+                value.reads = value.reads | {STATE_READS[op][1]}
+            pops, pushes = count, 1
+        elif op == "callsub" and args[0] in subs:
+            sub = subs[args[0]]
+            if sub.args is not None and sub.returns is not None:
+                pops, pushes = sub.args, sub.returns
+                if sub.pure:
+                    value = _combine(stack, sub.args, op, args, index, 1 + sub.cost)
+                    if value is not None:
+                        value.reads = value.reads | sub.reads
+            for write in sub.writes:
+                invalidate(write)
+            if pops is None:
+                # Stack effect unknown: nothing below the call can be reused
+                stack = []
+                continue
+        elif op in STACK_EFFECTS:
+            pops, pushes = STACK_EFFECTS[op]
+        else:
+            invalidate("*")
+            stack = []
+            continue
+
+        if op in STATE_WRITES:
+            invalidate(STATE_WRITES[op])
+        if op == "store":
+            invalidate(("scratch", args[0]))
+
+        if value is not None and pops is None:
+            stack.append(value)
+        else:
+            for _ in range(pops or 0):
+                if stack:
+                    stack.pop()
+            if value is not None:
+                stack.append(value)
+            else:
+                stack.extend([None] * (pushes or 0))
+
+        if value is not None and (value.start != value.end or value.cost > 1):
+            value.block = block
+            occurrences.append((value.key, epoch(value.reads), value))
+        if op in CONDITIONAL or op in ("switch", "match"):
+            block += 1
+
+
+def _combine(stack, count, op, args, index, cost):
+    """Build an expression from the top `count` stack entries, if contiguous"""
+    if len(stack) < count:
+        return None
+    operands = stack[len(stack) - count:] if count else []
+    if any(operand is None for operand in operands):
+        return None
+    expected = index
+    for operand in reversed(operands):
+        if operand.end != expected - 1:
+            return None
+        expected = operand.start
+    start = operands[0].start if operands else index
+    reads = frozenset().union(*(operand.reads for operand in operands)) if operands else frozenset()
+    key = (op,) + tuple(args) + tuple(operand.key for operand in operands)
+    return _Value(key, start, index, reads, cost + sum(operand.cost for operand in operands))
+
+
+def _free_slots(items):
+    used = set()
+    for item in items:
+        if isinstance(item, Instruction):
+            if item.op in ("loads", "stores"):
+                return []
+            if item.op in ("load", "store"):
+                used.add(parse_int(item.args[0]))
+    return [slot for slot in range(255, -1, -1) if slot not in used]
+
+
+def eliminate_redundant_loads(program, stats):
+    """Keep repeated pure expressions in scratch slots; returns whether anything changed"""
+    items = program.items
+    positions = _label_positions(items)
+    subs = _analyze_subroutines(items, positions)
+    slots = _free_slots(items)
+    if not slots:
+        return False
+
+    groups = {}
+    for region in _regions(items):
+        occurrences = []
+        _scan_region(program, items, region, subs, occurrences)
+        for key, epoch, value in occurrences:
+            groups.setdefault((region[0], key, epoch), []).append(value)
+
+    def span_size(value):
+        return sum(instruction_size(items[i]) for i in range(value.start, value.end + 1))
+
+    def savings(values):
+        """(cost saved on the shortest path, cost saved overall, bytes saved)"""
+        cost = values[0].cost
+        repeats = len(values) - 1
+        # Repeats past a conditional exit may never run; the dup + store must
+        # pay for itself before the first one
+        certain = sum(1 for value in values[1:] if value.block == values[0].block)
+        # dup + store after the first use; one load per repeat
+        return (
+            certain * (cost - 1) - 2,
+            repeats * (cost - 1) - 2,
+            repeats * (span_size(values[0]) - 2) - 3,
+        )
+
+    def profitable(values):
+        if len(values) < 2:
+            return False
+        worst, total, size = savings(values)
+        return worst >= 0 and (total > 0 or (total == 0 and size > 0))
+
+    candidates = []
+    for values in groups.values():
+        if profitable(values):
+            candidates.append((savings(values)[1:], values))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    claimed = []
+    rewrites = []
+    for _, values in candidates:
+        free = [
+            value for value in values
+            if all(value.end < start or value.start > end for start, end in claimed)
+        ]
+        # Occurrences must not overlap each other either
+        chosen = []
+        for value in free:
+            if not chosen or value.start > chosen[-1].end:
+                chosen.append(value)
+        if not slots or not profitable(chosen):
+            continue
+        slot = slots.pop(0)
+        for value in chosen:
+            claimed.append((value.start, value.end))
+        rewrites.append((slot, chosen))
+
+    if not rewrites:
+        return False
+
+    edits = []
+    for slot, chosen in rewrites:
+        first = chosen[0]
+        edits.append((first.end + 1, first.end + 1, [
+            _Emitted("dup", []), _Emitted("store", [str(slot)])
+        ]))
+        for value in chosen[1:]:
+            edits.append((value.start, value.end + 1, [_Emitted("load", [str(slot)])]))
+        stats["loads_eliminated"] += len(chosen) - 1
+    for start, end, new in sorted(edits, key=lambda edit: (edit[0], edit[1]), reverse=True):
+        items[start:end] = new
+    return True
+
+
+# -- driver ------------------------------------------------------------
+
+PASSES = ("fold", "dead_code", "redundant_loads")
+
+
+def optimize(source, passes=PASSES):
+    """Optimize TEAL source; returns (optimized TEAL, statistics)"""
+    program = _Program(source)
+    stats = {
+        "constants_folded": 0, "branches_simplified": 0,
+        "instructions_removed": 0, "loads_eliminated": 0,
+    }
+
+    def simplify():
+        for _ in range(100):
+            changed = False
+            if "fold" in passes:
+                while fold_constants(program, stats):
+                    changed = True
+            if "dead_code" in passes:
+                changed = remove_dead_code(program, stats) or changed
+            if not changed:
+                return
+
+    simplify()
+    if "redundant_loads" in passes and eliminate_redundant_loads(program, stats):
+        simplify()
+    return program.render() + "\n", stats
+
+
+def main(argv=None):
+    """Optimize a TEAL file: teal_optimizer.py <input.teal> [output.teal]"""
+    args = sys.argv[1:] if argv is None else argv
+    if not args:
+        print(main.__doc__)
+        return 2
+    with open(args[0]) as f:
+        source = f.read()
+    optimized, stats = optimize(source)
+    if len(args) > 1:
+        with open(args[1], "w") as f:
+            f.write(optimized)
+    else:
+        sys.stdout.write(optimized)
+    from teal_assembler import assemble
+
+    before, after = len(assemble(source)), len(assemble(optimized))
+    print(f"✅ {before} -> {after} bytes; {stats}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+TMPL_ contract templates
+A contract compiled with TMPL_ placeholders is assembled once into a
+template: every placeholder is hoisted into the intcblock / bytecblock at
+the start of the program, and the rest of the bytecode is kept as is.
+Branch offsets are relative, so per-partner bytecode is just a re-encoded
+constant header in front of the shared body, with no compile or algod
+round trip.
+
+Usage:
+    python teal_template.py virtual_card_manager TMPL_BASIC_DAILY_LIMIT=50000000 --check
+"""
+
+import argparse
+import sys
+import time
+
+from teal_assembler import (
+    Instruction, assemble, encode_varuint, is_template, parse_bytes, parse_int, parse_teal,
+)
+
+_PUSHES = {"int": "intcblock", "pushint": "intcblock", "byte": "bytecblock", "pushbytes": "bytecblock"}
+
+
+class TemplateError(Exception):
+    """Raised for bad templates or parameter values"""
+
+
+def _block_values(item):
+    """Constants of an intcblock / bytecblock line as TEAL tokens"""
+    if item.op == "intcblock":
+        return list(item.args)
+    values = []
+    position = 0
+    while position < len(item.args):
+        if is_template(item.args[position]):
+            values.append(item.args[position])
+            position += 1
+        else:
+            value, used = parse_bytes(item.args[position:])
+            values.append("0x" + value.hex())
+            position += used
+    return values
+
+
+def hoist_template_constants(teal):
+    """Move every TMPL_ push into the constant blocks at the top of the program
+
+    Returns (TEAL, {"intcblock": [...], "bytecblock": [...]}). Existing block
+    entries keep their indexes, so intc / bytec references stay valid.
+    """
+    version, items = parse_teal(teal)
+    blocks = {"intcblock": [], "bytecblock": []}
+    body = []
+    for item in items:
+        if isinstance(item, str):
+            body.append(f"{item}:")
+        elif item.op in blocks:
+            if blocks[item.op]:
+                raise TemplateError(f"More than one {item.op} (line {item.line})")
+            blocks[item.op] = _block_values(item)
+        elif len(item.args) == 1 and is_template(item.args[0]) and item.op in _PUSHES:
+            kind = _PUSHES[item.op]
+            name = item.args[0]
+            if name not in blocks[kind]:
+                blocks[kind].append(name)
+            index = blocks[kind].index(name)
+            op = kind[:-len("block")]
+            body.append(f"{op}_{index} // {name}" if index < 4 else f"{op} {index} // {name}")
+        else:
+            body.append(repr(item))
+
+    header = [f"#pragma version {version}"]
+    header += [" ".join([kind] + values) for kind, values in blocks.items() if values]
+    return "\n".join(header + body) + "\n", blocks
+
+
+def _encode_header(version, intcblock, bytecblock):
+    out = bytearray(encode_varuint(version))
+    if intcblock:
+        out.append(0x20)
+        out += encode_varuint(len(intcblock))
+        for value in intcblock:
+            out += encode_varuint(value)
+    if bytecblock:
+        out.append(0x26)
+        out += encode_varuint(len(bytecblock))
+        for value in bytecblock:
+            out += encode_varuint(len(value)) + value
+    return bytes(out)
+
+
+def build_template(teal, defaults):
+    """Template dict (JSON-serializable) from TEAL containing TMPL_ placeholders"""
+    hoisted, blocks = hoist_template_constants(teal)
+    version, _ = parse_teal(hoisted)
+    placeholders = [value for kind in blocks.values() for value in kind if is_template(value)]
+    unknown = set(placeholders) - set(defaults)
+    if unknown:
+        raise TemplateError(f"No defaults for {', '.join(sorted(unknown))}")
+
+    # Placeholders assemble as 0 / empty bytes; only the header depends on them
+    bytecode = assemble(hoisted)
+    header = _encode_header(
+        version,
+        [0 if is_template(value) else parse_int(value) for value in blocks["intcblock"]],
+        [b"" if is_template(value) else bytes.fromhex(value[2:]) for value in blocks["bytecblock"]],
+    )
+    if not bytecode.startswith(header):
+        raise TemplateError("Constant blocks are not at the start of the program")
+
+    return {
+        "teal_version": version,
+        "intcblock": blocks["intcblock"],
+        "bytecblock": blocks["bytecblock"],
+        "body": bytecode[len(header):].hex(),
+        "parameters": {
+            name: {"type": "uint64" if isinstance(value, int) else "bytes", "default": value}
+            for name, value in defaults.items() if name in placeholders
+        },
+        "teal": hoisted,
+    }
+
+
+def _parameter_value(name, spec, value):
+    if spec["type"] == "uint64":
+        value = int(value)
+        if not 0 <= value < 2 ** 64:
+            raise TemplateError(f"{name} must be a uint64, got {value}")
+        return value
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:]) if value.startswith("0x") else value.encode()
+    return bytes(value)
+
+
+def resolve(template, params=None):
+    """Parameter values with defaults filled in; rejects unknown names"""
+    params = dict(params or {})
+    unknown = set(params) - set(template["parameters"])
+    if unknown:
+        raise TemplateError(f"Unknown template parameters: {', '.join(sorted(unknown))}")
+    return {
+        name: _parameter_value(name, spec, params.get(name, spec["default"]))
+        for name, spec in template["parameters"].items()
+    }
+
+
+def instantiate(template, params=None):
+    """Bytecode for one set of parameter values"""
+    values = resolve(template, params)
+    intcblock = [
+        values[value] if is_template(value) else parse_int(value)
+        for value in template["intcblock"]
+    ]
+    bytecblock = [
+        values[value] if is_template(value) else bytes.fromhex(value[2:])
+        for value in template["bytecblock"]
+    ]
+    header = _encode_header(template["teal_version"], intcblock, bytecblock)
+    return header + bytes.fromhex(template["body"])
+
+
+def substitute_teal(template, params=None):
+    """TEAL with placeholders replaced, for review or algod compile"""
+    values = resolve(template, params)
+    lines = []
+    for line in template["teal"].splitlines():
+        tokens = line.split("//")[0].split()
+        if tokens and tokens[0] in ("intcblock", "bytecblock"):
+            line = " ".join(
+                tokens[:1] + [
+                    (str(values[token]) if isinstance(values[token], int)
+                     else "0x" + values[token].hex()) if is_template(token) else token
+                    for token in tokens[1:]
+                ]
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-partner bytecode from a contract template")
+    parser.add_argument("contract", nargs="?", default="virtual_card_manager")
+    parser.add_argument("params", nargs="*", metavar="TMPL_NAME=value")
+    parser.add_argument("--output", help="Write the approval bytecode here")
+    parser.add_argument("--check", action="store_true",
+                        help="Cross-check against assembling the substituted TEAL")
+    args = parser.parse_args(argv)
+
+    from artifacts import load_artifact
+
+    artifact = load_artifact(args.contract)
+    template = artifact.template()
+    if template is None:
+        print(f"❌ {artifact.name} {artifact.version} has no template")
+        return 1
+    try:
+        params = dict(param.split("=", 1) for param in args.params)
+        started = time.perf_counter()
+        bytecode = instantiate(template, params)
+        elapsed = time.perf_counter() - started
+    except (TemplateError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    for name, value in resolve(template, params).items():
+        print(f"   {name} = {value}")
+    print(f"✅ {artifact.name} {artifact.version}: {len(bytecode)} bytes in {elapsed * 1e6:.0f} µs")
+    if args.check:
+        if assemble(substitute_teal(template, params)) != bytecode:
+            print("❌ Substituted bytecode differs from assembling the substituted TEAL")
+            return 1
+        print("✅ Matches the assembled TEAL")
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(bytecode)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Tenant lookups and calls for the shared multi-tenant contract
+Every user lives in one shared application (algorand/contracts/
+shared_contract.py) as a box keyed by sha256 of their user ID, replacing
+the one-app-per-user legacy deployments
+
+Usage:
+    python tenants.py <app_id> <user_id>
+"""
+
+import base64
+import hashlib
+import sys
+
+from algosdk import encoding, transaction
+from algosdk.error import AlgodHTTPError
+
+from artifacts import load_artifact
+from box_storage import box_min_balance
+
+TENANT_BOX_SIZE = 48
+TENANT_KEY_SIZE = 32
+
+
+def tenant_box_min_balance(prefix):
+    """Minimum balance the app account needs per tenant box"""
+    return box_min_balance(len(prefix) + TENANT_KEY_SIZE, TENANT_BOX_SIZE)
+
+
+def tenant_key(user_id):
+    """On-chain tenant key; user IDs (phone numbers) are never stored as is"""
+    return hashlib.sha256(str(user_id).encode()).digest()
+
+
+def tenant_prefix(artifact=None):
+    artifact = artifact or load_artifact("shared_contract")
+    return bytes.fromhex(artifact.boxes["tenant"]["prefix"])
+
+
+class Tenant:
+    def __init__(self, owner, balance, limit):
+        self.owner = owner
+        self.balance = balance
+        self.limit = limit
+
+    @classmethod
+    def from_box(cls, value):
+        if len(value) != TENANT_BOX_SIZE:
+            raise ValueError(f"Tenant boxes are {TENANT_BOX_SIZE} bytes, got {len(value)}")
+        return cls(
+            encoding.encode_address(value[:32]),
+            int.from_bytes(value[32:40], "big"),
+            int.from_bytes(value[40:48], "big"),
+        )
+
+
+class SharedTenants:
+    """Onboarding and lookups against one deployed shared contract"""
+
+    def __init__(self, algod_client, app_id, prefix=None):
+        self.algod_client = algod_client
+        self.app_id = app_id
+        self.prefix = tenant_prefix() if prefix is None else prefix
+
+    def box_name(self, user_id):
+        return self.prefix + tenant_key(user_id)
+
+    def box_reference(self, user_id):
+        return (self.app_id, self.box_name(user_id))
+
+    def get(self, user_id):
+        """Tenant state, or None when the user has not been onboarded"""
+        try:
+            box = self.algod_client.application_box_by_name(self.app_id, self.box_name(user_id))
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        return Tenant.from_box(base64.b64decode(box["value"]))
+
+    def _call(self, sender, params, user_id, args):
+        return transaction.ApplicationCallTxn(
+            sender=sender,
+            sp=params,
+            index=self.app_id,
+            on_complete=transaction.OnComplete.NoOpOC,
+            app_args=[args[0], tenant_key(user_id)] + args[1:],
+            boxes=[self.box_reference(user_id)],
+        )
+
+    def register_txn(self, sender, params, user_id, owner):
+        return self._call(sender, params, user_id, ["register", encoding.decode_address(owner)])
+
+    def import_txn(self, sender, params, user_id, owner, balance, limit):
+        return self._call(sender, params, user_id, [
+            "import_tenant", encoding.decode_address(owner), balance, limit
+        ])
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 2:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    from instrumentation import algod_client_from_env
+
+    algod_client = algod_client_from_env()
+    tenant = SharedTenants(algod_client, int(args[0])).get(args[1])
+    if tenant is None:
+        print(f"❌ User {args[1]} is not a tenant")
+        return 1
+    print(f"👤 {args[1]} -> {tenant.owner}: balance {tenant.balance}, limit {tenant.limit}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Conformance tests for the off-chain use_card pre-check (card_precheck.py)
+Every named case and a batch of randomized cases run through the compiled
+plain and rolling contracts with teal_eval; the pre-check must agree with
+use_card on approval, denial reason and the state left behind.
+
+Usage:
+    python -m pytest test_card_precheck.py
+    python -m unittest test_card_precheck
+"""
+
+import random
+import unittest
+
+from card_precheck import (
+    BASE, CASES, FRESH, NOW, CardMirror, card_state, case_window, compare_case,
+    conformance_programs, random_case,
+)
+
+RANDOM_CASES = 500
+
+
+class PrecheckConformanceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.programs = conformance_programs()
+
+    def test_named_cases(self):
+        for contract, (program, rolling) in self.programs.items():
+            for name, state, prices, spend, expected in CASES:
+                window = case_window(state) if rolling else None
+                with self.subTest(contract=contract, case=name):
+                    self.assertEqual(compare_case(program, rolling, state, prices, spend, NOW,
+                                                  window, expected), [])
+
+    def test_random_cases(self):
+        rng = random.Random(0)
+        for contract, (program, rolling) in self.programs.items():
+            for i in range(RANDOM_CASES):
+                case = random_case(rng, rolling)
+                with self.subTest(contract=contract, case=i):
+                    self.assertEqual(compare_case(program, rolling, *case), [])
+
+
+class CardMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.mirror = CardMirror()
+        self.mirror.load_globals(BASE, FRESH, 1)
+        self.mirror.load("ADDR", card_state(balance=5_000), 1)
+
+    def test_committed_spend_is_charged(self):
+        decision = self.mirror.precheck("ADDR", 3_000, NOW)
+        self.assertTrue(decision.approved)
+        self.assertEqual(decision.state["balance"], 2_000)
+        self.mirror.commit("ADDR", decision)
+        self.assertEqual(self.mirror.precheck("ADDR", 3_000, NOW).reason, "insufficient_balance")
+
+    def test_unknown_card_is_denied(self):
+        self.assertEqual(self.mirror.precheck("NOBODY", 1, NOW).reason, "unknown_card")
+
+
+if __name__ == "__main__":
+    unittest.main()
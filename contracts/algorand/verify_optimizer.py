@@ -0,0 +1,329 @@
+"""
+Differential check for the TEAL optimizer
+Runs the PyTeal output and its optimized form side by side on generated
+transactions and ledger states, and fails if any call ends differently
+(verdict, failure, logs or resulting state). Contract templates are also
+checked with their default parameters against the plain build.
+
+Usage:
+    python verify_optimizer.py                       # all contracts
+    python verify_optimizer.py virtual_card_manager --iterations 5000 --seed 7
+"""
+
+import argparse
+import random
+import sys
+
+from artifact_builder import CONTRACTS, compile_programs, compile_template
+from teal_assembler import assemble
+from teal_eval import (
+    MAX_UINT64, ON_COMPLETION, Ledger, Program, application_address, evaluate, make_payment,
+    make_txn,
+)
+from teal_optimizer import optimize
+from teal_template import build_template, substitute_teal
+
+ACCOUNTS = [bytes([n]) * 32 for n in (1, 2, 3)]
+TENANTS = [bytes([n]) * 32 for n in (7, 8, 9)]
+APP_IDS = (1, 42, 7_000_000)
+
+CURRENCIES = (b"ALGO", b"USD", b"USDC", b"WST")
+
+CARD_MANAGER_GLOBAL = {
+    "OWNER": "address", "BASE_CURRENCY": "currency", "TOTAL_CARDS": "uint64",
+    "CONTRACT_VERSION": "bytes", "CHAINLINK_FEED": "uint64", "PAUSED": "uint64",
+    "PRICE_UPDATER": "address",
+    **{("px" + currency.decode()).ljust(10, "\0"): "price" for currency in CURRENCIES},
+}
+CARD_MANAGER_LOCAL = {
+    "balance": "limit", "daily_spent": "spent", "monthly_spent": "spent",
+    "last_reset_day": "day", "last_reset_month": "month", "kyc_tier": "uint64",
+    "region": "bytes", "is_active": "flag", "currency": "currency",
+    "daily_limit": "limit", "monthly_limit": "limit", "card_id": "card_id",
+}
+
+# State keys each contract reads and writes, with the kind of value stored
+STATE_KEYS = {
+    "virtual_card_manager": {"global": CARD_MANAGER_GLOBAL, "local": CARD_MANAGER_LOCAL},
+    "virtual_card_manager_rolling": {
+        "global": CARD_MANAGER_GLOBAL,
+        "local": CARD_MANAGER_LOCAL,
+        # box name prefix: (key kind, value kind)
+        "boxes": {b"w": ("card_id", "spend_window")},
+    },
+    "legacy_contract": {
+        "global": {"balance": "uint64", "limit": "uint64", "owner": "address"},
+        "local": {},
+    },
+    "shared_contract": {
+        "global": {"admin": "address", "tenants": "uint64"},
+        "local": {},
+        "boxes": {b"t": ("tenant", "tenant")},
+    },
+}
+
+INTERESTING_UINTS = (
+    0, 1, 2, 3, 4, 5, 1_000, 999_999, 1_000_000, 100_000_000, 500_000_000,
+    1_000_000_000, 2_500_000_000, 5_000_000_000, 25_000_000_000, MAX_UINT64 - 1, MAX_UINT64,
+)
+
+
+class Scenario:
+    def __init__(self, ledger, group, index, globals_):
+        self.ledger = ledger
+        self.group = group
+        self.index = index
+        self.globals = globals_
+
+    def describe(self):
+        txn = self.group[self.index]
+        args = [arg[:24] for arg in txn.get("ApplicationArgs", [])]
+        return (
+            f"sender={txn['Sender'][:1].hex()} app={txn.get('ApplicationID')} "
+            f"oc={txn.get('OnCompletion')} args={args} group={len(self.group)} "
+            f"ts={self.globals['LatestTimestamp']}"
+        )
+
+
+class ScenarioGenerator:
+    """Random but contract-aware ledgers and application calls"""
+
+    def __init__(self, name, methods, seed=0):
+        self.name = name
+        self.methods = methods
+        self.keys = STATE_KEYS.get(name, {"global": {}, "local": {}})
+        self.rng = random.Random(seed)
+        self.pool = list(INTERESTING_UINTS)
+        self.timestamp = 0
+
+    def uint(self):
+        rng = self.rng
+        roll = rng.random()
+        # Drawing most values from a small per-scenario pool makes balances,
+        # limits and amounts collide, which is where the edge cases are
+        if roll < 0.5:
+            return rng.choice(self.pool)
+        if roll < 0.7:
+            return rng.choice(INTERESTING_UINTS)
+        if roll < 0.9:
+            return rng.randrange(0, 10 ** 10)
+        return rng.randrange(0, MAX_UINT64 + 1)
+
+    def value(self, kind, timestamp):
+        rng = self.rng
+        if kind == "uint64":
+            return self.uint()
+        # Spent counters and limits lean towards values that let spends through
+        if kind == "spent":
+            return 0 if rng.random() < 0.5 else self.uint()
+        if kind == "limit":
+            return 10 ** 12 if rng.random() < 0.5 else self.uint()
+        if kind == "flag":
+            return rng.choice((0, 0, 1, 1, 2))
+        if kind in ("day", "month"):
+            period = 86_400 if kind == "day" else 2_592_000
+            return max(0, timestamp // period + rng.choice((-2, -1, 0, 0, 1)))
+        if kind == "address":
+            return rng.choice(ACCOUNTS)
+        if kind == "currency":
+            return rng.choice(CURRENCIES) if rng.random() < 0.9 else rng.randbytes(rng.randrange(0, 12))
+        if kind == "price":
+            return self.price_entry(timestamp)[8:]
+        if kind == "card_id":
+            return rng.randrange(1, 4).to_bytes(8, "big") if rng.random() < 0.9 else b"card_1"
+        return rng.choice((b"", b"USD", b"ALGO", b"card_1", rng.randbytes(rng.randrange(1, 40))))
+
+    def price_entry(self, timestamp):
+        """Packed currency | price | timestamp, mostly fresh and mostly sane"""
+        rng = self.rng
+        currency = rng.choice(CURRENCIES).ljust(8, b"\0")
+        price = rng.choice((1, 500_000, 1_000_000, 2_750_000)) if rng.random() < 0.8 else self.uint()
+        observed = max(0, timestamp + rng.choice((-7_200, -3_601, -3_600, -60, 0, 0, 5)))
+        return currency + price.to_bytes(8, "big") + observed.to_bytes(8, "big")
+
+    def box(self, kind, timestamp):
+        rng = self.rng
+        if kind == "spend_window":
+            # last_hour | cumulative | cumulative at the end of each of 25 hours
+            hour = timestamp // 3600 + rng.choice((-30, -24, -5, -1, 0, 0, 1))
+            slots = sorted(rng.randrange(0, 10 ** 6) for _ in range(25))
+            cumulative = slots[-1] + rng.choice((0, 0, 1_000))
+            # Out-of-order slots make the window underflow
+            if rng.random() < 0.1:
+                rng.shuffle(slots)
+            words = [max(hour, 0), cumulative] + slots
+            size = 216 if rng.random() < 0.95 else 208
+            return b"".join(word.to_bytes(8, "big") for word in words)[:size]
+        if kind == "tenant":
+            # owner | balance | limit
+            words = [self.value("limit", timestamp), self.value("limit", timestamp)]
+            return rng.choice(ACCOUNTS) + b"".join(word.to_bytes(8, "big") for word in words)
+        return rng.randbytes(rng.randrange(1, 64))
+
+    def state(self, spec, timestamp, presence):
+        state = {}
+        for key, kind in spec.items():
+            if self.rng.random() < presence:
+                # Occasionally store the wrong kind to exercise type failures
+                if self.rng.random() < 0.03:
+                    kind = "bytes" if kind != "bytes" else "uint64"
+                state[key.encode()] = self.value(kind, timestamp)
+        return state
+
+    def argument(self, spec):
+        rng = self.rng
+        name, kind = spec.split(":")
+        if rng.random() < 0.05:
+            return rng.randbytes(rng.randrange(0, 12))
+        if kind == "uint64":
+            return self.uint().to_bytes(8, "big")
+        if kind == "address":
+            return rng.choice(ACCOUNTS)
+        if name == "tenant":
+            return rng.choice(TENANTS)
+        if kind == "price_entries":
+            entries = b"".join(self.price_entry(self.timestamp) for _ in range(rng.randrange(1, 4)))
+            return entries if rng.random() < 0.95 else entries[:-1]
+        return rng.choice((b"US", b"EU", b"USD", b"WST", b""))
+
+    def scenario(self):
+        rng = self.rng
+        timestamp = rng.choice((0, 86_399, 86_400)) if rng.random() < 0.05 else \
+            rng.randrange(1_600_000_000, 1_800_000_000)
+        app_id = rng.choice(APP_IDS)
+        self.timestamp = timestamp
+        self.pool = rng.sample(INTERESTING_UINTS, 3) + [rng.randrange(0, 10 ** 9)]
+        local_state = {}
+        for account in ACCOUNTS:
+            if rng.random() < 0.75:
+                local_state[account] = self.state(self.keys["local"], timestamp, 0.9)
+        boxes = {}
+        for prefix, (key_kind, kind) in self.keys.get("boxes", {}).items():
+            keys = TENANTS if key_kind == "tenant" else [n.to_bytes(8, "big") for n in (1, 2, 3)]
+            for key in keys:
+                if rng.random() < 0.6:
+                    boxes[prefix + key] = self.box(kind, timestamp)
+        ledger = Ledger(
+            app_id=app_id,
+            global_state=self.state(self.keys["global"], timestamp, 0.9),
+            local_state=local_state,
+            boxes=boxes,
+            # Funds for refunds paid by inner payments
+            balances={application_address(app_id): rng.choice((0, self.uint(), 10 ** 12))},
+        )
+
+        sender = rng.choice(ACCOUNTS)
+        roll = rng.random()
+        if roll < 0.05:
+            call = make_txn(sender, application_id=0)
+        elif roll < 0.2:
+            on_completion = rng.choice([v for k, v in ON_COMPLETION.items() if k != "ClearState"])
+            call = make_txn(sender, on_completion=on_completion, application_id=app_id)
+        else:
+            method = rng.choice(list(self.methods) + ["unknown_method"])
+            specs = self.methods.get(method, [])
+            args = [method.encode()] + [self.argument(spec) for spec in specs]
+            if rng.random() < 0.05 and len(args) > 1:
+                args.pop()
+            call = make_txn(sender, application_id=app_id)
+            call["ApplicationArgs"] = args
+
+        group = [call]
+        if rng.random() < 0.3:
+            receiver = application_address(app_id) if rng.random() < 0.8 else rng.choice(ACCOUNTS)
+            payment = make_payment(sender, receiver, self.uint())
+            if rng.random() < 0.1:
+                payment["TypeEnum"] = 4
+            group = [payment, call]
+        globals_ = {"LatestTimestamp": timestamp, "Round": rng.randrange(1, 50_000_000)}
+        return Scenario(ledger, group, len(group) - 1, globals_)
+
+
+def verify(name, teal, optimized, methods, iterations=2000, seed=0):
+    """Compare both programs on generated calls; returns (mismatches, summary)"""
+    original_program = Program(teal)
+    optimized_program = Program(optimized)
+    generator = ScenarioGenerator(name, methods, seed)
+
+    mismatches = []
+    approved = 0
+    cost_before = cost_after = 0
+    cost_increases = 0
+    for _ in range(iterations):
+        scenario = generator.scenario()
+        before = evaluate(original_program, scenario.ledger, scenario.group, scenario.index,
+                          scenario.globals)
+        after = evaluate(optimized_program, scenario.ledger, scenario.group, scenario.index,
+                         scenario.globals)
+        if before.outcome() != after.outcome():
+            mismatches.append((scenario, before, after))
+            continue
+        if before.approved:
+            approved += 1
+            cost_before += before.cost
+            cost_after += after.cost
+            if after.cost > before.cost:
+                cost_increases += 1
+
+    summary = {
+        "iterations": iterations,
+        "approved": approved,
+        "bytes_before": len(assemble(teal)),
+        "bytes_after": len(assemble(optimized)),
+        "avg_cost_before": cost_before / approved if approved else 0,
+        "avg_cost_after": cost_after / approved if approved else 0,
+        "cost_increases": cost_increases,
+    }
+    return mismatches, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check optimized TEAL against the original")
+    parser.add_argument("contracts", nargs="*", help=f"Default: all of {', '.join(CONTRACTS)}")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    unknown = set(args.contracts) - set(CONTRACTS)
+    if unknown:
+        parser.error(f"unknown contracts: {', '.join(sorted(unknown))}")
+
+    failed = False
+    for name in args.contracts or CONTRACTS:
+        module, teals = compile_programs(name)
+        teal = teals["approval"]
+        optimized, stats = optimize(teal)
+        mismatches, summary = verify(
+            name, teal, optimized, module.METHODS, args.iterations, args.seed
+        )
+        print(
+            f"📦 {name}: {summary['bytes_before']} -> {summary['bytes_after']} bytes, "
+            f"avg cost {summary['avg_cost_before']:.1f} -> {summary['avg_cost_after']:.1f} "
+            f"over {summary['approved']}/{summary['iterations']} approved calls"
+        )
+        print(f"   passes: {stats}")
+        if summary["cost_increases"]:
+            print(f"   ⚠️ {summary['cost_increases']} approved calls cost more after optimization")
+        if mismatches:
+            failed = True
+            print(f"❌ {len(mismatches)} mismatching calls")
+            for scenario, before, after in mismatches[:5]:
+                print(f"   - {scenario.describe()}\n     original {before}\n     optimized {after}")
+        else:
+            print("✅ Optimized program is equivalent on all generated calls")
+
+        template_teal = compile_template(name, module, optimized=True)
+        if template_teal is not None:
+            template = build_template(template_teal, module.TEMPLATE_PARAMETERS)
+            mismatches, _ = verify(
+                name, teal, substitute_teal(template), module.METHODS, args.iterations, args.seed
+            )
+            if mismatches:
+                failed = True
+                print(f"❌ Template with default parameters differs on {len(mismatches)} calls")
+            else:
+                print("✅ Template with default parameters is equivalent")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
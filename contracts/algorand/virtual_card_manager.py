@@ -12,7 +12,106 @@ Features:
 
 from pyteal import *
 
-def approval_program():
+from card_index import card_box_min_balance
+
+# Contract interface, shared with the artifact builder and deployment tools
+VERSION = "1.9.0"
+TEAL_VERSION = 8
+
+# Byte slices: 4 contract settings plus one price table entry per currency
+GLOBAL_SCHEMA = {"num_uints": 10, "num_byte_slices": 16}
+LOCAL_SCHEMA = {"num_uints": 10, "num_byte_slices": 5}
+
+# Application call methods and the arguments following the method name
+METHODS = {
+    # after a payment of card_box_min_balance() to the app address, for new cards
+    "create_card": ["kyc_tier:uint64", "region:bytes", "currency:bytes"],
+    "fund_card": [],  # second in a group after a payment to the app address
+    "use_card": ["amount:uint64"],
+    "reset_limits": [],
+    "deactivate_card": [],
+    "activate_card": [],
+    "update_limits": ["account:address", "daily_limit:uint64", "monthly_limit:uint64"],
+    "emergency_pause": [],
+    "update_chainlink_feed": ["feed_id:uint64"],
+    "set_price_updater": ["account:address"],
+    "update_prices": ["prices:price_entries"],
+    "get_card_summary": ["account:address"],  # read-only, meant for simulate
+    "sweep_card": ["account:address"],
+}
+
+# Price table: one global "px" + currency code entry per currency, holding
+# price uint64 | timestamp uint64. update_prices takes up to MAX_PRICE_ENTRIES
+# packed (currency, price, timestamp) entries of PRICE_ENTRY_SIZE bytes, with
+# currency codes zero-padded to CURRENCY_CODE_SIZE bytes. Prices are base
+# currency units per card currency unit, scaled by PRICE_SCALE.
+PRICE_KEY_PREFIX = b"px"
+CURRENCY_CODE_SIZE = 8
+PRICE_ENTRY_SIZE = CURRENCY_CODE_SIZE + 16
+MAX_PRICE_ENTRIES = 8
+PRICE_SCALE = 1_000_000
+PRICE_MAX_AGE = 3600  # seconds before a cached price is too stale to spend with
+
+# Rolling-window limit mode: daily spend covers the last 24 hourly buckets,
+# kept in a per-card ring box, instead of a counter reset at UTC midnight
+WINDOW_HOURS = 24
+WINDOW_BUCKET_SECONDS = 3600
+WINDOW_SLOTS = WINDOW_HOURS + 1  # one extra slot for the hour leaving the window
+WINDOW_HEADER_SIZE = 16  # last_hour uint64 | cumulative uint64
+WINDOW_BOX_SIZE = WINDOW_HEADER_SIZE + WINDOW_SLOTS * 8
+
+# get_card_summary logs CARD_SUMMARY_PREFIX followed by balance, remaining
+# daily allowance, remaining monthly allowance, kyc tier and active flag as
+# uint64s, then the card currency code
+CARD_SUMMARY_PREFIX = b"CardSummary:"
+CARD_SUMMARY_FIELDS = ("balance", "daily_remaining", "monthly_remaining", "kyc_tier", "is_active")
+
+# Box storage; create_card must reference the card index box it writes, and
+# in rolling-window mode use_card and reset_limits the card's window box.
+# Close-out and sweep_card delete a card's boxes, so they reference both.
+CARD_INDEX_PREFIX = b"c"
+SPEND_WINDOW_PREFIX = b"w"
+BOXES = {
+    "card_index": {
+        "prefix": CARD_INDEX_PREFIX.hex(),
+        "key": "card_id:uint64",
+        "value": "owner:address",
+    },
+    "spend_window": {
+        "prefix": SPEND_WINDOW_PREFIX.hex(),
+        "key": "card_id:uint64",
+        "value": f"last_hour:uint64,cumulative:uint64,cumulative_at_hour:uint64[{WINDOW_SLOTS}]",
+        "option": "rolling_window",
+    },
+}
+
+# The holder pays for a new card's boxes with a payment of
+# card_box_min_balance() (card_index.py, shared with the tools) to the app
+# address right before create_card; recreating a deactivated card reuses its
+# ID and boxes and needs no payment. Close-out and sweep_card refund it with
+# the card balance.
+
+# Per-partner parameters. With template=True they are emitted as TMPL_
+# placeholders that teal_template.py substitutes into the compiled bytecode;
+# otherwise these defaults are compiled in.
+TEMPLATE_PARAMETERS = {
+    "TMPL_BASIC_DAILY_LIMIT": 100_000_000,       # 100 ALGO
+    "TMPL_BASIC_MONTHLY_LIMIT": 1_000_000_000,   # 1000 ALGO
+    "TMPL_STANDARD_DAILY_LIMIT": 500_000_000,    # 500 ALGO
+    "TMPL_STANDARD_MONTHLY_LIMIT": 5_000_000_000,  # 5000 ALGO
+    "TMPL_ENHANCED_DAILY_LIMIT": 2_500_000_000,  # 2500 ALGO
+    "TMPL_ENHANCED_MONTHLY_LIMIT": 25_000_000_000,  # 25000 ALGO
+    "TMPL_BASE_CURRENCY": "ALGO",
+    "TMPL_VERSION": VERSION,
+}
+
+def approval_program(rolling_window=False, template=False):
+    def parameter(name):
+        value = TEMPLATE_PARAMETERS[name]
+        if template:
+            return Tmpl.Int(name) if isinstance(value, int) else Tmpl.Bytes(name)
+        return Int(value) if isinstance(value, int) else Bytes(value)
+    
     # Global State Keys
     ASA_ID = Bytes("ASA_ID")
     OWNER = Bytes("OWNER")
@@ -20,6 +119,8 @@ def approval_program():
     CHAINLINK_FEED = Bytes("CHAINLINK_FEED")
     TOTAL_CARDS = Bytes("TOTAL_CARDS")
     CONTRACT_VERSION = Bytes("CONTRACT_VERSION")
+    PRICE_UPDATER = Bytes("PRICE_UPDATER")
+    PRICE_KEY = Bytes(PRICE_KEY_PREFIX)  # + padded currency code -> price | timestamp
     
     # Local State Keys
     BALANCE = Bytes("balance")
@@ -35,6 +136,10 @@ def approval_program():
     MONTHLY_LIMIT = Bytes("monthly_limit")
     CARD_ID = Bytes("card_id")
     
+    # Box Keys
+    CARD_INDEX = Bytes(CARD_INDEX_PREFIX)  # + card_id -> owner address
+    SPEND_WINDOW = Bytes(SPEND_WINDOW_PREFIX)  # + card_id -> hourly spend ring
+    
     # Application Methods
     METHOD_CREATE_CARD = Bytes("create_card")
     METHOD_FUND_CARD = Bytes("fund_card")
@@ -44,16 +149,20 @@ def approval_program():
     METHOD_ACTIVATE_CARD = Bytes("activate_card")
     METHOD_UPDATE_LIMITS = Bytes("update_limits")
     METHOD_EMERGENCY_PAUSE = Bytes("emergency_pause")
+    METHOD_SET_PRICE_UPDATER = Bytes("set_price_updater")
+    METHOD_UPDATE_PRICES = Bytes("update_prices")
+    METHOD_GET_CARD_SUMMARY = Bytes("get_card_summary")
+    METHOD_SWEEP_CARD = Bytes("sweep_card")
     
     # KYC Tier Limits (in microAlgos for ALGO, adjust for other currencies)
-    BASIC_DAILY_LIMIT = Int(100_000_000)    # 100 ALGO
-    BASIC_MONTHLY_LIMIT = Int(1_000_000_000) # 1000 ALGO
+    BASIC_DAILY_LIMIT = parameter("TMPL_BASIC_DAILY_LIMIT")
+    BASIC_MONTHLY_LIMIT = parameter("TMPL_BASIC_MONTHLY_LIMIT")
     
-    STANDARD_DAILY_LIMIT = Int(500_000_000)    # 500 ALGO
-    STANDARD_MONTHLY_LIMIT = Int(5_000_000_000) # 5000 ALGO
+    STANDARD_DAILY_LIMIT = parameter("TMPL_STANDARD_DAILY_LIMIT")
+    STANDARD_MONTHLY_LIMIT = parameter("TMPL_STANDARD_MONTHLY_LIMIT")
     
-    ENHANCED_DAILY_LIMIT = Int(2_500_000_000)    # 2500 ALGO
-    ENHANCED_MONTHLY_LIMIT = Int(25_000_000_000)  # 25000 ALGO
+    ENHANCED_DAILY_LIMIT = parameter("TMPL_ENHANCED_DAILY_LIMIT")
+    ENHANCED_MONTHLY_LIMIT = parameter("TMPL_ENHANCED_MONTHLY_LIMIT")
     
     # Helper Functions
     @Subroutine(TealType.uint64)
@@ -112,6 +221,172 @@ def approval_program():
             ])
         )
     
+    def spend_window_box():
+        return Concat(SPEND_WINDOW, App.localGet(Txn.sender(), CARD_ID))
+    
+    def window_slot_offset(hour):
+        return Int(WINDOW_HEADER_SIZE) + (hour % Int(WINDOW_SLOTS)) * Int(8)
+    
+    @Subroutine(TealType.uint64)
+    def advance_spend_window():
+        # Slot hour % 25 holds the cumulative spend at the end of that hour, so
+        # the last 24 hours spent cumulative - slot(hour - 24). Hours skipped
+        # since the last spend are filled with the current cumulative in at
+        # most two box writes, keeping this O(1) however long the card idled.
+        window = ScratchVar(TealType.bytes)
+        current_hour = ScratchVar(TealType.uint64)
+        last_hour = ScratchVar(TealType.uint64)
+        cumulative = ScratchVar(TealType.uint64)
+        first_slot = ScratchVar(TealType.uint64)
+        slot_count = ScratchVar(TealType.uint64)
+        head_count = ScratchVar(TealType.uint64)
+        fill = ScratchVar(TealType.bytes)
+        
+        return Seq([
+            window.store(spend_window_box()),
+            Pop(App.box_create(window.load(), Int(WINDOW_BOX_SIZE))),
+            current_hour.store(Global.latest_timestamp() / Int(WINDOW_BUCKET_SECONDS)),
+            last_hour.store(Btoi(App.box_extract(window.load(), Int(0), Int(8)))),
+            cumulative.store(Btoi(App.box_extract(window.load(), Int(8), Int(8)))),
+            If(current_hour.load() > last_hour.load()).Then(Seq([
+                If(current_hour.load() - last_hour.load() >= Int(WINDOW_SLOTS)).Then(Seq([
+                    first_slot.store(Int(0)),
+                    slot_count.store(Int(WINDOW_SLOTS))
+                ])).Else(Seq([
+                    first_slot.store((last_hour.load() + Int(1)) % Int(WINDOW_SLOTS)),
+                    slot_count.store(current_hour.load() - last_hour.load())
+                ])),
+                # 8 bytes doubled 5 times covers all 25 slots
+                fill.store(Itob(cumulative.load())),
+                *[fill.store(Concat(fill.load(), fill.load())) for _ in range(5)],
+                head_count.store(Int(WINDOW_SLOTS) - first_slot.load()),
+                If(slot_count.load() < head_count.load()).Then(
+                    head_count.store(slot_count.load())
+                ),
+                App.box_replace(
+                    window.load(),
+                    Int(WINDOW_HEADER_SIZE) + first_slot.load() * Int(8),
+                    Extract(fill.load(), Int(0), head_count.load() * Int(8))
+                ),
+                If(slot_count.load() > head_count.load()).Then(
+                    App.box_replace(
+                        window.load(),
+                        Int(WINDOW_HEADER_SIZE),
+                        Extract(fill.load(), Int(0), (slot_count.load() - head_count.load()) * Int(8))
+                    )
+                ),
+                App.box_replace(window.load(), Int(0), Itob(current_hour.load())),
+                last_hour.store(current_hour.load())
+            ])),
+            # Slot (hour + 1) % 25 is the one for hour - 24
+            cumulative.load() - Btoi(App.box_extract(
+                window.load(), window_slot_offset(last_hour.load() + Int(1)), Int(8)
+            ))
+        ])
+    
+    @Subroutine(TealType.none)
+    def record_window_spend(amount):
+        # Called after advance_spend_window, so the header hour is current
+        window = ScratchVar(TealType.bytes)
+        cumulative = ScratchVar(TealType.bytes)
+        
+        return Seq([
+            window.store(spend_window_box()),
+            cumulative.store(Itob(
+                Btoi(App.box_extract(window.load(), Int(8), Int(8))) + amount
+            )),
+            App.box_replace(window.load(), Int(8), cumulative.load()),
+            App.box_replace(
+                window.load(),
+                window_slot_offset(Btoi(App.box_extract(window.load(), Int(0), Int(8)))),
+                cumulative.load()
+            )
+        ])
+    
+    def refresh_daily_spent():
+        # Daily spend comes from the rolling window or the UTC-day counter
+        if rolling_window:
+            return App.localPut(Txn.sender(), DAILY_SPENT, advance_spend_window())
+        return reset_daily_limits_if_needed()
+    
+    @Subroutine(TealType.none)
+    def close_card(account):
+        # Deletes the card's boxes and refunds the card balance, plus the box
+        # minimum balance the holder paid at create_card, to its holder. The
+        # boxes go first so the app account has that balance free to pay. The
+        # inner payment pays no fee; the outer group covers it (fee pooling).
+        # Callers drop or clear the local state.
+        refund = ScratchVar(TealType.uint64)
+        card = App.localGetEx(account, Global.current_application_id(), CARD_ID)
+        
+        return Seq([
+            card,
+            refund.store(App.localGet(account, BALANCE)),
+            If(card.hasValue()).Then(Seq([
+                Pop(App.box_delete(Concat(CARD_INDEX, card.value()))),
+                Pop(App.box_delete(Concat(SPEND_WINDOW, card.value()))) if rolling_window else Seq(),
+                refund.store(refund.load() + Int(card_box_min_balance(rolling_window))),
+            ])),
+            If(refund.load() > Int(0)).Then(InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: account,
+                TxnField.amount: refund.load(),
+                TxnField.fee: Int(0),
+            })),
+            If(card.hasValue()).Then(Log(Concat(
+                Bytes("CardClosed:"),
+                card.value(),
+                Bytes(":"),
+                account,
+                Bytes(":"),
+                Itob(refund.load())
+            )))
+        ])
+    
+    @Subroutine(TealType.uint64)
+    def window_spent(window_box):
+        # Read-only advance_spend_window: what it would return now, without
+        # writing the skipped hours
+        window = App.box_get(window_box)
+        current_hour = Global.latest_timestamp() / Int(WINDOW_BUCKET_SECONDS)
+        
+        return Seq([
+            window,
+            If(Not(window.hasValue())).Then(Return(Int(0))),
+            If(current_hour >= ExtractUint64(window.value(), Int(0)) + Int(WINDOW_SLOTS)).Then(
+                Return(Int(0))
+            ),
+            ExtractUint64(window.value(), Int(8)) - ExtractUint64(
+                window.value(), window_slot_offset(current_hour + Int(1))
+            )
+        ])
+    
+    @Subroutine(TealType.uint64)
+    def remaining_allowance(limit, spent):
+        return If(limit > spent, limit - spent, Int(0))
+    
+    def price_key(currency):
+        return Concat(
+            PRICE_KEY, currency, BytesZero(Int(CURRENCY_CODE_SIZE) - Len(currency))
+        )
+    
+    @Subroutine(TealType.uint64)
+    def to_base_units(amount):
+        # Spends in the card's currency are charged against the balance and
+        # limits in base currency units, at a cached price no older than
+        # PRICE_MAX_AGE
+        currency = ScratchVar(TealType.bytes)
+        entry = App.globalGetEx(Global.current_application_id(), price_key(currency.load()))
+        
+        return Seq([
+            currency.store(App.localGet(Txn.sender(), CURRENCY)),
+            If(currency.load() == App.globalGet(BASE_CURRENCY)).Then(Return(amount)),
+            entry,
+            Assert(entry.hasValue()),
+            Assert(ExtractUint64(entry.value(), Int(8)) + Int(PRICE_MAX_AGE) >= Global.latest_timestamp()),
+            WideRatio([amount, ExtractUint64(entry.value(), Int(0))], [Int(PRICE_SCALE)])
+        ])
+    
     @Subroutine(TealType.uint64)
     def validate_card_usage(amount):
         kyc_tier = App.localGet(Txn.sender(), KYC_TIER)
@@ -133,32 +408,35 @@ def approval_program():
     # Application Creation
     on_creation = Seq([
         App.globalPut(OWNER, Txn.sender()),
-        App.globalPut(BASE_CURRENCY, Bytes("ALGO")),
+        App.globalPut(BASE_CURRENCY, parameter("TMPL_BASE_CURRENCY")),
         App.globalPut(TOTAL_CARDS, Int(0)),
-        App.globalPut(CONTRACT_VERSION, Bytes("1.0.0")),
+        App.globalPut(CONTRACT_VERSION, parameter("TMPL_VERSION")),
         # Chainlink feed will be set later via update call
         App.globalPut(CHAINLINK_FEED, Int(0)),
+        # Prices are pushed by the creator until set_price_updater delegates it
+        App.globalPut(PRICE_UPDATER, Txn.sender()),
         Approve()
     ])
     
     # Create Virtual Card
+    kyc_tier_arg = Btoi(Txn.application_args[1])
+    region_arg = Txn.application_args[2]
+    currency_arg = Txn.application_args[3]
+    card_id = ScratchVar(TealType.bytes)
+    existing_card_id = App.localGetEx(Txn.sender(), Global.current_application_id(), CARD_ID)
+    box_payment = Gtxn[Txn.group_index() - Int(1)]
+    
     create_card = Seq([
         # Validate inputs
         Assert(Txn.application_args.length() == Int(4)),
         Assert(is_opted_in()),
         Assert(App.localGet(Txn.sender(), IS_ACTIVE) == Int(0)),  # Not already active
         
-        # Parse arguments
-        kyc_tier_arg := Btoi(Txn.application_args[1]),
-        region_arg := Txn.application_args[2],
-        currency_arg := Txn.application_args[3],
-        
         # Validate KYC tier
         Assert(And(kyc_tier_arg >= Int(1), kyc_tier_arg <= Int(3))),
         
-        # Set card limits based on KYC tier
-        daily_limit := get_kyc_daily_limit(kyc_tier_arg),
-        monthly_limit := get_kyc_monthly_limit(kyc_tier_arg),
+        # Currency codes are zero-padded to CURRENCY_CODE_SIZE in price keys
+        Assert(And(Len(currency_arg) >= Int(1), Len(currency_arg) <= Int(CURRENCY_CODE_SIZE))),
         
         # Initialize local state
         App.localPut(Txn.sender(), BALANCE, Int(0)),
@@ -170,25 +448,35 @@ def approval_program():
         App.localPut(Txn.sender(), REGION, region_arg),
         App.localPut(Txn.sender(), IS_ACTIVE, Int(1)),
         App.localPut(Txn.sender(), CURRENCY, currency_arg),
-        App.localPut(Txn.sender(), DAILY_LIMIT, daily_limit),
-        App.localPut(Txn.sender(), MONTHLY_LIMIT, monthly_limit),
-        
-        # Generate unique card ID
-        card_id := Concat(
-            Bytes("card_"),
-            Itob(Global.latest_timestamp()),
-            Bytes("_"),
-            Txn.sender()
-        ),
-        App.localPut(Txn.sender(), CARD_ID, card_id),
         
-        # Increment total cards counter
-        App.globalPut(TOTAL_CARDS, App.globalGet(TOTAL_CARDS) + Int(1)),
+        # Set card limits based on KYC tier
+        App.localPut(Txn.sender(), DAILY_LIMIT, get_kyc_daily_limit(kyc_tier_arg)),
+        App.localPut(Txn.sender(), MONTHLY_LIMIT, get_kyc_monthly_limit(kyc_tier_arg)),
+        
+        # A deactivated card keeps its ID and boxes when recreated
+        existing_card_id,
+        If(existing_card_id.hasValue()).Then(
+            card_id.store(existing_card_id.value())
+        ).Else(Seq([
+            # The holder pays the minimum balance of the new card's boxes
+            Assert(Txn.group_index() > Int(0)),
+            Assert(box_payment.type_enum() == TxnType.Payment),
+            Assert(box_payment.receiver() == Global.current_application_address()),
+            Assert(box_payment.amount() >= Int(card_box_min_balance(rolling_window))),
+            
+            # Sequential 8-byte card ID from the total cards counter
+            card_id.store(Itob(App.globalGet(TOTAL_CARDS) + Int(1))),
+            App.localPut(Txn.sender(), CARD_ID, card_id.load()),
+            App.globalPut(TOTAL_CARDS, App.globalGet(TOTAL_CARDS) + Int(1)),
+            
+            # Index card ID -> owner for O(1) reverse lookups
+            App.box_put(Concat(CARD_INDEX, card_id.load()), Txn.sender()),
+        ])),
         
         # Log card creation event
         Log(Concat(
             Bytes("CardCreated:"),
-            card_id,
+            card_id.load(),
             Bytes(":"),
             Txn.sender(),
             Bytes(":"),
@@ -215,9 +503,11 @@ def approval_program():
         Assert(Gtxn[0].amount() > Int(0)),
         
         # Update balance
-        current_balance := App.localGet(Txn.sender(), BALANCE),
-        new_balance := current_balance + Gtxn[0].amount(),
-        App.localPut(Txn.sender(), BALANCE, new_balance),
+        App.localPut(
+            Txn.sender(),
+            BALANCE,
+            App.localGet(Txn.sender(), BALANCE) + Gtxn[0].amount()
+        ),
         
         # Log funding event
         Log(Concat(
@@ -235,26 +525,34 @@ def approval_program():
     ])
     
     # Use Virtual Card
+    spend_amount = ScratchVar(TealType.uint64)
+    amount = ScratchVar(TealType.uint64)
+    current_balance = ScratchVar(TealType.uint64)
+    daily_spent = ScratchVar(TealType.uint64)
+    monthly_spent = ScratchVar(TealType.uint64)
+    
     use_card = Seq([
-        # Parse amount argument
+        # Parse amount argument, given in the card's currency
         Assert(Txn.application_args.length() == Int(2)),
-        amount := Btoi(Txn.application_args[1]),
+        spend_amount.store(Btoi(Txn.application_args[1])),
+        amount.store(to_base_units(spend_amount.load())),
         
         # Reset limits if needed
-        reset_daily_limits_if_needed(),
+        refresh_daily_spent(),
         reset_monthly_limits_if_needed(),
         
         # Validate card usage
-        Assert(validate_card_usage(amount)),
+        Assert(validate_card_usage(amount.load())),
+        record_window_spend(amount.load()) if rolling_window else Seq(),
         
         # Update balances and spending
-        current_balance := App.localGet(Txn.sender(), BALANCE),
-        daily_spent := App.localGet(Txn.sender(), DAILY_SPENT),
-        monthly_spent := App.localGet(Txn.sender(), MONTHLY_SPENT),
+        current_balance.store(App.localGet(Txn.sender(), BALANCE)),
+        daily_spent.store(App.localGet(Txn.sender(), DAILY_SPENT)),
+        monthly_spent.store(App.localGet(Txn.sender(), MONTHLY_SPENT)),
         
-        App.localPut(Txn.sender(), BALANCE, current_balance - amount),
-        App.localPut(Txn.sender(), DAILY_SPENT, daily_spent + amount),
-        App.localPut(Txn.sender(), MONTHLY_SPENT, monthly_spent + amount),
+        App.localPut(Txn.sender(), BALANCE, current_balance.load() - amount.load()),
+        App.localPut(Txn.sender(), DAILY_SPENT, daily_spent.load() + amount.load()),
+        App.localPut(Txn.sender(), MONTHLY_SPENT, monthly_spent.load() + amount.load()),
         
         # Log usage event
         Log(Concat(
@@ -263,11 +561,11 @@ def approval_program():
             Bytes(":"),
             Txn.sender(),
             Bytes(":"),
-            Itob(amount),
+            Itob(spend_amount.load()),
             Bytes(":"),
             App.localGet(Txn.sender(), CURRENCY),
             Bytes(":"),
-            Itob(current_balance - amount)  # New balance
+            Itob(current_balance.load() - amount.load())  # New balance
         )),
         
         Approve()
@@ -278,7 +576,7 @@ def approval_program():
         # This can be called by anyone for automated resets
         # In production, you might want to restrict this to Chainlink nodes
         
-        reset_daily_limits_if_needed(),
+        refresh_daily_spent(),
         reset_monthly_limits_if_needed(),
         
         # Log reset event
@@ -329,17 +627,17 @@ def approval_program():
     ])
     
     # Update Limits (Owner only)
+    target_address = Txn.application_args[1]
+    new_daily_limit = Btoi(Txn.application_args[2])
+    new_monthly_limit = Btoi(Txn.application_args[3])
+    
     update_limits = Seq([
         Assert(is_owner()),
         Assert(Txn.application_args.length() == Int(4)),
         
-        target_address := Txn.application_args[1],
-        new_daily_limit := Btoi(Txn.application_args[2]),
-        new_monthly_limit := Btoi(Txn.application_args[3]),
-        
         # Update limits for target address
-        App.localPutEx(target_address, DAILY_LIMIT, new_daily_limit),
-        App.localPutEx(target_address, MONTHLY_LIMIT, new_monthly_limit),
+        App.localPut(target_address, DAILY_LIMIT, new_daily_limit),
+        App.localPut(target_address, MONTHLY_LIMIT, new_monthly_limit),
         
         # Log limit update
         Log(Concat(
@@ -373,11 +671,12 @@ def approval_program():
     ])
     
     # Update Chainlink Feed (Owner only)
+    new_feed_id = Btoi(Txn.application_args[1])
+    
     update_chainlink_feed = Seq([
         Assert(is_owner()),
         Assert(Txn.application_args.length() == Int(2)),
         
-        new_feed_id := Btoi(Txn.application_args[1]),
         App.globalPut(CHAINLINK_FEED, new_feed_id),
         
         # Log feed update
@@ -389,14 +688,150 @@ def approval_program():
         Approve()
     ])
     
+    # Set Price Updater (Owner only)
+    price_updater_arg = Txn.application_args[1]
+    
+    set_price_updater = Seq([
+        Assert(is_owner()),
+        Assert(Txn.application_args.length() == Int(2)),
+        Assert(Len(price_updater_arg) == Int(32)),
+        
+        App.globalPut(PRICE_UPDATER, price_updater_arg),
+        
+        Log(Concat(
+            Bytes("PriceUpdaterSet:"),
+            price_updater_arg
+        )),
+        
+        Approve()
+    ])
+    
+    # Update Prices (Owner or price updater), one call for every currency
+    price_entries = Txn.application_args[1]
+    entry_offset = ScratchVar(TealType.uint64)
+    entry_key = ScratchVar(TealType.bytes)
+    stored_entry = App.globalGetEx(Global.current_application_id(), entry_key.load())
+    
+    update_prices = Seq([
+        Assert(Or(is_owner(), Txn.sender() == App.globalGet(PRICE_UPDATER))),
+        Assert(Txn.application_args.length() == Int(2)),
+        Assert(Len(price_entries) > Int(0)),
+        Assert(Len(price_entries) <= Int(PRICE_ENTRY_SIZE * MAX_PRICE_ENTRIES)),
+        Assert(Len(price_entries) % Int(PRICE_ENTRY_SIZE) == Int(0)),
+        
+        For(
+            entry_offset.store(Int(0)),
+            entry_offset.load() < Len(price_entries),
+            entry_offset.store(entry_offset.load() + Int(PRICE_ENTRY_SIZE))
+        ).Do(Seq([
+            entry_key.store(Concat(
+                PRICE_KEY, Extract(price_entries, entry_offset.load(), Int(CURRENCY_CODE_SIZE))
+            )),
+            Assert(ExtractUint64(price_entries, entry_offset.load() + Int(CURRENCY_CODE_SIZE)) > Int(0)),
+            Assert(
+                ExtractUint64(price_entries, entry_offset.load() + Int(CURRENCY_CODE_SIZE + 8))
+                <= Global.latest_timestamp()
+            ),
+            stored_entry,
+            # Entries no newer than the cached price are skipped, so a
+            # retried or reordered batch never rolls a price back
+            If(
+                ExtractUint64(price_entries, entry_offset.load() + Int(CURRENCY_CODE_SIZE + 8))
+                > If(stored_entry.hasValue(), ExtractUint64(stored_entry.value(), Int(8)), Int(0))
+            ).Then(
+                App.globalPut(entry_key.load(), Extract(
+                    price_entries, entry_offset.load() + Int(CURRENCY_CODE_SIZE), Int(16)
+                ))
+            )
+        ])),
+        
+        Log(Concat(
+            Bytes("PricesUpdated:"),
+            price_entries
+        )),
+        
+        Approve()
+    ])
+    
+    # Get Card Summary (read-only), for clients calling through simulate.
+    # Spent amounts are as use_card would see them now, after any resets.
+    summary_account = Txn.application_args[1]
+    
+    if rolling_window:
+        summary_daily_spent = window_spent(
+            Concat(SPEND_WINDOW, App.localGet(summary_account, CARD_ID))
+        )
+    else:
+        summary_daily_spent = If(
+            get_current_day() > App.localGet(summary_account, LAST_RESET_DAY),
+            Int(0),
+            App.localGet(summary_account, DAILY_SPENT)
+        )
+    summary_monthly_spent = If(
+        get_current_month() > App.localGet(summary_account, LAST_RESET_MONTH),
+        Int(0),
+        App.localGet(summary_account, MONTHLY_SPENT)
+    )
+    
+    get_card_summary = Seq([
+        Assert(Txn.application_args.length() == Int(2)),
+        Assert(App.optedIn(summary_account, Global.current_application_id())),
+        
+        Log(Concat(
+            Bytes(CARD_SUMMARY_PREFIX),
+            Itob(App.localGet(summary_account, BALANCE)),
+            Itob(remaining_allowance(App.localGet(summary_account, DAILY_LIMIT), summary_daily_spent)),
+            Itob(remaining_allowance(
+                App.localGet(summary_account, MONTHLY_LIMIT), summary_monthly_spent
+            )),
+            Itob(App.localGet(summary_account, KYC_TIER)),
+            Itob(App.localGet(summary_account, IS_ACTIVE)),
+            App.localGet(summary_account, CURRENCY)
+        )),
+        
+        Approve()
+    ])
+    
+    # Close Out: the holder leaves the app, reclaiming their opt-in minimum
+    # balance; any remaining card balance is refunded
+    close_out = Seq([
+        close_card(Txn.sender()),
+        Approve()
+    ])
+    
+    # Sweep Card (Owner only): close an inactive or empty card for its holder.
+    # The holder stays opted in without a card until they close out.
+    sweep_account = Txn.application_args[1]
+    sweep_card_id = App.localGetEx(sweep_account, Global.current_application_id(), CARD_ID)
+    
+    sweep_card = Seq([
+        Assert(is_owner()),
+        Assert(Txn.application_args.length() == Int(2)),
+        Assert(App.optedIn(sweep_account, Global.current_application_id())),
+        sweep_card_id,
+        Assert(sweep_card_id.hasValue()),
+        Assert(Or(
+            App.localGet(sweep_account, IS_ACTIVE) == Int(0),
+            App.localGet(sweep_account, BALANCE) == Int(0)
+        )),
+        
+        close_card(sweep_account),
+        *[App.localDel(sweep_account, key) for key in (
+            BALANCE, DAILY_SPENT, MONTHLY_SPENT, LAST_RESET_DAY, LAST_RESET_MONTH, KYC_TIER,
+            REGION, IS_ACTIVE, CURRENCY, DAILY_LIMIT, MONTHLY_LIMIT, CARD_ID
+        )],
+        
+        Approve()
+    ])
+    
     # Main Program Logic
     program = Cond(
         [Txn.application_id() == Int(0), on_creation],
-        [Txn.on_completion() == OnCall.OptIn, Approve()],
-        [Txn.on_completion() == OnCall.CloseOut, Approve()],
-        [Txn.on_completion() == OnCall.UpdateApplication, 
+        [Txn.on_completion() == OnComplete.OptIn, Approve()],
+        [Txn.on_completion() == OnComplete.CloseOut, close_out],
+        [Txn.on_completion() == OnComplete.UpdateApplication, 
          If(is_owner()).Then(Approve()).Else(Reject())],
-        [Txn.on_completion() == OnCall.DeleteApplication, 
+        [Txn.on_completion() == OnComplete.DeleteApplication, 
          If(is_owner()).Then(Approve()).Else(Reject())],
         [Txn.application_args[0] == METHOD_CREATE_CARD, create_card],
         [Txn.application_args[0] == METHOD_FUND_CARD, fund_card],
@@ -407,6 +842,10 @@ def approval_program():
         [Txn.application_args[0] == METHOD_UPDATE_LIMITS, update_limits],
         [Txn.application_args[0] == METHOD_EMERGENCY_PAUSE, emergency_pause],
         [Txn.application_args[0] == Bytes("update_chainlink_feed"), update_chainlink_feed],
+        [Txn.application_args[0] == METHOD_SET_PRICE_UPDATER, set_price_updater],
+        [Txn.application_args[0] == METHOD_UPDATE_PRICES, update_prices],
+        [Txn.application_args[0] == METHOD_GET_CARD_SUMMARY, get_card_summary],
+        [Txn.application_args[0] == METHOD_SWEEP_CARD, sweep_card],
         [Int(1), Reject()]
     )
     
@@ -420,8 +859,8 @@ def clear_state_program():
 
 if __name__ == "__main__":
     # Compile the contract
-    approval_teal = compileTeal(approval_program(), Mode.Application, version=8)
-    clear_state_teal = compileTeal(clear_state_program(), Mode.Application, version=8)
+    approval_teal = compileTeal(approval_program(), Mode.Application, version=TEAL_VERSION)
+    clear_state_teal = compileTeal(clear_state_program(), Mode.Application, version=TEAL_VERSION)
     
     # Write to files
     with open("virtual_card_manager_approval.teal", "w") as f:
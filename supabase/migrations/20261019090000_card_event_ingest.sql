@@ -0,0 +1,73 @@
+/*
+  # Card Event Ingest
+
+  1. New Tables
+    - `card_events` - Decoded Virtual Card Manager logs, keyed by
+      (round, intra, log_index) so replayed rounds upsert in place
+    - `card_holders` - Card ID to holder address, with the rounds the card
+      was created and closed in
+    - `ingest_cursors` - Last round committed by each ingest follower
+
+  2. Security
+    - Enable RLS on all tables
+    - Admins can read events and holders; writes come from the ingest
+      service through the service role
+*/
+
+CREATE TABLE IF NOT EXISTS card_events (
+  round bigint NOT NULL,
+  intra integer NOT NULL,
+  log_index integer NOT NULL,
+  kind text NOT NULL CHECK (kind IN ('CardCreated', 'CardFunded', 'CardUsed', 'CardClosed')),
+  card_id bigint NOT NULL,
+  address text NOT NULL,
+  amount numeric(20, 0),
+  currency text,
+  balance numeric(20, 0),
+  kyc_tier integer,
+  region text,
+  created_at timestamptz DEFAULT now(),
+  PRIMARY KEY (round, intra, log_index)
+);
+
+CREATE INDEX IF NOT EXISTS card_events_card_id ON card_events (card_id, round);
+CREATE INDEX IF NOT EXISTS card_events_address ON card_events (address, round);
+
+CREATE TABLE IF NOT EXISTS card_holders (
+  card_id bigint PRIMARY KEY,
+  address text NOT NULL,
+  created_round bigint,
+  closed_round bigint
+);
+
+CREATE INDEX IF NOT EXISTS card_holders_address ON card_holders (address);
+
+CREATE TABLE IF NOT EXISTS ingest_cursors (
+  name text PRIMARY KEY,
+  round bigint NOT NULL,
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE card_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE card_holders ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ingest_cursors ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Admins can read card events"
+  ON card_events FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM users
+      WHERE users.id = auth.uid() AND users.role = 'admin'
+    )
+  );
+
+CREATE POLICY "Admins can read card holders"
+  ON card_holders FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM users
+      WHERE users.id = auth.uid() AND users.role = 'admin'
+    )
+  );
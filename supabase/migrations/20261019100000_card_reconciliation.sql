@@ -0,0 +1,50 @@
+/*
+  # Card Reconciliation Digests
+
+  1. New Functions
+    - `card_partition(address, partitions)` - Hash partition of a holder
+      address: the first 32 bits of md5(address), modulo the partition count
+    - `card_digest(part, ...)` - 32-bit digest `part` (0 or 1) of a
+      virtual_cards row, taken from md5 of its canonical
+      `address|id|balance|currency|kyc_tier|region|active` form
+
+  2. Notes
+    - Both must stay in step with contracts/algorand/reconcile.py, which
+      computes the same values from chain state
+    - Digests cover active cards and cards with a balance, as in
+      `SELECT card_partition(user_address, 256), count(*), sum(card_digest(0, ...)),
+      sum(card_digest(1, ...)) FROM virtual_cards WHERE is_active OR balance > 0 GROUP BY 1`
+*/
+
+CREATE OR REPLACE FUNCTION card_partition(address text, partitions bigint)
+RETURNS bigint
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT ('x' || lpad(substr(md5(address), 1, 8), 16, '0'))::bit(64)::bigint % partitions
+$$;
+
+CREATE OR REPLACE FUNCTION card_digest(
+  part bigint,
+  address text,
+  card_id text,
+  balance numeric,
+  currency text,
+  kyc_tier text,
+  region text,
+  is_active boolean
+)
+RETURNS bigint
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT ('x' || lpad(substr(md5(concat_ws('|',
+    address,
+    card_id,
+    round(coalesce(balance, 0))::text,
+    coalesce(currency, ''),
+    coalesce(kyc_tier, ''),
+    coalesce(region, ''),
+    CASE WHEN is_active THEN '1' ELSE '0' END
+  )), 1 + 8 * part::int, 8), 16, '0'))::bit(64)::bigint
+$$;
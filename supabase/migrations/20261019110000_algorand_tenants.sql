@@ -0,0 +1,71 @@
+/*
+  # Algorand Deployments and Shared-Contract Tenants
+
+  1. New Tables
+    - `algorand_contracts` - Per-user legacy app deployments written by
+      algorand/scripts/deploy_contract_simple.py (created here if missing)
+    - `algorand_tenants` - Users registered as tenant boxes of the shared
+      app, one row per (app_id, tenant_key); onboarding and
+      migrate_to_shared.py upsert on that key so reruns update in place
+
+  2. Changes
+    - `algorand_contracts.status` - 'active', or 'inactive' once
+      migrate_to_shared.py has moved the app into the shared contract
+
+  3. Security
+    - Enable RLS on both tables
+    - Admins can read them; writes come from the deploy and migration
+      scripts through the service role
+*/
+
+CREATE TABLE IF NOT EXISTS algorand_contracts (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id text NOT NULL,
+  app_id bigint NOT NULL,
+  address text NOT NULL,
+  network text NOT NULL DEFAULT 'testnet',
+  created_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE algorand_contracts
+  ADD COLUMN IF NOT EXISTS status text NOT NULL DEFAULT 'active'
+  CHECK (status IN ('active', 'inactive'));
+
+CREATE INDEX IF NOT EXISTS algorand_contracts_app_id ON algorand_contracts (app_id);
+
+CREATE TABLE IF NOT EXISTS algorand_tenants (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id text NOT NULL,
+  app_id bigint NOT NULL,
+  tenant_key text NOT NULL,
+  address text NOT NULL,
+  network text NOT NULL DEFAULT 'testnet',
+  legacy_app_id bigint,
+  created_at timestamptz DEFAULT now(),
+  UNIQUE (app_id, tenant_key)
+);
+
+CREATE INDEX IF NOT EXISTS algorand_tenants_user_id ON algorand_tenants (user_id);
+
+ALTER TABLE algorand_contracts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE algorand_tenants ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Admins can read algorand contracts"
+  ON algorand_contracts FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM users
+      WHERE users.id = auth.uid() AND users.role = 'admin'
+    )
+  );
+
+CREATE POLICY "Admins can read algorand tenants"
+  ON algorand_tenants FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM users
+      WHERE users.id = auth.uid() AND users.role = 'admin'
+    )
+  );